@@ -0,0 +1,124 @@
+"""Per-message cost of auto-response matching at 25 entries.
+
+AutoResponse.on_message runs for every non-bot guild message. The old
+find_response re-lowercased every trigger, rebuilt the full-match list and
+went through re.search (and its pattern cache) for each regex trigger on
+every message. This replays a synthetic stream (mostly chatter, a few
+trigger hits) through that algorithm — reproduced below — and through the
+compiled TriggerMatcher the cog now caches per config version, and reports
+microseconds per message and the message rate one core sustains.
+
+Run from the repo root:
+    python benchmarks/auto_response.py [--entries 25] [--messages 10000]
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.optional.auto_response import (  # noqa: E402
+    TriggerMatcher, _response_texts, entry_match_mode,
+)
+
+CHATTER = [
+    "lol that's wild", "anyone up for a game tonight?", "brb", "nice one",
+    "did you see the patch notes", "the build is green again", "gg",
+    "what time is the meeting", "that map is so much better now",
+    "honestly I think the new season is better than the last three combined",
+]
+
+
+def entries(n, seed=0):
+    """n entries, a third per mode, three triggers each."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        mode = ("full", "contains", "regex")[i % 3]
+        words = [f"kw{i}x{j}" for j in range(3)]
+        triggers = [rf"\b{w}\b" for w in words] if mode == "regex" else words
+        out.append({"triggers": triggers, "responses": [f"reply {i}"],
+                    "match": mode, "auto_delete": rng.random() < 0.1})
+    return out
+
+
+def stream(n, table, seed=1):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        line = rng.choice(CHATTER)
+        if rng.random() < 0.05:
+            line += " " + rng.choice(rng.choice(table)["triggers"]).replace(r"\b", "")
+        out.append(line)
+    return out
+
+
+def legacy_find(entries, content):
+    """The pre-compilation find_response."""
+    text = content.strip().lower()
+    for entry in entries:
+        triggers = [str(t) for t in entry.get("triggers", [])]
+        texts = _response_texts(entry.get("responses"))
+        if not triggers or not texts:
+            continue
+        mode = entry_match_mode(entry)
+        if mode == "regex":
+            hit = False
+            for pattern in triggers:
+                try:
+                    if re.search(pattern, content, re.IGNORECASE):
+                        hit = True
+                        break
+                except re.error:
+                    continue
+        elif mode == "contains":
+            hit = any(t.lower() in text for t in triggers)
+        else:
+            hit = text in [t.lower() for t in triggers]
+        if hit:
+            return entry, random.choice(texts)
+    return None
+
+
+def run(find, messages, rounds=5):
+    """Best-of-rounds microseconds per message (whole-stream timing; a
+    per-message timer would cost more than the match itself)."""
+    per_message = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for content in messages:
+            find(content)
+        per_message.append((time.perf_counter() - started) * 1e6 / len(messages))
+    return min(per_message), statistics.median(per_message)
+
+
+def report(label, best, median):
+    print(f"  {label:<9} best {best:6.2f} us/msg   median {median:6.2f} us/msg   "
+          f"~{1e6 / best:,.0f} msgs/sec/core")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=25)
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+    table = entries(args.entries)
+    messages = stream(args.messages, table)
+    matcher = TriggerMatcher(table)
+    hits = sum(matcher.find(m) is not None for m in messages)
+    assert hits == sum(legacy_find(table, m) is not None for m in messages)
+    print(f"{args.entries} entries, {len(messages)} messages ({hits} hits):")
+    old = report("legacy", *run(lambda m: legacy_find(table, m), messages))
+    new = report("compiled", *run(matcher.find, messages))
+    print(f"  speedup {old / new:.1f}x; 10k msgs/sec costs "
+          f"{old * 1e4 / 1e6:.0%} -> {new * 1e4 / 1e6:.0%} of one core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Per-message config overhead: Config.get() vs one Config.snapshot().
+
+The hot listeners (gpt.on_message, AutoResponse.on_message,
+SetRole._process_reaction_toggle, Gpt.cooldown_config) read several keys per
+inbound message. This replays that read pattern N times both ways and
+reports the cost per message against a 10k msgs/sec budget (100 µs/msg).
+
+Run from the repo root:
+    python benchmarks/config_snapshot.py [--messages 100000] [--writer]
+
+--writer adds a background thread doing config.set() on the same guild at
+~1 kHz, so the snapshot path also pays its rebuild-after-change cost.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import Config  # noqa: E402
+
+GUILD = 123456789
+# What one inbound message reads across the listeners that see it.
+KEYS = ("gpt_personality_data", "ai_enabled", "auto_responses", "emoji_role_toggles")
+BUDGET_NS = 1e9 / 10_000
+
+
+def per_message_get(config, n):
+    get = config.get
+    started = time.perf_counter_ns()
+    for _ in range(n):
+        for key in KEYS:
+            get(GUILD, key)
+        get(None, "cooldown_tier_bases", scope="global")
+        get(None, "cooldown_windows", scope="global")
+    return (time.perf_counter_ns() - started) / n
+
+
+def per_message_snapshot(config, n):
+    snapshot = config.snapshot
+    started = time.perf_counter_ns()
+    for _ in range(n):
+        guild_cfg = snapshot(GUILD)
+        for key in KEYS:
+            guild_cfg.get(key)
+        global_cfg = snapshot(None, scope="global")
+        global_cfg.get("cooldown_tier_bases")
+        global_cfg.get("cooldown_windows")
+    return (time.perf_counter_ns() - started) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--writer", action="store_true",
+                        help="concurrent config.set() on the same guild")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = Config(config_dir=tmp)
+        config._save_delay = 3600  # keep disk I/O out of the measurement
+        config.set(GUILD, "gpt_personality_data", {"prompt": "x" * 500, "version": 1})
+        config.set(GUILD, "auto_responses", [{"triggers": ["hi"], "responses": ["yo"]}] * 25)
+        config.set(GUILD, "emoji_role_toggles", [{"message_id": i} for i in range(50)])
+
+        stop = threading.Event()
+        if args.writer:
+            def writer():
+                i = 0
+                while not stop.is_set():
+                    config.set(GUILD, "counter", i)
+                    i += 1
+                    time.sleep(0.001)
+            threading.Thread(target=writer, daemon=True).start()
+
+        try:
+            before = per_message_get(config, args.messages)
+            after = per_message_snapshot(config, args.messages)
+        finally:
+            stop.set()
+            config.shutdown()
+
+    for label, ns in (("get() x6", before), ("snapshot() x2", after)):
+        print(f"{label:>15}: {ns:8.0f} ns/msg  ({ns / BUDGET_NS:6.2%} of a 10k msg/s budget)")
+    print(f"{'speedup':>15}: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
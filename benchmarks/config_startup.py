@@ -0,0 +1,106 @@
+"""Config startup time and RSS at 1k/10k/50k synthetic guild files.
+
+Compares lazy loading (the default: only global.json is parsed at boot,
+guilds load on first touch under an LRU cap) against the old eager
+behaviour (every guild parsed and kept resident, reproduced here by touching
+every guild with the cap disabled). Each measurement runs in a fresh
+subprocess so RSS figures don't bleed between runs.
+
+Run from the repo root:
+    python benchmarks/config_startup.py [--guilds 1000 10000 50000] [--active 200]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _rss_kb():
+    """Current resident set size (Linux /proc; falls back to peak RSS)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def seed(config_dir, guilds):
+    """Guild files shaped like real ones: a personality, a few memories."""
+    rng = random.Random(0)
+    for gid in range(guilds):
+        data = {
+            "current_ai_provider": "xai",
+            "gpt_personality_data": {"prompt": "be helpful " * 20, "version": 1},
+            "gpt_memories": [
+                {"text": f"memory {i} " * 8, "expires": 2e9, "type": "fact",
+                 "sender": "u", "personality_version": 1, "stored_at": 1.7e9}
+                for i in range(rng.randint(0, 20))
+            ],
+        }
+        with open(os.path.join(config_dir, f"{10**17 + gid}.json"), "w") as f:
+            json.dump(data, f)
+
+
+def measure(config_dir, mode, active):
+    """Child-process body: boot a Config, touch guilds, report JSON."""
+    sys.path.insert(0, ROOT)
+    from core.config import Config
+
+    rss_before = _rss_kb()
+    started = time.perf_counter()
+    if mode == "eager":
+        config = Config(config_dir=config_dir, max_resident=None)
+        gids = config.guild_ids()
+        for gid in gids:
+            config.get(gid, "current_ai_provider")
+    else:
+        config = Config(config_dir=config_dir)
+        gids = config.guild_ids()
+    boot_s = time.perf_counter() - started
+    # Then a burst of traffic from a subset of active guilds.
+    for gid in gids[:active]:
+        config.get(gid, "gpt_memories")
+    stats = config.cache_stats()
+    config.shutdown()
+    print(json.dumps({"boot_s": boot_s, "rss_mb": (_rss_kb() - rss_before) / 1024,
+                      "resident": stats["resident"]}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--active", type=int, default=200,
+                        help="guilds touched after boot (the live working set)")
+    parser.add_argument("--child", nargs=2, metavar=("DIR", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        measure(args.child[0], args.child[1], args.active)
+        return
+
+    print(f"{'guilds':>7} {'mode':>6} {'boot s':>8} {'RSS MB':>8} {'resident':>9}")
+    for guilds in args.guilds:
+        with tempfile.TemporaryDirectory() as tmp:
+            seed(tmp, guilds)
+            for mode in ("eager", "lazy"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--active", str(args.active),
+                     "--child", tmp, mode],
+                    check=True, capture_output=True, text=True).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                print(f"{guilds:>7} {mode:>6} {result['boot_s']:>8.3f} "
+                      f"{result['rss_mb']:>8.1f} {result['resident']:>9}")
+
+
+if __name__ == "__main__":
+    main()
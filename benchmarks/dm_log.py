@@ -0,0 +1,137 @@
+"""DM transcript reads: full-file scan vs the sidecar index.
+
+load_dms used to stream and json.loads every line of user_{id}.jsonl for
+any read — a 50-row tail, an after_id poll one row from the end — and
+list_dm_conversations did that once per user to find each newest row. This
+writes a --rows transcript and times the reads read_dms makes through that
+algorithm (reproduced below) and through the indexed load_dms, then lists
+--users small conversations both ways. The scan is linear in rows, so the
+listing is also extrapolated to --rows rows per user (creating 10k x 200k
+rows on disk is not practical); the indexed listing doesn't depend on it.
+
+Run from the repo root:
+    python benchmarks/dm_log.py [--rows 200000] [--users 10000] [--user-rows 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import dm_log  # noqa: E402
+
+FIRST_ID = 10 ** 17
+
+
+def legacy_load_dms(user_id, limit=None, since=None, after_id=None):
+    """The pre-index load_dms."""
+    path = dm_log._dm_file(user_id)
+    if not path.exists():
+        return []
+    rows = [] if (limit is None or after_id is not None) else deque(maxlen=limit)
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if after_id is not None:
+                try:
+                    if int(row.get('message_id') or 0) <= after_id:
+                        continue
+                except (TypeError, ValueError):
+                    continue
+            if since is not None and str(row.get('timestamp', '')) <= since:
+                continue
+            rows.append(row)
+            if after_id is not None and limit is not None and len(rows) >= limit:
+                break
+    return list(rows)
+
+
+def message_id(row):
+    return FIRST_ID + row * 1000
+
+
+def write_transcript(user_id, rows):
+    with open(dm_log._dm_file(user_id), 'w') as f:
+        for i in range(rows):
+            f.write(json.dumps({
+                "timestamp": f"2026-01-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}",
+                "direction": "in" if i % 2 else "out", "user_id": user_id, "author_id": user_id,
+                "message_id": message_id(i), "content": f"message number {i} " + "x" * 80,
+                "attachments": [],
+            }) + '\n')
+
+
+def timed(fn, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def conversations(load):
+    """list_dm_conversations' blocking half, over either reader."""
+    return [{"user_id": uid, "last_message_at": (tail[-1]["timestamp"] if tail else None)}
+            for uid in dm_log.list_dm_users() for tail in [load(uid, limit=1)]]
+
+
+def report(label, old, new):
+    print(f"  {label:<28} scan {old * 1e3:10.2f} ms   index {new * 1e3:8.3f} ms   "
+          f"{old / new:10,.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--user-rows", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        dm_log.DM_LOG_DIR = Path(tmp) / "big"
+        dm_log.DM_LOG_DIR.mkdir()
+        write_transcript(1, args.rows)
+        size = dm_log._dm_file(1).stat().st_size
+        started = time.perf_counter()
+        dm_log.load_dms(1, limit=1)  # first read indexes the existing transcript
+        build = time.perf_counter() - started
+        print(f"{args.rows:,} rows ({size / 1e6:.0f} MB); one-time index build "
+              f"{build:.2f}s ({dm_log._index_file(1).stat().st_size / 1e6:.1f} MB):")
+        for label, kwargs in (("read_dms tail, limit 50", {"limit": 50}),
+                              ("poll, 10 rows behind", {"after_id": message_id(args.rows - 11), "limit": 50}),
+                              ("poll from the middle", {"after_id": message_id(args.rows // 2), "limit": 50})):
+            old, expected = timed(lambda: legacy_load_dms(1, **kwargs), args.rounds)
+            new, got = timed(lambda: dm_log.load_dms(1, **kwargs), args.rounds)
+            assert got == expected, label
+            report(label, old, new)
+
+        dm_log.DM_LOG_DIR = Path(tmp) / "many"
+        dm_log.DM_LOG_DIR.mkdir()
+        for uid in range(1, args.users + 1):
+            write_transcript(uid, args.user_rows)
+        conversations(dm_log.load_dms)  # index build, as above
+        old, expected = timed(lambda: conversations(legacy_load_dms), 1)
+        new, got = timed(lambda: conversations(dm_log.load_dms), 1)
+        assert got == expected
+        print(f"{args.users:,} conversations of {args.user_rows} rows:")
+        report("list_dm_conversations", old, new)
+        extrapolated = old * args.rows / args.user_rows
+        print(f"  at {args.rows:,} rows per user the scan listing would take "
+              f"~{extrapolated / 3600:,.1f} h; the indexed one stays {new:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Request latency: a model (and HTTP client) built per request vs. the pool.
+
+LLMClient used to build a fresh pydantic-ai provider on every chat() call,
+so every `!gpt` message paid a new connection — TCP, plus TLS against a real
+provider. This runs N sequential chat() calls against a local stub
+OpenAI-compatible server both ways and reports p50/p95 time to first byte
+(the stub answers in one small non-streamed body, so first byte ≈ response).
+
+The stub speaks plain HTTP on loopback, where a connect costs microseconds.
+--connect-delay makes the stub stall each NEW connection for that many
+seconds, standing in for the handshake round trips a real provider costs
+(TCP + TLS 1.3 to a nearby region is typically 20-60 ms). At the default
+of 0 the gap is what building the provider/SDK client itself costs.
+
+Run from the repo root:
+    python benchmarks/llm_pool.py [--requests 200] [--connect-delay 0.03]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.llm.client import LLMClient, ProviderConfig, _new_http_client  # noqa: E402
+
+PROVIDER_INFO = {"name": "stub", "base_url": None, "requires_api_key": False,
+                 "default_model": "stub-model", "models": {"stub-model": {}}}
+MESSAGES = [{"role": "system", "content": "You are terse."},
+            {"role": "user", "content": "ping"}]
+COMPLETION = json.dumps({
+    "id": "chatcmpl-stub", "object": "chat.completion", "created": 0,
+    "model": "stub-model",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "pong"}}],
+    "usage": {"prompt_tokens": 8, "completion_tokens": 1, "total_tokens": 9},
+}).encode()
+
+
+def make_handler(connect_delay, counter):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        # Headers and body go out as two writes; with Nagle on, a kept-alive
+        # socket stalls ~40 ms per response on the peer's delayed ACK.
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            counter["connections"] += 1
+            if connect_delay:
+                time.sleep(connect_delay)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(COMPLETION)))
+            self.end_headers()
+            self.wfile.write(COMPLETION)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+
+class _Config:
+    def get(self, *a, **k):
+        return None
+
+
+class PerRequestClient(LLMClient):
+    """The old behavior: a new model and HTTP client for every request."""
+
+    def _build_model(self, provider, model, provider_info, api_key):
+        return self._construct_model(provider, model, provider_info, api_key,
+                                     _new_http_client("openai"))
+
+
+async def measure(client, pc, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        await client.chat(pc, MESSAGES)
+        samples.append((time.perf_counter() - started) * 1000)
+    await client.aclose()
+    return samples
+
+
+def report(label, samples, connections):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+    print(f"{label:<22} p50 {statistics.median(samples):7.2f} ms   "
+          f"p95 {p95:7.2f} ms   connections opened: {connections}")
+    return statistics.median(samples), p95
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--connect-delay", type=float, default=0.0,
+                        help="seconds the stub stalls each new connection")
+    args = parser.parse_args()
+
+    counter = {"connections": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.connect_delay, counter))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    info = dict(PROVIDER_INFO, base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    pc = ProviderConfig(provider="stub", model="stub-model", provider_info=info, all_providers={})
+
+    print(f"{args.requests} sequential chat() calls, connect delay "
+          f"{args.connect_delay * 1000:.0f} ms\n")
+    counter["connections"] = 0
+    fresh = asyncio.run(measure(PerRequestClient(_Config()), pc, args.requests))
+    fresh_p50, fresh_p95 = report("model per request", fresh, counter["connections"])
+    counter["connections"] = 0
+    pooled = asyncio.run(measure(LLMClient(_Config()), pc, args.requests))
+    pooled_p50, pooled_p95 = report("pooled (cached model)", pooled, counter["connections"])
+    print(f"\nsaved per request: p50 {fresh_p50 - pooled_p50:.2f} ms, "
+          f"p95 {fresh_p95 - pooled_p95:.2f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
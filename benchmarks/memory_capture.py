@@ -0,0 +1,168 @@
+"""Per-message cost of GPT memory capture at 1k and 100k stored memories.
+
+Gpt.capture_and_store_memories runs on every message the bot sees. The old
+version ran eleven uncompiled patterns one by one, de-duplicated each new
+memory against the guild's whole list, and scanned the list for expired
+entries on every message. This replays a synthetic message stream (mostly
+chatter, some memory-worthy lines, repeats included) through the old
+algorithm — reproduced below — and through the shipped cog method, against
+a guild already holding N memories, and reports microseconds per message.
+
+Run from the repo root:
+    python benchmarks/memory_capture.py [--stored 1000 100000] [--messages 5000]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.optional.gpt import Gpt  # noqa: E402
+from core.memories import MEMORY_PATTERNS, MemoryMatcher  # noqa: E402
+
+CHATTER = [
+    "lol that's wild", "anyone up for a game tonight?", "brb", "nice one",
+    "did you see the patch notes", "the build is green again", "gg",
+    "what time is the meeting", "that map is so much better now",
+]
+MEMORABLE = [
+    "I love {w}", "I hate {w}", "my name is {w}", "call me {w}",
+    "I'm {w} today", "remind me to {w}", "I want {w}", "I feel {w}",
+]
+WORDS = ["pizza", "mondays", "sourdough", "tired", "factorio", "rain", "Ada", "cats"]
+
+
+def stream(n, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        if rng.random() < 0.15:
+            out.append(rng.choice(MEMORABLE).format(w=rng.choice(WORDS)))
+        else:
+            out.append(rng.choice(CHATTER))
+    return out
+
+
+def stored(n, now, seed=1):
+    rng = random.Random(seed)
+    return [{"text": f"I love thing{i}", "type": "positive_preference",
+             "sender": rng.randrange(500), "expires": now + rng.uniform(60, 86400 * 30),
+             "personality_version": 0, "stored_at": now} for i in range(n)]
+
+
+def legacy_capture(config, ctx, messages, version):
+    """The pre-index algorithm, minus the directive admin check (no
+    directives in the stream)."""
+    all_server_memories = config.get(ctx, "gpt_memories") or []
+    new = []
+    changes_made = False
+    for msg in messages:
+        for kind, pattern, duration, _trigger in MEMORY_PATTERNS:
+            m = re.search(pattern, msg.content, flags=re.I)
+            if m:
+                new.append({"text": m.group(0), "expires": time.time() + duration,
+                            "type": kind, "sender": msg.author.id,
+                            "personality_version": version, "stored_at": time.time()})
+    if not new:
+        if any(m.get("expires", 0) <= time.time() for m in all_server_memories):
+            active = [m for m in all_server_memories if m.get("expires", 0) > time.time()]
+            if len(active) != len(all_server_memories):
+                config.set(ctx, "gpt_memories", active)
+        return
+    for new_mem in new:
+        for existing in all_server_memories:
+            if (new_mem["text"] == existing.get("text", "") and new_mem["type"] == existing.get("type", "")
+                    and new_mem["sender"] == existing.get("sender")):
+                existing.update(expires=new_mem["expires"], stored_at=new_mem["stored_at"])
+                changes_made = True
+                break
+        else:
+            all_server_memories.append(new_mem)
+            changes_made = True
+    if any(m.get("expires", 0) <= time.time() for m in all_server_memories):
+        all_server_memories = [m for m in all_server_memories if m.get("expires", 0) > time.time()]
+        changes_made = True
+    if changes_made:
+        config.set(ctx, "gpt_memories", all_server_memories)
+
+
+class _Config:
+    def __init__(self, memories):
+        self.values = {"gpt_memories": memories}
+
+    def get(self, ctx, key, default=None, scope="guild"):
+        return self.values.get(key, default)
+
+    def set(self, ctx, key, value, scope="guild"):
+        self.values[key] = value
+
+
+def _messages(texts):
+    authors = [SimpleNamespace(id=i, bot=False) for i in range(50)]
+    return [SimpleNamespace(content=t, author=authors[i % 50], guild=None)
+            for i, t in enumerate(texts)]
+
+
+def run_legacy(n_stored, messages):
+    config = _Config(stored(n_stored, time.time()))
+    ctx = SimpleNamespace(guild=SimpleNamespace(id=1))
+    samples = []
+    for msg in messages:
+        started = time.perf_counter()
+        legacy_capture(config, ctx, [msg], 0)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def run_indexed(n_stored, messages):
+    gpt = Gpt.__new__(Gpt)
+    gpt.logger = logging.getLogger("bench")
+    gpt.bot = SimpleNamespace(config=_Config(stored(n_stored, time.time())))
+    gpt.memory_matcher = MemoryMatcher()
+    gpt._memory_indexes = {}
+    ctx = SimpleNamespace(guild=SimpleNamespace(id=1))
+
+    async def go():
+        await gpt.capture_and_store_memories(ctx, [messages[0]], 0)  # builds the index
+        samples = []
+        for msg in messages:
+            started = time.perf_counter()
+            await gpt.capture_and_store_memories(ctx, [msg], 0)
+            samples.append((time.perf_counter() - started) * 1e6)
+        return samples
+    return asyncio.run(go())
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(0.99 * len(samples)))]
+    print(f"  {label:<9} mean {statistics.fmean(samples):9.1f} us   "
+          f"p50 {statistics.median(samples):9.1f} us   p99 {p99:9.1f} us")
+    return statistics.fmean(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stored", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+    messages = _messages(stream(args.messages))
+    for n in args.stored:
+        print(f"{n} stored memories, {len(messages)} messages:")
+        # The legacy path is O(stored) per message; sample fewer at scale.
+        sample = messages[: max(200, len(messages) * 1000 // max(n, 1000))]
+        old = report("legacy", run_legacy(n, sample))
+        new = report("indexed", run_indexed(n, messages))
+        print(f"  speedup {old / new:.1f}x\n")
+
+
+if __name__ == "__main__":
+    main()
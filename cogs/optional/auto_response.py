@@ -19,6 +19,14 @@ Absent/empty key = inert in that guild (default OFF everywhere; manage with
 !autoresponse). First matching entry wins, in config
 order. Capped at 25 entries per guild — the panel dropdown's hard limit.
 
+Matching runs on every guild message, so a guild's entries are compiled
+once into a `TriggerMatcher` (full-match dict, one automaton for all
+contains triggers, pre-compiled regexes) and cached per guild against the
+config snapshot version; any write to `auto_responses` bumps the version
+and the next message recompiles. The cache is an LRU of MATCHER_CACHE_SIZE
+guilds (like config residency); a guild that empties its entries or
+removes the bot is dropped at once.
+
 Loop safety: ALL bot-authored messages are ignored (message.author.bot),
 not just our own — two bots both running this cog once replied to each
 other's replies forever (the cope->seethe incident, 2026-08-07).
@@ -29,6 +37,7 @@ the same services (`_list_entries` / `_add_entry` / `_remove_entry`) the
 panel does — the panel holds presentation only, so an agent and an admin
 clicking buttons write the identical `auto_responses` shape.
 """
+from collections import OrderedDict
 from discord.ext import commands
 
 import discord
@@ -40,6 +49,8 @@ from core.ops import OpParam, OpScope, ParamKind, PermissionLevel, op
 from core.utils import InvokerOnlyView, app_is_admin, is_admin
 
 MAX_ENTRIES = 25  # Discord select-menu option cap
+# Compiled matchers kept, least recently matched evicted first.
+MATCHER_CACHE_SIZE = 256
 
 MATCH_FULL = "full"
 MATCH_CONTAINS = "contains"
@@ -66,6 +77,79 @@ def entry_match_mode(entry):
     return MATCH_FULL if entry.get("full_match", True) else MATCH_CONTAINS
 
 
+class TriggerMatcher:
+    """One guild's entries, compiled for `find`.
+
+    full     — dict of case-folded trigger -> first entry index using it
+    contains — every trigger in one lookahead alternation, listed in entry
+               order: at each position of the message the automaton reports
+               the earliest entry whose trigger starts there, so the
+               minimum over all positions is the first matching entry
+    regex    — patterns compiled once; a malformed one is dropped here
+
+    Entries with no triggers or no responses are left out, as before."""
+
+    def __init__(self, entries):
+        self.entries = []  # (entry, response texts), by compiled index
+        self.full = {}
+        self.regexes = []  # (index, [compiled patterns]), in entry order
+        contains = {}
+        for entry in entries:
+            triggers = [str(t) for t in entry.get("triggers", [])]
+            texts = _response_texts(entry.get("responses"))
+            if not triggers or not texts:
+                continue
+            index = len(self.entries)
+            self.entries.append((entry, texts))
+            mode = entry_match_mode(entry)
+            if mode == MATCH_REGEX:
+                compiled = []
+                for pattern in triggers:
+                    try:
+                        compiled.append(re.compile(pattern, re.IGNORECASE))
+                    except re.error:
+                        continue
+                if compiled:
+                    self.regexes.append((index, compiled))
+            elif mode == MATCH_CONTAINS:
+                for t in triggers:
+                    contains.setdefault(t.lower(), index)
+            else:
+                for t in triggers:
+                    self.full.setdefault(t.lower(), index)
+        self.contains = contains
+        self.automaton = None
+        if contains:
+            ordered = sorted(contains, key=contains.__getitem__)
+            self.automaton = re.compile(
+                "(?=(" + "|".join(re.escape(t) for t in ordered) + "))")
+
+    def first_match(self, content):
+        """Index (into self.entries) of the first matching entry, or None."""
+        text = content.strip().lower()
+        best = self.full.get(text)
+        if self.automaton is not None and best != 0:
+            for m in self.automaton.finditer(text):
+                index = self.contains[m.group(1)]
+                if best is None or index < best:
+                    best = index
+                    if index == 0:
+                        break
+        for index, patterns in self.regexes:
+            if best is not None and index >= best:
+                break
+            if any(p.search(content) for p in patterns):
+                return index
+        return best
+
+    def find(self, content):
+        index = self.first_match(content)
+        if index is None:
+            return None
+        entry, texts = self.entries[index]
+        return entry, random.choice(texts)
+
+
 def find_response(entries, content):
     """(entry, response) for the first entry matching `content`, else None.
 
@@ -74,31 +158,11 @@ def find_response(entries, content):
     regex  — a trigger is a case-insensitive pattern searched against it
 
     Pure function of (config entries, message text) so the rules stay
-    unit-testable. A malformed regex is skipped rather than raised: a bad
-    pattern in one guild's config must not break message handling."""
-    text = content.strip().lower()
-    for entry in entries:
-        triggers = [str(t) for t in entry.get("triggers", [])]
-        texts = _response_texts(entry.get("responses"))
-        if not triggers or not texts:
-            continue
-        mode = entry_match_mode(entry)
-        if mode == MATCH_REGEX:
-            hit = False
-            for pattern in triggers:
-                try:
-                    if re.search(pattern, content, re.IGNORECASE):
-                        hit = True
-                        break
-                except re.error:
-                    continue
-        elif mode == MATCH_CONTAINS:
-            hit = any(t.lower() in text for t in triggers)
-        else:
-            hit = text in [t.lower() for t in triggers]
-        if hit:
-            return entry, random.choice(texts)
-    return None
+    unit-testable; the cog keeps the compiled `TriggerMatcher` instead of
+    rebuilding it per message. A malformed regex is skipped rather than
+    raised: a bad pattern in one guild's config must not break message
+    handling."""
+    return TriggerMatcher(entries).find(content)
 
 
 def normalize_triggers(triggers, mode):
@@ -158,6 +222,8 @@ class AutoResponse(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.logger = bot.logger
+        # guild id -> (snapshot version, TriggerMatcher), LRU order
+        self._matchers = OrderedDict()
 
     def _entries(self, guild_id):
         return self.bot.config.get(guild_id, "auto_responses", []) or []
@@ -244,6 +310,20 @@ class AutoResponse(commands.Cog):
         return {"status": "removed", "index": index, "entry": removed,
                 "count": len(entries)}
 
+    def _matcher(self, guild_id, version, entries):
+        """The guild's compiled matcher, rebuilt when its config version moves."""
+        cached = self._matchers.get(guild_id)
+        if cached is None or cached[0] != version:
+            cached = self._matchers[guild_id] = (version, TriggerMatcher(entries))
+            while len(self._matchers) > MATCHER_CACHE_SIZE:
+                self._matchers.popitem(last=False)
+        self._matchers.move_to_end(guild_id)
+        return cached[1]
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self._matchers.pop(guild.id, None)
+
     @commands.Cog.listener()
     async def on_message(self, message):
         # ANY bot author, not just self — the guard that makes a two-bot
@@ -252,10 +332,13 @@ class AutoResponse(commands.Cog):
             return
         if message.guild is None:
             return
-        entries = self._entries(message.guild.id)
+        # Hot path (every guild message): lock-free snapshot read.
+        snapshot = self.bot.config.snapshot(message.guild.id)
+        entries = snapshot.get("auto_responses") or []
         if not entries:
+            self._matchers.pop(message.guild.id, None)
             return
-        found = find_response(entries, message.content)
+        found = self._matcher(message.guild.id, snapshot.version, entries).find(message.content)
         if not found:
             return
         entry, response = found
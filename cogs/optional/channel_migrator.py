@@ -4,13 +4,14 @@ import json
 import re
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Set, Union
-from urllib.parse import urlsplit
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import aiohttp
 import discord
 from discord.ext import commands
 
+from core import channel_bundle
+from core.asset_store import AssetStore, asset_key
 from core.utils import is_superadmin
 
 
@@ -24,9 +25,24 @@ class ChannelMigrator(commands.Cog):
     """Tools for exporting and replaying channel history bundles."""
 
     CHAR_LIMIT = 1900  # Leave headroom for metadata
+    # Pause between replay sends until discord.py has seen the channel's
+    # rate-limit headers; after that the pause comes from the bucket
+    # (see _send_delay).
     POST_DELAY = 0.3
-    ASSET_DELAY = 1.0
+    MAX_SEND_DELAY = 5.0
+    # Replay prefetch: entries buffered ahead of the sender, downloads in
+    # flight at once, and the attachment bytes the buffer may hold (one
+    # entry bigger than that is still let through on its own).
+    PREFETCH_ENTRIES = 32
+    PREFETCH_CONCURRENCY = 4
+    PREFETCH_BYTES = 64 * 1024 * 1024
+    # Bundle asset downloads in flight at once, and the shared
+    # content-addressed store they land in (core/asset_store.py).
+    ASSET_CONCURRENCY = 4
+    ASSET_CHUNK = 64 * 1024
+    ASSET_STORE_DIR = "assets"
     STORAGE_DIR = Path("backups") / "channel_exports"
+    BUNDLE_SUFFIX = channel_bundle.BUNDLE_SUFFIX
     JSONL_SUFFIX = ".jsonl"
     JSON_SUFFIX = ".json"
 
@@ -39,6 +55,7 @@ class ChannelMigrator(commands.Cog):
         # Created lazily in _session(): __init__ runs in a sync context where
         # aiohttp.ClientSession() may not have a running event loop.
         self._http_session: Optional[aiohttp.ClientSession] = None
+        self._assets: Optional[AssetStore] = None
 
     @commands.command(name="backupchannel", hidden=True)
     @commands.check(is_superadmin)
@@ -48,38 +65,63 @@ class ChannelMigrator(commands.Cog):
         channel: Optional[Union[ChannelTarget, str]] = None,
         guild_id: Optional[int] = None,
     ):
-        """Export the current (or specified) channel into a local bundle."""
+        """Export the current (or specified) channel into a local bundle.
+
+        If an earlier export of the same channel stopped partway, this
+        resumes it after its last checkpointed message instead of starting
+        a new bundle."""
         target_channel = self._resolve_backup_channel(ctx, channel, guild_id)
         if not self._is_text_channel(target_channel):
             await ctx.send("Only text channels or threads can be exported.")
             return
 
-        safe_name = self._generate_bundle_name(target_channel)
-        bundle_path = self._bundle_path(safe_name)
-        if bundle_path.exists():
-            safe_name = self._dedupe_bundle_name(safe_name)
+        bundle_path = self._resumable_bundle_path(target_channel)
+        after = None
+        if bundle_path is not None:
+            safe_name = self._bundle_name_of(bundle_path)
+            _meta, blocks, _summary = channel_bundle.read_index(bundle_path)
+            after = channel_bundle.checkpoint(blocks)
+            writer = channel_bundle.BundleWriter(bundle_path, resume=True)
+            await ctx.send(
+                f"Resuming export of {target_channel.mention} into bundle `{safe_name}` "
+                f"after {writer.message_count} already-exported messages."
+            )
+        else:
+            safe_name = self._generate_bundle_name(target_channel)
             bundle_path = self._bundle_path(safe_name)
-
-        await ctx.send(
-            f"Starting export of {target_channel.mention} into bundle `{safe_name}`. "
-            "This may take a while for large histories."
-        )
-
-        message_count = 0
+            if bundle_path.exists():
+                safe_name = self._dedupe_bundle_name(safe_name)
+                bundle_path = self._bundle_path(safe_name)
+            writer = channel_bundle.BundleWriter(
+                bundle_path, meta={"bundle_name": safe_name, "channel_id": target_channel.id})
+            blocks = []
+            await ctx.send(
+                f"Starting export of {target_channel.mention} into bundle `{safe_name}`. "
+                "This may take a while for large histories."
+            )
+
+        complete = False
         try:
-            with bundle_path.open("w", encoding="utf-8") as fp:
-                header = self._build_bundle_header(ctx, target_channel, safe_name)
-                fp.write(json.dumps(header) + "\n")
-                async for message in target_channel.history(limit=None, oldest_first=True):
-                    fp.write(json.dumps(self._wrap_message(message)) + "\n")
-                    message_count += 1
-                fp.write(json.dumps({"type": "summary", "message_count": message_count}) + "\n")
+            if not blocks:
+                await writer.put(self._build_bundle_header(ctx, target_channel, safe_name))
+            history = target_channel.history(
+                limit=None, oldest_first=True,
+                after=discord.Object(id=after) if after else None)
+            async for message in history:
+                await writer.put(self._wrap_message(message))
+            complete = True
         except discord.Forbidden:
             await ctx.send("I cannot read that channel's history.")
             return
         except discord.HTTPException as exc:
-            await ctx.send(f"Failed while reading history: {exc}")
+            await ctx.send(
+                f"Failed while reading history: {exc}\n"
+                f"Run `!backupchannel` on the same channel again to resume."
+            )
             return
+        finally:
+            # Also on failure: what was read so far is kept and indexed.
+            message_count = await writer.close(complete=complete)
 
         await ctx.send(
             f"Export complete. Stored {message_count} messages at `{bundle_path}`.\n"
@@ -92,8 +134,11 @@ class ChannelMigrator(commands.Cog):
         self,
         ctx: commands.Context,
         bundle_name: str,
+        start: int = 0,
     ):
-        """Replay a stored bundle into the current channel."""
+        """Replay a stored bundle into the current channel, optionally
+        starting at its `start`-th message (0-based) to finish a replay that
+        was cut short."""
         try:
             safe_name = self._sanitize_bundle_name(bundle_name)
         except commands.BadArgument as exc:
@@ -110,16 +155,16 @@ class ChannelMigrator(commands.Cog):
             await ctx.send("Can only migrate into text channels or threads.")
             return
 
-        total_entries = self._count_bundle_messages(bundle_path)
+        start = max(0, start)
+        total_entries = max(0, self._count_bundle_messages(bundle_path) - start)
         await ctx.send(
-            f"Replaying {total_entries} entries from `{safe_name}` into {target_channel.mention}. "
+            f"Replaying {total_entries} entries from `{safe_name}` into {target_channel.mention}"
+            + (f", starting at entry {start}" if start else "") + ". "
             "Attachments will be re-uploaded when possible (fallback to links if too large or unavailable)."
         )
 
-        sent_entries = 0
-        for entry in self._iter_bundle_messages(bundle_path):
-            await self._replay_entry(target_channel, entry)
-            sent_entries += 1
+        sent_entries = await self._replay_bundle(
+            target_channel, self._iter_bundle_messages(bundle_path, start))
 
         await ctx.send(
             f"Migration complete. Replayed {sent_entries} entries from `{safe_name}` into {target_channel.mention}."
@@ -132,7 +177,8 @@ class ChannelMigrator(commands.Cog):
         ctx: commands.Context,
         bundle_name: Optional[str] = None,
     ):
-        """Download all embed images and attachments from a bundle dump."""
+        """Download all embed images and attachments from a bundle dump into
+        the shared asset store, which later replays read them from."""
         if bundle_name:
             try:
                 safe_name = self._sanitize_bundle_name(bundle_name)
@@ -142,43 +188,55 @@ class ChannelMigrator(commands.Cog):
             bundle_path = self._resolve_bundle_path(safe_name)
         else:
             bundle_path = self._latest_bundle_path()
-            safe_name = bundle_path.stem if bundle_path else None
+            safe_name = self._bundle_name_of(bundle_path) if bundle_path else None
 
         if not bundle_path:
             await ctx.send("No bundle found to download assets from.")
             return
 
-        asset_dir = self.storage_dir / f"{safe_name}_assets"
-        asset_dir.mkdir(parents=True, exist_ok=True)
-
-        urls = self._collect_bundle_media_urls(bundle_path)
+        references = self._collect_bundle_media_refs(bundle_path)
+        # One download per asset: re-issued CDN links differ only in the query.
+        by_key: Dict[str, str] = {}
+        for _message_id, url in references:
+            by_key.setdefault(asset_key(url), url)
+        urls = sorted(by_key.values())
         if not urls:
             await ctx.send(f"No embed images or attachments found in `{safe_name}`.")
             return
 
-        await ctx.send(f"Downloading {len(urls)} assets from `{safe_name}` into `{asset_dir}`.")
+        store = self._asset_store()
+        await ctx.send(f"Fetching {len(urls)} assets from `{safe_name}` into the asset store `{store.root}`.")
 
-        downloaded = 0
-        failed = 0
-        for index, url in enumerate(sorted(urls)):
-            filename = self._filename_from_url(url, index)
-            payload = await self._download_with_retry(url, filename)
-            if payload is None:
-                failed += 1
-                await asyncio.sleep(self.ASSET_DELAY)
-                continue
-            (asset_dir / filename).write_bytes(payload)
-            downloaded += 1
-            await asyncio.sleep(self.ASSET_DELAY)
+        gate = asyncio.Semaphore(self.ASSET_CONCURRENCY)
 
+        async def fetch(url):
+            async with gate:
+                return await self._store_asset(url)
+        outcomes = await asyncio.gather(*(fetch(url) for url in urls))
+        counts = {"new": 0, "duplicate": 0, "cached": 0, None: 0}
+        for outcome in outcomes:
+            counts[outcome] += 1
+        stored = {asset_key(url) for url, outcome in zip(urls, outcomes) if outcome is not None}
+        store.record(safe_name, [(mid, url) for mid, url in references if asset_key(url) in stored])
+
+        bundle_stats = store.stats(safe_name)
+        store_stats = store.stats()
         await ctx.send(
-            f"Asset download complete. Saved {downloaded} files to `{asset_dir}` "
-            f"({failed} failed)."
+            f"Asset download complete: {counts['new']} new, {counts['duplicate']} duplicates of stored "
+            f"blobs, {counts['cached']} already stored, {counts[None]} failed.\n"
+            f"`{safe_name}`: {bundle_stats['references']} references to {bundle_stats['blobs']} blobs, "
+            f"{_megabytes(bundle_stats['stored_bytes'])} stored for {_megabytes(bundle_stats['logical_bytes'])} "
+            f"referenced.\n"
+            f"Store: {store_stats['blobs']} blobs, {_megabytes(store_stats['stored_bytes'])}, "
+            f"{_megabytes(store_stats['saved_bytes'])} saved by dedupe."
         )
 
     async def cog_unload(self):
         if self._http_session is not None and not self._http_session.closed:
             await self._http_session.close()
+        if self._assets is not None:
+            self._assets.close()
+            self._assets = None
 
     def _session(self) -> aiohttp.ClientSession:
         """Return the shared HTTP session, creating it on first use."""
@@ -186,25 +244,49 @@ class ChannelMigrator(commands.Cog):
             self._http_session = aiohttp.ClientSession()
         return self._http_session
 
+    def _asset_store(self) -> AssetStore:
+        """Return the shared asset store, opening it on first use."""
+        if self._assets is None:
+            self._assets = AssetStore(self.storage_dir / self.ASSET_STORE_DIR)
+        return self._assets
+
     def _is_text_channel(self, channel: Any) -> bool:
         return isinstance(channel, (discord.TextChannel, discord.Thread))
 
     def _bundle_path(self, safe_name: str) -> Path:
-        return self.storage_dir / f"{safe_name}{self.JSONL_SUFFIX}"
+        return self.storage_dir / f"{safe_name}{self.BUNDLE_SUFFIX}"
+
+    def _bundle_name_of(self, bundle_path: Path) -> str:
+        for suffix in (self.BUNDLE_SUFFIX, self.JSONL_SUFFIX, self.JSON_SUFFIX):
+            if bundle_path.name.endswith(suffix):
+                return bundle_path.name[: -len(suffix)]
+        return bundle_path.stem
 
     def _resolve_bundle_path(self, safe_name: str) -> Optional[Path]:
-        jsonl_path = self._bundle_path(safe_name)
-        if jsonl_path.exists():
-            return jsonl_path
-        json_path = self.storage_dir / f"{safe_name}{self.JSON_SUFFIX}"
-        if json_path.exists():
-            return json_path
+        # Compressed bundles first; .jsonl / .json are older exports.
+        for suffix in (self.BUNDLE_SUFFIX, self.JSONL_SUFFIX, self.JSON_SUFFIX):
+            path = self.storage_dir / f"{safe_name}{suffix}"
+            if path.exists():
+                return path
         return None
 
     def _latest_bundle_path(self) -> Optional[Path]:
-        candidates = list(self.storage_dir.glob(f"*{self.JSONL_SUFFIX}")) + list(
-            self.storage_dir.glob(f"*{self.JSON_SUFFIX}")
-        )
+        candidates = [
+            path
+            for suffix in (self.BUNDLE_SUFFIX, self.JSONL_SUFFIX, self.JSON_SUFFIX)
+            for path in self.storage_dir.glob(f"*{suffix}")
+        ]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda path: path.stat().st_mtime)
+
+    def _resumable_bundle_path(self, channel: ChannelTarget) -> Optional[Path]:
+        """Newest compressed bundle of `channel` whose export never finished."""
+        candidates = []
+        for path in self.storage_dir.glob(f"*{self.BUNDLE_SUFFIX}"):
+            meta, _blocks, summary = channel_bundle.read_index(path)
+            if summary is None and meta.get("channel_id") == channel.id:
+                candidates.append(path)
         if not candidates:
             return None
         return max(candidates, key=lambda path: path.stat().st_mtime)
@@ -347,6 +429,8 @@ class ChannelMigrator(commands.Cog):
         }
 
     def _count_bundle_messages(self, bundle_path: Path) -> int:
+        if bundle_path.name.endswith(self.BUNDLE_SUFFIX):
+            return channel_bundle.count_messages(bundle_path)
         if bundle_path.suffix == self.JSONL_SUFFIX:
             count = 0
             with bundle_path.open("r", encoding="utf-8") as fp:
@@ -366,7 +450,20 @@ class ChannelMigrator(commands.Cog):
         bundle = self._read_bundle_json(bundle_path)
         return len(bundle.get("messages", []))
 
-    def _iter_bundle_messages(self, bundle_path: Path) -> Iterable[MessageEntry]:
+    def _iter_bundle_messages(self, bundle_path: Path, start: int = 0) -> Iterable[MessageEntry]:
+        """Message entries in export order, from the `start`-th (0-based).
+        Compressed bundles seek to it through their index."""
+        if bundle_path.name.endswith(self.BUNDLE_SUFFIX):
+            for payload in channel_bundle.iter_records(bundle_path, start):
+                message = payload.get("message")
+                if payload.get("type") == "message" and isinstance(message, dict):
+                    yield message
+            return
+        if start:
+            for index, message in enumerate(self._iter_bundle_messages(bundle_path)):
+                if index >= start:
+                    yield message
+            return
         if bundle_path.suffix == self.JSONL_SUFFIX:
             with bundle_path.open("r", encoding="utf-8") as fp:
                 for line in fp:
@@ -392,15 +489,82 @@ class ChannelMigrator(commands.Cog):
         with path.open("r", encoding="utf-8") as fp:
             return json.load(fp)
 
-    async def _replay_entry(self, channel: MessageableTarget, entry: MessageEntry):
+    async def _replay_bundle(self, channel: MessageableTarget, entries: Iterable[MessageEntry]) -> int:
+        """Replay `entries` in order while their attachments download ahead.
+
+        A producer walks the bundle, starts each entry's downloads (at most
+        PREFETCH_CONCURRENCY at once) and queues the entry; the sender takes
+        entries off the queue in order and awaits each download only when
+        it reaches it. The queue holds PREFETCH_ENTRIES entries and
+        PREFETCH_BYTES of attachments, so a slow channel doesn't pull the
+        whole bundle into memory. Returns the number of entries replayed."""
+        buffer: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue(maxsize=self.PREFETCH_ENTRIES)
+        gate = asyncio.Semaphore(self.PREFETCH_CONCURRENCY)
+        budget = _ByteBudget(self.PREFETCH_BYTES)
+        filesize_limit = self._filesize_limit(channel)
+        downloads: Set[asyncio.Task] = set()
+
+        async def fetch(attachment):
+            async with gate:
+                return await self._fetch_attachment(
+                    attachment["url"], attachment.get("filename") or "file")
+
+        async def produce():
+            for entry in entries:
+                fetches = []
+                reserved = 0
+                for attachment in entry.get("attachments") or []:
+                    size = attachment.get("size", 0) or 0
+                    if not attachment.get("url") or size > filesize_limit:
+                        fetches.append(None)  # _handle_attachments reports it
+                        continue
+                    fetches.append(attachment)
+                    reserved += size
+                await budget.acquire(reserved)
+                for index, attachment in enumerate(fetches):
+                    if attachment is not None:
+                        task = asyncio.ensure_future(fetch(attachment))
+                        downloads.add(task)
+                        task.add_done_callback(downloads.discard)
+                        fetches[index] = task
+                await buffer.put((entry, fetches, reserved))
+            await buffer.put(None)
+
+        producer = asyncio.ensure_future(produce())
+        sent = 0
+        try:
+            while True:
+                getter = asyncio.ensure_future(buffer.get())
+                if not producer.done():
+                    await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+                    if not getter.done():
+                        getter.cancel()
+                        producer.result()  # if the walk failed, raise it here
+                        continue
+                item = await getter
+                if item is None:
+                    break
+                entry, fetches, reserved = item
+                try:
+                    await self._replay_entry(channel, entry, fetches)
+                finally:
+                    await budget.release(reserved)
+                sent += 1
+        finally:
+            producer.cancel()
+            for task in list(downloads):
+                task.cancel()
+        return sent
+
+    async def _replay_entry(self, channel: MessageableTarget, entry: MessageEntry,
+                            prefetched: Optional[List[Optional[asyncio.Future]]] = None):
         header = self._format_header(entry)
         content = entry.get("content") or ""
         chunks = self._chunk_text(content, self.CHAR_LIMIT) or [""]
         await self._send_chunks(channel, header, chunks)
-
         attachments = entry.get("attachments") or []
         if attachments:
-            await self._handle_attachments(channel, attachments)
+            await self._handle_attachments(channel, attachments, prefetched)
 
     def _format_header(self, entry: MessageEntry) -> str:
         timestamp = self._format_timestamp(entry.get("created_at"))
@@ -423,7 +587,7 @@ class ChannelMigrator(commands.Cog):
             else:
                 payload = chunk
             await channel.send(payload, allowed_mentions=self._no_mentions)
-            await asyncio.sleep(self.POST_DELAY)
+            await self._pace(channel)
 
     def _parse_timestamp(self, raw: Optional[str]) -> Optional[datetime]:
         if not raw:
@@ -434,9 +598,47 @@ class ChannelMigrator(commands.Cog):
         except ValueError:
             return None
 
-    async def _handle_attachments(self, channel: MessageableTarget, attachments: List[Dict[str, Any]]):
-        filesize_limit = getattr(getattr(channel, "guild", None), "filesize_limit", 8 * 1024 * 1024)
-        for attachment in attachments:
+    def _filesize_limit(self, channel: MessageableTarget) -> int:
+        return getattr(getattr(channel, "guild", None), "filesize_limit", 8 * 1024 * 1024)
+
+    def _send_delay(self, channel: MessageableTarget) -> float:
+        """Seconds to pause before the next send into `channel`.
+
+        discord.py keeps a bucket per route from the X-RateLimit-* headers
+        of each response; this reads the message-send bucket of `channel`
+        and spreads its remaining budget evenly over the time left until
+        the window resets. That's ~0 while there is plenty of budget, and
+        avoids draining it in a burst and then stalling. With no budget
+        left, discord.py itself waits, so no extra pause is added. Until
+        the first response has filled the bucket (or if the library's
+        internals change), POST_DELAY."""
+        http = getattr(self.bot, "http", None)
+        try:
+            route = discord.http.Route("POST", "/channels/{channel_id}/messages", channel_id=channel.id)
+            bucket_hash = http._bucket_hashes.get(route.key)
+            bucket = http._buckets.get(f"{bucket_hash or route.key}:{route.major_parameters}")
+            expires, remaining = bucket.expires, bucket.remaining
+        except AttributeError:
+            return self.POST_DELAY
+        if expires is None:
+            return self.POST_DELAY
+        left = expires - asyncio.get_running_loop().time()
+        if left <= 0 or remaining <= 0:
+            return 0.0
+        return min(self.MAX_SEND_DELAY, left / (remaining + 1))
+
+    async def _pace(self, channel: MessageableTarget) -> None:
+        delay = self._send_delay(channel)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _handle_attachments(self, channel: MessageableTarget, attachments: List[Dict[str, Any]],
+                                  prefetched: Optional[List[Optional[asyncio.Future]]] = None):
+        """Re-upload an entry's attachments. `prefetched[i]`, when given, is
+        the download already started for `attachments[i]` (None where
+        nothing was fetched); otherwise each one is downloaded here."""
+        filesize_limit = self._filesize_limit(channel)
+        for index, attachment in enumerate(attachments):
             url = attachment.get("url")
             filename = attachment.get("filename") or "file"
             size = attachment.get("size", 0)
@@ -450,15 +652,19 @@ class ChannelMigrator(commands.Cog):
                     ),
                     allowed_mentions=self._no_mentions,
                 )
-                await asyncio.sleep(self.POST_DELAY)
+                await self._pace(channel)
                 continue
-            payload = await self._download_with_retry(url, filename)
+            download = prefetched[index] if prefetched else None
+            if download is not None:
+                payload = await download
+            else:
+                payload = await self._fetch_attachment(url, filename)
             if payload is None:
                 await channel.send(
                     f"[Failed to download `{filename}` after retries. Linking original instead.]\n{url}",
                     allowed_mentions=self._no_mentions,
                 )
-                await asyncio.sleep(self.POST_DELAY)
+                await self._pace(channel)
                 continue
 
             discord_file = discord.File(io.BytesIO(payload), filename=filename)
@@ -469,7 +675,57 @@ class ChannelMigrator(commands.Cog):
                     f"[Failed to upload `{filename}` ({exc}). Linking original instead.]\n{url}",
                     allowed_mentions=self._no_mentions,
                 )
-            await asyncio.sleep(self.POST_DELAY)
+            await self._pace(channel)
+
+    async def _fetch_attachment(self, url: str, filename: str) -> Optional[bytes]:
+        """Attachment bytes for replay: from the asset store when
+        `!downloadbundleassets` already saved them (CDN links expire), else
+        from the network."""
+        payload = await asyncio.to_thread(self._asset_store().read, url)
+        if payload is not None:
+            return payload
+        return await self._download_with_retry(url, filename)
+
+    async def _store_asset(self, url: str, attempts: int = 3) -> Optional[str]:
+        """Download `url` into the asset store. Returns "cached" (its URL
+        was already stored), "new", "duplicate" (same bytes as a stored
+        blob) or None after `attempts` failures.
+
+        Bytes go to a `.part` file first; a retry, or a later run after a
+        crash, asks for the rest with a Range header and appends when the
+        server answers 206 (a 200 means it ignored the range: start over)."""
+        store = self._asset_store()
+        if await asyncio.to_thread(store.lookup, url):
+            return "cached"
+        part = store.partial_path(url)
+        for attempt in range(1, attempts + 1):
+            try:
+                offset = part.stat().st_size if part.exists() else 0
+                headers = {"Range": f"bytes={offset}-"} if offset else {}
+                async with self._session().get(url, headers=headers) as resp:
+                    if resp.status == 416 and offset:
+                        pass  # nothing past what we have: the .part is complete
+                    elif resp.status == 206 and resp.headers.get("Content-Range", "").startswith(
+                            f"bytes {offset}-"):
+                        await self._write_response(resp, part, "ab")
+                    elif resp.status == 200:
+                        await self._write_response(resp, part, "wb")
+                    else:
+                        raise RuntimeError(f"HTTP {resp.status}")
+                _sha256, _size, new = await asyncio.to_thread(store.add_file, part, url)
+                return "new" if new else "duplicate"
+            except Exception as exc:
+                if self.logger:
+                    self.logger.warning(
+                        "Failed to store asset %s (attempt %d/%d): %s", url, attempt, attempts, exc)
+                if attempt < attempts:
+                    await asyncio.sleep(self.POST_DELAY)
+        return None
+
+    async def _write_response(self, resp: Any, path: Path, mode: str) -> None:
+        with path.open(mode) as fp:
+            async for chunk in resp.content.iter_chunked(self.ASSET_CHUNK):
+                fp.write(chunk)
 
     async def _download_with_retry(self, url: str, filename: str, attempts: int = 3) -> Optional[bytes]:
         for attempt in range(1, attempts + 1):
@@ -500,11 +756,15 @@ class ChannelMigrator(commands.Cog):
         from core.utils import recursive_split
         return recursive_split(text, limit)
 
-    def _collect_bundle_media_urls(self, bundle_path: Path) -> Set[str]:
-        urls: Set[str] = set()
+    def _collect_bundle_media_refs(self, bundle_path: Path) -> List[Tuple[int, str]]:
+        """(message id, media URL) for every attachment and embed image in
+        the bundle, in bundle order."""
+        references: List[Tuple[int, str]] = []
         for message in self._iter_bundle_messages(bundle_path):
-            urls.update(self._extract_message_media_urls(message))
-        return urls
+            message_id = message.get("id") or 0
+            for url in sorted(self._extract_message_media_urls(message)):
+                references.append((message_id, url))
+        return references
 
     def _extract_message_media_urls(self, message: MessageEntry) -> Set[str]:
         urls: Set[str] = set()
@@ -539,10 +799,29 @@ class ChannelMigrator(commands.Cog):
             urls.add(section)
         return urls
 
-    def _filename_from_url(self, url: str, index: int) -> str:
-        parsed = urlsplit(url)
-        name = Path(parsed.path).name or "file"
-        return f"{index}_{name}"
+
+def _megabytes(num_bytes: int) -> str:
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
+
+
+class _ByteBudget:
+    """Bytes of prefetched attachments the replay buffer may hold."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, size: int) -> None:
+        async with self._changed:
+            # An oversized entry waits for an empty buffer, then goes alone.
+            await self._changed.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
+
+    async def release(self, size: int) -> None:
+        async with self._changed:
+            self.used -= size
+            self._changed.notify_all()
 
 
 async def setup(bot: commands.Bot):
@@ -1,13 +1,171 @@
+"""Superadmin bulk cleanup: `!cleanup user|gone|replies|stale-replies|full`.
+
+`_run_cleanup` scans every readable text channel's history, oldest first,
+SCAN_CONCURRENCY channels at a time (one semaphore for the whole run, so a
+big guild doesn't open a history walk per channel at once). Matches younger
+than Discord's 14-day bulk-delete limit are removed with
+`channel.delete_messages` in batches of up to 100 ids — one request per
+batch instead of one per message; older ones still need a `delete()` each.
+
+Live runs checkpoint the last fully handled message id per channel in
+`logs/cleanup_checkpoints.json` (0600), keyed by guild and by the run's
+criteria, so an interrupted or repeated `!cleanup gone` resumes after the
+checkpoint instead of rescanning years of history. A match whose delete
+failed holds the checkpoint just before it, so the next run retries it. Dry runs read but never
+write checkpoints. `--fresh` drops the checkpoints for those criteria first
+— needed after more members have left, since `gone` / `stale-replies`
+judge authors by the membership at scan time.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import timedelta
+
 from discord.ext import commands
 import discord
-import time
 from core.utils import is_superadmin, safe_delete
 
+# Channels whose history is read at the same time.
+SCAN_CONCURRENCY = 4
+# Bulk delete takes 2-100 ids, none older than 14 days (with a margin for
+# the time the batch spends queued).
+BULK_DELETE_MAX = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+# Pending bulk deletes are flushed (and the checkpoint advanced) at least
+# every this many scanned messages, so a channel with sparse matches still
+# makes resumable progress.
+CHECKPOINT_EVERY = 1000
+CHECKPOINT_PATH = "logs/cleanup_checkpoints.json"
+CHECKPOINT_FILE_MODE = 0o600
+# Checkpoint file writes are coalesced to one per this many seconds.
+CHECKPOINT_SAVE_SECONDS = 5.0
+STATUS_EDIT_SECONDS = 4.0
+
+
+class CleanupCriteria:
+    """What a run deletes, and the reason a given message matches."""
+
+    def __init__(self, member_ids, target_author_ids=None, gone_authors=False,
+                 reply_to_ids=None, reply_to_gone=False):
+        self.member_ids = member_ids
+        self.target_author_ids = set(target_author_ids or ())
+        self.gone_authors = gone_authors
+        self.reply_to_ids = set(reply_to_ids or ())
+        self.reply_to_gone = reply_to_gone
+        self.discovered_gone_ids = set()
+
+    @property
+    def key(self):
+        """Checkpoint key: runs with the same criteria share progress."""
+        parts = []
+        if self.target_author_ids:
+            parts.append("user:" + ",".join(map(str, sorted(self.target_author_ids))))
+        if self.gone_authors:
+            parts.append("gone")
+        if self.reply_to_ids:
+            parts.append("replies:" + ",".join(map(str, sorted(self.reply_to_ids))))
+        if self.reply_to_gone:
+            parts.append("stale-replies")
+        return "|".join(parts)
+
+    def reason(self, message):
+        """Why `message` should be deleted, or None."""
+        # Check 1: message is by a target author
+        if message.author.id in self.target_author_ids:
+            return "author match"
+
+        # Check 2: message is by someone who left
+        if self.gone_authors and message.author.id not in self.member_ids and not message.author.bot:
+            self.discovered_gone_ids.add(message.author.id)
+            return "gone author"
+
+        reference = message.reference
+        if reference is None:
+            return None
+        # Check 3: message replies to a target user
+        ref = reference.resolved
+        if ref and isinstance(ref, discord.Message):
+            if ref.author.id in self.reply_to_ids:
+                return "reply to target"
+            if self.reply_to_gone and ref.author.id not in self.member_ids and not ref.author.bot:
+                self.discovered_gone_ids.add(ref.author.id)
+                return "reply to gone user"
+
+        # Check 4: message replies to a deleted message (reference unresolved)
+        # If the referenced message is gone, it was likely from a departed user
+        # whose messages were already deleted — include these too.
+        # resolved=None means discord couldn't fetch it (deleted)
+        if self.reply_to_gone and ref is None and reference.message_id:
+            return "reply to deleted message"
+        return None
+
+
+class CleanupCheckpoints:
+    """{guild id: {criteria key: {channel id: last handled message id}}},
+    persisted atomically (temp + rename) and owner-only."""
+
+    def __init__(self, path=CHECKPOINT_PATH, clock=time.monotonic):
+        self.path = path
+        self._clock = clock
+        self._saved_at = None
+        self.dirty = False
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+        if not isinstance(self.data, dict):
+            self.data = {}
+
+    def _channels(self, guild_id, key):
+        return self.data.setdefault(str(guild_id), {}).setdefault(key, {})
+
+    def get(self, guild_id, key, channel_id):
+        return self.data.get(str(guild_id), {}).get(key, {}).get(str(channel_id))
+
+    def advance(self, guild_id, key, channel_id, message_id):
+        self._channels(guild_id, key)[str(channel_id)] = message_id
+        self.dirty = True
+        self.save(force=False)
+
+    def clear(self, guild_id, key):
+        if self.data.get(str(guild_id), {}).pop(key, None) is not None:
+            self.dirty = True
+            self.save()
+
+    def save(self, force=True):
+        now = self._clock()
+        if not self.dirty or (not force and self._saved_at is not None
+                              and now - self._saved_at < CHECKPOINT_SAVE_SECONDS):
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, CHECKPOINT_FILE_MODE)
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.data, f, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+        self._saved_at = now
+        self.dirty = False
+
+
+class _ChannelResult:
+    def __init__(self, channel):
+        self.channel = channel
+        self.found = 0
+        self.deleted = 0
+        self.failed = 0
+        self.bulk_requests = 0
+        self.resumed = False
+        self.error = None
+
 
 class Cleanup(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.logger = bot.logger
+        self._checkpoints = None
 
     @commands.group(name='cleanup', hidden=True, invoke_without_command=True)
     @commands.check(is_superadmin)
@@ -20,7 +178,8 @@ class Cleanup(commands.Cog):
             "`!cleanup replies <user_id> [--dry]` - Delete replies to a user\n"
             "`!cleanup stale-replies [--dry]` - Delete replies to any user who left the server\n"
             "`!cleanup full <user_id> [--dry]` - All of the above for a specific user + stale replies\n"
-            "\nAdd `--dry` to preview without deleting.",
+            "\nAdd `--dry` to preview without deleting. Runs resume where the last "
+            "one with the same criteria stopped; add `--fresh` to rescan everything.",
             delete_after=30
         )
 
@@ -29,43 +188,49 @@ class Cleanup(commands.Cog):
     async def cleanup_user(self, ctx, user_id: int, *, flags: str = ""):
         """Delete all messages by a specific user ID."""
         dry = "--dry" in flags
-        await self._run_cleanup(ctx, dry=dry, target_author_ids={user_id})
+        fresh = "--fresh" in flags
+        await self._run_cleanup(ctx, dry=dry, fresh=fresh, target_author_ids={user_id})
 
     @cleanup.command(name='gone')
     @commands.check(is_superadmin)
     async def cleanup_gone(self, ctx, *, flags: str = ""):
         """Delete all messages by users who have left the server."""
         dry = "--dry" in flags
-        await self._run_cleanup(ctx, dry=dry, gone_authors=True)
+        fresh = "--fresh" in flags
+        await self._run_cleanup(ctx, dry=dry, fresh=fresh, gone_authors=True)
 
     @cleanup.command(name='replies')
     @commands.check(is_superadmin)
     async def cleanup_replies(self, ctx, user_id: int, *, flags: str = ""):
         """Delete all replies to a specific user ID."""
         dry = "--dry" in flags
-        await self._run_cleanup(ctx, dry=dry, reply_to_ids={user_id})
+        fresh = "--fresh" in flags
+        await self._run_cleanup(ctx, dry=dry, fresh=fresh, reply_to_ids={user_id})
 
     @cleanup.command(name='stale-replies')
     @commands.check(is_superadmin)
     async def cleanup_stale_replies(self, ctx, *, flags: str = ""):
         """Delete replies to any user who has left the server."""
         dry = "--dry" in flags
-        await self._run_cleanup(ctx, dry=dry, reply_to_gone=True)
+        fresh = "--fresh" in flags
+        await self._run_cleanup(ctx, dry=dry, fresh=fresh, reply_to_gone=True)
 
     @cleanup.command(name='full')
     @commands.check(is_superadmin)
     async def cleanup_full(self, ctx, user_id: int, *, flags: str = ""):
         """Full cleanup: messages by user, replies to user, and replies to all gone users."""
         dry = "--dry" in flags
+        fresh = "--fresh" in flags
         await self._run_cleanup(
-            ctx, dry=dry,
+            ctx, dry=dry, fresh=fresh,
             target_author_ids={user_id},
             reply_to_ids={user_id},
             reply_to_gone=True
         )
 
     async def _run_cleanup(self, ctx, *, dry=False, target_author_ids=None,
-                           gone_authors=False, reply_to_ids=None, reply_to_gone=False):
+                           gone_authors=False, reply_to_ids=None, reply_to_gone=False,
+                           fresh=False):
         """Core cleanup engine. Scans all text channels and deletes matching messages.
 
         Args:
@@ -74,6 +239,7 @@ class Cleanup(commands.Cog):
             gone_authors: If True, delete messages from any user no longer in the guild.
             reply_to_ids: Set of user IDs — delete messages that reply to them.
             reply_to_gone: If True, delete messages that reply to any user no longer in the guild.
+            fresh: If True, forget this run's checkpoints and scan from the start.
         """
         if ctx.guild is None:
             await ctx.send("This command must be used in a server.")
@@ -84,122 +250,69 @@ class Cleanup(commands.Cog):
         status = await ctx.send(f"**[{mode}]** Starting cleanup scan across all channels...")
 
         guild = ctx.guild
-        member_ids = {m.id for m in guild.members}
-        target_author_ids = target_author_ids or set()
-        reply_to_ids = reply_to_ids or set()
-
-        # Track which gone user IDs we discover
-        discovered_gone_ids = set()
+        criteria = CleanupCriteria(
+            {m.id for m in guild.members}, target_author_ids=target_author_ids,
+            gone_authors=gone_authors, reply_to_ids=reply_to_ids, reply_to_gone=reply_to_gone)
+        target_author_ids = criteria.target_author_ids
+        reply_to_ids = criteria.reply_to_ids
+        checkpoints = self.checkpoints()
+        if fresh and not dry:
+            checkpoints.clear(guild.id, criteria.key)
 
-        total_found = 0
-        total_deleted = 0
-        total_failed = 0
         channel_results = []
-
-        text_channels = [ch for ch in guild.channels if isinstance(ch, discord.TextChannel)]
-        total_channels = len(text_channels)
-        last_status_update = 0.0  # monotonic timestamp of last edit
-
-        for i, channel in enumerate(text_channels, 1):
+        text_channels = []
+        for channel in guild.channels:
+            if not isinstance(channel, discord.TextChannel):
+                continue
             # Check bot has permissions in this channel
             perms = channel.permissions_for(guild.me)
             if not perms.read_message_history:
                 channel_results.append((channel.name, 0, 0, 0, "no read permission"))
-                continue
-            if not dry and not perms.manage_messages:
+            elif not dry and not perms.manage_messages:
                 channel_results.append((channel.name, 0, 0, 0, "no manage_messages permission"))
-                continue
-
-            # Update status with 4-second cooldown (always update on last channel)
+            else:
+                text_channels.append(channel)
+
+        gate = asyncio.Semaphore(SCAN_CONCURRENCY)
+        results = [_ChannelResult(channel) for channel in text_channels]
+        progress = {"done": 0, "edited_at": 0.0}
+
+        async def scan(result):
+            async with gate:
+                await self._clean_channel(result, criteria, dry, checkpoints, fresh)
+            progress["done"] += 1
+            # Status update with a 4-second cooldown (always on the last channel)
             now = time.monotonic()
-            if i == total_channels or now - last_status_update >= 4.0:
+            if progress["done"] == len(results) or now - progress["edited_at"] >= STATUS_EDIT_SECONDS:
+                progress["edited_at"] = now
                 try:
                     await status.edit(
-                        content=f"**[{mode}]** Scanning channel {i}/{total_channels}: #{channel.name}... "
-                               f"({total_found} found so far)"
-                    )
-                    last_status_update = now
+                        content=f"**[{mode}]** Scanned {progress['done']}/{len(results)} channels, "
+                                f"last #{result.channel.name}... "
+                                f"({sum(r.found for r in results)} found so far)")
                 except discord.HTTPException:
                     pass
 
-            ch_found = 0
-            ch_deleted = 0
-            ch_failed = 0
-            to_delete = []
-
-            try:
-                async for message in channel.history(limit=None, oldest_first=True):
-                    should_delete = False
-                    reason = None
-
-                    # Check 1: message is by a target author
-                    if message.author.id in target_author_ids:
-                        should_delete = True
-                        reason = "author match"
-
-                    # Check 2: message is by someone who left
-                    if not should_delete and gone_authors:
-                        if message.author.id not in member_ids and not message.author.bot:
-                            should_delete = True
-                            reason = "gone author"
-                            discovered_gone_ids.add(message.author.id)
-
-                    # Check 3: message replies to a target user
-                    if not should_delete and message.reference and message.reference.resolved:
-                        ref = message.reference.resolved
-                        if isinstance(ref, discord.Message):
-                            if ref.author.id in reply_to_ids:
-                                should_delete = True
-                                reason = "reply to target"
-                            elif reply_to_gone and ref.author.id not in member_ids and not ref.author.bot:
-                                should_delete = True
-                                reason = "reply to gone user"
-                                discovered_gone_ids.add(ref.author.id)
-
-                    # Check 4: message replies to a deleted message (reference unresolved)
-                    if not should_delete and reply_to_gone and message.reference and not message.reference.resolved:
-                        # If the referenced message is gone, it was likely from a departed user
-                        # whose messages were already deleted — include these too
-                        if message.reference.resolved is None and message.reference.message_id:
-                            # Try to determine if the original author is gone
-                            # resolved=None means discord couldn't fetch it (deleted)
-                            should_delete = True
-                            reason = "reply to deleted message"
-
-                    if should_delete:
-                        ch_found += 1
-                        to_delete.append((message, reason))
-
-            except discord.Forbidden:
-                channel_results.append((channel.name, 0, 0, 0, "forbidden"))
-                continue
-            except discord.HTTPException as e:
-                channel_results.append((channel.name, ch_found, 0, 0, f"error: {e}"))
-                continue
-
-            # Delete phase
-            if not dry and to_delete:
-                for message, reason in to_delete:
-                    try:
-                        await message.delete()
-                        ch_deleted += 1
-                    except discord.NotFound:
-                        ch_deleted += 1  # Already gone, counts as success
-                    except (discord.Forbidden, discord.HTTPException) as e:
-                        ch_failed += 1
-                        self.logger.warning(
-                            f"Cleanup: failed to delete message {message.id} in #{channel.name}: {e}"
-                        )
-
-            total_found += ch_found
-            total_deleted += ch_deleted
-            total_failed += ch_failed
-
-            if ch_found > 0:
+        try:
+            await asyncio.gather(*(scan(result) for result in results))
+        finally:
+            if not dry:
+                checkpoints.save()
+
+        total_found = sum(r.found for r in results)
+        total_deleted = sum(r.deleted for r in results)
+        total_failed = sum(r.failed for r in results)
+        discovered_gone_ids = criteria.discovered_gone_ids
+        for result in results:
+            name = result.channel.name
+            if result.error:
+                channel_results.append((name, result.found, result.deleted, result.failed,
+                                        f" ({result.error})"))
+            elif result.found > 0:
                 note = ""
                 if not dry:
-                    note = f" (deleted {ch_deleted}, failed {ch_failed})"
-                channel_results.append((channel.name, ch_found, ch_deleted, ch_failed, note))
+                    note = f" (deleted {result.deleted}, failed {result.failed})"
+                channel_results.append((name, result.found, result.deleted, result.failed, note))
 
         # Build summary
         lines = [f"**[{mode}] Cleanup complete.**\n"]
@@ -220,6 +333,13 @@ class Cleanup(commands.Cog):
             lines.append(f"**Deleted:** {total_deleted}")
             if total_failed:
                 lines.append(f"**Failed:** {total_failed}")
+            bulk_requests = sum(r.bulk_requests for r in results)
+            if bulk_requests:
+                lines.append(f"Bulk delete requests: {bulk_requests}")
+        resumed = sum(r.resumed for r in results)
+        if resumed:
+            lines.append(f"Resumed {resumed} channel(s) from checkpoints "
+                         f"(add `--fresh` to rescan from the start).")
 
         if channel_results:
             lines.append("\n**Per-channel breakdown:**")
@@ -254,6 +374,96 @@ class Cleanup(commands.Cog):
             f"reply_to={reply_to_ids} reply_to_gone={reply_to_gone}"
         )
 
+    def checkpoints(self):
+        if self._checkpoints is None:
+            self._checkpoints = CleanupCheckpoints()
+        return self._checkpoints
+
+    async def _clean_channel(self, result, criteria, dry, checkpoints, fresh):
+        """Scan one channel oldest-first from its checkpoint, deleting matches
+        as it goes (bulk for young messages, one by one for old ones)."""
+        channel = result.channel
+        guild_id = channel.guild.id
+        after = None if fresh else checkpoints.get(guild_id, criteria.key, channel.id)
+        result.resumed = after is not None
+        bulk_cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        young = []
+        scanned = 0
+        last_id = None
+        # Oldest match whose delete failed; the checkpoint never passes it.
+        first_failed = None
+
+        def failed(messages):
+            nonlocal first_failed
+            for message in messages:
+                if first_failed is None or message.id < first_failed:
+                    first_failed = message.id
+
+        async def flush():
+            if young and not dry:
+                failed(await self._bulk_delete(result, list(young)))
+            young.clear()
+            if dry or last_id is None:
+                return
+            handled = last_id if first_failed is None else first_failed - 1
+            if handled != checkpoints.get(guild_id, criteria.key, channel.id):
+                checkpoints.advance(guild_id, criteria.key, channel.id, handled)
+
+        try:
+            history = channel.history(
+                limit=None, oldest_first=True,
+                after=discord.Object(id=after) if after else None)
+            async for message in history:
+                scanned += 1
+                if criteria.reason(message):
+                    result.found += 1
+                    if message.created_at > bulk_cutoff:
+                        young.append(message)
+                    elif not dry and not await self._delete_one(result, message):
+                        failed([message])
+                last_id = message.id
+                if len(young) >= BULK_DELETE_MAX or scanned % CHECKPOINT_EVERY == 0:
+                    await flush()
+            await flush()
+        except discord.Forbidden:
+            result.error = "forbidden"
+        except discord.HTTPException as e:
+            result.error = f"error: {e}"
+        if result.error:
+            # Matches scanned before the error still go (or count as failed).
+            await flush()
+
+    async def _bulk_delete(self, result, messages):
+        """One request per batch of up to 100. A rejected batch falls back to
+        single deletes, so one bad id doesn't fail its 99 neighbours.
+        Returns the messages that could not be deleted."""
+        if len(messages) > 1:
+            try:
+                await result.channel.delete_messages(messages)
+                result.bulk_requests += 1
+                result.deleted += len(messages)
+                return []
+            except discord.HTTPException as e:
+                self.logger.info(
+                    f"Cleanup: bulk delete of {len(messages)} in #{result.channel.name} "
+                    f"failed ({e}); deleting one by one")
+        return [message for message in messages if not await self._delete_one(result, message)]
+
+    async def _delete_one(self, result, message):
+        """Delete one message; False if it is still there."""
+        try:
+            await message.delete()
+            result.deleted += 1
+        except discord.NotFound:
+            result.deleted += 1  # Already gone, counts as success
+        except (discord.Forbidden, discord.HTTPException) as e:
+            result.failed += 1
+            self.logger.warning(
+                f"Cleanup: failed to delete message {message.id} in #{result.channel.name}: {e}"
+            )
+            return False
+        return True
+
 
 async def setup(bot):
     await bot.add_cog(Cleanup(bot))
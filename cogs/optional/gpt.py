@@ -1,16 +1,22 @@
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import discord
+import asyncio
 import os
 import time
 import re
-from collections import deque
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
 from core.utils import InvokerOnlyView, app_is_admin, is_admin, is_superadmin, recursive_split
-from core.llm import LLMClient, PROVIDER_ALIASES, DEFAULT_PROVIDER
-from core.ops import ORIGIN_COG, ORIGIN_CORE, OpScope, registry
+from core.chat_history import ChannelHistoryBuffer, MessageFetchCache
+from core.memories import MemoryIndex, MemoryMatcher
+from core.rate_limit import SlidingWindowLimiter, read_state, write_state
+from core.llm import LLMClient, LLMResponse, ProviderRouter, PROVIDER_ALIASES, DEFAULT_PROVIDER
+from core.llm.budget import DEFAULT_CONTEXT_BUDGET, ContextBudget, TokenCounter, rank_memories
+from core.llm.coalesce import LED, RequestCoalescer, context_fingerprint, normalize_question
+from core.llm.ledger import UsageLedger
+from core.ops import ORIGIN_COG, ORIGIN_CORE, OpParam, OpScope, ParamKind, PermissionLevel, op, registry
 from core.agent_loop import agent_ops, resolve_bot_tools
 from core.agent_gate import (
     GATE_ADMIN,
@@ -24,6 +30,8 @@ from core.agent_gate import (
 from core.mcp_server import ENABLE_CONFIG_KEY, exposed_ops, resolve_mcp_tools
 
 PANEL_TIMEOUT = 180
+# Channel messages given to the model as conversation context.
+HISTORY_LIMIT = 15
 
 # Rate limiting is a nested-window ladder, not a flat per-message cooldown.
 # A model's declared cost per million OUTPUT tokens (`cost_per_mtok_output`)
@@ -59,6 +67,22 @@ _UNSET_COST_SECONDS = 20
 # (count, period_mult) pairs: count messages allowed per period_mult * base.
 # The 300/4320x outer window is 24h at pricy's x=20 — the daily spend cap.
 DEFAULT_COOLDOWN_WINDOWS = ((1, 1), (10, 15), (100, 150), (300, 4320))
+# Accepted-call timestamps survive restarts here (wall-clock, 0600), so a
+# restart doesn't hand every guild a fresh daily spend cap. Global
+# `cooldown_state_persist` (absent => on) turns it off; read at cog load.
+COOLDOWN_STATE_PATH = os.path.join("logs", "cooldown_state.json")
+COOLDOWN_STATE_SAVE_SECONDS = 60
+# Global bool; absent ⇒ on. Usage of every LLM call is kept in
+# logs/usage_ledger.sqlite3 (core/llm/ledger.py); read at cog load.
+USAGE_LEDGER_KEY = "usage_ledger_enabled"
+USAGE_LEDGER_FLUSH_SECONDS = 30
+
+
+def _sparkline(values):
+    """One block character per value, scaled to the largest."""
+    blocks = " ▁▂▃▄▅▆▇█"
+    peak = max(values, default=0) or 1
+    return "".join(blocks[round(v / peak * (len(blocks) - 1))] for v in values)
 
 
 def cooldown_tier_for_cost(cost_per_mtok_output, tier_bases=None):
@@ -123,10 +147,142 @@ def is_nudge_false_alarm(text):
     return (text or "").strip().strip(".!").upper() == NUDGE_FALSE_ALARM_SENTINEL
 
 
-def build_agentic_guidance(tool_names, guild_id, channel_id, author_id,
-                           message_id):
-    """System-prompt lines for agentic runs: available tools, target ids,
-    and — critically — the MECHANICS of tool invocation.
+# Global bool; absent ⇒ on. Off sends plain-chat replies only once complete.
+STREAMING_KEY = "ai_streaming"
+# Guild bool; absent ⇒ off. Concurrent identical plain-chat questions share
+# one model call (core/llm/coalesce.py).
+COALESCE_KEY = "gpt_coalesce_enabled"
+# Guild seconds; absent/0 ⇒ off. Plain-chat answers are re-served to the
+# same question in the same conversation for this long (capped at 300).
+ANSWER_CACHE_KEY = "gpt_answer_cache_seconds"
+# Streamed replies: Discord allows roughly 5 edits per 5 s per channel, so a
+# streaming reply edits at most this often (the final edit is immediate).
+STREAM_EDIT_INTERVAL = 1.2
+DISCORD_MESSAGE_LIMIT = 2000
+_SENTENCE_END = re.compile(r'[.!?…:;](?:["\')\]]*)\s|\n')
+
+
+def normalize_reply(text):
+    """Collapse the blank lines models like to emit (applied to every reply,
+    streamed or not)."""
+    return text.replace("\n\n", "\n").replace("\\n\\n", "\\n")
+
+
+def layout_stream_chunks(text, limit=DISCORD_MESSAGE_LIMIT):
+    """Split `text` into <= `limit` chunks greedily from the start, cutting
+    at the last newline, sentence end or space that fits. Greedy (unlike
+    recursive_split's midpoint cut) so a chunk, once its successor exists,
+    never changes as more text streams in — only the last message is edited.
+    A cut inside a ``` fence closes it and reopens it in the next chunk."""
+    chunks = []
+    reopen = ""
+    while True:
+        text = reopen + text
+        if len(text) <= limit:
+            chunks.append(text)
+            return chunks
+        window = text[:limit - 4]  # room to close a fence
+        # Newline, then sentence end, then space — the first kind found in
+        # the back half of the window wins; a hard cut is the last resort.
+        cut = len(window)
+        for sep in ("\n", ". ", " "):
+            at = window.rfind(sep)
+            if at >= len(window) // 2 and at > len(reopen):
+                cut = at + len(sep)
+                break
+        chunk, text = text[:cut], text[cut:]
+        reopen = ""
+        fences = re.findall(r'^(`{3,})(\w*)', chunk, re.M)
+        if len(fences) % 2:
+            delimiter, lang = fences[-1]
+            chunk = chunk.rstrip("\n") + "\n" + delimiter
+            reopen = f"{delimiter}{lang}\n"
+        chunks.append(chunk)
+
+
+class StreamingReply:
+    """Posts a streamed completion progressively: the first message as soon
+    as one sentence is complete, then throttled edits (STREAM_EDIT_INTERVAL)
+    that append whole sentences, rolling into new messages past Discord's
+    2000-character limit.
+
+    `check(text)` is the compliance gate (Gpt.check_message_compliance's
+    verdict) and runs on the full accumulated text before every render,
+    the final text included. A violation stops the stream: `feed` returns
+    False (`finish` None) and the caller `retract()`s whatever was already
+    posted.
+    """
+
+    def __init__(self, send, check, interval=STREAM_EDIT_INTERVAL,
+                 limit=DISCORD_MESSAGE_LIMIT, clock=time.monotonic):
+        self._send = send  # async (content) -> discord.Message
+        self._check = check
+        self.interval = interval
+        self.limit = limit
+        self._clock = clock
+        self.raw = ""
+        self.messages = []
+        self._shown = []
+        self._last_render = None
+
+    async def feed(self, delta):
+        self.raw += delta
+        text = normalize_reply(self.raw)
+        if not self._check(text):
+            return False
+        due = (not self.messages
+               or self._clock() - self._last_render >= self.interval)
+        if due:
+            # Only whole sentences become visible mid-stream.
+            visible = text[:self._sentence_end(text)].strip()
+            if visible:
+                await self._render(visible)
+        return True
+
+    @staticmethod
+    def _sentence_end(text):
+        end = 0
+        for match in _SENTENCE_END.finditer(text):
+            end = match.end()
+        return end
+
+    async def finish(self, final_text=None):
+        """Render the complete reply. Returns the text shown ("" if none),
+        or None if it fails the compliance check. The final response's text
+        can differ from the streamed deltas (a router fallback, a provider
+        that only yields a final response), so it is checked again."""
+        text = normalize_reply(final_text if final_text is not None else self.raw).strip()
+        if text and not self._check(text):
+            return None
+        if text:
+            await self._render(text)
+        return text
+
+    async def retract(self):
+        for message in self.messages:
+            try:
+                await message.delete()
+            except Exception:
+                pass
+        self.messages, self._shown = [], []
+
+    async def _render(self, text):
+        for i, chunk in enumerate(layout_stream_chunks(text, self.limit)):
+            if i < len(self.messages):
+                if self._shown[i] != chunk:
+                    await self.messages[i].edit(content=chunk)
+                    self._shown[i] = chunk
+            else:
+                self.messages.append(await self._send(chunk))
+                self._shown.append(chunk)
+        self._last_render = self._clock()
+
+
+def build_agentic_guidance(tool_names):
+    """System-prompt lines for agentic runs: available tools and —
+    critically — the MECHANICS of tool invocation. Id-free, so it belongs to
+    the cacheable prompt prefix; the per-message ids come from
+    build_agentic_context.
 
     The mechanics block exists because models (observed live: grok narrating
     "run tool search_history with channel_id is ..." as plain text) sometimes
@@ -142,9 +298,8 @@ def build_agentic_guidance(tool_names, guild_id, channel_id, author_id,
     lines = [
         "",
         "You have REAL Discord tools available: " + ", ".join(tool_names) + ".",
-        f"- Current guild id: {guild_id}. Current channel id: {channel_id}.",
-        f"- The invoking user's id is {author_id}. Their message that triggered "
-        f"you (\"my message\"/\"this message\") has message id {message_id}.",
+        "- The current guild, channel, invoking user and triggering message "
+        "ids are listed under CURRENT CONTEXT at the end of these instructions.",
         "- Every history line above is prefixed with [msg_id: ...]. Use those ids "
         "DIRECTLY when reacting, editing, or replying — no guessing, and no "
         "search_history when the target is already visible in the history. "
@@ -168,8 +323,8 @@ def build_agentic_guidance(tool_names, guild_id, channel_id, author_id,
         "intend a tool call, EMIT the function call instead of describing it.",
         "- Worked example: someone asks \"do i play factorio\" and the answer "
         "isn't in the visible history. Correct: emit the function call "
-        "search_history with arguments {\"channel_ids\": [" + str(channel_id) +
-        "], \"author_id\": " + str(author_id) + ", \"contains\": \"factorio\", "
+        "search_history with arguments {\"channel_ids\": [<current channel id>], "
+        "\"author_id\": <invoking user's id>, \"contains\": \"factorio\", "
         "\"limit\": 100}, wait for the results, then answer in plain text. "
         "Wrong: any reply that merely talks about searching.",
         "",
@@ -199,6 +354,16 @@ def build_agentic_guidance(tool_names, guild_id, channel_id, author_id,
     return lines
 
 
+def build_agentic_context(guild_id, channel_id, author_id, message_id):
+    """The per-message ids an agentic run targets — the volatile half of
+    build_agentic_guidance, kept out of the cached prompt prefix."""
+    return [
+        f"- Current guild id: {guild_id}. Current channel id: {channel_id}.",
+        f"- The invoking user's id is {author_id}. Their message that triggered "
+        f"you (\"my message\"/\"this message\") has message id {message_id}.",
+    ]
+
+
 class Gpt(commands.Cog):
     """This is a cog with a GPT question command."""
     def __init__(self, bot):
@@ -209,11 +374,30 @@ class Gpt(commands.Cog):
         # Provider-agnostic LLM client: provider/model resolution, API calls,
         # model discovery, and usage/cost tracking now live in core.llm.
         self.llm = LLMClient(self.bot.config, logger=self.logger)
-        # Per-guild monotonic timestamps of accepted LLM calls, newest last.
-        # Backs the nested-window rate limit (see _check_cooldown). In-memory,
-        # so it resets on restart — acceptable: this is cost shaping, not
-        # billing, and restarts are rare.
-        self._call_history: Dict[int, deque] = {}
+        # Plain-chat calls go through the guild's fallback chain, with
+        # per-provider circuit breakers and optional hedging.
+        self.router = ProviderRouter(self.llm)
+        # Per-guild accepted LLM calls behind the nested-window rate limit
+        # (see _check_cooldown); persisted across restarts when enabled.
+        self.cooldowns = SlidingWindowLimiter()
+        self._cooldown_state_path = None
+        # (global snapshot, parsed cooldown_config()) — see cooldown_config.
+        self._cooldown_config_cache = (None, None)
+        # Rendered recent turns per channel, fed by the listeners below, so
+        # _build_history needn't re-read channel history on every run.
+        self.history = ChannelHistoryBuffer()
+        # fetch_message by id for whatever the buffer can't answer.
+        self.fetch_cache = MessageFetchCache(not_found=(discord.NotFound,))
+        # Prompt token estimates, calibrated per model from reported usage.
+        self.token_counter = TokenCounter()
+        # Memory capture: compiled patterns, and a de-dup/expiry index per
+        # guild over its stored gpt_memories list.
+        self.memory_matcher = MemoryMatcher()
+        self._memory_indexes: Dict[Optional[int], MemoryIndex] = {}
+        # Identical concurrent plain-chat questions share one call, and
+        # answers are briefly cached — both per-guild opt-in (COALESCE_KEY,
+        # ANSWER_CACHE_KEY).
+        self.coalescer = RequestCoalescer()
 
     def _current_model_info(self, ctx) -> Dict[str, Any]:
         """The stored config dict for the guild's current model (may be {})."""
@@ -243,8 +427,14 @@ class Gpt(commands.Cog):
         tier_bases: {tier_label: base_seconds}. windows: sorted list of
         (count, period_mult) meaning `count` messages allowed per
         `period_mult * base` seconds. Malformed config falls back whole-sale
-        to the defaults rather than half-applying."""
-        raw_bases = self.bot.config.get(None, "cooldown_tier_bases", scope="global") or {}
+        to the defaults rather than half-applying. Parsed once per global
+        snapshot: any global config change retires the snapshot and the next
+        call re-parses. Callers must not mutate the returned values."""
+        global_cfg = self.bot.config.snapshot(None, scope="global")
+        cached_snapshot, parsed = self._cooldown_config_cache
+        if cached_snapshot is global_cfg:
+            return parsed
+        raw_bases = global_cfg.get("cooldown_tier_bases") or {}
         bases = {}
         for label, _bound, default in COOLDOWN_TIERS:
             try:
@@ -252,7 +442,7 @@ class Gpt(commands.Cog):
             except (TypeError, ValueError):
                 bases[label] = default
 
-        raw_windows = self.bot.config.get(None, "cooldown_windows", scope="global")
+        raw_windows = global_cfg.get("cooldown_windows")
         windows = []
         if isinstance(raw_windows, list):
             try:
@@ -263,7 +453,9 @@ class Gpt(commands.Cog):
                 windows = []
         if not windows:
             windows = list(DEFAULT_COOLDOWN_WINDOWS)
-        return bases, windows
+        parsed = (bases, windows)
+        self._cooldown_config_cache = (global_cfg, parsed)
+        return parsed
 
     def _check_cooldown(self, ctx):
         """Per-guild nested-window gate keyed by the current model's cost tier.
@@ -284,22 +476,8 @@ class Gpt(commands.Cog):
         label, base = cooldown_tier_for_cost(cost, bases)
         if base <= 0:
             return None
-        now = time.monotonic()
-        hist = self._call_history.setdefault(ctx.guild.id, deque())
-        horizon = max(m for _c, m in windows) * base
-        while hist and now - hist[0] > horizon:
-            hist.popleft()
-        worst = 0.0
-        for count, mult in windows:
-            period = mult * base
-            recent = [t for t in hist if now - t <= period]
-            if len(recent) >= count:
-                # The count-th most recent call exits this window at t+period.
-                worst = max(worst, recent[-count] + period - now)
-        if worst > 0:
-            return worst
-        hist.append(now)
-        return None
+        return self.cooldowns.check(
+            ctx.guild.id, [(count, mult * base) for count, mult in windows])
 
     def _refund_last_call(self, ctx):
         """Un-record the most recent call after an API failure — an errored
@@ -307,9 +485,82 @@ class Gpt(commands.Cog):
         used to lock a guild out for the full pricy cooldown)."""
         if getattr(ctx, "guild", None) is None:
             return
-        hist = self._call_history.get(ctx.guild.id)
-        if hist:
-            hist.pop()
+        self.cooldowns.refund(ctx.guild.id)
+
+    def _load_cooldown_state(self):
+        """Resume persisted cooldown windows, if enabled (see COOLDOWN_STATE_PATH)."""
+        if not self.bot.config.get_global("cooldown_state_persist", True):
+            return
+        self._cooldown_state_path = COOLDOWN_STATE_PATH
+        try:
+            self.cooldowns.load(read_state(COOLDOWN_STATE_PATH))
+        except (TypeError, ValueError):
+            self.logger.warning("Ignoring malformed cooldown state file")
+        self.save_cooldown_state.start()
+
+    def _save_cooldown_state(self):
+        """Write the windows out if a call was recorded/refunded since the last save."""
+        if self._cooldown_state_path is None or not self.cooldowns.dirty:
+            return
+        bases, windows = self.cooldown_config()
+        # Older calls than the widest window at the slowest tier never count.
+        horizon = max(m for _c, m in windows) * max(bases.values(), default=0)
+        try:
+            write_state(self._cooldown_state_path, self.cooldowns.dump(horizon))
+        except OSError as e:
+            self.logger.warning(f"Could not save cooldown state: {e}")
+
+    @tasks.loop(seconds=COOLDOWN_STATE_SAVE_SECONDS)
+    async def save_cooldown_state(self):
+        self._save_cooldown_state()
+
+    @tasks.loop(seconds=USAGE_LEDGER_FLUSH_SECONDS)
+    async def flush_usage_ledger(self):
+        # A failed flush keeps its batch for the next tick; an exception
+        # escaping here would stop the loop for good.
+        try:
+            self.llm.ledger.flush()
+        except Exception as e:
+            self.logger.warning(f"Could not flush the usage ledger: {e}")
+
+    def usage_summary(self, guild_id: Optional[int], hours: Optional[int] = 24) -> Dict[str, Any]:
+        """Spend rollup from the usage ledger: totals plus per provider/model
+        rows (see UsageLedger.spend). `hours` None means all time."""
+        ledger = self.llm.ledger
+        if ledger is None:
+            return {"enabled": False, "hours": hours, "calls": 0, "cost_usd": 0.0, "models": []}
+        models = ledger.spend(guild_id, hours)
+        return {
+            "enabled": True,
+            "hours": hours,
+            "calls": sum(row["calls"] for row in models),
+            "cost_usd": round(sum(row["cost_usd"] for row in models), 6),
+            "models": models,
+        }
+
+    @op(
+        "ai_usage_summary",
+        "Report this guild's AI chat usage from the usage ledger: call count, "
+        "tokens and estimated USD cost per provider/model over the last N "
+        "hours, plus the observed average cost per reply.",
+        PermissionLevel.ADMIN,
+        params=[
+            OpParam("hours", ParamKind.INTEGER,
+                    "Window in hours, counting the current hour (max 720 = 30 days).",
+                    required=False, default=24, minimum=1, maximum=720),
+        ],
+        serialize=lambda summary: dict(summary),
+        agent_guidance=(
+            "Costs are estimates from a static price table; models with no "
+            "known price are counted in unpriced_calls and add no cost."),
+        scope=OpScope.GUILD,
+        group="ai-usage",
+    )
+    async def op_ai_usage_summary(self, ctx, hours: int = 24) -> dict:
+        guild = getattr(ctx, "guild", None)
+        if guild is None:
+            raise ValueError("ai_usage_summary must be called in a guild.")
+        return self.usage_summary(guild.id, hours)
 
     def get_provider_config(self, ctx) -> Dict[str, Any]:
         """Get the current provider configuration for a guild.
@@ -320,184 +571,172 @@ class Gpt(commands.Cog):
         """
         return self.llm.get_provider_config(ctx)
 
-    async def call_ai_api(self, provider_config: Dict[str, Any], messages: List[Dict], metadata: Dict) -> str:
+    def _context_budget(self, provider_config) -> ContextBudget:
+        """This request's token budget for history and memories: the
+        model's `context_budget` config, else DEFAULT_CONTEXT_BUDGET."""
+        models = provider_config["provider_info"].get("models", {}) or {}
+        model_info = models.get(provider_config["model"], {}) or {}
+        return ContextBudget(
+            model_info.get("context_budget", DEFAULT_CONTEXT_BUDGET), self.token_counter,
+            model=f"{provider_config['provider']}:{provider_config['model']}")
+
+    def _record_usage(self, label, usage, messages=None, budget=None):
+        """Log one call's usage (with the context budget's packed/dropped
+        counts) and, for single-request calls whose whole prompt is
+        `messages`, calibrate the token counter against it."""
+        line = (
+            f"{label}: provider={usage.provider} model={usage.model} "
+            f"prompt={usage.prompt_tokens} completion={usage.completion_tokens} "
+            f"cached={usage.cached_prompt_tokens} total={usage.total_tokens} "
+            f"est_cost_usd={usage.estimated_cost_usd}"
+        )
+        if budget is not None:
+            line += f" {budget.summary()}"
+        if messages is not None:
+            self.token_counter.calibrate(f"{usage.provider}:{usage.model}", messages, usage.prompt_tokens)
+        return line
+
+    async def call_ai_api(self, provider_config: Dict[str, Any], messages: List[Dict], metadata: Dict,
+                          budget: Optional[ContextBudget] = None) -> str:
         """Call the appropriate AI API based on provider configuration.
 
-        Delegates to core.llm.LLMClient.chat(); returns plain text to match
-        the original signature. Usage/cost tracking happens inside the
-        client and is available via response.usage for callers that want it
-        (see LLMClient.chat for the richer LLMResponse).
+        Delegates to core.llm.ProviderRouter.chat() (LLMClient.chat over the
+        guild's fallback chain); returns plain text to match the original
+        signature. Usage/cost tracking happens inside the client and is
+        attributed to whichever provider answered (see LLMClient.chat for
+        the richer LLMResponse).
         """
-        response = await self.llm.chat(provider_config, messages, metadata)
+        response = await self.router.chat(provider_config, messages, metadata)
         if response.usage:
-            self.logger.debug(
-                f"AI usage: provider={response.usage.provider} model={response.usage.model} "
-                f"prompt={response.usage.prompt_tokens} completion={response.usage.completion_tokens} "
-                f"total={response.usage.total_tokens} est_cost_usd={response.usage.estimated_cost_usd}"
-            )
+            self.logger.debug(self._record_usage("AI usage", response.usage, messages, budget))
         return response.text
 
-    async def _build_history(self, ctx, agentic):
-        """Scrape recent channel messages (plus referenced messages) into
+    async def _recent_turns(self, channel):
+        """The channel's last HISTORY_LIMIT messages as HistoryTurns, oldest
+        first — from the rolling buffer when it holds a complete window,
+        else one history() call that seeds it."""
+        turns = self.history.recent(channel.id, HISTORY_LIMIT)
+        if turns is not None:
+            return turns
+        self.history.track(channel.id)
+        messages = [msg async for msg in channel.history(limit=HISTORY_LIMIT)]
+        self.history.seed(channel.id, messages, HISTORY_LIMIT)
+        return self.history.recent(channel.id, HISTORY_LIMIT) or []
+
+    async def _resolve_reference(self, channel, message_id):
+        """A referenced message as a HistoryTurn: the buffer (which also
+        holds the replies the gateway resolved), then the client's message
+        cache, and only then fetch_message through the shared fetch cache."""
+        turn = self.history.lookup(channel.id, message_id)
+        if turn is not None:
+            self.history.stats["ref_hits"] += 1
+            return turn
+        msg = discord.utils.get(self.bot.cached_messages, id=message_id)
+        if msg is None:
+            self.history.stats["ref_fetches"] += 1
+            msg = await self.fetch_cache.get(channel, message_id)
+        return self.history.remember(channel.id, msg)
+
+    async def _build_history(self, ctx, agentic, budget=None):
+        """Assemble recent channel messages (plus referenced messages) into
         OpenAI-style history turns and a user-id -> display-name mapping.
-        Moved verbatim out of process_askgpt (seam-machine claim 1)."""
+        Turns come pre-rendered from the rolling buffer (core/chat_history),
+        so a warm channel costs no REST calls here. With a ContextBudget the
+        turns are packed into its history share, newest first."""
         history = []
-        messages = []
-        # Get the last 15 messages in the channel (increased for better context)
-        async for msg in ctx.channel.history(limit=15):
-            messages.append(msg)
-        
-        # Track referenced messages to include in context
-        referenced_msgs = {}
-        reply_chain_ids = set()
-        
-        # First pass: Identify all message references
-        for msg in messages:
-            if msg.reference and msg.reference.message_id:
-                reply_chain_ids.add(msg.reference.message_id)
-        
-        # Second pass: Fetch messages that are referenced but not in our current history
+        # The command path can run before this cog's on_message listener has
+        # seen the invoking message; observe() is idempotent.
+        self.history.observe(ctx.message)
+        turns = await self._recent_turns(ctx.channel)
+        window_ids = {turn.id for turn in turns}
+
+        # Referenced messages that aren't already in the window
+        reply_chain_ids = {turn.reference_id for turn in turns
+                           if turn.reference_id and turn.reference_id not in window_ids}
+        referenced = {}
         if reply_chain_ids:
-            self.logger.debug(f"Found {len(reply_chain_ids)} referenced messages to fetch")
-            for ref_id in reply_chain_ids:
-                # Skip if message is already in our history
-                if any(msg.id == ref_id for msg in messages):
-                    continue
-                
-                try:
-                    # Try to fetch the referenced message
-                    ref_msg = await ctx.channel.fetch_message(ref_id)
-                    referenced_msgs[ref_id] = ref_msg
-                except Exception as e:
-                    self.logger.warning(f"Failed to fetch referenced message {ref_id}: {e}")
-        
+            self.logger.debug(f"Found {len(reply_chain_ids)} referenced messages to resolve")
+            # Misses are fetched concurrently: N references, one round trip.
+            ref_ids = sorted(reply_chain_ids)
+            results = await asyncio.gather(
+                *(self._resolve_reference(ctx.channel, ref_id) for ref_id in ref_ids),
+                return_exceptions=True)
+            for ref_id, result in zip(ref_ids, results):
+                # BaseException: a cancelled lookup comes back as a
+                # CancelledError, which is not an Exception.
+                if isinstance(result, BaseException):
+                    self.logger.warning(f"Failed to fetch referenced message {ref_id}: {result}")
+                else:
+                    referenced[ref_id] = result
+
         # Build a mapping from user IDs to display names for non-bot messages
         user_mapping = {}
-        for msg in list(messages) + list(referenced_msgs.values()):
-            if not msg.author.bot:
-                user_mapping[str(msg.author.id)] = msg.author.display_name
-                # Extract user ids from user mentions in the message (formats like <@123456> and <@!123456>)
-                mentioned_ids = [(str(user.id), user.name) for user in msg.mentions]
-                for uid, name in mentioned_ids:
+        for turn in list(turns) + list(referenced.values()):
+            if not turn.author_bot:
+                user_mapping[str(turn.author_id)] = turn.author_name
+                # User ids mentioned in the message (<@123456> / <@!123456>)
+                for uid, name in turn.mentions:
                     if uid not in user_mapping and uid != str(self.bot.user.id):
                         member = ctx.guild.get_member(int(uid))
                         user_mapping[uid] = member.display_name if member else name
-        
-        # Prepare all messages for history (regular messages + referenced messages)
-        all_messages_for_history = list(messages)
-        
-        # Add referenced messages to the history preparation
-        for ref_id, ref_msg in referenced_msgs.items():
-            # Add a special note indicating this is a referenced message
-            modified_content = f"[REFERENCED MESSAGE] {ref_msg.content}"
-            # Create a temporary copy with modified content to avoid changing the original
-            ref_msg_copy = type('MessageCopy', (), {
-                'id': ref_msg.id,
-                'author': ref_msg.author,
-                'content': modified_content,
-                'created_at': ref_msg.created_at,
-                'reference': ref_msg.reference
-            })
-            all_messages_for_history.append(ref_msg_copy)
-        
+
+        # (turn, text) pairs: a referenced message is shown as its bare text
+        # with a marker, without embed/attachment annotations.
+        entries = [(turn, turn.rendered) for turn in turns]
+        entries.extend((turn, f"[REFERENCED MESSAGE] {turn.content}")
+                       for turn in referenced.values())
+
         # Sort all messages chronologically to preserve conversation flow
-        all_messages_for_history.sort(key=lambda x: getattr(x, 'created_at', 0))
-        
-        # Mark the most recent message (last in list after sorting)
-        if all_messages_for_history:
-            most_recent_msg_id = all_messages_for_history[-1].id if hasattr(all_messages_for_history[-1], 'id') else None
-        
+        entries.sort(key=lambda entry: entry[0].created_at)
+        by_id = {turn.id: turn for turn, _text in entries}
+        most_recent_msg_id = entries[-1][0].id if entries else None
+
         # Construct history with bot messages unchanged and non-bot with user ID prefix
-        for msg in all_messages_for_history:
-            # Extract content including embeds
-            full_content = getattr(msg, 'content', '')
-            
-            # Add embed data if present
-            if hasattr(msg, 'embeds') and msg.embeds:
-                embed_parts = []
-                for i, embed in enumerate(msg.embeds):
-                    embed_info = []
-                    
-                    # For Twitter/X embeds, format specially
-                    if embed.author and embed.author.name and embed.url and ('twitter.com' in embed.url or 'x.com' in embed.url):
-                        embed_info.append(f"[Shared Tweet from {embed.author.name}]")
-                        if embed.description:
-                            embed_info.append(f'[Tweet: "{embed.description}"]')
-                        if embed.url:
-                            embed_info.append(f"[Tweet URL: {embed.url}]")
-                    else:
-                        # Generic embed formatting
-                        if embed.title:
-                            embed_info.append(f"[Link Preview: {embed.title}]")
-                        if embed.description:
-                            # Truncate long descriptions
-                            desc = embed.description[:200] + "..." if len(embed.description) > 200 else embed.description
-                            embed_info.append(f'[Description: "{desc}"]')
-                        if embed.url and not embed.title:
-                            embed_info.append(f"[Link: {embed.url}]")
-                        if embed.author and embed.author.name and not ('twitter.com' in str(embed.url) or 'x.com' in str(embed.url)):
-                            embed_info.append(f"[Author: {embed.author.name}]")
-                        if embed.fields:
-                            for field in embed.fields:
-                                field_value = field.value[:100] + "..." if len(field.value) > 100 else field.value
-                                embed_info.append(f"[{field.name}: {field_value}]")
-                        if embed.image and embed.image.url:
-                            embed_info.append(f"[Embedded Image: {embed.image.url}]")
-                        if embed.thumbnail and embed.thumbnail.url and not embed.image:
-                            embed_info.append(f"[Thumbnail: {embed.thumbnail.url}]")
-                    
-                    if embed_info:
-                        embed_parts.extend(embed_info)
-                
-                if embed_parts:
-                    full_content = full_content + "\n" + "\n".join(embed_parts) if full_content else "\n".join(embed_parts)
-            
-            # Add attachment info if present
-            if hasattr(msg, 'attachments') and msg.attachments:
-                attachment_parts = []
-                for att in msg.attachments:
-                    att_info = f"[Attachment: {att.filename}"
-                    if att.content_type:
-                        att_info += f" ({att.content_type})"
-                    att_info += f" - {att.url}]"
-                    attachment_parts.append(att_info)
-                
-                if attachment_parts:
-                    full_content = full_content + "\n" + "\n".join(attachment_parts) if full_content else "\n".join(attachment_parts)
-            
+        position = {}
+        for turn, full_content in entries:
+            position[turn.id] = len(history)
             # In agentic mode every history line carries its Discord
             # message id so the model can target reactions/edits/replies
             # directly instead of guessing or searching for ids.
-            id_tag = f"[msg_id: {msg.id}] " if agentic and hasattr(msg, 'id') else ""
+            id_tag = f"[msg_id: {turn.id}] " if agentic else ""
 
-            if hasattr(msg, 'author') and hasattr(msg.author, 'bot') and msg.author.bot:
+            if turn.author_bot:
                 history.append({"role": "assistant", "content": f"{id_tag}{full_content}"})
+                continue
+            # For user messages, add context about whether it's a reply
+            reply_context = ""
+            replied_to = by_id.get(turn.reference_id) if turn.reference_id else None
+            if replied_to is not None:
+                reply_context = f" [replying to {replied_to.author_name}]"
+
+            # Mark if this is the most recent message
+            if turn.id == most_recent_msg_id:
+                history.append({"role": "user", "content": f"[MOST RECENT MESSAGE] {id_tag}{turn.author_id}{reply_context}: {full_content}"})
             else:
-                # For user messages, add context about whether it's a reply
-                reply_context = ""
-                if hasattr(msg, 'reference') and msg.reference and msg.reference.message_id:
-                    # Find who they're replying to
-                    replied_to_id = msg.reference.message_id
-                    replied_to_msg = next((m for m in all_messages_for_history if hasattr(m, 'id') and m.id == replied_to_id), None)
-                    if replied_to_msg and hasattr(replied_to_msg, 'author'):
-                        reply_context = f" [replying to {replied_to_msg.author.display_name}]"
-                
-                author_id = getattr(msg.author, 'id', 'unknown') if hasattr(msg, 'author') else 'unknown'
-                
-                # Mark if this is the most recent message
-                if hasattr(msg, 'id') and most_recent_msg_id and msg.id == most_recent_msg_id:
-                    history.append({"role": "user", "content": f"[MOST RECENT MESSAGE] {id_tag}{author_id}{reply_context}: {full_content}"})
-                else:
-                    history.append({"role": "user", "content": f"{id_tag}{author_id}{reply_context}: {full_content}"})
+                history.append({"role": "user", "content": f"{id_tag}{turn.author_id}{reply_context}: {full_content}"})
+
+        if budget is not None:
+            # A referenced message is kept or dropped together with its reply.
+            links = {position[turn.id]: position[turn.reference_id]
+                     for turn, _text in entries
+                     if turn.id not in referenced and turn.reference_id in referenced}
+            history = budget.pack_history(history, links)
         return history, user_mapping
 
-    def _build_system_prompt(self, ctx, tool_names, user_mapping):
-        """Assemble the system prompt: persona, situational instructions,
-        agentic tool guidance, and active user memories.
+    def _build_system_prompt(self, ctx, tool_names, user_mapping, budget=None, query=""):
+        """Assemble the system prompt as (stable, volatile).
+
+        `stable` — persona, situational rules, agentic tool mechanics — is
+        identical across a guild's messages, so providers can serve it from
+        their prompt cache; it must not pick up anything per-message.
+        `volatile` holds what changes every run: the user-ID mapping, the
+        agentic target ids, and active user memories (whose display names
+        come from the current mapping).
 
         `tool_names` is the guild's resolved bot-tool allowlist. When empty
-        the agentic guidance block is omitted (plain-chat behavior).
-        Moved verbatim out of process_askgpt (seam-machine claim 1)."""
+        the agentic guidance block is omitted (plain-chat behavior). With a
+        ContextBudget, memories are ranked against `query` (the recent
+        conversation) and only the best that fit the budget are included."""
         agentic = bool(tool_names)
         # Retrieve personality data (prompt and version)
         personality_data = self.bot.config.get(ctx, "gpt_personality_data")
@@ -542,7 +781,7 @@ class Gpt(commands.Cog):
             "- The conversation history is below; user messages are prefixed with their ID.",
             "- Some messages may be marked as [REFERENCED MESSAGE] - these are messages that were replied to.",
             "- Some users may be shown as [replying to Username] to indicate they replied to someone's message.",
-            f"- User-ID → display-name mapping for reference: {mapping_str}.",
+            "- A User-ID → display-name mapping is listed under CURRENT CONTEXT at the end of these instructions.",
             "- **CRITICAL**: Focus your reply on the MOST RECENT message. The last message in the history is what you're responding to.",
             "- Earlier messages provide context, but the LATEST message is the primary one needing a response.",
             "- If someone just asked you a question or made a request, that's in the LAST message - respond to THAT.",
@@ -552,26 +791,40 @@ class Gpt(commands.Cog):
         ])
 
         if agentic:
-            prompt_parts.extend(build_agentic_guidance(
-                tool_names, ctx.guild.id, ctx.channel.id, ctx.author.id,
-                ctx.message.id))
+            prompt_parts.extend(build_agentic_guidance(tool_names))
+
+        # 3) Per-message context — everything below changes between runs
+        context_parts = [
+            "CURRENT CONTEXT:",
+            f"- User-ID → display-name mapping for reference: {mapping_str}.",
+        ]
+        if agentic:
+            context_parts.extend(build_agentic_context(
+                ctx.guild.id, ctx.channel.id, ctx.author.id, ctx.message.id))
 
         # 4) Dynamic User Memories (if any)
-        if active_memories_for_prompt:
-            prompt_parts.append("") # Blank line for separation
-            prompt_parts.append("Consider these relevant memories from users (format: User DisplayName (ID): \"memory text\" (Type: type, Stored: YYYY-MM-DD)):")
-            for mem in active_memories_for_prompt:
-                sender_id_str = str(mem.get('sender'))
-                sender_display_name = user_mapping.get(sender_id_str, sender_id_str) # Fallback to ID if not in current mapping
-                stored_at_ts = mem.get('stored_at', time.time()) # Fallback to now if somehow missing
-                stored_at_str = datetime.fromtimestamp(stored_at_ts).strftime('%Y-%m-%d')
-                memory_text = mem.get('text', '')
-                memory_type = mem.get('type', 'unknown')
-                prompt_parts.append(
-                    f"- User {sender_display_name} ({sender_id_str}): \"{memory_text}\" (Type: {memory_type}, Stored: {stored_at_str})"
-                )
-            prompt_parts.append("Use these memories to inform your responses appropriately, remembering they are statements from users, not your own.")
-        return "\n".join(prompt_parts)
+        if budget is not None:
+            active_memories_for_prompt = rank_memories(
+                active_memories_for_prompt, query, speakers=user_mapping)
+        memory_lines = []
+        for mem in active_memories_for_prompt:
+            sender_id_str = str(mem.get('sender'))
+            sender_display_name = user_mapping.get(sender_id_str, sender_id_str) # Fallback to ID if not in current mapping
+            stored_at_ts = mem.get('stored_at', time.time()) # Fallback to now if somehow missing
+            stored_at_str = datetime.fromtimestamp(stored_at_ts).strftime('%Y-%m-%d')
+            memory_text = mem.get('text', '')
+            memory_type = mem.get('type', 'unknown')
+            memory_lines.append(
+                f"- User {sender_display_name} ({sender_id_str}): \"{memory_text}\" (Type: {memory_type}, Stored: {stored_at_str})"
+            )
+        if budget is not None:
+            memory_lines = [memory_lines[i] for i in budget.pack_memories(memory_lines)]
+        if memory_lines:
+            context_parts.append("") # Blank line for separation
+            context_parts.append("Consider these relevant memories from users (format: User DisplayName (ID): \"memory text\" (Type: type, Stored: YYYY-MM-DD)):")
+            context_parts.extend(memory_lines)
+            context_parts.append("Use these memories to inform your responses appropriately, remembering they are statements from users, not your own.")
+        return "\n".join(prompt_parts), "\n".join(context_parts)
 
     async def process_askgpt(self, ctx, question: str):
         # Per-model cooldown, enforced here so BOTH entry points (the mention
@@ -602,63 +855,170 @@ class Gpt(commands.Cog):
             tool_names = self._resolve_bot_tools(ctx)
             agentic = bool(ctx.guild) and bool(tool_names)
 
-            history, user_mapping = await self._build_history(ctx, agentic)
-            prompt = self._build_system_prompt(ctx, tool_names, user_mapping)
+            # User pings are an intended feature ("tell @X he's cool"),
+            # but model output must never be able to ping roles or
+            # @everyone/@here — that's a mass-ping vector via prompt
+            # injection (see docs/security.md).
+            reply_mentions = discord.AllowedMentions(
+                users=True, roles=False, everyone=False, replied_user=True
+            )
 
-            # Prepare messages for API
-            api_messages = [
-                {
-                    "role": "system",
-                    "content": prompt
-                },
-                *history
-            ]
+            def answer():
+                return self._answer(ctx, question, provider_config, tool_names,
+                                    agentic, reply_mentions)
 
-            metadata = {
-                "service": "literallybot",
-                "sender": str(ctx.author.id),
-                "channel": str(ctx.channel.id),
-                "guild": str(ctx.guild.id) if ctx.guild else "DM"
-            }
+            # Agentic runs are never shared: their tools act as the invoker.
+            key = None if agentic else await self._coalesce_key(ctx, question, provider_config)
+            if key is None:
+                await answer()
+                return
+            shared, how = await self.coalescer.run(key, answer, self._answer_cache_ttl(ctx))
+            if how == LED:
+                return
+            self.logger.debug(f"gpt answer {how}: guild={ctx.guild.id} stats={self.coalescer.stats}")
+            if shared is None:
+                await answer()  # the shared run had nothing to show
+                return
+            for chunk in recursive_split(shared, 2000):
+                await ctx.send(chunk, allowed_mentions=reply_mentions)
+
+    async def _answer(self, ctx, question, provider_config, tool_names, agentic, reply_mentions):
+        """Assemble context, call the model and post the reply. Returns the
+        text shown, or None when nothing was (refusal, empty reply, error)."""
+        budget = self._context_budget(provider_config)
+        history, user_mapping = await self._build_history(ctx, agentic, budget)
+        # Memories are ranked against the last few turns of conversation.
+        query = "\n".join(turn["content"] for turn in history[-5:])
+        prompt, context = self._build_system_prompt(ctx, tool_names, user_mapping, budget, query)
+
+        # Prepare messages for API. The stable prompt leads so providers
+        # can cache it; the volatile context is sent after it (see
+        # core/llm/client.py _request_parameters).
+        api_messages = [
+            {
+                "role": "system",
+                "content": prompt
+            },
+            {
+                "role": "system",
+                "content": context,
+                "volatile": True,
+            },
+            *history
+        ]
 
-            try:
-                if agentic:
-                    response = await self._run_agentic(ctx, provider_config, api_messages, metadata, question, tool_names)
-                else:
-                    response = await self.call_ai_api(provider_config, api_messages, metadata)
-                response = response.replace("\n\n", "\n").replace("\\n\\n", "\\n")
-
-                if not response.strip():
-                    # Thinking models can spend the whole token budget on
-                    # reasoning and return no content; an empty ctx.send() is
-                    # a Discord 400 (50006).
-                    await ctx.send("The model returned an empty response (likely spent its whole token budget thinking). Try again or check the model's reasoning_effort setting.")
-                    return
-                
-                # Check if the response complies with our safety rules
-                is_compliant, checked_response = self.check_message_compliance(ctx, response)
-                if not is_compliant:
-                    await ctx.send(f"I'm sorry {ctx.author.display_name}, I can't do that.")
-                    return
-                     
-                chunks = recursive_split(response, 2000)
-                # User pings are an intended feature ("tell @X he's cool"),
-                # but model output must never be able to ping roles or
-                # @everyone/@here — that's a mass-ping vector via prompt
-                # injection (see docs/security.md).
-                reply_mentions = discord.AllowedMentions(
-                    users=True, roles=False, everyone=False, replied_user=True
-                )
-                for chunk in chunks:
-                    await ctx.send(chunk, allowed_mentions=reply_mentions)
-                    
-            except Exception as e:
-                self.logger.error(f"AI API error: {e}", exc_info=True)
-                self._refund_last_call(ctx)
-                await ctx.send(f"Error calling {provider_config['provider']} API: {str(e)}")
+        metadata = {
+            "service": "literallybot",
+            "sender": str(ctx.author.id),
+            "channel": str(ctx.channel.id),
+            "guild": str(ctx.guild.id) if ctx.guild else "DM"
+        }
+
+        if not agentic and self._streaming_enabled():
+            return await self._stream_reply(ctx, provider_config, api_messages, metadata, reply_mentions, budget)
+
+        try:
+            if agentic:
+                response = await self._run_agentic(ctx, provider_config, api_messages, metadata, question, tool_names, budget)
+            else:
+                response = await self.call_ai_api(provider_config, api_messages, metadata, budget)
+            response = normalize_reply(response)
+
+            if not response.strip():
+                # Thinking models can spend the whole token budget on
+                # reasoning and return no content; an empty ctx.send() is
+                # a Discord 400 (50006).
+                await ctx.send("The model returned an empty response (likely spent its whole token budget thinking). Try again or check the model's reasoning_effort setting.")
+                return None
+
+            # Check if the response complies with our safety rules
+            is_compliant, checked_response = self.check_message_compliance(ctx, response)
+            if not is_compliant:
+                await ctx.send(f"I'm sorry {ctx.author.display_name}, I can't do that.")
+                return None
+
+            chunks = recursive_split(response, 2000)
+            for chunk in chunks:
+                await ctx.send(chunk, allowed_mentions=reply_mentions)
+            return response
+
+        except Exception as e:
+            self.logger.error(f"AI API error: {e}", exc_info=True)
+            self._refund_last_call(ctx)
+            await ctx.send(f"Error calling {provider_config['provider']} API: {str(e)}")
+            return None
+
+    async def _coalesce_key(self, ctx, question, provider_config):
+        """Identity of a plain-chat answer for in-flight sharing (see
+        core/llm/coalesce.py), or None when the guild hasn't opted in. An
+        answer cache implies sharing in-flight requests too."""
+        if ctx.guild is None:
+            return None
+        if not (self.bot.config.get(ctx, COALESCE_KEY, False) or self._answer_cache_ttl(ctx)):
+            return None
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        self.history.observe(ctx.message)
+        turns = await self._recent_turns(ctx.channel)
+        return (ctx.guild.id, ctx.channel.id, provider_config["provider"],
+                provider_config["model"], normalized,
+                context_fingerprint(turns, normalized, ctx.message.id))
+
+    def _answer_cache_ttl(self, ctx) -> float:
+        try:
+            return max(0.0, float(self.bot.config.get(ctx, ANSWER_CACHE_KEY, 0) or 0))
+        except (TypeError, ValueError):
+            return 0.0
+
+    def _streaming_enabled(self):
+        return bool(self.bot.config.get_global(STREAMING_KEY, True))
+
+    async def _stream_reply(self, ctx, provider_config, api_messages, metadata, reply_mentions, budget=None):
+        """Plain-chat reply streamed into progressively edited messages (see
+        StreamingReply). Same outcomes as the buffered path: compliance
+        refusal, empty-response notice, API error + cooldown refund. Returns
+        the text shown, or None."""
+        async def send(content):
+            return await ctx.send(content, allowed_mentions=reply_mentions)
+
+        def compliant(text):
+            return self.check_message_compliance(ctx, text)[0]
+
+        reply = StreamingReply(send, compliant)
+        final = None
+        stream = self.router.chat_stream(provider_config, api_messages, metadata)
+        try:
+            async for item in stream:
+                if isinstance(item, LLMResponse):
+                    final = item
+                elif not await reply.feed(item):
+                    shown = None
+                    break
+            else:
+                shown = await reply.finish(final.text if final else None)
+            if shown is None:
+                await reply.retract()
+                await ctx.send(f"I'm sorry {ctx.author.display_name}, I can't do that.")
                 return
+        except Exception as e:
+            self.logger.error(f"AI API error: {e}", exc_info=True)
+            self._refund_last_call(ctx)
+            await ctx.send(f"Error calling {provider_config['provider']} API: {str(e)}")
+            return
+        finally:
+            await stream.aclose()
+
+        if final is not None and final.usage:
+            self.logger.debug(self._record_usage("AI usage", final.usage, api_messages, budget))
+        if not shown:
+            # Thinking models can spend the whole token budget on reasoning
+            # and return no content; an empty ctx.send() is a Discord 400.
+            await ctx.send("The model returned an empty response (likely spent its whole token budget thinking). Try again or check the model's reasoning_effort setting.")
+            return None
+        return shown
 
-    async def _run_agentic(self, ctx, provider_config, api_messages, metadata, question, tool_names) -> str:
+    async def _run_agentic(self, ctx, provider_config, api_messages, metadata, question, tool_names, budget=None) -> str:
         """Run the request through the in-bot agent loop (ops-registry tools).
 
         The actor for every tool call is the INVOKING USER's Member (ctx
@@ -716,7 +1076,7 @@ class Gpt(commands.Cog):
                 user_prompt=command_turn,
                 max_tool_calls=AGENT_TOOL_BUDGET * 2,
             )
-            self._log_agentic_usage(response)
+            self._log_agentic_usage(response, budget)
 
             # Narrated-call backstop: the reply names an enabled tool but zero
             # tools ran — almost certainly a verbalized invocation (observed
@@ -761,14 +1121,13 @@ class Gpt(commands.Cog):
 
         return response.text
 
-    def _log_agentic_usage(self, response):
+    def _log_agentic_usage(self, response, budget=None):
+        # No calibration: an agent run's prompt_tokens span several requests
+        # plus tool definitions, not the messages we estimated.
         if response.usage:
             self.logger.info(
-                f"agentic usage: provider={response.usage.provider} model={response.usage.model} "
-                f"prompt={response.usage.prompt_tokens} completion={response.usage.completion_tokens} "
-                f"total={response.usage.total_tokens} est_cost_usd={response.usage.estimated_cost_usd} "
-                f"tool_calls={response.usage.tool_calls}"
-            )
+                self._record_usage("agentic usage", response.usage, budget=budget)
+                + f" tool_calls={response.usage.tool_calls}")
 
     def check_message_compliance(self, ctx, message):
         """
@@ -983,6 +1342,7 @@ class Gpt(commands.Cog):
         # Store the API key
         api_key_name = f"{provider.upper()}_API_KEY"
         config.set(None, api_key_name, api_key, scope="global")
+        self.llm.invalidate_models()
 
         provider_info = all_providers[provider]
         lines = [f"API key set for {provider_info['name']}. Attempting to discover available models..."]
@@ -1008,12 +1368,37 @@ class Gpt(commands.Cog):
         """
         return await self.llm.discover_models(provider, api_key, provider_info)
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Fires again on a fresh session (not a resume): events may have been
+        # missed meanwhile, so buffered windows can no longer be trusted.
+        self.history.reset()
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        self.history.update(payload.message)
+        self.fetch_cache.discard([payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        self.history.remove(payload.channel_id, [payload.message_id])
+        self.fetch_cache.discard([payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        self.history.remove(payload.channel_id, payload.message_ids)
+        self.fetch_cache.discard(payload.message_ids)
+
     @commands.Cog.listener()
     async def on_message(self, message):
+        self.history.observe(message)
         ctx = await self.bot.get_context(message) # Get context for config and other operations
 
+        # One lock-free snapshot of the guild config for this whole event.
+        guild_cfg = self.bot.config.snapshot(ctx)
+
         # Retrieve current personality version for tagging memories
-        personality_data = self.bot.config.get(ctx, "gpt_personality_data")
+        personality_data = guild_cfg.get("gpt_personality_data")
         current_personality_version = 0 # Default version
         if personality_data and isinstance(personality_data, dict):
             current_personality_version = personality_data.get("version", 0)
@@ -1039,8 +1424,8 @@ class Gpt(commands.Cog):
         # Case 2: Message is a reply to a bot message
         elif message.reference and message.reference.message_id:
             try:
-                referenced_message = await ctx.channel.fetch_message(message.reference.message_id)
-                if referenced_message.author.id == self.bot.user.id:
+                referenced = await self._resolve_reference(ctx.channel, message.reference.message_id)
+                if referenced.author_id == self.bot.user.id:
                     self.logger.debug(f"Responding to reply to bot message from {message.author.display_name}")
                     should_respond = True
             except Exception as e:
@@ -1056,7 +1441,7 @@ class Gpt(commands.Cog):
                 if not ctx.guild:
                     return
                 # Per-guild kill switch (/aisettings → Server config).
-                if not self.bot.config.get(ctx, "ai_enabled", True):
+                if not guild_cfg.get("ai_enabled", True):
                     return
 
                 # Cooldown is enforced inside process_askgpt (per-model,
@@ -1136,107 +1521,76 @@ class Gpt(commands.Cog):
             + (" and its stored API key." if had_key else ".")
         )
 
+    def _memory_index(self, ctx, memories):
+        """The guild's MemoryIndex over its stored `gpt_memories` list,
+        rebuilt when the list object changed underneath it (a reload from
+        disk, eviction, a write that replaced the list)."""
+        key = ctx.guild.id if ctx.guild else None
+        index = self._memory_indexes.get(key)
+        if index is None or index.memories is not memories:
+            index = MemoryIndex(memories)
+            self._memory_indexes[key] = index
+        return index
+
     async def capture_and_store_memories(self, ctx, messages, current_personality_version):
         config = self.bot.config
-        all_server_memories = config.get(ctx, "gpt_memories") or []
         newly_captured_memories = []
-        changes_made = False
-        
-        # Define regex patterns with their durations (in seconds) and type identifiers
-        # Durations adjusted as per user request
-        patterns = [
-            {"pattern": r"you'?re\s+to\s+always\s+(.+)", "duration": 604800, "type": "directive"}, # 1 week
-            {"pattern": r"\bmy name(?:'s| is)?\s+([^\.,!\n]+)", "duration": 7776000, "type": "stated_name"}, # 90 days
-            {"pattern": r"\bcall me\s+([^\.,!\n]+)", "duration": 7776000, "type": "nickname"}, # 90 days
-            {"pattern": r"\bI(?:'m| am)\s+(.+)", "duration": 86400, "type": "personal_statement"}, # 1 day
-            {"pattern": r"\bI(?: want|'?d like)\s+(.+)", "duration": 43200, "type": "desire_request"}, # 12 hours
-            {"pattern": r"\bI love\s+(.+)", "duration": 2592000, "type": "positive_preference"}, # 30 days
-            {"pattern": r"\bI hate\s+(.+)", "duration": 2592000, "type": "negative_preference"}, # 30 days
-            {"pattern": r"\bremind me to\s+(.+)", "duration": 86400, "type": "reminder"}, # 1 day
-            {"pattern": r"\bI (?:feel|am feeling)\s+(.+)", "duration": 43200, "type": "emotional_state"}, # 12 hours
-            {"pattern": r"\bmy birthday(?:'s| is)?\s+([^\.,!\n]+)", "duration": 31536000, "type": "birthday"}, # 1 year
-            {"pattern": r"\bI(?:'m| am) excited (?:about|for)\s+(.+)", "duration": 172800, "type": "enthusiasm"} # 2 days
-        ]
-        
-        # Scan messages for new memories
+
+        # Scan messages for new memories (patterns and durations: core/memories.py)
         for msg in messages:
             # if msg.author.bot: # Do not capture memories from bot's own messages
             #     continue
-            content = msg.content
-            for item in patterns:
-                m = re.search(item["pattern"], content, flags=re.I)
-                if m:
-                    # Directive memories ("you're to always ...") steer the
-                    # system prompt for EVERY user in the guild for a week —
-                    # that's stored prompt injection unless the author is
-                    # trusted. Admins/superadmins only (docs/security.md).
-                    if item["type"] == "directive":
-                        author = getattr(msg, "author", None)
-                        if author is None or getattr(author, "bot", False):
-                            continue
-                        sender_ctx = type("SenderCtx", (), {
-                            "author": author,
-                            "guild": getattr(msg, "guild", None) or ctx.guild,
-                            "bot": self.bot,
-                        })()
-                        if not is_admin(self.bot.config, sender_ctx):
-                            continue
-                    text = m.group(0) # Capture the whole matched text
-                    expires = time.time() + item["duration"]
-                    newly_captured_memories.append({
-                        'text': text,
-                        'expires': expires,
-                        'type': item["type"],
-                        'sender': msg.author.id,
-                        'personality_version': current_personality_version, # Tag with current personality version
-                        'stored_at': time.time() # Add stored_at timestamp
-                    })
-        
-        # Skip further processing if no new memories were captured
-        if not newly_captured_memories:
-            # Check if we need to purge expired memories
-            if any(m.get('expires', 0) <= time.time() for m in all_server_memories):
-                active_server_memories = [m for m in all_server_memories if m.get('expires', 0) > time.time()]
-                if len(active_server_memories) != len(all_server_memories):
-                    config.set(ctx, "gpt_memories", active_server_memories)
-                    self.logger.debug(f"Purged {len(all_server_memories) - len(active_server_memories)} expired memories")
-            return
-        
-        # Merge new memories, avoiding exact duplicates (text, type, sender)
+            for match in self.memory_matcher.scan(msg.content):
+                # Directive memories ("you're to always ...") steer the
+                # system prompt for EVERY user in the guild for a week —
+                # that's stored prompt injection unless the author is
+                # trusted. Admins/superadmins only (docs/security.md).
+                if match.type == "directive":
+                    author = getattr(msg, "author", None)
+                    if author is None or getattr(author, "bot", False):
+                        continue
+                    sender_ctx = type("SenderCtx", (), {
+                        "author": author,
+                        "guild": getattr(msg, "guild", None) or ctx.guild,
+                        "bot": self.bot,
+                    })()
+                    if not is_admin(self.bot.config, sender_ctx):
+                        continue
+                now = time.time()
+                newly_captured_memories.append({
+                    'text': match.text, # The whole matched text
+                    'expires': now + match.duration,
+                    'type': match.type,
+                    'sender': msg.author.id,
+                    'personality_version': current_personality_version, # Tag with current personality version
+                    'stored_at': now # Add stored_at timestamp
+                })
+
+        memories = config.get(ctx, "gpt_memories")
+        if memories is None:
+            if not newly_captured_memories:
+                return
+            memories = []
+        index = self._memory_index(ctx, memories)
+        changes_made = index.compacted
+        index.compacted = False
+
+        # Merge new memories; an exact duplicate (text, type, sender) just
+        # has its expiry, personality version and timestamp refreshed.
         for new_mem in newly_captured_memories:
-            is_duplicate = False
-            for existing_mem in all_server_memories:
-                if (new_mem['text'] == existing_mem.get('text', '') and
-                    new_mem['type'] == existing_mem.get('type', '') and
-                    new_mem['sender'] == existing_mem.get('sender')):
-                    # If it's a duplicate fact, check if we need to update its properties
-                    if (existing_mem.get('expires') != new_mem['expires'] or
-                        existing_mem.get('personality_version') != new_mem['personality_version'] or
-                        existing_mem.get('stored_at') != new_mem['stored_at']):
-                        
-                        existing_mem['expires'] = new_mem['expires']
-                        existing_mem['personality_version'] = new_mem['personality_version']
-                        existing_mem['stored_at'] = new_mem['stored_at']
-                        changes_made = True
-                        
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                all_server_memories.append(new_mem)
-                changes_made = True
-                
-        # Purge expired memories if needed
-        if any(m.get('expires', 0) <= time.time() for m in all_server_memories):
-            active_server_memories = [m for m in all_server_memories if m.get('expires', 0) > time.time()]
-            if len(active_server_memories) != len(all_server_memories):
-                all_server_memories = active_server_memories
-                changes_made = True
-        
+            changes_made |= index.upsert(new_mem)
+
+        # Purge expired memories (O(expired): the index keeps an expiry heap)
+        purged = index.purge()
+        if purged:
+            changes_made = True
+            self.logger.debug(f"Purged {purged} expired memories")
+
         # Only save if changes were made
         if changes_made:
-            config.set(ctx, "gpt_memories", all_server_memories)
-            self.logger.debug(f"Stored {len(newly_captured_memories)} new memories")
+            config.set(ctx, "gpt_memories", memories)
+            if newly_captured_memories:
+                self.logger.debug(f"Stored {len(newly_captured_memories)} new memories")
 
     # ==================== ADMIN SURFACE (/aisettings) ====================
     #
@@ -1248,6 +1602,21 @@ class Gpt(commands.Cog):
 
     async def cog_load(self):
         self._seed_model_costs()
+        self._load_cooldown_state()
+        if self.bot.config.get_global(USAGE_LEDGER_KEY, True):
+            self.llm.ledger = UsageLedger()
+            self.flush_usage_ledger.start()
+
+    async def cog_unload(self):
+        if self._cooldown_state_path is not None:
+            self.save_cooldown_state.cancel()
+            self._save_cooldown_state()
+        if self.llm.ledger is not None:
+            self.flush_usage_ledger.cancel()
+            self.llm.ledger.close()
+            self.llm.ledger = None
+        # Pooled provider connections (see LLMClient._build_model).
+        await self.llm.aclose()
 
     def _seed_model_costs(self):
         """Backfill `cost_per_mtok_output` on existing models from known prices.
@@ -2014,7 +2383,8 @@ class AiSettingsView(InvokerOnlyView, discord.ui.LayoutView):
         self.clear_items()
         if self.page in ("providers", "mcp", "agentops") and not self.is_super:
             self.page = "server"
-        tabs = [self._tab_button("⚙ Server config", "server")]
+        tabs = [self._tab_button("⚙ Server config", "server"),
+                self._tab_button("💰 Usage", "usage")]
         if self.is_super:
             # Global-scope pages: invisible to non-superadmins, not merely
             # disabled — a guild admin shouldn't even see the catalog knobs.
@@ -2086,6 +2456,8 @@ class AiSettingsView(InvokerOnlyView, discord.ui.LayoutView):
             body = self._mcp_text()
         elif self.page == "agentops":
             body = self._agentops_text()
+        elif self.page == "usage":
+            body = self._usage_text()
         else:
             body = self._server_text()
         if self._flash:
@@ -2110,6 +2482,37 @@ class AiSettingsView(InvokerOnlyView, discord.ui.LayoutView):
             + (", ".join(bot_tools) if bot_tools else "*none — plain chat*")
         )
 
+    def _usage_text(self):
+        gid = self._cfg_ctx()
+        if self.gpt.llm.ledger is None:
+            return ("## AI settings — Usage\n"
+                    f"The usage ledger is off (global `{USAGE_LEDGER_KEY}`).")
+        windows = [("24h", 24), ("7d", 24 * 7), ("all time", None)]
+        totals = " · ".join(
+            f"**{label}:** {summary['calls']} calls, ${summary['cost_usd']:.2f}"
+            for label, summary in ((label, self.gpt.usage_summary(gid, hours))
+                                   for label, hours in windows))
+        rows = self.gpt.usage_summary(gid, 24 * 7)["models"]
+        if rows:
+            lines = [f"{'provider/model':<32} {'calls':>6} {'tokens':>9} {'$':>8} {'$/call':>8}"]
+            for row in rows[:12]:
+                per_call = "—" if row["cost_per_call"] is None else f"{row['cost_per_call']:.4f}"
+                tokens = row["prompt_tokens"] + row["completion_tokens"]
+                lines.append(f"{(row['provider'] + '/' + row['model'])[:32]:<32} "
+                             f"{row['calls']:>6} {tokens:>9} {row['cost_usd']:>8.3f} {per_call:>8}")
+            table = "```\n" + "\n".join(lines) + "\n```"
+        else:
+            table = "*no AI calls in the last 7 days*"
+        hourly = self.gpt.llm.ledger.hourly_cost(gid, 24)
+        return (
+            "## AI settings — Usage\n"
+            "Estimated spend for this server (from the static price table; "
+            "unpriced models count calls but no cost).\n"
+            f"{totals}\n"
+            f"**Last 7 days by model:**\n{table}\n"
+            f"**Hourly cost, last 24h:** `{_sparkline(hourly)}` (peak ${max(hourly):.3f}/h)"
+        )
+
     def _agentops_text(self):
         wl = self._whitelist_names()
         live = [n for n in wl if registry.get(n) is not None]
@@ -1,11 +1,15 @@
+import asyncio
+import heapq
+import itertools
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import re
 import time
+from collections import deque
 from typing import Optional
 
-# Snooze bounds: below 10 minutes a snooze races the 10s delivery loop and
-# reads as noise; above 30 days it outlives the reminder's relevance.
+# Snooze bounds: below 10 minutes a snooze reads as noise; above 30 days it
+# outlives the reminder's relevance.
 SNOOZE_MIN_SECONDS = 10 * 60
 SNOOZE_MAX_SECONDS = 30 * 86400
 # Hybrid scheme, chosen by USE CASE (labeled from real invocations,
@@ -24,6 +28,20 @@ SNOOZE_STATIC_FLOOR = 600  # 10m — always offered
 SNOOZE_MULTIPLIERS = (1.0, 2.0)
 SNOOZE_STATIC_FALLBACK = (600, 3600, 86400)  # 10m / 1h / 1d
 
+# Delivery: due reminders go out concurrently, but never more than this many
+# DMs in flight at once (a restart after downtime can release hundreds).
+DELIVERY_CONCURRENCY = 8
+# The scheduler sleeps until the next due reminder, but wakes at least this
+# often to notice a hand-edit of the global `reminders` list.
+RESYNC_SECONDS = 60
+# Lateness samples kept for stats() percentiles.
+LATENESS_SAMPLES = 1000
+# stats() goes to the log at most this often, and only after deliveries.
+STATS_LOG_SECONDS = 3600
+# A crashed scheduler loop restarts after 1s, doubling up to this cap; a run
+# that lasted at least this long starts the backoff over.
+RESTART_BACKOFF_MAX = 300
+
 
 def format_duration(seconds: int) -> str:
     """Compact human duration: 90 -> '1m', 5400 -> '1h30m', 129600 -> '1d12h'."""
@@ -100,10 +118,14 @@ class SnoozeButton(discord.ui.DynamicItem[discord.ui.Button],
         base = self.orig if self.orig is not None else self.secs
         if base:
             row["delay"] = base
-        config = interaction.client.config
-        reminders = config.get(None, "reminders", [])
-        reminders.append(row)
-        config.set(None, "reminders", reminders)
+        cog = interaction.client.get_cog("Reminders")
+        if cog is not None:
+            cog.scheduler.add(row)
+        else:  # cog disabled: store it for whenever it's back
+            config = interaction.client.config
+            reminders = config.get(None, "reminders", [])
+            reminders.append(row)
+            config.set(None, "reminders", reminders)
         # Strip the buttons so one delivery can't be snoozed twice, then
         # confirm on the same message.
         await interaction.response.edit_message(view=None)
@@ -166,14 +188,190 @@ def parse_duration(args: str):
     return delay, remainder
 
 
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ReminderScheduler:
+    """Min-heap scheduler over the global `reminders` list.
+
+    The list in config stays the persisted form (schema unchanged); the heap
+    of (timestamp, seq, row) is an index over the same row dicts, so the loop
+    sleeps exactly until the earliest one instead of scanning every row every
+    10 seconds. Rows added through `add()` wake the loop immediately; a
+    hand-edit of the list is noticed within RESYNC_SECONDS (the loop compares
+    list identity with what config holds and re-heaps on a change).
+
+    `deliver` is an async callable taking one row; it owns its own error
+    handling (anything it still raises is logged here). Delivered (or
+    undeliverable) rows are dropped from the list with one config.set per
+    batch — the config writer coalesces those. A row whose timestamp isn't
+    a number is logged and left out of the heap, so it stays in the list
+    untouched instead of stopping the loop.
+    """
+
+    def __init__(self, config, deliver, logger, concurrency=DELIVERY_CONCURRENCY,
+                 clock=time.time):
+        self.config = config
+        self._deliver = deliver
+        self.logger = logger
+        self._concurrency = concurrency
+        self._clock = clock
+        self._rows = None
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._lateness = deque(maxlen=LATENESS_SAMPLES)
+        self._delivered = 0
+        self._logged_delivered = 0
+        self._stats_logged_at = clock()
+
+    def _index(self, rows):
+        """Heap entries for `rows`, skipping (and logging) malformed ones."""
+        heap = []
+        for r in rows:
+            try:
+                heap.append((int(r["timestamp"]), next(self._seq), r))
+            except (KeyError, TypeError, ValueError):
+                self.logger.warning(f"Skipping malformed reminder row: {r!r}")
+        heapq.heapify(heap)
+        return heap
+
+    def _resync(self):
+        """Re-heap if config's list is no longer the one we indexed."""
+        rows = self.config.get(None, "reminders", [])
+        if rows is self._rows:
+            return
+        self._rows = rows
+        self._heap = self._index(rows)
+
+    def reset(self):
+        """Forget the index so the next _resync rebuilds it from config
+        (after a crash the heap may have lost popped, undelivered rows)."""
+        self._rows = None
+
+    def add(self, row):
+        """Persist a new reminder and wake the loop if it is now the earliest."""
+        self._resync()
+        self._rows.append(row)
+        self.config.set(None, "reminders", self._rows)
+        heapq.heappush(self._heap, (int(row["timestamp"]), next(self._seq), row))
+        self._wakeup.set()
+
+    def next_due(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    async def deliver_batch(self, rows):
+        """Send due rows concurrently, at most `concurrency` at a time."""
+        gate = asyncio.Semaphore(self._concurrency)
+
+        async def one(row):
+            async with gate:
+                self._lateness.append(max(0.0, self._clock() - int(row["timestamp"])))
+                try:
+                    await self._deliver(row)
+                except Exception:
+                    self.logger.exception(f"Reminder delivery failed for {row.get('user_id')}")
+
+        await asyncio.gather(*(one(row) for row in rows))
+        self._delivered += len(rows)
+
+    def _persist_removed(self, rows):
+        """Drop delivered rows from the stored list (one write per batch)."""
+        current = self.config.get(None, "reminders", [])
+        if current is self._rows:
+            done = {id(r) for r in rows}
+            self._rows[:] = [r for r in self._rows if id(r) not in done]
+        else:
+            # Reloaded externally mid-delivery: the new list holds copies, so
+            # match by value rather than identity.
+            self._rows = [r for r in current if r not in rows]
+            self._heap = self._index(self._rows)
+        self.config.set(None, "reminders", self._rows)
+
+    async def run(self):
+        while True:
+            self._resync()
+            now = self._clock()
+            due = self.pop_due(now)
+            if due:
+                await self.deliver_batch(due)
+                self._persist_removed(due)
+                continue
+            self._maybe_log_stats(now)
+            next_due = self.next_due()
+            timeout = RESYNC_SECONDS if next_due is None else min(next_due - now, RESYNC_SECONDS)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        """Pending count, delivered count, and delivery lateness (seconds
+        past the due time when the send started) percentiles."""
+        samples = sorted(self._lateness)
+        return {
+            "pending": len(self._heap),
+            "delivered": self._delivered,
+            "lateness_p50": _percentile(samples, 50),
+            "lateness_p95": _percentile(samples, 95),
+            "lateness_p99": _percentile(samples, 99),
+            "lateness_max": samples[-1] if samples else None,
+        }
+
+    def _maybe_log_stats(self, now):
+        """Log stats() every STATS_LOG_SECONDS, if anything was delivered."""
+        if now - self._stats_logged_at < STATS_LOG_SECONDS or self._delivered == self._logged_delivered:
+            return
+        self._stats_logged_at = now
+        self._logged_delivered = self._delivered
+        stats = self.stats()
+        self.logger.info(
+            f"Reminders: {stats['pending']} pending, {stats['delivered']} delivered; lateness "
+            f"p50 {stats['lateness_p50']:.1f}s p95 {stats['lateness_p95']:.1f}s "
+            f"p99 {stats['lateness_p99']:.1f}s max {stats['lateness_max']:.1f}s")
+
+
 class Reminders(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.logger = bot.logger
-        self.check_reminders.start()
+        self.scheduler = ReminderScheduler(bot.config, self._deliver, self.logger)
+        self._task = None
+
+    async def cog_load(self):
+        self._task = asyncio.create_task(self._run_scheduler())
 
     def cog_unload(self):
-        self.check_reminders.cancel()
+        if self._task:
+            self._task.cancel()
+
+    async def _run_scheduler(self):
+        await self.bot.wait_until_ready()
+        backoff = 1
+        while True:
+            started = time.monotonic()
+            try:
+                await self.scheduler.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if time.monotonic() - started >= RESTART_BACKOFF_MAX:
+                    backoff = 1
+                self.logger.exception(f"Reminder scheduler crashed; restarting in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, RESTART_BACKOFF_MAX)
+                self.scheduler.reset()
 
     @commands.command(name="remindme", aliases=["setreminder", "reminder", "r"])
     async def remindme(self, ctx, *, args: str = None):
@@ -202,43 +400,27 @@ class Reminders(commands.Cog):
         delay, text = parsed
         current_time = int(time.time())
         remind_time = current_time + delay
-        config = self.bot.config
-        reminders = config.get(None, "reminders", [])
         # "delay" feeds the snooze buttons at delivery (0.5x/1x/2x of the
         # original duration); legacy rows without it get static offsets.
-        reminders.append({"user_id": ctx.author.id, "timestamp": remind_time,
-                          "text": text, "delay": delay})
-        config.set(None, "reminders", reminders)
+        self.scheduler.add({"user_id": ctx.author.id, "timestamp": remind_time,
+                            "text": text, "delay": delay})
         await ctx.send(f"Reminder set — <t:{remind_time}:R>.")
 
-    @tasks.loop(seconds=10)
-    async def check_reminders(self):
-        current_time = int(time.time())
-        config = self.bot.config
-        reminders = config.get(None, "reminders", [])
-        updated_reminders = []
-        for reminder in reminders:
-            if reminder["timestamp"] <= current_time:
-                user = self.bot.get_user(reminder["user_id"])
-                if not user:
-                    try:
-                        user = await self.bot.fetch_user(reminder["user_id"])
-                    except Exception as e:
-                        self.logger.warning(f"Failed to fetch user {reminder['user_id']}: {e}")
-                        continue
-                try:
-                    await user.send(f"Reminder: {reminder['text']}",
-                                    view=snooze_view(reminder.get("delay")))
-                except Exception as e:
-                    self.logger.warning(f"Failed to send DM to {reminder['user_id']}: {e}")
-            else:
-                updated_reminders.append(reminder)
-        if len(updated_reminders) != len(reminders):
-            config.set(None, "reminders", updated_reminders)
-    
-    @check_reminders.before_loop
-    async def before_check_reminders(self):
-        await self.bot.wait_until_ready()
+    async def _deliver(self, reminder):
+        """DM one due reminder. A user that can't be resolved or DM'd is
+        logged and the reminder dropped, as before."""
+        user = self.bot.get_user(reminder["user_id"])
+        if not user:
+            try:
+                user = await self.bot.fetch_user(reminder["user_id"])
+            except Exception as e:
+                self.logger.warning(f"Failed to fetch user {reminder['user_id']}: {e}")
+                return
+        try:
+            await user.send(f"Reminder: {reminder['text']}",
+                            view=snooze_view(reminder.get("delay")))
+        except Exception as e:
+            self.logger.warning(f"Failed to send DM to {reminder['user_id']}: {e}")
 
 async def setup(bot):
     # DynamicItem registration is what routes remsnooze:* interactions after
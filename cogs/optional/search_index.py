@@ -0,0 +1,168 @@
+"""Feeds the opt-in local message index (core/message_index.py).
+
+search_history answers from Discord's own search endpoint; when that fails,
+this index lets it still answer guild-wide and multi-channel queries. The cog
+is inert unless the global `message_index_enabled` bool is true (read at
+load ⇒ restart-bound). When enabled it:
+
+- indexes every guild message the gateway delivers, plus edits and deletes
+  (raw events, so uncached messages are covered too), in batched writes;
+- walks each readable text channel's history backwards, one page at a time
+  with a pause between pages, checkpointing the oldest indexed id per channel
+  so a restart resumes where it stopped instead of starting over;
+- but first, after a restart, walks each channel forwards from its newest
+  indexed id, so what was posted while the bot was offline is indexed too
+  (the index doesn't call a channel complete until that is done).
+"""
+
+import asyncio
+
+import discord
+from discord.ext import commands, tasks
+
+from core import message_index
+
+ENABLED_KEY = "message_index_enabled"
+# Buffered gateway rows are written at least this often.
+FLUSH_SECONDS = 2.0
+# Backfill pacing: one history page per channel step, then a pause. 100 is
+# the API's page size; the pause keeps the walk far below the history
+# bucket so live commands never queue behind it.
+BACKFILL_PAGE = 100
+BACKFILL_PAGE_DELAY = 2.0
+
+
+class SearchIndex(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.logger = bot.logger
+        self.index = None
+        self._backfill_task = None
+
+    async def cog_load(self):
+        if not self.bot.config.get_global(ENABLED_KEY, False):
+            return
+        self.index = message_index.MessageIndex()
+        message_index.activate(self.index)
+        self.flush_loop.start()
+        self._backfill_task = asyncio.create_task(self._backfill_all())
+        self.logger.info(f"Local message index enabled at {self.index.path}")
+
+    async def cog_unload(self):
+        if self.index is None:
+            return
+        self.flush_loop.cancel()
+        if self._backfill_task:
+            self._backfill_task.cancel()
+        message_index.activate(None)
+        self.index.close()
+        self.index = None
+
+    @tasks.loop(seconds=FLUSH_SECONDS)
+    async def flush_loop(self):
+        self.index.flush()
+
+    # --- real-time feed -------------------------------------------------
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if self.index is None or message.guild is None:
+            return
+        self.index.add(message_index.row_from_message(message))
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        if self.index is None or payload.guild_id is None:
+            return
+        content = payload.data.get("content")
+        if content is not None:  # embed-only updates carry no content
+            self.index.edit(payload.message_id, content)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if self.index is not None and payload.guild_id is not None:
+            self.index.delete([payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        if self.index is not None and payload.guild_id is not None:
+            self.index.delete(list(payload.message_ids))
+
+    # --- backfill -------------------------------------------------------
+
+    def _backfill_channels(self):
+        for guild in self.bot.guilds:
+            me = guild.me
+            for channel in guild.text_channels:
+                perms = channel.permissions_for(me)
+                if perms.read_messages and perms.read_message_history:
+                    yield channel
+
+    async def _catch_up_page(self, channel, after_id):
+        """Index one page newer than the channel's newest indexed id; the
+        channel is caught up once a page comes back short."""
+        rows = []
+        try:
+            async for message in channel.history(limit=BACKFILL_PAGE, oldest_first=True,
+                                                 after=discord.Object(id=after_id)):
+                rows.append(message_index.row_from_message(message))
+        except (discord.Forbidden, discord.NotFound):
+            self.index.mark_caught_up(channel.guild.id, channel.id)
+            return
+        self.index.add_many(rows)
+        if rows:
+            self.index.save_newest(channel.guild.id, channel.id, max(r["id"] for r in rows))
+        if len(rows) < BACKFILL_PAGE:
+            self.index.mark_caught_up(channel.guild.id, channel.id)
+
+    async def _backfill_page(self, channel):
+        """Index one page: newer than the channel's newest indexed id while
+        it is catching up after a restart, then older than its checkpoint.
+        Returns False once the channel's history is exhausted."""
+        after_id = self.index.catch_up_from(channel.id)
+        if after_id is not None:
+            await self._catch_up_page(channel, after_id)
+            return True
+        oldest_id, complete = self.index.checkpoint(channel.id)
+        if complete:
+            return False
+        before = discord.Object(id=oldest_id) if oldest_id else None
+        rows = []
+        try:
+            async for message in channel.history(limit=BACKFILL_PAGE, before=before):
+                rows.append(message_index.row_from_message(message))
+        except (discord.Forbidden, discord.NotFound):
+            self.index.save_checkpoint(channel.guild.id, channel.id, oldest_id, True)
+            return False
+        self.index.add_many(rows)
+        done = len(rows) < BACKFILL_PAGE
+        new_oldest = min((r["id"] for r in rows), default=oldest_id)
+        self.index.save_checkpoint(channel.guild.id, channel.id, new_oldest, done)
+        return not done
+
+    async def _backfill_all(self):
+        """Round-robin one page per channel per pass, so every channel gets
+        recent history early instead of one channel monopolizing the walk."""
+        await self.bot.wait_until_ready()
+        pending = list(self._backfill_channels())
+        for channel in pending:
+            if self.index.catch_up_from(channel.id) is None:
+                self.index.mark_caught_up(channel.guild.id, channel.id)  # no gap
+        while pending:
+            still = []
+            for channel in pending:
+                try:
+                    if await self._backfill_page(channel):
+                        still.append(channel)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.logger.warning(f"message index backfill failed for "
+                                        f"#{channel} ({channel.id}): {e}")
+                await asyncio.sleep(BACKFILL_PAGE_DELAY)
+            pending = still
+        self.logger.info("Local message index backfill complete")
+
+
+async def setup(bot):
+    await bot.add_cog(SearchIndex(bot))
@@ -598,7 +598,11 @@ class SetRole(commands.Cog):
             return
         if not payload.guild_id:
             return
-        entries = self._entries(payload.guild_id)
+        # Every reaction in every guild lands here: read a lock-free
+        # snapshot, and only take the migrating path for the legacy shape.
+        entries = self.bot.config.snapshot(payload.guild_id).get(TOGGLES_KEY) or []
+        if isinstance(entries, dict):
+            entries = self._entries(payload.guild_id)
         entry = next((e for e in entries if e["message_id"] == payload.message_id
                       and _emoji_matches(e["emoji"], payload.emoji)), None)
         if not entry:
@@ -0,0 +1,177 @@
+"""Content-addressed blob store for channel-export assets.
+
+`!downloadbundleassets` used to save every URL of a bundle into its own
+`<bundle>_assets/` folder, so an image reposted across channels or bundles
+was downloaded and stored once per copy, and replay went back to Discord's
+CDN, whose signed URLs expire. Assets now live once, by content:
+
+    <root>/blobs/ab/abcdef…        -- SHA-256 of the bytes, first two hex
+                                       digits as a fan-out directory
+    <root>/partial/<key hash>.part -- an unfinished download (HTTP range
+                                       resume continues it)
+    <root>/assets.sqlite3
+        blobs(sha256, size)                       -- one row per stored blob
+        assets(key, sha256)                       -- URL key -> blob
+        manifest(bundle, message_id, key)         -- which bundle message
+                                                     referenced which asset
+
+A URL key is the URL itself, except on Discord's CDN hosts, where the
+expiring `ex`/`is`/`hm` query parameters are dropped: the path already
+identifies the attachment, and the signature changes every time the URL is
+re-issued. Any other parameter stays in the key — media.discordapp.net
+renders `width`/`height`/`format` variants of one path, and those are
+different bytes.
+
+`stats()` compares what the manifests reference (logical bytes: every
+reference counted at full size) with what the blobs occupy, which is the
+storage dedupe saved. The store is shared by all bundles and never deletes
+blobs; removing a bundle leaves its assets for the others.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+CDN_HOSTS = {"cdn.discordapp.com", "media.discordapp.net"}
+# The signed-URL parameters: expiry, issue time, signature.
+CDN_EXPIRING_PARAMS = {"ex", "is", "hm"}
+HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assets (
+    key    TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL REFERENCES blobs (sha256)
+);
+CREATE TABLE IF NOT EXISTS manifest (
+    bundle     TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    key        TEXT NOT NULL,
+    PRIMARY KEY (bundle, message_id, key)
+);
+"""
+
+
+def asset_key(url: str) -> str:
+    """Stable identity of an asset URL (see module docstring)."""
+    parts = urlsplit(url)
+    if parts.hostname in CDN_HOSTS:
+        kept = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                if k not in CDN_EXPIRING_PARAMS]
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(kept), ""))
+    return url
+
+
+class AssetStore:
+    """One SQLite connection, used from the event loop and from worker
+    threads (blob reads, hashing); the lock serializes them."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.partial_dir = self.root / "partial"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "assets.sqlite3"), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # --- blobs ----------------------------------------------------------
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / sha256
+
+    def partial_path(self, url: str) -> Path:
+        digest = hashlib.sha256(asset_key(url).encode("utf-8")).hexdigest()
+        return self.partial_dir / f"{digest}.part"
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Blob hash already stored for `url`, if its blob is present."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT sha256 FROM assets WHERE key = ?', (asset_key(url),)).fetchone()
+        if row and self.blob_path(row[0]).exists():
+            return row[0]
+        return None
+
+    def read(self, url: str) -> Optional[bytes]:
+        sha256 = self.lookup(url)
+        return self.blob_path(sha256).read_bytes() if sha256 else None
+
+    def add_file(self, path, url: str) -> Tuple[str, int, bool]:
+        """Move a finished download into the store under its hash and map
+        `url` to it. (sha256, size, whether the blob is new) — False means
+        the same bytes were already stored and the file was dropped."""
+        path = Path(path)
+        digest = hashlib.sha256()
+        with path.open("rb") as fp:
+            for chunk in iter(lambda: fp.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        size = path.stat().st_size
+        target = self.blob_path(sha256)
+        new = not target.exists()
+        if new:
+            target.parent.mkdir(exist_ok=True)
+            os.replace(path, target)
+        else:
+            path.unlink()
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR IGNORE INTO blobs (sha256, size) VALUES (?, ?)', (sha256, size))
+            self._conn.execute('INSERT OR REPLACE INTO assets (key, sha256) VALUES (?, ?)',
+                               (asset_key(url), sha256))
+        return sha256, size, new
+
+    # --- manifests ------------------------------------------------------
+
+    def record(self, bundle: str, references: List[Tuple[int, str]]) -> None:
+        """Note that `bundle`'s message `message_id` references `url`, for
+        each (message_id, url) pair."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO manifest (bundle, message_id, key) VALUES (?, ?, ?)',
+                [(bundle, int(message_id), asset_key(url)) for message_id, url in references])
+
+    def manifest(self, bundle: str) -> Dict[int, List[Dict[str, Any]]]:
+        """{message id: [{key, sha256, size}, ...]} for one bundle's stored assets."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT m.message_id, m.key, b.sha256, b.size FROM manifest m '
+                'JOIN assets a ON a.key = m.key JOIN blobs b ON b.sha256 = a.sha256 '
+                'WHERE m.bundle = ? ORDER BY m.message_id', (bundle,)).fetchall()
+        out: Dict[int, List[Dict[str, Any]]] = {}
+        for message_id, key, sha256, size in rows:
+            out.setdefault(message_id, []).append({"key": key, "sha256": sha256, "size": size})
+        return out
+
+    def stats(self, bundle: Optional[str] = None) -> Dict[str, int]:
+        """references / logical_bytes: manifest entries and their full size;
+        blobs / stored_bytes: distinct blobs behind them; saved_bytes is the
+        difference dedupe made. Whole store when `bundle` is None."""
+        where, args = ('WHERE m.bundle = ?', (bundle,)) if bundle is not None else ('', ())
+        with self._lock:
+            references, logical = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM manifest m '
+                'JOIN assets a ON a.key = m.key JOIN blobs b ON b.sha256 = a.sha256 ' + where,
+                args).fetchone()
+            blobs, stored = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs WHERE sha256 IN ('
+                'SELECT a.sha256 FROM manifest m JOIN assets a ON a.key = m.key ' + where + ')',
+                args).fetchone()
+        return {"references": references, "logical_bytes": logical, "blobs": blobs,
+                "stored_bytes": stored, "saved_bytes": logical - stored}
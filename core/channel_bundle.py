@@ -0,0 +1,235 @@
+"""Compressed, indexed, resumable channel-export bundles.
+
+`!backupchannel` used to write one uncompressed JSON line per message with
+`fp.write` on the event loop, and a failure at message 400k of 500k meant
+starting over. A bundle is now `<name>.jsonl.gz` plus an index sidecar
+`<name>.jsonl.gz.idx`:
+
+- The bundle is the same JSONL records (bundle header, messages, summary)
+  as before, gzip-compressed in blocks of BLOCK_MESSAGES messages. Each
+  block is its own gzip member, so `gzip.open` reads the whole file as one
+  stream, and decompression can also start at any block's first byte.
+- The index is JSONL too: a `bundle` line naming the source channel, one
+  `block` line per finished block (first message ordinal `n`, `count`,
+  first/last message id, byte `offset`/`end` in the bundle), and a
+  `summary` line once the export is complete. Counting messages or
+  starting a replay at message N reads the index, not the bundle.
+
+`BundleWriter` does the JSON encoding and compression on a writer thread
+fed through a bounded queue (QUEUE_DEPTH records), so a slow disk pushes
+back on the history walk instead of the event loop. A block's index line
+is written only after the block is flushed, which makes the last indexed
+block the checkpoint: resuming truncates anything after its `end` (a block
+cut short by a crash) and continues from its `last_id` with
+`history(after=...)`.
+
+gzip is from the standard library; zstd would compress better but needs a
+dependency this repo doesn't carry.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import io
+import json
+import queue
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BUNDLE_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+# Messages per gzip member / index line.
+BLOCK_MESSAGES = 1000
+# Records buffered between the history walk and the writer thread.
+QUEUE_DEPTH = 256
+
+_CLOSE = object()
+
+
+def index_path(bundle_path) -> Path:
+    return Path(f"{bundle_path}{INDEX_SUFFIX}")
+
+
+def read_index(bundle_path) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """(bundle meta, block lines, summary line or None). A torn last line
+    (crash mid-write) is ignored."""
+    meta: Dict[str, Any] = {}
+    blocks: List[Dict[str, Any]] = []
+    summary = None
+    try:
+        with index_path(bundle_path).open("r", encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                kind = entry.get("type")
+                if kind == "bundle":
+                    meta = entry
+                elif kind == "block":
+                    blocks.append(entry)
+                elif kind == "summary":
+                    summary = entry
+    except OSError:
+        pass
+    return meta, blocks, summary
+
+
+def checkpoint(blocks: List[Dict[str, Any]]) -> Optional[int]:
+    """Id of the last message in a finished block (resume after it)."""
+    for block in reversed(blocks):
+        if block.get("last_id") is not None:
+            return block["last_id"]
+    return None
+
+
+def count_messages(bundle_path) -> int:
+    """Exported message count, from the index alone."""
+    _meta, blocks, summary = read_index(bundle_path)
+    if summary is not None:
+        return int(summary["message_count"])
+    return sum(block["count"] for block in blocks)
+
+
+def iter_records(bundle_path, start: int = 0) -> Iterator[Dict[str, Any]]:
+    """Records from the bundle, starting at the block holding message
+    ordinal `start` (earlier messages of that block are skipped; non-message
+    records after the seek point are still yielded). A truncated trailing
+    block ends the iteration instead of raising."""
+    _meta, blocks, _summary = read_index(bundle_path)
+    offset, ordinal = 0, 0
+    for block in blocks:
+        if block["n"] <= start and block["count"]:
+            offset, ordinal = block["offset"], block["n"]
+    with open(bundle_path, "rb") as raw:
+        raw.seek(offset)
+        text = io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode="rb"), encoding="utf-8")
+        try:
+            for line in text:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("type") == "message":
+                    ordinal += 1
+                    if ordinal <= start:
+                        continue
+                yield record
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return
+
+
+class BundleWriter:
+    """Writes records to a bundle from a thread (see module docstring).
+
+    `await put(record)` from the event loop, then `await close(complete)`.
+    An error on the writer thread is re-raised by the next put/close."""
+
+    def __init__(self, bundle_path, meta: Optional[Dict[str, Any]] = None, resume: bool = False,
+                 block_messages: Optional[int] = None):
+        self.path = Path(bundle_path)
+        self.block_messages = block_messages or BLOCK_MESSAGES
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=QUEUE_DEPTH)
+        self._error: Optional[BaseException] = None
+        self.message_count = 0
+        end = 0
+        if resume:
+            _meta, blocks, _summary = read_index(self.path)
+            end = blocks[-1]["end"] if blocks else 0
+            self.message_count = sum(block["count"] for block in blocks)
+        else:
+            with index_path(self.path).open("w", encoding="utf-8") as fp:
+                fp.write(json.dumps({"type": "bundle", **(meta or {})}) + "\n")
+        # Drop whatever followed the last indexed block (a crash mid-block).
+        self._raw = self.path.open("r+b" if resume and self.path.exists() else "wb")
+        self._raw.truncate(end)
+        self._raw.seek(end)
+        self._index = index_path(self.path).open("a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name=f"bundle-writer:{self.path.name}",
+                                        daemon=True)
+        self._thread.start()
+
+    async def put(self, record: Dict[str, Any]) -> None:
+        self._raise_if_failed()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            await asyncio.to_thread(self._queue.put, record)
+
+    async def close(self, complete: bool = True) -> int:
+        """Finish the open block and, if `complete`, write the summary.
+        Returns the bundle's total message count."""
+        await asyncio.to_thread(self._queue.put, (_CLOSE, complete))
+        await asyncio.to_thread(self._thread.join)
+        self._raise_if_failed()
+        return self.message_count
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"bundle writer failed: {self._error}") from self._error
+
+    # --- writer thread --------------------------------------------------
+
+    def _run(self) -> None:
+        block = None
+        closing = False
+        try:
+            while True:
+                item = self._queue.get()
+                if isinstance(item, tuple) and item and item[0] is _CLOSE:
+                    closing = True
+                    self._finish_block(block)
+                    if item[1]:
+                        self._write_summary()
+                    return
+                if block is None:
+                    block = self._open_block()
+                block["gz"].write((json.dumps(item) + "\n").encode("utf-8"))
+                if item.get("type") == "message":
+                    message_id = (item.get("message") or {}).get("id")
+                    block["count"] += 1
+                    if block["first_id"] is None:
+                        block["first_id"] = message_id
+                    block["last_id"] = message_id
+                    if block["count"] >= self.block_messages:
+                        self._finish_block(block)
+                        block = None
+        except BaseException as exc:  # surfaced on the event loop by put/close
+            self._error = exc
+            # Keep draining so a blocked put() on the loop can't hang.
+            while not closing:
+                item = self._queue.get()
+                closing = isinstance(item, tuple) and bool(item) and item[0] is _CLOSE
+        finally:
+            self._raw.close()
+            self._index.close()
+
+    def _open_block(self) -> Dict[str, Any]:
+        offset = self._raw.tell()  # before GzipFile writes the member header
+        return {"gz": gzip.GzipFile(fileobj=self._raw, mode="wb", mtime=0),
+                "offset": offset, "n": self.message_count, "count": 0,
+                "first_id": None, "last_id": None}
+
+    def _finish_block(self, block) -> None:
+        if block is None:
+            return
+        block["gz"].close()  # ends the member; leaves _raw open
+        self._raw.flush()
+        self.message_count += block["count"]
+        entry = {key: block[key] for key in ("n", "count", "first_id", "last_id", "offset")}
+        self._index.write(json.dumps({"type": "block", **entry, "end": self._raw.tell()}) + "\n")
+        self._index.flush()
+
+    def _write_summary(self) -> None:
+        summary = {"type": "summary", "message_count": self.message_count}
+        with gzip.GzipFile(fileobj=self._raw, mode="wb", mtime=0) as gz:
+            gz.write((json.dumps(summary) + "\n").encode("utf-8"))
+        self._raw.flush()
+        self._index.write(json.dumps(summary) + "\n")
+        self._index.flush()
@@ -0,0 +1,334 @@
+"""Rolling per-channel buffer of already-formatted chat history turns.
+
+Every chat run used to start with `channel.history(limit=15)` plus one
+`fetch_message` per referenced message, then re-render every embed and
+attachment — even when the same channel was processed seconds earlier. The
+buffer keeps the last BUFFER_SIZE messages of each channel the chat path has
+touched, rendered once, and is fed by the gateway (Gpt's on_message / raw
+edit / raw delete listeners). A reply in a busy channel then assembles its
+context with zero REST calls:
+
+- a channel is seeded by ONE history() call the first time it is used; after
+  that every new message arrives through `observe()`, so the window stays
+  contiguous without re-reading it;
+- referenced messages are looked up in the buffer, then in the references
+  the gateway already resolved (MESSAGE_CREATE carries the replied-to
+  message), and only then fetched — and a fetched one is remembered.
+
+A fresh gateway session may have missed events, so `reset()` (on_ready)
+drops everything and channels re-seed on next use. Headless on purpose: no
+cog imports, so tests drive it with plain stand-in objects.
+"""
+
+import asyncio
+import bisect
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Turns kept per channel. Larger than the history window so a reply to a
+# message that has scrolled out of the window still resolves locally.
+BUFFER_SIZE = 50
+# Channels tracked at once (least recently used is dropped past this).
+MAX_CHANNELS = 512
+# Referenced messages remembered per channel beyond the rolling window.
+MAX_REFS = 64
+# MessageFetchCache bounds: fetched messages kept, and for how long.
+FETCH_CACHE_SIZE = 1024
+FETCH_CACHE_TTL = 300.0
+
+
+@dataclass
+class HistoryTurn:
+    """One message, reduced to what chat-history assembly reads."""
+    id: int
+    author_id: int
+    author_bot: bool
+    author_name: str  # display name at the time it was seen
+    content: str  # raw message text
+    rendered: str  # text plus embed/attachment annotations
+    created_at: Any
+    reference_id: Optional[int]
+    mentions: Tuple[Tuple[str, str], ...]  # (user id, user name)
+
+
+def render_content(msg) -> str:
+    """A message's text plus readable annotations for its embeds and
+    attachments — what the model sees for that message."""
+    full_content = getattr(msg, 'content', '') or ''
+
+    if getattr(msg, 'embeds', None):
+        embed_parts = []
+        for embed in msg.embeds:
+            embed_info = []
+
+            # For Twitter/X embeds, format specially
+            if embed.author and embed.author.name and embed.url and ('twitter.com' in embed.url or 'x.com' in embed.url):
+                embed_info.append(f"[Shared Tweet from {embed.author.name}]")
+                if embed.description:
+                    embed_info.append(f'[Tweet: "{embed.description}"]')
+                if embed.url:
+                    embed_info.append(f"[Tweet URL: {embed.url}]")
+            else:
+                # Generic embed formatting
+                if embed.title:
+                    embed_info.append(f"[Link Preview: {embed.title}]")
+                if embed.description:
+                    # Truncate long descriptions
+                    desc = embed.description[:200] + "..." if len(embed.description) > 200 else embed.description
+                    embed_info.append(f'[Description: "{desc}"]')
+                if embed.url and not embed.title:
+                    embed_info.append(f"[Link: {embed.url}]")
+                if embed.author and embed.author.name and not ('twitter.com' in str(embed.url) or 'x.com' in str(embed.url)):
+                    embed_info.append(f"[Author: {embed.author.name}]")
+                if embed.fields:
+                    for field in embed.fields:
+                        field_value = field.value[:100] + "..." if len(field.value) > 100 else field.value
+                        embed_info.append(f"[{field.name}: {field_value}]")
+                if embed.image and embed.image.url:
+                    embed_info.append(f"[Embedded Image: {embed.image.url}]")
+                if embed.thumbnail and embed.thumbnail.url and not embed.image:
+                    embed_info.append(f"[Thumbnail: {embed.thumbnail.url}]")
+
+            embed_parts.extend(embed_info)
+
+        if embed_parts:
+            full_content = full_content + "\n" + "\n".join(embed_parts) if full_content else "\n".join(embed_parts)
+
+    if getattr(msg, 'attachments', None):
+        attachment_parts = []
+        for att in msg.attachments:
+            att_info = f"[Attachment: {att.filename}"
+            if att.content_type:
+                att_info += f" ({att.content_type})"
+            att_info += f" - {att.url}]"
+            attachment_parts.append(att_info)
+
+        if attachment_parts:
+            full_content = full_content + "\n" + "\n".join(attachment_parts) if full_content else "\n".join(attachment_parts)
+
+    return full_content
+
+
+def turn_from_message(msg) -> HistoryTurn:
+    reference = getattr(msg, 'reference', None)
+    return HistoryTurn(
+        id=msg.id,
+        author_id=msg.author.id,
+        author_bot=bool(getattr(msg.author, 'bot', False)),
+        author_name=msg.author.display_name,
+        content=msg.content or '',
+        rendered=render_content(msg),
+        created_at=msg.created_at,
+        reference_id=reference.message_id if reference else None,
+        mentions=tuple((str(u.id), u.name) for u in getattr(msg, 'mentions', ())),
+    )
+
+
+def _resolved_reference(msg):
+    """The replied-to message the gateway sent along with `msg`, if any
+    (discord.py leaves a DeletedReferencedMessage or None otherwise)."""
+    reference = getattr(msg, 'reference', None)
+    resolved = getattr(reference, 'resolved', None) if reference else None
+    if resolved is not None and hasattr(resolved, 'author') and hasattr(resolved, 'created_at'):
+        return resolved
+    return None
+
+
+class _Channel:
+    __slots__ = ('ids', 'turns', 'refs', 'seeded', 'exhausted')
+
+    def __init__(self):
+        self.ids: List[int] = []  # sorted; snowflakes sort chronologically
+        self.turns: Dict[int, HistoryTurn] = {}
+        self.refs: 'OrderedDict[int, HistoryTurn]' = OrderedDict()
+        self.seeded = False
+        # The seeding history() call came back short: the channel holds
+        # fewer messages than asked for, so a short window is still whole.
+        self.exhausted = False
+
+
+class ChannelHistoryBuffer:
+    def __init__(self, size=BUFFER_SIZE, max_channels=MAX_CHANNELS):
+        self.size = size
+        self.max_channels = max_channels
+        self._channels: 'OrderedDict[int, _Channel]' = OrderedDict()
+        self.stats = {"window_hits": 0, "window_seeds": 0,
+                      "ref_hits": 0, "ref_fetches": 0}
+
+    def _channel(self, channel_id, create=False) -> Optional[_Channel]:
+        chan = self._channels.get(channel_id)
+        if chan is not None:
+            self._channels.move_to_end(channel_id)
+        elif create:
+            chan = self._channels[channel_id] = _Channel()
+            if len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        return chan
+
+    def _insert(self, chan, turn):
+        if turn.id not in chan.turns:
+            bisect.insort(chan.ids, turn.id)
+        chan.turns[turn.id] = turn
+        chan.refs.pop(turn.id, None)
+        while len(chan.ids) > self.size:
+            # Scrolled out of the window, but still a likely reply target.
+            self._remember_ref(chan, chan.turns.pop(chan.ids.pop(0)))
+
+    def _remember_ref(self, chan, turn):
+        if turn.id in chan.turns:
+            return
+        chan.refs[turn.id] = turn
+        chan.refs.move_to_end(turn.id)
+        while len(chan.refs) > MAX_REFS:
+            chan.refs.popitem(last=False)
+
+    # --- gateway feed ---------------------------------------------------
+
+    def observe(self, message) -> None:
+        """A new message in a channel. Ignored unless the channel is being
+        tracked — untracked channels seed themselves on first use — and
+        idempotent, so the chat path may re-observe its invoking message."""
+        chan = self._channel(message.channel.id)
+        if chan is None or message.id in chan.turns:
+            return  # a message is created once; changes come via update()
+        self._insert(chan, turn_from_message(message))
+        resolved = _resolved_reference(message)
+        if resolved is not None:
+            self._remember_ref(chan, turn_from_message(resolved))
+
+    def update(self, message) -> None:
+        """An edited message (content, or embeds arriving late)."""
+        chan = self._channels.get(message.channel.id)
+        if chan is None:
+            return
+        if message.id in chan.turns:
+            chan.turns[message.id] = turn_from_message(message)
+        elif message.id in chan.refs:
+            chan.refs[message.id] = turn_from_message(message)
+
+    def remove(self, channel_id, message_ids: Iterable[int]) -> None:
+        chan = self._channels.get(channel_id)
+        if chan is None:
+            return
+        for mid in message_ids:
+            chan.refs.pop(mid, None)
+            if chan.turns.pop(mid, None) is not None:
+                chan.ids.remove(mid)
+
+    def reset(self) -> None:
+        """Forget everything — a new gateway session may have missed events."""
+        self._channels.clear()
+
+    # --- reads ----------------------------------------------------------
+
+    def track(self, channel_id) -> None:
+        """Start buffering a channel. Called before the seeding history()
+        await so messages that arrive meanwhile aren't lost."""
+        self._channel(channel_id, create=True)
+
+    def seed(self, channel_id, messages, limit) -> None:
+        chan = self._channel(channel_id, create=True)
+        for message in messages:
+            self._insert(chan, turn_from_message(message))
+            resolved = _resolved_reference(message)
+            if resolved is not None:
+                self._remember_ref(chan, turn_from_message(resolved))
+        chan.seeded = True
+        chan.exhausted = len(messages) < limit
+        self.stats["window_seeds"] += 1
+
+    def recent(self, channel_id, limit) -> Optional[List[HistoryTurn]]:
+        """The newest `limit` turns, oldest first — or None when the buffer
+        can't vouch for a complete window (never seeded, or deletes have
+        thinned it) and the caller must seed it."""
+        chan = self._channel(channel_id)
+        if chan is None or not chan.seeded:
+            return None
+        if len(chan.ids) < limit and not chan.exhausted:
+            return None
+        self.stats["window_hits"] += 1
+        return [chan.turns[mid] for mid in chan.ids[-limit:]]
+
+    def lookup(self, channel_id, message_id) -> Optional[HistoryTurn]:
+        chan = self._channels.get(channel_id)
+        if chan is None:
+            return None
+        return chan.turns.get(message_id) or chan.refs.get(message_id)
+
+    def remember(self, channel_id, message) -> HistoryTurn:
+        """Keep a message fetched by id, so the next lookup is local."""
+        turn = turn_from_message(message)
+        chan = self._channel(channel_id, create=True)
+        self._remember_ref(chan, turn)
+        return turn
+
+
+class MessageFetchCache:
+    """fetch_message behind an LRU + TTL cache, shared by every call site
+    that needs a message by id. Concurrent misses for one id share a single
+    request (a task of its own, so a cancelled caller doesn't take it down
+    for the others), and "not found" is cached too, so a reply to a deleted
+    message doesn't cost a round trip on every run. Listeners `discard()`
+    ids on edit/delete so a cached copy never outlives its message's last
+    change.
+    """
+
+    def __init__(self, size=FETCH_CACHE_SIZE, ttl=FETCH_CACHE_TTL,
+                 clock=time.monotonic, not_found=(LookupError,)):
+        self.size = size
+        self.ttl = ttl
+        self._clock = clock
+        # Exception types cached as a negative entry (the cog passes
+        # discord.NotFound); anything else is transient and re-raised only.
+        self._not_found = not_found
+        self._entries: 'OrderedDict[int, Tuple[float, Any]]' = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def get(self, channel, message_id):
+        entry = self._entries.get(message_id)
+        if entry is not None:
+            expires, value = entry
+            if self._clock() < expires:
+                self._entries.move_to_end(message_id)
+                self.stats["hits"] += 1
+                if isinstance(value, BaseException):
+                    raise value
+                return value
+            del self._entries[message_id]
+        pending = self._inflight.get(message_id)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            pending = asyncio.ensure_future(self._fetch(channel, message_id))
+            # Retrieved even when every waiter was cancelled.
+            pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[message_id] = pending
+        # The request is its own task: cancelling one waiter (the one that
+        # started it included) never cancels it for the others.
+        return await asyncio.shield(pending)
+
+    async def _fetch(self, channel, message_id):
+        try:
+            value = await channel.fetch_message(message_id)
+        except self._not_found as e:
+            self._store(message_id, e)
+            raise
+        else:
+            self._store(message_id, value)
+            return value
+        finally:
+            del self._inflight[message_id]
+
+    def _store(self, message_id, value):
+        self._entries[message_id] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(message_id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def discard(self, message_ids: Iterable[int]) -> None:
+        for mid in message_ids:
+            self._entries.pop(mid, None)
@@ -1,6 +1,14 @@
 import os, json
+import copy
+import itertools
+import queue
 import time
-from threading import Timer, Lock
+from collections import OrderedDict
+from types import MappingProxyType
+from threading import Lock, Thread, Event
+
+from core import config_sqlite
+from core.config_watch import PollingWatcher, make_watcher
 
 # Config files hold plaintext secrets (the Discord token since #83, provider
 # API keys, the MCP bearer token), so the store is owner-only on disk: the
@@ -9,6 +17,22 @@ from threading import Timer, Lock
 DIR_MODE = 0o700
 FILE_MODE = 0o600
 
+# Upper bound on queued write wake-ups. The queue only carries config ids that
+# just became dirty (the dirty set is the source of truth), so overflowing it
+# never loses a write — the next batch sweeps every dirty id regardless.
+WRITE_QUEUE_SIZE = 1024
+
+# global.json is the hand-edited file (token, provider keys, cooldown tuning),
+# so it stays indented. Guild/user files are machine-written and can be large
+# (gpt_memories, auto_responses), so they are written compactly.
+_PRETTY_CONFIG_IDS = frozenset({'global'})
+
+# Default LRU cap on configs held in memory. Configs load on first touch, so
+# a shard serving many idle guilds pays only for the ones that are active.
+# Dirty (unsaved) configs and the global config are never evicted, so the
+# resident count can exceed this while a write is pending.
+DEFAULT_MAX_RESIDENT = 2048
+
 
 def _harden(path, mode):
     """chmod that never breaks a working bot over a permissions nicety.
@@ -23,43 +47,220 @@ def _harden(path, mode):
         pass
 
 
+class ConfigSnapshot:
+    """Immutable, version-stamped view of one config file's top-level keys.
+
+    Grab one per event (`config.snapshot(ctx)`) and read it as often as needed
+    without touching the store's lock. Writes and reloads never mutate a
+    snapshot — they retire it, and the next `snapshot()` call gets a fresh one
+    with a higher `version`. Immutability is top-level only: values are the
+    same objects `get()` returns (see "Lists Are References" in
+    docs/config-system.md), so treat them as read-only.
+    """
+
+    __slots__ = ('config_id', 'version', '_data')
+
+    def __init__(self, config_id, version, data):
+        self.config_id = config_id
+        self.version = version
+        self._data = MappingProxyType(dict(data))
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def keys(self):
+        return self._data.keys()
+
+    def __repr__(self):
+        return f'<ConfigSnapshot {self.config_id} v{self.version} keys={len(self._data)}>'
+
+
+def _resolve_backend(config_dir, backend):
+    """'json' or 'sqlite': explicit argument, then the CONFIG_BACKEND env var,
+    then whichever store is on disk (a migrated install has config.sqlite3)."""
+    backend = backend or os.environ.get('CONFIG_BACKEND', '').strip().lower()
+    if not backend:
+        backend = 'sqlite' if os.path.exists(config_sqlite.db_path(config_dir)) else 'json'
+    if backend not in ('json', 'sqlite'):
+        raise ValueError(f"Unknown config backend: {backend!r} (expected 'json' or 'sqlite')")
+    return backend
+
+
 class Config:
-    def __init__(self, config_dir='configs'):
+    def __init__(self, config_dir='configs', watch_backend='auto', backend=None,
+                 max_resident=DEFAULT_MAX_RESIDENT):
         self.config_dir = config_dir
         os.makedirs(self.config_dir, mode=DIR_MODE, exist_ok=True)
         # makedirs' mode is ignored when the directory already exists (and is
         # masked by umask when it doesn't), so set it explicitly either way.
         _harden(self.config_dir, DIR_MODE)
-        self._configs = {}  # maps config_id (str) to config dict
+        self.backend = _resolve_backend(self.config_dir, backend)
+        # None for the JSON-file backend; the SQLite store otherwise.
+        self._store = (config_sqlite.SqliteConfigStore(config_sqlite.db_path(self.config_dir),
+                                                       file_mode=FILE_MODE)
+                       if self.backend == 'sqlite' else None)
+        self._configs = OrderedDict()  # resident config_id (str) -> config dict, LRU order
+        self._known_ids = set()  # every config_id that exists, resident or not
+        self._load_errors = {}  # config_id -> why it couldn't be read; never written over
+        self._max_resident = max_resident  # None = never evict
+        self._flushing = set()  # ids being written right now (pinned like dirty ones)
         self._dirty_configs = set()  # Track what needs saving
+        self._dirty_keys = {}  # config_id -> changed keys (None = whole config)
         self._file_mtimes = {}  # Track file modification times
-        self._save_timer = None
-        self._reload_timer = None
-        self._save_delay = 5.0  # seconds
-        self._reload_delay = 2.0  # seconds - check for external changes
+        self._snapshots = {}  # config_id -> current ConfigSnapshot (built lazily)
+        self._versions = {}  # config_id -> version stamp of the last change
+        self._version_counter = itertools.count(1)
+        self._save_delay = 5.0  # seconds - write-coalescing window
+        self._reload_delay = 2.0  # seconds - poll interval when inotify is unavailable
         self._lock = Lock()  # Thread safety for timer operations
         self._data_lock = Lock()  # Thread safety for config dict access
         self._writing = False  # Flag to prevent read-during-write
-        self._load_all()
-        self._schedule_reload()  # Start monitoring for external changes
+        self._reload_stats = {
+            'checks': 0,          # watcher wake-ups that reported changes
+            'reloads': 0,         # files actually re-parsed
+            'errors': 0,
+            'last_reload_ms': 0.0,
+            'max_reload_ms': 0.0,
+            'total_reload_ms': 0.0,
+        }
+        self._write_stats = {
+            'batches': 0,
+            'files_written': 0,
+            'bytes_written': 0,
+            'write_errors': 0,
+            'queue_overflows': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+        }
+        self._cache_stats = {'loads': 0, 'evictions': 0, 'load_ms': 0.0}
+        self._load_index()
+        # One long-lived writer instead of a Timer per set(): set() only marks
+        # the config dirty and wakes this thread; serialization and disk I/O
+        # never run on the caller's (event loop) thread.
+        self._write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._writer_stop = Event()
+        self._writer_thread = Thread(target=self._writer_loop, name='config-writer', daemon=True)
+        self._writer_thread.start()
+        if self._store is not None:
+            self._watcher = config_sqlite.SqliteWatcher(self._store, self._reload_delay)
+        else:
+            self._watcher = make_watcher(self.config_dir, self._reload_delay, watch_backend)
+        self._watch_stop = Event()
+        self._watch_thread = Thread(target=self._watch_loop, name='config-watch', daemon=True)
+        self._watch_thread.start()  # Start monitoring for external changes
 
-    def _load_all(self):
-        for fname in os.listdir(self.config_dir):
-            if not fname.endswith('.json'):
-                continue
-            path = os.path.join(self.config_dir, fname)
-            with open(path, 'r') as f:
-                data = json.load(f)
-            
-            config_id = fname[:-5]  # Remove .json extension
-            self._configs[config_id] = data
-            # Track initial modification time
-            self._file_mtimes[config_id] = os.path.getmtime(path)
+    def _load_index(self):
+        """Discover which configs exist without parsing any of them.
+
+        Guild configs load on first touch (_resident); only global is read
+        up front, since nearly every code path consults it.
+        """
+        if self._store is not None:
+            self._known_ids.update(self._store.config_ids())
+        else:
+            with os.scandir(self.config_dir) as it:
+                self._known_ids.update(entry.name[:-5] for entry in it
+                                       if entry.name.endswith('.json'))
         
         # ensure global config exists
-        if 'global' not in self._configs:
-            self._configs['global'] = {}
-            self._immediate_save('global')
+        with self._data_lock:
+            if self._resident('global') is None:
+                self._refuse_unreadable('global')
+                self._configs['global'] = {}
+                self._known_ids.add('global')
+                if self._store is None:
+                    self._immediate_save('global')
+
+    def _read_config(self, config_id):
+        """Parse one config from the backend; None if it doesn't exist."""
+        if self._store is not None:
+            return self._store.load(config_id)
+        path = os.path.join(self.config_dir, f'{config_id}.json')
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        # Track modification time as of this read
+        self._file_mtimes[config_id] = mtime
+        return data
+
+    def _resident(self, config_id):
+        """The in-memory dict for a config, loading it on first touch; None
+        if no such config exists or it can't be read - assumes _data_lock
+        held. An unreadable config stays known (and in _load_errors) so
+        writes refuse it instead of replacing the file with a new dict."""
+        cfg = self._configs.get(config_id)
+        if cfg is not None:
+            self._configs.move_to_end(config_id)
+            return cfg
+        if config_id not in self._known_ids or config_id in self._load_errors:
+            return None
+        started = time.perf_counter()
+        try:
+            cfg = self._read_config(config_id)
+        except (OSError, ValueError) as e:
+            print(f"[Config] Error loading {config_id}: {e}")
+            self._load_errors[config_id] = e
+            cfg = None
+        self._cache_stats['load_ms'] += (time.perf_counter() - started) * 1000
+        if cfg is None:
+            if config_id not in self._load_errors:
+                self._known_ids.discard(config_id)
+            return None
+        self._cache_stats['loads'] += 1
+        self._admit(config_id, cfg)
+        return cfg
+
+    def _refuse_unreadable(self, config_id):
+        """Raise if config_id exists but couldn't be read - assumes
+        _data_lock held. Called before a write would start it from {}."""
+        error = self._load_errors.get(config_id)
+        if error is not None:
+            raise ValueError(f"Config {config_id} could not be loaded ({error}); "
+                             f"not overwriting it") from error
+
+    def _admit(self, config_id, cfg):
+        """Make a config resident and enforce the LRU cap - assumes _data_lock
+        held. A (re)loaded config gets a fresh version stamp so snapshots stay
+        monotonic across eviction."""
+        self._configs[config_id] = cfg
+        self._configs.move_to_end(config_id)
+        self._known_ids.add(config_id)
+        self._retire_snapshot(config_id)
+        if self._max_resident is None:
+            return
+        excess = len(self._configs) - self._max_resident
+        if excess <= 0:
+            return
+        # Oldest first; never drop unsaved data, an in-flight write, global,
+        # or the config being admitted.
+        pinned = self._dirty_configs | self._flushing | {'global', config_id}
+        victims = []
+        for cid in self._configs:
+            if cid not in pinned:
+                victims.append(cid)
+                if len(victims) == excess:
+                    break
+        for victim in victims:
+            del self._configs[victim]
+            self._snapshots.pop(victim, None)
+            self._file_mtimes.pop(victim, None)
+            self._cache_stats['evictions'] += 1
+
+    def cache_stats(self):
+        """Residency counters: configs in memory vs known on disk, lazy
+        loads, LRU evictions and total load time."""
+        with self._data_lock:
+            return dict(self._cache_stats, resident=len(self._configs),
+                        known=len(self._known_ids), max_resident=self._max_resident)
 
     def _resolve_config_id(self, ctx, scope='guild'):
         """Resolve context to config file identifier"""
@@ -82,11 +283,27 @@ class Config:
         else:
             raise ValueError(f"Invalid scope: {scope}")
 
-    def _immediate_save(self, config_id):
-        """Save immediately without buffering"""
+    def _serialize(self, config_id):
+        """JSON text of a config as it stands - assumes _data_lock held, so
+        no set() can change the dict mid-encode."""
+        indent = 4 if config_id in _PRETTY_CONFIG_IDS else None
+        separators = None if indent else (',', ':')
+        return json.dumps(self._configs.get(config_id, {}),
+                          indent=indent, separators=separators)
+
+    def _immediate_save(self, config_id, sync=False, text=None):
+        """Save immediately without buffering. Returns bytes written.
+
+        `text` is the config already serialized under _data_lock (the writer
+        thread passes it); without it the caller must hold _data_lock.
+        `sync` fsyncs the temp file before the rename (the batch writer does;
+        the directory entry is fsynced once per batch by the caller).
+        """
         fname = f'{config_id}.json'
         path = os.path.join(self.config_dir, fname)
         temp_path = path + '.tmp'
+        if text is None:
+            text = self._serialize(config_id)
         
         self._writing = True  # Set flag to prevent reload during write
         try:
@@ -104,7 +321,11 @@ class Config:
                     os.fchmod(f.fileno(), FILE_MODE)
                 except (OSError, AttributeError):
                     pass  # best-effort: Windows has no fchmod
-                json.dump(self._configs.get(config_id, {}), f, indent=4)
+                f.write(text)
+                written = f.tell()
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
 
             # Cross-platform atomic rename
             if os.name == 'nt':  # Windows
@@ -118,6 +339,7 @@ class Config:
 
             # Update modification time after successful write
             self._file_mtimes[config_id] = os.path.getmtime(path)
+            return written
                 
         except Exception as e:
             # Clean up temp file if something goes wrong
@@ -130,40 +352,194 @@ class Config:
         finally:
             self._writing = False  # Clear flag
 
-    def _schedule_save(self):
-        """Schedule a delayed save to batch writes"""
-        with self._lock:
-            if self._save_timer:
-                self._save_timer.cancel()
-            self._save_timer = Timer(self._save_delay, self._timer_flush)
-            self._save_timer.daemon = True  # Allow program to exit
-            self._save_timer.start()
-
-    def _timer_flush(self):
-        """Timer callback that acquires lock before flushing"""
-        with self._lock:
-            self._flush_all()
+    def _mark_dirty(self, config_id, key=None):
+        """Record a pending write and wake the writer - assumes _data_lock held.
+
+        Only the transition clean -> dirty enqueues, so a hot guild calling
+        set() a thousand times in one window costs one queue entry and one
+        file write. `key` narrows the write to that key for the SQLite
+        backend (None = the whole config); the JSON backend ignores it.
+        """
+        if config_id in self._dirty_keys:
+            keys = self._dirty_keys[config_id]
+            if keys is not None:
+                if key is None:
+                    self._dirty_keys[config_id] = None
+                else:
+                    keys.add(key)
+        else:
+            self._dirty_keys[config_id] = None if key is None else {key}
+        if config_id in self._dirty_configs:
+            return
+        self._dirty_configs.add(config_id)
+        try:
+            self._write_queue.put_nowait(config_id)
+        except queue.Full:
+            self._write_stats['queue_overflows'] += 1
+
+    def _retire_snapshot(self, config_id):
+        """Bump the config's version and drop its snapshot - assumes
+        _data_lock held. Readers holding the old snapshot keep a consistent
+        (now stale) view; the next snapshot() builds the new one."""
+        self._versions[config_id] = next(self._version_counter)
+        self._snapshots.pop(config_id, None)
+
+    def _writer_loop(self):
+        """Writer thread: wait for a dirty config, let the coalescing window
+        collect more, then write the whole dirty set as one batch."""
+        while not self._writer_stop.is_set():
+            config_id = self._write_queue.get()
+            if config_id is None:
+                return  # shutdown sentinel
+            # Coalesce: every set() in the next _save_delay seconds rides
+            # along. shutdown() cuts the window short and flushes itself.
+            if self._writer_stop.wait(self._save_delay):
+                return
+            try:
+                with self._lock:
+                    self._flush_all()
+            except Exception as e:
+                # This is the only writer: it must outlive any one bad batch
+                # (whose configs _flush_all has already put back).
+                self._write_stats['write_errors'] += 1
+                print(f"[Config] Writer error, will retry: {e}")
+
+    def _fsync_dir(self):
+        """Persist the renames of a batch with one directory fsync (POSIX)."""
+        if os.name == 'nt':
+            return
+        try:
+            fd = os.open(self.config_dir, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
 
     def _flush_all(self):
         """Write all dirty configs to disk - assumes lock is already held"""
-        for config_id in list(self._dirty_configs):  # Copy to avoid modification during iteration
-            self._immediate_save(config_id)
-        self._dirty_configs.clear()
-        self._save_timer = None
+        # Wake-ups for this batch are about to go stale; drop them so the
+        # writer does not wait out another coalescing window for nothing.
+        # Drained BEFORE the swap: an id dirtied after the swap must keep its
+        # wake-up.
+        while True:
+            try:
+                if self._write_queue.get_nowait() is None:
+                    self._write_queue.put_nowait(None)  # keep the sentinel
+                    break
+            except queue.Empty:
+                break
+        with self._data_lock:
+            batch, self._dirty_configs = self._dirty_configs, set()
+            batch_keys, self._dirty_keys = self._dirty_keys, {}
+            self._flushing = batch  # keeps the batch resident until written
+        if not batch:
+            return
+        try:
+            self._write_batch(batch, batch_keys)
+        except Exception:
+            self._requeue(batch, batch_keys)
+            raise
+        finally:
+            with self._data_lock:
+                self._flushing = set()
+
+    def _requeue(self, config_ids, batch_keys):
+        """Mark configs from a failed write dirty again, with the keys they
+        had, so the next batch retries them."""
+        with self._data_lock:
+            for config_id in config_ids:
+                keys = batch_keys.get(config_id)
+                if keys is None:
+                    self._mark_dirty(config_id)
+                else:
+                    for key in keys:
+                        self._mark_dirty(config_id, key)
+
+    def _write_batch(self, batch, batch_keys):
+        started = time.perf_counter()
+        stats = self._write_stats
+        if self._store is not None:
+            self._flush_to_store(batch, batch_keys)
+            self._record_flush(started)
+            return
+        # Serialize under the lock: the event loop keeps mutating these dicts
+        # while the files are written.
+        texts, failed = {}, set()
+        with self._data_lock:
+            for config_id in batch:
+                try:
+                    texts[config_id] = self._serialize(config_id)
+                except Exception as e:
+                    failed.add(config_id)
+                    print(f"[Config] Error serializing {config_id}: {e}")
+        for config_id, text in texts.items():
+            try:
+                stats['bytes_written'] += self._immediate_save(config_id, sync=True, text=text)
+                stats['files_written'] += 1
+            except Exception as e:
+                failed.add(config_id)
+                print(f"[Config] Error writing {config_id}.json: {e}")
+        if failed:
+            # Keep them dirty for the next batch rather than losing them.
+            stats['write_errors'] += len(failed)
+            self._requeue(failed, batch_keys)
+        self._fsync_dir()
+        self._record_flush(started)
+
+    def _flush_to_store(self, batch, batch_keys):
+        """SQLite backend: write only the changed keys, one transaction."""
+        stats = self._write_stats
+        try:
+            # Copy what the batch writes under the lock; the store serializes
+            # it on this thread while the event loop keeps calling set().
+            with self._data_lock:
+                changes = [(config_id, self._batch_copy(config_id, batch_keys.get(config_id)),
+                            batch_keys.get(config_id))
+                           for config_id in batch]
+            stats['bytes_written'] += self._store.write_batch(changes)
+            stats['files_written'] += len(changes)
+        except Exception as e:
+            stats['write_errors'] += 1
+            print(f"[Config] Error writing batch to {self._store.path}: {e}")
+            self._requeue(batch, batch_keys)
+
+    def _batch_copy(self, config_id, keys):
+        """Deep copy of the keys a store write needs (all of them when `keys`
+        is None) - assumes _data_lock held."""
+        cfg = self._configs.get(config_id, {})
+        wanted = cfg.keys() if keys is None else (k for k in keys if k in cfg)
+        return {key: copy.deepcopy(cfg[key]) for key in wanted}
+
+    def _record_flush(self, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = self._write_stats
+        stats['batches'] += 1
+        stats['last_flush_ms'] = elapsed_ms
+        stats['max_flush_ms'] = max(stats['max_flush_ms'], elapsed_ms)
 
     def flush(self):
         """Manually flush all pending writes"""
         with self._lock:
-            if self._save_timer:
-                self._save_timer.cancel()
-                self._save_timer = None
             self._flush_all()
 
+    def write_stats(self):
+        """Counters for the background writer: pending configs (queue depth),
+        batches, files and bytes written, and flush duration."""
+        stats = dict(self._write_stats)
+        stats['queue_depth'] = len(self._dirty_configs)
+        return stats
+
     def guild_ids(self):
-        """All guild ids with a loaded config (guild configs are the
-        digit-named files). The public enumeration API — callers must use
-        this rather than reaching into the private storage dicts."""
-        return [int(cid) for cid in self._configs if cid.isdigit()]
+        """All guild ids with a config (guild configs are the digit-named
+        files), resident or not - enumerating never loads anything. The
+        public enumeration API — callers must use this rather than reaching
+        into the private storage dicts."""
+        with self._data_lock:
+            return [int(cid) for cid in self._known_ids if cid.isdigit()]
 
     def global_keys(self):
         """All keys currently present in the global config — the public
@@ -171,39 +547,66 @@ class Config:
         private storage dicts)."""
         config_id = self._resolve_config_id(None, 'global')
         with self._data_lock:
-            return list(self._configs.get(config_id, {}).keys())
+            return list((self._resident(config_id) or {}).keys())
 
     def get(self, ctx, key, default=None, scope='guild'):
         """Get a config value from guild, user, or global scope. Read-only - does not persist defaults."""
         config_id = self._resolve_config_id(ctx, scope)
         with self._data_lock:
-            cfg = self._configs.get(config_id, {})
+            cfg = self._resident(config_id) or {}
             return cfg.get(key, default)
 
+    def snapshot(self, ctx, scope='guild'):
+        """Immutable snapshot of a guild, user, or global config.
+
+        The lock-free read path for hot listeners: fetch once per event, then
+        `.get()` on the snapshot as often as needed. Only the first read after
+        a change takes the lock (to build the new snapshot); every later read
+        until the next change is a plain dict lookup.
+        """
+        config_id = self._resolve_config_id(ctx, scope)
+        snap = self._snapshots.get(config_id)
+        if snap is not None:
+            return snap
+        with self._data_lock:
+            snap = self._snapshots.get(config_id)
+            if snap is None:
+                cfg = self._resident(config_id) or {}
+                snap = ConfigSnapshot(config_id, self._versions.get(config_id, 0), cfg)
+                self._snapshots[config_id] = snap
+            return snap
+
     def set(self, ctx, key, value, scope='guild'):
         """Set a config value in guild, user, or global scope"""
         config_id = self._resolve_config_id(ctx, scope)
         with self._data_lock:
-            cfg = self._configs.setdefault(config_id, {})
+            cfg = self._resident(config_id)
+            if cfg is None:
+                self._refuse_unreadable(config_id)
+                cfg = {}
+                self._admit(config_id, cfg)
             cfg[key] = value
-        self._dirty_configs.add(config_id)
-        self._schedule_save()
+            self._retire_snapshot(config_id)
+            self._mark_dirty(config_id, key)
 
     def rem(self, ctx, key, scope='guild'):
         """Remove a config key from guild, user, or global scope"""
         config_id = self._resolve_config_id(ctx, scope)
         with self._data_lock:
-            if config_id in self._configs and key in self._configs[config_id]:
-                del self._configs[config_id][key]
-                self._dirty_configs.add(config_id)
-                self._schedule_save()
+            cfg = self._resident(config_id)
+            if cfg is not None and key in cfg:
+                del cfg[key]
+                self._retire_snapshot(config_id)
+                self._mark_dirty(config_id, key)
                 return True
         return False
 
     def has(self, ctx, key, scope='guild'):
         """Check if a config key exists in guild, user, or global scope"""
         config_id = self._resolve_config_id(ctx, scope)
-        return config_id in self._configs and key in self._configs[config_id]
+        with self._data_lock:
+            cfg = self._resident(config_id)
+            return cfg is not None and key in cfg
 
     # Convenience methods for user configs
     def get_user(self, ctx, key, default=None):
@@ -239,21 +642,67 @@ class Config:
         """Check if a global config key exists"""
         return self.has(None, key, scope='global')
 
-    def _schedule_reload(self):
-        """Schedule periodic check for external file changes"""
-        with self._lock:
-            if self._reload_timer:
-                self._reload_timer.cancel()
-            self._reload_timer = Timer(self._reload_delay, self._timer_reload)
-            self._reload_timer.daemon = True
-            self._reload_timer.start()
-    
-    def _timer_reload(self):
-        """Timer callback to check for external changes"""
-        with self._lock:
-            self._check_external_changes()
-        self._schedule_reload()  # Reschedule next check outside lock
-    
+    def _watch_loop(self):
+        """Watcher thread: block until files change, reload only those.
+
+        Replaces the old 2-second Timer chain that stat'ed every file in the
+        directory on every tick. With inotify an idle store does no work at
+        all; the polling fallback still scans, but parses only what changed.
+        """
+        while not self._watch_stop.is_set():
+            try:
+                changed = self._watcher.wait(self._reload_delay)
+            except Exception as e:
+                if self._watch_stop.is_set():
+                    return  # watcher closed under us by shutdown()
+                # Dying here would silently stop external edits reloading.
+                self._reload_stats['errors'] += 1
+                print(f"[Config] {self._watcher.backend} watcher failed: {e}")
+                if self._fall_back_to_polling():
+                    changed = None  # events may have been lost: one full pass
+                elif self._watch_stop.wait(self._reload_delay):
+                    return
+                else:
+                    continue
+            if getattr(self._watcher, 'overflowed', False):
+                # The kernel dropped events; one full pass restores correctness.
+                self._watcher.overflowed = False
+                changed = None
+            elif not changed:
+                continue
+            with self._lock:
+                if self._store is not None:
+                    self._check_store_changes(changed)
+                else:
+                    self._check_external_changes(changed)
+
+    def _fall_back_to_polling(self):
+        """Swap a failed inotify watcher for the scandir poller. False when
+        there is nothing to fall back to (already polling, or the SQLite
+        store's watcher, which just retries next interval)."""
+        if self._store is not None or self._watcher.backend == 'poll':
+            return False
+        try:
+            self._watcher.close()
+        except OSError:
+            pass
+        self._watcher = PollingWatcher(self.config_dir, self._reload_delay)
+        print("[Config] Falling back to polling configs/ for external edits")
+        return True
+
+    def reload_stats(self):
+        """Counters for the external-change watcher.
+
+        `files_checked` and `reloads` should track the number of changed
+        files, not the size of configs/ — that is the point of the watcher.
+        """
+        stats = dict(self._reload_stats)
+        stats['backend'] = self._watcher.backend
+        stats['files_checked'] = self._watcher.files_checked
+        stats['avg_reload_ms'] = (stats['total_reload_ms'] / stats['reloads']
+                                  if stats['reloads'] else 0.0)
+        return stats
+
     def _merge_configs(self, config_id, external_data):
         """Merge external changes with current config, handling conflicts"""
         current_data = self._configs.get(config_id, {})
@@ -278,19 +727,34 @@ class Config:
         
         # Merge: external data takes precedence
         with self._data_lock:
-            self._configs[config_id] = external_data.copy()
+            self._admit(config_id, external_data.copy())
+
+    def _defer_if_not_resident(self, config_id):
+        """A change to a config that isn't in memory needs no parse now: the
+        next touch loads the new contents. Returns True when deferred."""
+        with self._data_lock:
+            if config_id in self._configs:
+                return False
+            self._known_ids.add(config_id)
+            if self._load_errors.pop(config_id, None) is not None:
+                self._retire_snapshot(config_id)  # repaired: read it again
+            return True
     
-    def _check_external_changes(self):
-        """Check for external file modifications and reload if needed"""
+    def _check_external_changes(self, fnames=None):
+        """Reload the given files (all of configs/ when None) if they changed
+        externally since we last read or wrote them."""
         if self._writing:
             return  # Skip if we're currently writing
-        
-        for fname in os.listdir(self.config_dir):
-            if not fname.endswith('.json'):
-                continue
-            
+
+        if fnames is None:
+            fnames = [f for f in os.listdir(self.config_dir) if f.endswith('.json')]
+        self._reload_stats['checks'] += 1
+
+        for fname in fnames:
             config_id = fname[:-5]
             path = os.path.join(self.config_dir, fname)
+            if self._defer_if_not_resident(config_id):
+                continue
             
             try:
                 current_mtime = os.path.getmtime(path)
@@ -300,6 +764,7 @@ class Config:
                 is_modified = not is_new and current_mtime > self._file_mtimes[config_id]
                 
                 if is_new or is_modified:
+                    started = time.perf_counter()
                     # Load the external changes
                     with open(path, 'r') as f:
                         external_data = json.load(f)
@@ -311,22 +776,65 @@ class Config:
                     self._file_mtimes[config_id] = current_mtime
                     
                     # If this config was dirty, it's not anymore (external changes win)
-                    if config_id in self._dirty_configs:
-                        self._dirty_configs.remove(config_id)
+                    with self._data_lock:
+                        self._dirty_configs.discard(config_id)
+                        self._dirty_keys.pop(config_id, None)
                     
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    stats = self._reload_stats
+                    stats['reloads'] += 1
+                    stats['last_reload_ms'] = elapsed_ms
+                    stats['total_reload_ms'] += elapsed_ms
+                    stats['max_reload_ms'] = max(stats['max_reload_ms'], elapsed_ms)
+
                     action = "Loaded new" if is_new else "Reloaded"
                     print(f"[Config] {action} {config_id}.json due to external changes")
                     
             except (OSError, json.JSONDecodeError) as e:
+                self._reload_stats['errors'] += 1
                 print(f"[Config] Error reloading {config_id}.json: {e}")
     
+    def _check_store_changes(self, config_ids):
+        """SQLite backend twin of _check_external_changes: reload the configs
+        another connection changed (the sqlite3 shell, a migration, a tool)."""
+        self._reload_stats['checks'] += 1
+        for config_id in config_ids:
+            if self._defer_if_not_resident(config_id):
+                continue
+            started = time.perf_counter()
+            try:
+                external_data = self._store.load(config_id) or {}
+            except Exception as e:
+                self._reload_stats['errors'] += 1
+                print(f"[Config] Error reloading {config_id} from {self._store.path}: {e}")
+                continue
+            is_new = config_id not in self._configs
+            self._merge_configs(config_id, external_data)
+            with self._data_lock:
+                self._dirty_configs.discard(config_id)
+                self._dirty_keys.pop(config_id, None)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stats = self._reload_stats
+            stats['reloads'] += 1
+            stats['last_reload_ms'] = elapsed_ms
+            stats['total_reload_ms'] += elapsed_ms
+            stats['max_reload_ms'] = max(stats['max_reload_ms'], elapsed_ms)
+            action = "Loaded new" if is_new else "Reloaded"
+            print(f"[Config] {action} {config_id} due to external changes")
+
     def shutdown(self):
-        """Clean shutdown - flush all pending writes and cancel timers"""
+        """Clean shutdown - stop the writer and watcher, flush pending writes"""
+        self._writer_stop.set()
+        try:
+            self._write_queue.put_nowait(None)
+        except queue.Full:
+            pass  # the writer is awake anyway and sees _writer_stop
+        self._writer_thread.join(timeout=self._save_delay + 1)
         with self._lock:
-            if self._save_timer:
-                self._save_timer.cancel()
-                self._save_timer = None
-            if self._reload_timer:
-                self._reload_timer.cancel()
-                self._reload_timer = None
             self._flush_all()
+        self._watch_stop.set()
+        self._watcher.wake()
+        self._watch_thread.join(timeout=self._reload_delay + 1)
+        self._watcher.close()
+        if self._store is not None:
+            self._store.close()
@@ -0,0 +1,432 @@
+"""SQLite (WAL) storage backend for core.config.Config.
+
+The JSON backend rewrites a whole guild file whenever any key in it changes,
+and parses every file at startup. This backend stores one row per
+(config_id, key) with the value as JSON text, so a write touches only the
+keys that changed and a config is one indexed SELECT away:
+
+    config_values(config_id, key, value, items) -- the data
+    config_items(config_id, key, pos, value)    -- elements of list values
+    config_changes(seq, config_id)              -- append-only change log
+
+List values (`gpt_memories`, `auto_responses`, `emoji_role_toggles`, the
+global `reminders`, ...) get one config_items row per element, ordered by
+`pos`; their config_values row only marks the key (`items` = 1). A write
+diffs the new list against the element digests cached from the last load
+or write: the common prefix and suffix stay put, and only the elements in
+between are deleted and inserted. Positions are spaced ITEM_GAP apart, so
+an append, a removal or an in-place edit anywhere in the list costs the
+rows it changes. Only an insert into a full gap renumbers the whole list.
+The list is still JSON-encoded per element to compute the diff; that is
+CPU work, not disk writes. A key without cached digests gets a full rewrite:
+a pre-items blob row, the first write after an external edit, or a config
+written wholesale.
+
+`Config` keeps its in-memory dicts, write coalescing and snapshots either
+way; only load / write / external-change detection go through the store.
+
+External edits keep working. Triggers on config_values log every insert,
+update and delete into config_changes — including ones made from the
+`sqlite3` shell or another process — and the watcher polls
+`PRAGMA data_version`, which only moves when ANOTHER connection commits.
+An idle store therefore costs one pragma per poll, and a change reloads
+only the configs named in the log.
+
+Selected with `Config(backend='sqlite')`, the `CONFIG_BACKEND` env var, or
+automatically when configs/config.sqlite3 exists. Migrate an existing
+install (bot stopped) with:
+
+    python -m core.config_sqlite migrate [--config-dir configs]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+DB_FILENAME = 'config.sqlite3'
+# Where `migrate` moves the imported *.json files, so a hand edit to one of
+# them can't be mistaken for a live edit once the bot reads SQLite.
+MIGRATED_DIRNAME = 'migrated-json'
+# Spacing between list-element positions (see module docstring).
+ITEM_GAP = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS config_values (
+    config_id TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    value     TEXT NOT NULL,
+    PRIMARY KEY (config_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS config_changes (
+    seq       INTEGER PRIMARY KEY AUTOINCREMENT,
+    config_id TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS config_values_ins AFTER INSERT ON config_values
+BEGIN INSERT INTO config_changes (config_id) VALUES (NEW.config_id); END;
+CREATE TRIGGER IF NOT EXISTS config_values_upd AFTER UPDATE ON config_values
+BEGIN INSERT INTO config_changes (config_id) VALUES (NEW.config_id); END;
+CREATE TRIGGER IF NOT EXISTS config_values_del AFTER DELETE ON config_values
+BEGIN INSERT INTO config_changes (config_id) VALUES (OLD.config_id); END;
+CREATE TABLE IF NOT EXISTS config_items (
+    config_id TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    pos       INTEGER NOT NULL,
+    value     TEXT NOT NULL,
+    PRIMARY KEY (config_id, key, pos)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS config_items_ins AFTER INSERT ON config_items
+BEGIN INSERT INTO config_changes (config_id) VALUES (NEW.config_id); END;
+CREATE TRIGGER IF NOT EXISTS config_items_upd AFTER UPDATE ON config_items
+BEGIN INSERT INTO config_changes (config_id) VALUES (NEW.config_id); END;
+CREATE TRIGGER IF NOT EXISTS config_items_del AFTER DELETE ON config_items
+BEGIN INSERT INTO config_changes (config_id) VALUES (OLD.config_id); END;
+"""
+
+
+def _encode(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+def _positions_between(lower, upper, count):
+    """`count` ascending positions strictly between `lower` and `upper`
+    (None = unbounded), or None if the gap is too small."""
+    if count == 0:
+        return []
+    if lower is None and upper is None:
+        return [ITEM_GAP * (i + 1) for i in range(count)]
+    if lower is None:
+        return [upper - ITEM_GAP * (count - i) for i in range(count)]
+    if upper is None:
+        return [lower + ITEM_GAP * (i + 1) for i in range(count)]
+    step = (upper - lower) // (count + 1)
+    if step < 1:
+        return None
+    return [lower + step * (i + 1) for i in range(count)]
+
+
+def _diff_items(old, texts):
+    """Row changes turning the cached list `old` [(pos, digest)] into the
+    encoded elements `texts`: (positions to delete, [(pos, text)] to write,
+    new cache), or None when the positions need renumbering."""
+    digests = [_digest(text) for text in texts]
+    shortest = min(len(old), len(texts))
+    prefix = 0
+    while prefix < shortest and old[prefix][1] == digests[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < shortest - prefix
+           and old[len(old) - 1 - suffix][1] == digests[len(texts) - 1 - suffix]):
+        suffix += 1
+    removed = old[prefix:len(old) - suffix]
+    middle = range(prefix, len(texts) - suffix)
+    if len(removed) == len(middle):
+        positions = [pos for pos, _digest_ in removed]  # overwrite in place
+        deletes = []
+    else:
+        positions = _positions_between(old[prefix - 1][0] if prefix else None,
+                                       old[len(old) - suffix][0] if suffix else None,
+                                       len(middle))
+        if positions is None:
+            return None
+        deletes = [pos for pos, _digest_ in removed]
+    writes = [(pos, texts[i]) for pos, i in zip(positions, middle)]
+    cache = (old[:prefix] + [(pos, digests[i]) for pos, i in zip(positions, middle)]
+             + old[len(old) - suffix:])
+    return deletes, writes, cache
+
+
+def db_path(config_dir):
+    return os.path.join(config_dir, DB_FILENAME)
+
+
+class SqliteConfigStore:
+    """One connection, serialized by an internal lock (the writer thread and
+    the watcher thread both use it)."""
+
+    backend = 'sqlite'
+
+    def __init__(self, path, file_mode=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # WAL + NORMAL: a commit survives a process crash; only an OS crash
+        # can lose the last transactions, never corrupt the file.
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(config_values)')}
+        if 'items' not in columns:  # a store created before list values had rows
+            self._conn.execute(
+                'ALTER TABLE config_values ADD COLUMN items INTEGER NOT NULL DEFAULT 0')
+        if file_mode is not None:
+            # Same secrets as the JSON files; -wal/-shm carry page copies.
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.chmod(path + suffix, file_mode)
+                except OSError:
+                    pass
+        self._data_version = self._pragma_data_version()
+        self._seen_seq = self._max_seq()
+        self._own_ranges = []  # (after_seq, through_seq] written by us, unread
+        self.files_checked = 0  # watcher-stat parity: configs re-read
+        # (config_id, key) -> [(pos, digest)] of each stored list element.
+        self._items = {}
+
+    def _pragma_data_version(self):
+        return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _max_seq(self):
+        # AUTOINCREMENT's high-water mark, not MAX(seq): pruning the log
+        # must not make the next write look like it has unread changes.
+        row = self._conn.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'config_changes'").fetchone()
+        return row[0] if row else 0
+
+    def load(self, config_id):
+        """One config's keys, or None if it has no rows."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, value, items FROM config_values WHERE config_id = ?',
+                (config_id,)).fetchall()
+            if not rows:
+                return None
+            items = self._conn.execute(
+                'SELECT key, pos, value FROM config_items WHERE config_id = ? '
+                'ORDER BY key, pos', (config_id,)).fetchall()
+            data = {}
+            for key, value, is_list in rows:
+                if is_list:
+                    data[key] = []
+                    self._items[(config_id, key)] = []
+                else:
+                    data[key] = json.loads(value)
+                    self._items.pop((config_id, key), None)
+            for key, pos, value in items:
+                if key in data and (config_id, key) in self._items:
+                    data[key].append(json.loads(value))
+                    self._items[(config_id, key)].append((pos, _digest(value)))
+        return data
+
+    def config_ids(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                'SELECT DISTINCT config_id FROM config_values')]
+
+    def write_batch(self, changes):
+        """Apply one coalesced batch in a single transaction.
+
+        `changes` is [(config_id, data, keys)]: `keys` is the set of keys that
+        changed (upserted if present in `data`, deleted if not), or None to
+        replace the config wholesale. Returns bytes of JSON written.
+        """
+        written = 0
+        rows = []
+        deletes = []
+        replaces = []
+        lists = []  # (config_id, key, encoded elements)
+        for config_id, data, keys in changes:
+            if keys is None:
+                replaces.append((config_id,))
+                keys = data.keys()
+            for key in keys:
+                if key not in data:
+                    deletes.append((config_id, key))
+                elif isinstance(data[key], list):
+                    rows.append((config_id, key, '[]', 1))
+                    lists.append((config_id, key, [_encode(item) for item in data[key]]))
+                else:
+                    value = _encode(data[key])
+                    written += len(value)
+                    rows.append((config_id, key, value, 0))
+        replaced = {config_id for (config_id,) in replaces}
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # BEGIN IMMEDIATE holds the write lock, so every change-log
+                # row between these two reads is ours, not external.
+                start_seq = self._max_seq()
+                caught_up = start_seq == self._seen_seq
+                conn.executemany('DELETE FROM config_values WHERE config_id = ?', replaces)
+                conn.executemany('DELETE FROM config_items WHERE config_id = ?', replaces)
+                conn.executemany(
+                    'INSERT INTO config_values (config_id, key, value, items) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (config_id, key) DO UPDATE SET value = excluded.value, '
+                    'items = excluded.items',
+                    rows)
+                conn.executemany(
+                    'DELETE FROM config_values WHERE config_id = ? AND key = ?', deletes)
+                # Keys that are gone, or no longer lists, drop their elements.
+                conn.executemany(
+                    'DELETE FROM config_items WHERE config_id = ? AND key = ?',
+                    deletes + [(config_id, key) for config_id, key, _value, is_list in rows
+                               if not is_list])
+                caches = {}
+                for config_id, key, texts in lists:
+                    # An unread external change may have touched these rows:
+                    # don't trust the cached digests then.
+                    old = self._items.get((config_id, key)) if caught_up and config_id not in replaced else None
+                    written += self._write_items(config_id, key, old, texts, caches)
+                end_seq = self._max_seq()
+                if caught_up:
+                    # Nothing external pending: drop our own rows outright.
+                    conn.execute('DELETE FROM config_changes WHERE seq <= ?', (end_seq,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            for config_id in replaced:
+                for cached in [k for k in self._items if k[0] == config_id]:
+                    del self._items[cached]
+            for config_id, key in deletes:
+                self._items.pop((config_id, key), None)
+            for config_id, key, _value, is_list in rows:
+                if not is_list:
+                    self._items.pop((config_id, key), None)
+            self._items.update(caches)
+            if caught_up:
+                self._seen_seq = end_seq
+            elif end_seq > start_seq:
+                # An external change is still unread below us; remember which
+                # rows are ours so the watcher doesn't reload them.
+                self._own_ranges.append((start_seq, end_seq))
+        return written
+
+    def _write_items(self, config_id, key, old, texts, caches):
+        """Store one list's elements (inside write_batch's transaction),
+        diffing against `old` when there is one. Returns bytes written and
+        records the new digests in `caches`."""
+        diff = _diff_items(old, texts) if old is not None else None
+        if diff is None:  # no trustworthy cache, or a full gap: rewrite
+            self._conn.execute('DELETE FROM config_items WHERE config_id = ? AND key = ?',
+                               (config_id, key))
+            diff = _diff_items([], texts)
+        deletes, writes, cache = diff
+        self._conn.executemany(
+            'DELETE FROM config_items WHERE config_id = ? AND key = ? AND pos = ?',
+            [(config_id, key, pos) for pos in deletes])
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO config_items (config_id, key, pos, value) VALUES (?, ?, ?, ?)',
+            [(config_id, key, pos, text) for pos, text in writes])
+        caches[(config_id, key)] = cache
+        return sum(len(text) for _pos, text in writes)
+
+    def external_changes(self):
+        """Config ids changed by other connections since the last call.
+
+        O(1) when nothing changed (one pragma); otherwise reads just the new
+        change-log rows and prunes them.
+        """
+        with self._lock:
+            version = self._pragma_data_version()
+            if version == self._data_version:
+                return set()
+            self._data_version = version
+            rows = self._conn.execute(
+                'SELECT seq, config_id FROM config_changes WHERE seq > ?',
+                (self._seen_seq,)).fetchall()
+            if rows:
+                self._seen_seq = rows[-1][0]
+                self._conn.execute('DELETE FROM config_changes WHERE seq <= ?',
+                                   (self._seen_seq,))
+            own, self._own_ranges = self._own_ranges, []
+        changed = {config_id for seq, config_id in rows
+                   if not any(lo < seq <= hi for lo, hi in own)}
+        self.files_checked += len(changed)
+        return changed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SqliteWatcher:
+    """Watcher-shaped adapter (see core.config_watch) over the store's change
+    log: `wait()` sleeps one poll interval, then returns the changed config
+    ids — ids, not filenames; Config routes them to _check_store_changes."""
+
+    backend = 'sqlite'
+
+    def __init__(self, store, interval=2.0):
+        self._store = store
+        self.interval = interval
+        self._woken = threading.Event()
+
+    @property
+    def files_checked(self):
+        return self._store.files_checked
+
+    def wait(self, timeout):
+        if self._woken.wait(timeout):
+            return set()
+        return self._store.external_changes()
+
+    def wake(self):
+        self._woken.set()
+
+    def close(self):
+        self.wake()
+
+
+def migrate_json_dir(config_dir, move_json=True):
+    """Import every configs/*.json into configs/config.sqlite3.
+
+    Each file replaces that config's rows wholesale, so re-running after a
+    partial failure is safe. With `move_json` the imported files are moved to
+    configs/migrated-json/ (kept as a backup, out of the live directory).
+    Returns {"configs": n, "keys": n, "path": db path}.
+    """
+    from core.config import FILE_MODE  # late: core.config imports this module
+
+    imported = []
+    keys = 0
+    store = SqliteConfigStore(db_path(config_dir), file_mode=FILE_MODE)
+    try:
+        batch = []
+        for fname in sorted(os.listdir(config_dir)):
+            if not fname.endswith('.json'):
+                continue
+            with open(os.path.join(config_dir, fname), 'r') as f:
+                data = json.load(f)
+            batch.append((fname[:-5], data, None))
+            imported.append(fname)
+            keys += len(data)
+        store.write_batch(batch)
+    finally:
+        store.close()
+    if move_json and imported:
+        backup_dir = os.path.join(config_dir, MIGRATED_DIRNAME)
+        os.makedirs(backup_dir, exist_ok=True)
+        for fname in imported:
+            os.replace(os.path.join(config_dir, fname), os.path.join(backup_dir, fname))
+    return {"configs": len(imported), "keys": keys, "path": db_path(config_dir)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m core.config_sqlite',
+        description='SQLite config backend tools. Stop the bot first.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    migrate = sub.add_parser('migrate', help='import configs/*.json into config.sqlite3')
+    migrate.add_argument('--config-dir', default='configs')
+    migrate.add_argument('--keep-json', action='store_true',
+                         help='leave the imported .json files in place')
+    args = parser.parse_args(argv)
+
+    result = migrate_json_dir(args.config_dir, move_json=not args.keep_json)
+    print(f"Imported {result['configs']} config(s), {result['keys']} key(s) "
+          f"into {result['path']}.")
+    if not args.keep_json and result['configs']:
+        print(f"Originals moved to {os.path.join(args.config_dir, MIGRATED_DIRNAME)}/.")
+
+
+if __name__ == '__main__':
+    main()
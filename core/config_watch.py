@@ -0,0 +1,172 @@
+"""Change detection for the configs/ directory.
+
+`Config` used to stat every file in configs/ every 2 seconds, forever. That is
+O(guild count) syscalls per tick whether or not anything changed. The watchers
+here report WHICH files changed, so the reload path re-parses only those:
+
+    InotifyWatcher  - Linux inotify through ctypes (no third-party dependency).
+                      Blocks until the kernel reports a close-after-write or a
+                      rename into the directory; an idle store costs nothing.
+    PollingWatcher  - everywhere else. One os.scandir batch per interval,
+                      diffed against the previous pass's mtimes.
+
+Both expose the same calls: `wait(timeout)` returns the set of changed
+`*.json` filenames (empty on timeout or wake), `wake()` interrupts a blocked
+`wait` from another thread (shutdown), and `close()`. Neither knows anything
+about Config — the bot's own writes show up too, and the caller filters them
+against its recorded mtimes exactly as before.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+# inotify(7) constants — stable kernel ABI.
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _is_config_file(name):
+    return name.endswith('.json')
+
+
+class PollingWatcher:
+    """Portable fallback: one os.scandir pass per interval.
+
+    DirEntry carries the name without a per-file listdir+join, and the mtime
+    comparison happens in one batch. Still O(files) per pass — that is the
+    cost inotify exists to remove — but nothing is parsed unless it changed.
+    """
+
+    backend = 'poll'
+
+    def __init__(self, directory, interval=2.0):
+        self.directory = directory
+        self.interval = interval
+        self._mtimes = self._scan()
+        self.files_checked = 0
+        self._woken = threading.Event()
+
+    def _scan(self):
+        mtimes = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not _is_config_file(entry.name):
+                    continue
+                try:
+                    mtimes[entry.name] = entry.stat().st_mtime
+                except OSError:
+                    continue  # removed between readdir and stat
+        return mtimes
+
+    def wait(self, timeout):
+        """Sleep `timeout` (the poll interval), then diff one scan."""
+        # Event.wait rather than select(): select() only takes sockets on
+        # Windows, which is exactly where this fallback runs.
+        if self._woken.wait(timeout):
+            return set()
+        current = self._scan()
+        self.files_checked += len(current)
+        changed = {name for name, mtime in current.items()
+                   if self._mtimes.get(name) != mtime}
+        self._mtimes = current
+        return changed
+
+    def wake(self):
+        self._woken.set()
+
+    def close(self):
+        self.wake()
+
+
+class InotifyWatcher:
+    """Kernel-notified watcher for one directory (Linux only).
+
+    Raises OSError from __init__ when inotify is unavailable (not Linux, no
+    libc symbol, watch limit exhausted); callers fall back to polling.
+    """
+
+    backend = 'inotify'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files_checked = 0
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError('libc not found')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify unavailable')
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # CLOSE_WRITE, not MODIFY/CREATE: an editor's truncate-then-write
+        # would otherwise be reported (and parsed) half-written.
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO
+        wd = libc.inotify_add_watch(fd, os.fsencode(directory), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, 'inotify_add_watch failed')
+        self._fd = fd
+        self._wake_r, self._wake_w = os.pipe()
+        # Set when the kernel queue overflowed: events were dropped, so the
+        # caller must fall back to one full scan to stay correct.
+        self.overflowed = False
+
+    def wait(self, timeout):
+        """Block up to `timeout` seconds for events; return changed names."""
+        if self._fd is None:
+            return set()
+        ready, _, _ = select.select([self._fd, self._wake_r], [], [], timeout)
+        if not ready or self._wake_r in ready:
+            return set()
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            _wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                self.overflowed = True
+            elif _is_config_file(name):
+                changed.add(name)
+        self.files_checked += len(changed)
+        return changed
+
+    def wake(self):
+        if self._fd is not None:
+            os.write(self._wake_w, b'x')
+
+    def close(self):
+        if self._fd is not None:
+            for fd in (self._fd, self._wake_r, self._wake_w):
+                os.close(fd)
+            self._fd = None
+
+
+def make_watcher(directory, interval=2.0, backend='auto'):
+    """Pick the cheapest watcher available for `directory`.
+
+    `backend` is 'auto' (inotify, else polling), 'inotify' (raise if
+    unavailable) or 'poll'.
+    """
+    if backend in ('auto', 'inotify'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            if backend == 'inotify':
+                raise
+    return PollingWatcher(directory, interval)
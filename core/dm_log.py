@@ -14,20 +14,46 @@ before handing values here) so string comparison against `since` orders
 correctly — except across a DST fallback, and except for ties. `message_id`
 is stored on every row precisely so callers can cursor on it instead:
 snowflakes are monotonic, so `after_id` is the lossless poll cursor.
+
+Each transcript has a sidecar index, `user_{id}.jsonl.idx`: one fixed-width
+record per stored row, in file order, holding the row's END byte offset and
+the highest message_id seen up to and including that row. The running max
+is what makes the index searchable even though edit notes re-use an older
+message_id: every row before the first record whose max exceeds `after_id`
+is at or below the cursor, so a poll binary-searches to that record and
+reads forward from there. A tail read starts from the last records (the
+last one is the newest-row pointer list_dm_conversations needs). Reads
+therefore cost the rows they return, not the transcript size.
+
+The JSONL stays the source of truth. log_dm keeps the index in step as it
+appends; a reader finding it behind (a transcript written before the index
+existed, a crash between the two writes) indexes the missing tail first,
+and one it finds ahead of its transcript (file replaced) rebuilds it.
+Writers and index maintenance share one in-process lock — the bot is the
+only writer.
 """
 
 import json
-from collections import deque
+import struct
+import threading
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 DM_LOG_DIR = Path('logs/dms')
 
+# (running max message_id, end offset of the row), little-endian u64 each.
+_INDEX_RECORD = struct.Struct('<QQ')
+_index_lock = threading.Lock()
+
 
 def _dm_file(user_id: int) -> Path:
     return DM_LOG_DIR / f'user_{user_id}.jsonl'
 
 
+def _index_file(user_id: int) -> Path:
+    return DM_LOG_DIR / f'user_{user_id}.jsonl.idx'
+
+
 def row_from_message(message, human_user_id: int) -> Dict:
     """Build a transcript row from a discord.Message.
 
@@ -52,10 +78,107 @@ def row_from_message(message, human_user_id: int) -> Dict:
 
 
 def log_dm(user_id: int, row: Dict):
-    """Append one DM row to the user's transcript."""
+    """Append one DM row to the user's transcript (and its index)."""
     DM_LOG_DIR.mkdir(parents=True, exist_ok=True)
-    with open(_dm_file(user_id), 'a') as f:
-        f.write(json.dumps(row) + '\n')
+    line = (json.dumps(row) + '\n').encode('utf-8')
+    with _index_lock:
+        with open(_dm_file(user_id), 'ab') as f:
+            offset = f.tell()
+            f.write(line)
+        with open(_index_file(user_id), 'a+b') as idx:
+            count, torn = divmod(idx.seek(0, 2), _INDEX_RECORD.size)
+            top, covered = _last_record(idx, count)
+            # Only extend an index that ends exactly where this row starts;
+            # otherwise the next read catches it up from the transcript.
+            if covered == offset and not torn:
+                idx.write(_INDEX_RECORD.pack(max(top, _row_id(row) or 0), offset + len(line)))
+
+
+def _row_id(row: Dict) -> Optional[int]:
+    try:
+        return int(row.get('message_id') or 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse(line: bytes) -> Optional[Dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        row = json.loads(line)
+    except ValueError:  # JSONDecodeError, or bytes that aren't UTF-8
+        return None
+    return row if isinstance(row, dict) else None
+
+
+def _last_record(idx, count: int) -> Tuple[int, int]:
+    if not count:
+        return 0, 0
+    idx.seek((count - 1) * _INDEX_RECORD.size)
+    return _INDEX_RECORD.unpack(idx.read(_INDEX_RECORD.size))
+
+
+def _sync_index(user_id: int) -> None:
+    """Index whatever the transcript holds past the last indexed row.
+    Caller holds _index_lock."""
+    size = _dm_file(user_id).stat().st_size
+    with open(_index_file(user_id), 'a+b') as idx:
+        count = idx.seek(0, 2) // _INDEX_RECORD.size
+        idx.truncate(count * _INDEX_RECORD.size)  # a torn trailing record
+        top, covered = _last_record(idx, count)
+        if covered > size:  # the transcript was replaced: start over
+            idx.truncate(0)
+            top, covered = 0, 0
+        if covered == size:
+            return
+        records = []
+        with open(_dm_file(user_id), 'rb') as f:
+            f.seek(covered)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # a row still being written
+                covered += len(line)
+                row = _parse(line)
+                if row is None:
+                    continue  # corrupt lines ride along in the next row's span
+                top = max(top, _row_id(row) or 0)
+                records.append(_INDEX_RECORD.pack(top, covered))
+        idx.write(b''.join(records))
+
+
+class _Index:
+    """Random access to a transcript through its index file."""
+
+    def __init__(self, idx, transcript):
+        self._idx = idx
+        self._transcript = transcript
+        self.count = idx.seek(0, 2) // _INDEX_RECORD.size
+
+    def _record(self, i: int) -> Tuple[int, int]:
+        self._idx.seek(i * _INDEX_RECORD.size)
+        return _INDEX_RECORD.unpack(self._idx.read(_INDEX_RECORD.size))
+
+    def first_after(self, message_id: int) -> int:
+        """Position of the first row whose running max exceeds `message_id`."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._record(mid)[0] > message_id:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def rows(self, lo: int, hi: int) -> List[Dict]:
+        """Parsed rows at positions [lo, hi), corrupt lines skipped."""
+        if lo >= hi:
+            return []
+        start = self._record(lo - 1)[1] if lo else 0
+        end = self._record(hi - 1)[1]
+        self._transcript.seek(start)
+        data = self._transcript.read(end - start)
+        return [row for row in map(_parse, data.split(b'\n')) if row is not None]
 
 
 def load_dms(user_id: int, limit: Optional[int] = None,
@@ -81,44 +204,60 @@ def load_dms(user_id: int, limit: Optional[int] = None,
     file RAISES, because "they never wrote" and "the read failed" must not
     look identical to a caller deciding whether to re-contact someone.
 
-    Memory is bounded by `limit`, not by transcript size: the file is
-    streamed a line at a time and at most `limit` rows are ever retained
-    (forward paging stops reading once its page is full; a tail read keeps
-    a rolling window of the last N). A 50-row read of a 200k-row
-    transcript costs 50 rows of memory, not 200k.
+    Cost is bounded by the rows returned, not by transcript size: a poll
+    binary-searches the index for its cursor and a tail read starts from
+    the end, each reading pages of about `limit` rows (more only when
+    `since`/`after_id` filter rows out). A 50-row read of a 200k-row
+    transcript reads ~50 rows.
     """
     path = _dm_file(user_id)
     if not path.exists():
         return []
+    with _index_lock:
+        _sync_index(user_id)
+
+    def keep(row: Dict) -> bool:
+        if after_id is not None:
+            row_id = _row_id(row)
+            if row_id is None or row_id <= after_id:
+                return False
+        return since is None or str(row.get('timestamp', '')) > since
+
+    with open(path, 'rb') as transcript, open(_index_file(user_id), 'rb') as idx:
+        index = _Index(idx, transcript)
+        if after_id is not None or limit is None:
+            start = index.first_after(after_id) if after_id is not None else 0
+            return _read_forward(index, start, keep, limit)
+        return _read_tail(index, keep, limit)
+
+
+def _read_forward(index: _Index, pos: int, keep: Callable[[Dict], bool],
+                  limit: Optional[int]) -> List[Dict]:
+    """The OLDEST `limit` matching rows from position `pos` on."""
+    if limit is None:
+        return [row for row in index.rows(pos, index.count) if keep(row)]
+    rows: List[Dict] = []
+    page = limit
+    while pos < index.count and len(rows) < limit:
+        hi = min(pos + page, index.count)
+        rows.extend(row for row in index.rows(pos, hi) if keep(row))
+        pos, page = hi, page * 2
+    return rows[:limit]
+
 
-    # Tail reads keep a rolling window of the most recent `limit` rows;
-    # everything older falls off the left as it is read.
-    rows: Any = ([] if (limit is None or after_id is not None)
-                 else deque(maxlen=limit))
-    with open(path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                row = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            if after_id is not None:
-                try:
-                    if int(row.get('message_id') or 0) <= after_id:
-                        continue
-                except (TypeError, ValueError):
-                    continue
-            if since is not None and str(row.get('timestamp', '')) <= since:
-                continue
-            rows.append(row)
-            # Forward paging takes the OLDEST matching rows, so the page is
-            # complete as soon as it is full — no reason to read further.
-            if after_id is not None and limit is not None and len(rows) >= limit:
-                break
-
-    return list(rows)
+def _read_tail(index: _Index, keep: Callable[[Dict], bool], limit: int) -> List[Dict]:
+    """The NEWEST `limit` matching rows, oldest first."""
+    pages: List[List[Dict]] = []
+    found = 0
+    hi, page = index.count, limit
+    while hi > 0 and found < limit:
+        lo = max(hi - page, 0)
+        matched = [row for row in index.rows(lo, hi) if keep(row)]
+        pages.append(matched)
+        found += len(matched)
+        hi, page = lo, page * 2
+    rows = [row for matched in reversed(pages) for row in matched]
+    return rows[len(rows) - limit:] if len(rows) > limit else rows
 
 
 def list_dm_users() -> List[int]:
@@ -1,10 +1,14 @@
 """Provider-agnostic LLM client package.
 
 Public surface:
-    LLMClient       - async client: chat(), run_agent(), discover_models()
+    LLMClient       - async client: chat(), chat_stream(), run_agent(),
+                      discover_models()
     ProviderConfig  - resolved provider/model config for a call site
+    ProviderRouter  - chat()/chat_stream() across a guild's fallback chain
+                      (circuit breakers, optional hedging)
     LLMResponse     - text + usage/cost result of a chat() call
     UsageRecord     - per-call token/cost usage
+    UsageLedger     - persistent per-call usage with hourly/all-time rollups
     PROVIDER_ALIASES, DEFAULT_PROVIDER - shared constants
 """
 
@@ -15,13 +19,17 @@ from .client import (
     PROVIDER_ALIASES,
     DEFAULT_PROVIDER,
 )
+from .router import ProviderRouter
+from .ledger import UsageLedger
 from .usage import UsageRecord
 
 __all__ = [
     "LLMClient",
     "ProviderConfig",
+    "ProviderRouter",
     "LLMResponse",
     "UsageRecord",
+    "UsageLedger",
     "PROVIDER_ALIASES",
     "DEFAULT_PROVIDER",
 ]
@@ -0,0 +1,203 @@
+"""Token budgets for the parts of a chat prompt that grow.
+
+The GPT cog used to send a fixed 15-message window plus every active
+memory in the guild, so prompt size grew without bound as a guild
+accumulated memories. `ContextBudget` packs history turns, referenced
+messages and memories into a per-model token budget instead, and keeps
+packed/dropped counts for the usage log.
+
+Token counts come from `TokenCounter`: a local estimator shaped after BPE
+tokenizers (short words ≈ 1 token, long words split, digits in groups of
+three, punctuation and symbols on their own), calibrated per model against
+the prompt_tokens each provider reports. No tokenizer dependency — the
+budget has to hold for every provider, and none of them ship one that
+works offline for all models.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Prompt tokens for history + references + memories, when the model's config
+# has no `context_budget`. The fixed 15-message window this replaces peaked
+# around 8k tokens of history on long messages.
+DEFAULT_CONTEXT_BUDGET = 6000
+# Share of the budget held back from history for memories; memories also
+# get whatever history leaves unused.
+MEMORY_SHARE = 0.25
+# Per-message framing (role, separators) the provider adds on the wire.
+MESSAGE_OVERHEAD = 4
+# Memory ranking: a memory's recency weight halves every this many days.
+MEMORY_HALF_LIFE_DAYS = 14
+
+_PIECE = re.compile(r"[A-Za-z]+|[0-9]{1,3}|\s+|[^\sA-Za-z0-9]")
+_WORD = re.compile(r"[a-z0-9]{3,}")
+_STOPWORDS = frozenset(
+    "the and for are but not you your yours with this that have has had was "
+    "were from they them their what when where which who will would can "
+    "could should just about into than then there these those been being "
+    "our out all any how its it's i'm dont don't".split())
+
+
+def estimate_tokens(text: str) -> float:
+    """Uncalibrated token estimate for `text` (see TokenCounter)."""
+    n = 0.0
+    for piece in _PIECE.findall(text):
+        head = piece[0]
+        if head.isspace():
+            n += 1 if "\n" in piece else 0  # spaces ride on the next word
+        elif head.isascii() and head.isalpha():
+            n += 1 + max(0, len(piece) - 6) / 4
+        elif head.isascii():
+            n += 1  # a digit group or one punctuation mark
+        elif head.isalpha() and ord(head) < 0x2E80:
+            n += 0.5  # accented Latin, Cyrillic, Greek: merges in pairs
+        else:
+            n += 1.5  # CJK, emoji, symbols
+    return n
+
+
+class TokenCounter:
+    """Per-model token counter: `estimate_tokens` scaled by a ratio learned
+    from the provider's own prompt_tokens for requests whose full prompt
+    we estimated (`calibrate`). Starts at 1.0 for a model never seen."""
+
+    SMOOTHING = 0.2
+    RATIO_BOUNDS = (0.5, 2.0)
+
+    def __init__(self):
+        self.ratios: Dict[str, float] = {}
+
+    def count(self, text: str, model: Optional[str] = None) -> int:
+        return math.ceil(estimate_tokens(text) * self.ratios.get(model, 1.0))
+
+    def count_messages(self, messages: Sequence[Dict], model: Optional[str] = None) -> int:
+        return sum(self.count(m.get("content") or "", model) + MESSAGE_OVERHEAD
+                   for m in messages)
+
+    def calibrate(self, model: str, messages: Sequence[Dict], actual: int) -> None:
+        """Fold one observation — the provider counted `actual` prompt
+        tokens for `messages` — into the model's ratio."""
+        estimated = sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD
+                        for m in messages)
+        if estimated <= 0 or actual <= 0:
+            return
+        low, high = self.RATIO_BOUNDS
+        observed = min(max(actual / estimated, low), high)
+        ratio = self.ratios.get(model)
+        self.ratios[model] = observed if ratio is None else (
+            ratio + self.SMOOTHING * (observed - ratio))
+
+
+def rank_memories(memories: Iterable[Dict], query: str,
+                  speakers: Iterable[str] = (), now: Optional[float] = None) -> List[Dict]:
+    """Memories best-first for a conversation: word overlap with `query`
+    (the recent history text) dominates, recency breaks ties between
+    equally relevant memories, and memories from someone taking part in the
+    conversation (`speakers`, user-id strings) get a lift."""
+    now = time.time() if now is None else now
+    query_words = set(_WORD.findall(query.lower())) - _STOPWORDS
+    speakers = set(speakers)
+
+    def score(memory):
+        words = set(_WORD.findall((memory.get("text") or "").lower())) - _STOPWORDS
+        relevance = len(words & query_words) / math.sqrt(len(words)) if words else 0.0
+        age_days = max(0.0, now - memory.get("stored_at", now)) / 86400
+        recency = 0.5 ** (age_days / MEMORY_HALF_LIFE_DAYS)
+        present = 0.5 if str(memory.get("sender")) in speakers else 0.0
+        return 4 * relevance + recency + present
+
+    return sorted(memories, key=score, reverse=True)
+
+
+class ContextBudget:
+    """One request's token budget for history, references and memories.
+
+    Pack history first, into the budget minus MEMORY_SHARE; memories then
+    get everything history left. `stats` counts what was packed and
+    dropped, for the usage log."""
+
+    def __init__(self, tokens: int, counter: TokenCounter, model: Optional[str] = None,
+                 memory_share: float = MEMORY_SHARE):
+        self.tokens = tokens
+        self.counter = counter
+        self.model = model
+        self.memory_share = memory_share
+        self.used = 0
+        self.stats = {"turns": 0, "turns_dropped": 0, "refs": 0, "refs_dropped": 0,
+                      "memories": 0, "memories_dropped": 0}
+
+    def _cost(self, text: str) -> int:
+        return self.counter.count(text, self.model) + MESSAGE_OVERHEAD
+
+    def pack_memories(self, lines: Sequence[str]) -> List[int]:
+        """Indices of the memory lines (best first) that fit what is left
+        of the budget; a line that doesn't fit is skipped, a shorter one
+        after it may still go in."""
+        cap = self.tokens - self.used
+        spent = 0
+        kept = []
+        for i, line in enumerate(lines):
+            cost = self.counter.count(line, self.model) + 1
+            if spent + cost <= cap:
+                kept.append(i)
+                spent += cost
+        self.used += spent
+        self.stats["memories"] = len(kept)
+        self.stats["memories_dropped"] = len(lines) - len(kept)
+        return kept
+
+    def pack_history(self, messages: Sequence[Dict], references: Dict[int, int] = None) -> List[Dict]:
+        """Pack chronological `messages` newest-first into the history
+        share of the budget and return the kept ones in their original
+        order.
+
+        `references` maps a message's index to the index of the referenced
+        message it replies to; that entry is only worth its tokens next to
+        the reply, so it is packed right after its reply (or dropped with
+        it). Turns stop at the first one that doesn't fit, so the window
+        stays contiguous. The most recent message is always kept, over
+        budget or not."""
+        references = references or {}
+        ref_entries = set(references.values())
+        limit = int(self.tokens * (1 - self.memory_share))
+        remaining = limit - self.used
+        kept = set()
+
+        def take(i):
+            nonlocal remaining
+            if i in kept:
+                return True
+            cost = self._cost(messages[i].get("content") or "")
+            if kept and cost > remaining:
+                return False
+            kept.add(i)
+            remaining -= cost
+            return True
+
+        for i in reversed(range(len(messages))):
+            if i in ref_entries:
+                continue  # packed with its reply
+            if not take(i):
+                break  # the window stays contiguous: no older turns past a gap
+            target = references.get(i)
+            if target is not None:
+                take(target)
+
+        self.used = limit - remaining
+        refs_kept = len(kept & ref_entries)
+        self.stats["refs"] = refs_kept
+        self.stats["refs_dropped"] = len(ref_entries) - refs_kept
+        self.stats["turns"] = len(kept) - refs_kept
+        self.stats["turns_dropped"] = len(messages) - len(ref_entries) - self.stats["turns"]
+        return [m for i, m in enumerate(messages) if i in kept]
+
+    def summary(self) -> str:
+        """One log-friendly line: budget use and packed/dropped counts."""
+        s = self.stats
+        return (f"budget={self.used}/{self.tokens} turns={s['turns']}(-{s['turns_dropped']}) "
+                f"refs={s['refs']}(-{s['refs_dropped']}) "
+                f"memories={s['memories']}(-{s['memories_dropped']})")
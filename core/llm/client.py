@@ -5,11 +5,14 @@ Anthropic), the agent loop, model discovery, and usage/cost tracking.
 Callers (cogs) should not talk to provider SDKs directly for chat
 completions -- go through `LLMClient`.
 
-Public surface: LLMClient (chat / run_agent / discover_models),
+Public surface: LLMClient (chat / chat_stream / run_agent / discover_models),
 LLMResponse, ProviderConfig. Requests are built as pydantic-ai messages
 and executed via `pydantic_ai.direct.model_request` (chat) or
 `pydantic_ai.Agent` (run_agent); both share `_build_model()` /
-`_build_settings()` so provider behavior is identical across paths. The
+`_build_settings()` so provider behavior is identical across paths.
+Built models are cached per provider/model/base_url/key fingerprint over
+one keep-alive HTTP pool per endpoint, so back-to-back requests reuse
+warm connections; catalog and key changes invalidate the cache. The
 raw openai SDK appears only in `discover_models` (pydantic-ai has no
 model-listing API).
 
@@ -28,28 +31,40 @@ Notable behavior notes vs. the old implementation:
 - `metadata` passthrough uses `extra_body={"metadata": ...}` plus
   `openai_store=True`, producing the same request JSON as the old
   `metadata=`/`store=` SDK kwargs. Anthropic drops metadata, as before.
+- Prompt caching: a system message flagged `"volatile": True` is sent
+  after every other system message as a dynamic instruction, so the
+  leading system prompt stays a byte-stable prefix. OpenAI and xAI cache
+  such prefixes automatically; Anthropic gets explicit `cache_control`
+  breakpoints after the tool definitions and the stable prefix.
 """
 
 from __future__ import annotations
 
 import os
 import asyncio
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
+import httpx
 import openai
 
 from pydantic_ai import Agent
-from pydantic_ai.direct import model_request
+from pydantic_ai.direct import model_request, model_request_stream
 from pydantic_ai.messages import (
     ModelMessage,
     ModelRequest as PaiModelRequest,
     ModelResponse as PaiModelResponse,
+    PartDeltaEvent,
+    PartStartEvent,
+    InstructionPart,
     SystemPromptPart,
     TextPart,
+    TextPartDelta,
     UserPromptPart,
 )
-from pydantic_ai.models import Model
+from pydantic_ai.models import DEFAULT_HTTP_TIMEOUT, Model, ModelRequestParameters, get_user_agent
 from pydantic_ai.models.anthropic import AnthropicModel
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.profiles.openai import OpenAIModelProfile
@@ -60,6 +75,7 @@ from pydantic_ai.settings import ModelSettings
 from pydantic_ai.tools import Tool
 from pydantic_ai.usage import RequestUsage, UsageLimits
 
+from .ledger import guild_of
 from .usage import UsageRecord, estimate_cost
 
 # Provider aliases (also used by the cog for command-level aliasing).
@@ -72,6 +88,15 @@ PROVIDER_ALIASES: Dict[str, str] = {
 DEFAULT_PROVIDER = "xai"
 DEFAULT_MAX_TOKENS = 3000
 
+# Built pydantic-ai models are cached (see LLMClient._build_model); this
+# bounds how many distinct provider/model/key combinations stay resident.
+MODEL_CACHE_SIZE = 32
+# Idle keep-alive connections per endpoint pool, and how long they may idle.
+# Provider APIs drop idle connections after ~60-120s; reusing one inside
+# that window skips the TCP + TLS handshake on the next request.
+POOL_KEEPALIVE_CONNECTIONS = 8
+POOL_KEEPALIVE_EXPIRY = 90.0
+
 # Seed skeleton used when no ai_providers config exists yet, so a fresh
 # install can go straight to `!setapikey <provider> <key>` instead of
 # hand-editing JSON. Persisted to config the first time a mutating command
@@ -151,6 +176,10 @@ class ProviderConfig:
     model: Optional[str]
     provider_info: Dict[str, Any]
     all_providers: Dict[str, Any]
+    # Where ProviderRouter goes when this one fails or stalls (the guild's
+    # ai_fallback_chain), and whether it may race them (ai_hedge_requests).
+    fallbacks: List["ProviderConfig"] = field(default_factory=list)
+    hedge: bool = False
 
     def __getitem__(self, key: str) -> Any:
         return getattr(self, key)
@@ -184,6 +213,17 @@ class LLMClient:
         """
         self.config = config
         self.logger = logger or _NullLogger()
+        # Built models keyed by _model_key, LRU-bounded by MODEL_CACHE_SIZE,
+        # plus one keep-alive HTTP pool per endpoint (provider, api type,
+        # base_url, key fingerprint) shared by every model on it. Both are
+        # bound to the event loop they were built on.
+        self._models: "OrderedDict[Tuple, Model]" = OrderedDict()
+        self._http_clients: Dict[Tuple, Any] = {}
+        self._pool_loop = None
+        self.model_cache_stats = {"hits": 0, "builds": 0, "invalidations": 0}
+        # Optional UsageLedger (core/llm/ledger.py): when set, every call's
+        # usage is recorded against the guild in its metadata.
+        self.ledger = None
 
     # ------------------------------------------------------------------
     # Provider/model resolution
@@ -204,6 +244,7 @@ class LLMClient:
         """Persist the provider catalog — THE one write-back for every
         catalog mutation (see module-level set_all_providers)."""
         set_all_providers(self.config, all_providers)
+        self.invalidate_models()
 
     def get_provider_config(self, ctx) -> ProviderConfig:
         """Get the current provider configuration for a guild."""
@@ -232,8 +273,38 @@ class LLMClient:
             model=current_model,
             provider_info=provider_info,
             all_providers=all_providers,
+            fallbacks=self._fallbacks(ctx, all_providers, (current_provider, current_model)),
+            hedge=bool(config.get(ctx, "ai_hedge_requests", False)),
         )
 
+    def _fallbacks(self, ctx, all_providers: Dict[str, Any],
+                   primary: Tuple[str, Optional[str]]) -> List[ProviderConfig]:
+        """The guild's `ai_fallback_chain` ("provider" or "provider/model"
+        entries) as ProviderConfigs. Unknown providers, repeats, and
+        providers with no usable API key are dropped."""
+        chain = []
+        seen = {primary}
+        for entry in self.config.get(ctx, "ai_fallback_chain") or []:
+            if not isinstance(entry, str):
+                continue
+            provider, _, model = entry.strip().partition("/")
+            provider = PROVIDER_ALIASES.get(provider.lower(), provider.lower())
+            provider_info = all_providers.get(provider)
+            if not provider_info:
+                continue
+            model = model or provider_info.get("default_model")
+            if (provider, model) in seen:
+                continue
+            try:
+                self._resolve_api_key(provider, provider_info)
+            except ValueError:
+                continue
+            seen.add((provider, model))
+            chain.append(ProviderConfig(provider=provider, model=model,
+                                        provider_info=provider_info,
+                                        all_providers=all_providers))
+        return chain
+
     def _get_api_key(self, provider: str) -> Optional[str]:
         api_key_name = f"{provider.upper()}_API_KEY"
         return self.config.get(None, api_key_name, scope="global") or os.environ.get(api_key_name)
@@ -259,6 +330,21 @@ class LLMClient:
     # pydantic-ai request assembly
     # ------------------------------------------------------------------
 
+    def _model_key(self, provider: str, model: str, provider_info: Dict[str, Any],
+                   api_key: str) -> Tuple[Tuple, Tuple]:
+        """(endpoint key, model key) for the model cache. Every input that
+        changes what _construct_model builds is part of the key, so a catalog
+        or key edit can never be served a stale model — invalidation only
+        reclaims the superseded entries' connections."""
+        api_type = provider_info.get("api_type", "openai")
+        base_url = None if api_type == "anthropic" else provider_info.get("base_url")
+        model_info = (provider_info.get("models", {}) or {}).get(model, {})
+        plain_max_tokens = provider == "ollama" or bool(
+            base_url and "max_completion_tokens" not in model_info)
+        fingerprint = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        endpoint = (provider, api_type, base_url, fingerprint)
+        return endpoint, endpoint + (model, plain_max_tokens)
+
     def _build_model(
         self,
         provider: str,
@@ -266,18 +352,86 @@ class LLMClient:
         provider_info: Dict[str, Any],
         api_key: str,
     ) -> Model:
-        """Construct the pydantic-ai model for a provider/model pair.
+        """The pydantic-ai model for a provider/model pair, built once and
+        reused: a provider built per request meant a new HTTP client —
+        connection pool, TCP and TLS handshake — on every `!gpt` message.
 
-        A future agent loop should reuse this to build
-        `pydantic_ai.Agent(self._build_model(...), tools=[...])`.
+        Reuse this to build `pydantic_ai.Agent(self._build_model(...),
+        tools=[...])`.
         """
+        self._check_pool_loop()
+        endpoint, key = self._model_key(provider, model, provider_info, api_key)
+        pai_model = self._models.get(key)
+        if pai_model is not None:
+            self._models.move_to_end(key)
+            self.model_cache_stats["hits"] += 1
+            return pai_model
+        http_client = self._http_clients.get(endpoint)
+        if http_client is None:
+            http_client = self._http_clients[endpoint] = _new_http_client(endpoint[1])
+        pai_model = self._construct_model(provider, model, provider_info, api_key, http_client)
+        self._models[key] = pai_model
+        self.model_cache_stats["builds"] += 1
+        while len(self._models) > MODEL_CACHE_SIZE:
+            # Models are thin wrappers; the endpoint's pool outlives them.
+            self._models.popitem(last=False)
+        return pai_model
+
+    def _check_pool_loop(self) -> None:
+        """httpx connections belong to the event loop that opened them; a
+        cache built under another loop (a test's earlier asyncio.run, a
+        restarted bot loop) is unusable, so start over."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not self._pool_loop:
+            self._models.clear()
+            self._http_clients.clear()
+            self._pool_loop = loop
+
+    def invalidate_models(self) -> None:
+        """Drop every cached model and retire their connection pools. Called
+        when the provider catalog or an API key changes.
+
+        Retired pools are closed after DEFAULT_HTTP_TIMEOUT rather than now:
+        a request already in flight on one must be allowed to finish."""
+        self._models.clear()
+        retired = list(self._http_clients.values())
+        self._http_clients.clear()
+        self.model_cache_stats["invalidations"] += 1
+        if not retired:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop: nothing was opened under one, GC reclaims them
+        loop.create_task(_close_clients(retired, delay=DEFAULT_HTTP_TIMEOUT))
+
+    async def aclose(self) -> None:
+        """Close every pooled connection now (cog unload / shutdown)."""
+        self._models.clear()
+        clients = list(self._http_clients.values())
+        self._http_clients.clear()
+        await _close_clients(clients)
+
+    def _construct_model(
+        self,
+        provider: str,
+        model: str,
+        provider_info: Dict[str, Any],
+        api_key: str,
+        http_client: Any,
+    ) -> Model:
+        """Construct the pydantic-ai model for a provider/model pair over a
+        shared HTTP client (see _build_model for the cached entry point)."""
         api_type = provider_info.get("api_type", "openai")
 
         if api_type == "anthropic":
             # The configured base_url points at the messages endpoint, not a
             # base URL; the old implementation hardcoded the endpoint too, so
             # the provider default is used deliberately.
-            return AnthropicModel(model, provider=AnthropicProvider(api_key=api_key))
+            return AnthropicModel(model, provider=AnthropicProvider(api_key=api_key, http_client=http_client))
 
         base_url = provider_info.get("base_url")
         if provider == "ollama":
@@ -287,7 +441,7 @@ class LLMClient:
             # provider's per-model profile (qwen/llama/... detection).
             return OpenAIChatModel(
                 model,
-                provider=OllamaProvider(base_url=base_url, api_key=api_key),
+                provider=OllamaProvider(base_url=base_url, api_key=api_key, http_client=http_client),
                 profile=OpenAIModelProfile(openai_chat_supports_max_completion_tokens=False),
             )
 
@@ -301,14 +455,15 @@ class LLMClient:
             # hand-rolled client sent `max_tokens` here and had a retry-swap
             # fallback that this migration dropped; this restores the wire shape.
             model_info = (provider_info.get("models", {}) or {}).get(model, {})
+            provider_obj = OpenAIProvider(base_url=base_url, api_key=api_key, http_client=http_client)
             if "max_completion_tokens" not in model_info:
                 return OpenAIChatModel(
                     model,
-                    provider=OpenAIProvider(base_url=base_url, api_key=api_key),
+                    provider=provider_obj,
                     profile=OpenAIModelProfile(openai_chat_supports_max_completion_tokens=False),
                 )
-            return OpenAIChatModel(model, provider=OpenAIProvider(base_url=base_url, api_key=api_key))
-        return OpenAIChatModel(model, provider=OpenAIProvider(api_key=api_key))
+            return OpenAIChatModel(model, provider=provider_obj)
+        return OpenAIChatModel(model, provider=OpenAIProvider(api_key=api_key, http_client=http_client))
 
     def _build_settings(
         self,
@@ -332,7 +487,15 @@ class LLMClient:
         )
         settings: Dict[str, Any] = {"max_tokens": max_tokens}
 
-        if api_type != "anthropic":
+        if api_type == "anthropic":
+            # Anthropic only caches what a `cache_control` breakpoint closes:
+            # one after the tool definitions, one after the stable system
+            # prefix (the volatile suffix rides behind it uncached). Opt out
+            # per model with "prompt_cache": false.
+            if model_info.get("prompt_cache", True):
+                settings["anthropic_cache_tool_definitions"] = True
+                settings["anthropic_cache_instructions"] = True
+        else:
             # Thinking models (e.g. qwen3.5 via ollama) can burn the entire
             # token budget on reasoning and return empty content; "none"
             # disables it. Passed through verbatim via openai_reasoning_effort.
@@ -346,8 +509,20 @@ class LLMClient:
                 settings["extra_body"] = {"metadata": metadata}
                 settings["openai_store"] = True
 
+            # OpenAI caches identical prefixes on its own; the key routes a
+            # guild's requests (same persona prefix) to the same cache shard.
+            # api.openai.com only — compatible endpoints may reject the field.
+            if (model_info.get("prompt_cache", True) and metadata
+                    and not provider_info.get("base_url")):
+                settings["openai_prompt_cache_key"] = (
+                    f"{metadata.get('service', '')}:{metadata.get('guild', '')}")
+
         return settings  # type: ignore[return-value]
 
+    def _track(self, usage: Optional[UsageRecord], metadata: Optional[Dict], kind: str) -> None:
+        if usage is not None and self.ledger is not None:
+            self.ledger.record(usage, guild_of(metadata), kind)
+
     # ------------------------------------------------------------------
     # Chat completion (non-streaming)
     # ------------------------------------------------------------------
@@ -378,15 +553,63 @@ class LLMClient:
             pai_model,
             _to_pai_messages(messages),
             model_settings=settings,
+            model_request_parameters=_request_parameters(messages),
         )
 
         text = "".join(
             part.content for part in response.parts if isinstance(part, TextPart)
         ).strip()
         usage = _usage_from_pai(response.usage, provider=provider, model=model)
+        self._track(usage, metadata, "chat")
 
         return LLMResponse(text=text, provider=provider, model=model, usage=usage, raw=response)
 
+    async def chat_stream(
+        self,
+        provider_config: ProviderConfig,
+        messages: List[Dict],
+        metadata: Optional[Dict] = None,
+    ) -> AsyncIterator[Union[str, LLMResponse]]:
+        """Streaming chat(): yields text deltas (str) as the provider sends
+        them, then exactly one final LLMResponse — full stripped text plus
+        usage, the same object chat() would have returned.
+
+        Same request assembly as chat(). Closing the iterator early (the
+        consumer broke out) cancels the underlying HTTP stream.
+        """
+        provider = provider_config.provider
+        model = provider_config.model
+        provider_info = provider_config.provider_info
+
+        api_key = self._resolve_api_key(provider, provider_info)
+
+        pai_model = self._build_model(provider, model, provider_info, api_key)
+        settings = self._build_settings(provider_info, model, metadata)
+
+        async with model_request_stream(
+            pai_model,
+            _to_pai_messages(messages),
+            model_settings=settings,
+            model_request_parameters=_request_parameters(messages),
+        ) as stream:
+            async for event in stream:
+                if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                    delta = event.part.content
+                elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                    delta = event.delta.content_delta
+                else:
+                    continue  # thinking / tool-call parts never reach the channel
+                if delta:
+                    yield delta
+            response = stream.get()
+
+        text = "".join(
+            part.content for part in response.parts if isinstance(part, TextPart)
+        ).strip()
+        usage = _usage_from_pai(response.usage, provider=provider, model=model)
+        self._track(usage, metadata, "stream")
+        yield LLMResponse(text=text, provider=provider, model=model, usage=usage, raw=response)
+
     # ------------------------------------------------------------------
     # Agent loop (multi-turn tool calling)
     # ------------------------------------------------------------------
@@ -422,7 +645,11 @@ class LLMClient:
         pai_model = self._build_model(provider, model, provider_info, api_key)
         settings = self._build_settings(provider_info, model, metadata)
 
-        agent = Agent(model=pai_model, tools=tools, model_settings=settings)
+        # Volatile system text becomes a dynamic (function) instruction, the
+        # Agent-side equivalent of _request_parameters.
+        volatile = _volatile_text(messages)
+        agent = Agent(model=pai_model, tools=tools, model_settings=settings,
+                      instructions=(lambda: volatile) if volatile else None)
         result = await agent.run(
             user_prompt,
             message_history=_to_pai_messages(messages),
@@ -438,6 +665,7 @@ class LLMClient:
         # attribute in pydantic-ai 2.x (not the v1 `.usage()` method) and
         # duck-types RequestUsage's input/output token fields.
         usage = _usage_from_pai(result.usage, provider=provider, model=model)
+        self._track(usage, metadata, "agent")
         text = (result.output or "").strip()
         return LLMResponse(text=text, provider=provider, model=model, usage=usage, raw=result)
 
@@ -506,6 +734,33 @@ class LLMClient:
             raise
 
 
+def _new_http_client(api_type: str):
+    """One endpoint's keep-alive pool. OpenAI-compatible endpoints get
+    pydantic-ai's default client plus longer keep-alive; Anthropic gets its
+    SDK's own default client class, since newer anthropic releases reject a
+    plain httpx client (they ship their own httpx fork)."""
+    if api_type == "anthropic":
+        import anthropic
+        return anthropic.DefaultAsyncHttpxClient()
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout=DEFAULT_HTTP_TIMEOUT, connect=5),
+        headers={"User-Agent": get_user_agent()},
+        limits=httpx.Limits(
+            max_keepalive_connections=POOL_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY),
+    )
+
+
+async def _close_clients(clients: List[Any], delay: float = 0) -> None:
+    if delay:
+        await asyncio.sleep(delay)
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+
+
 class _NullLogger:
     """No-op logger used when the caller doesn't supply one."""
     def debug(self, *a, **k): pass
@@ -519,13 +774,16 @@ def _to_pai_messages(messages: List[Dict]) -> List[ModelMessage]:
 
     Consecutive system/user messages are grouped into a single ModelRequest;
     assistant messages become ModelResponses. Order is preserved 1:1 on the
-    wire.
+    wire. Volatile system messages are left out here — they travel as
+    instructions (see _request_parameters).
     """
     pai_messages: List[ModelMessage] = []
     request_parts: List[Any] = []
 
     for msg in messages:
         role = msg.get("role")
+        if role == "system" and msg.get("volatile"):
+            continue
         content = msg.get("content") or ""
         if role == "assistant":
             if request_parts:
@@ -543,6 +801,25 @@ def _to_pai_messages(messages: List[Dict]) -> List[ModelMessage]:
     return pai_messages
 
 
+def _volatile_text(messages: List[Dict]) -> str:
+    return "\n\n".join(
+        msg.get("content") or "" for msg in messages
+        if msg.get("role") == "system" and msg.get("volatile"))
+
+
+def _request_parameters(messages: List[Dict]) -> Optional[ModelRequestParameters]:
+    """Request parameters carrying the volatile system text as a dynamic
+    instruction part. Providers place instructions after the leading system
+    prompt, and Anthropic's instruction cache breakpoint stops in front of
+    dynamic parts, so the stable prefix is what gets cached. None when
+    there is nothing volatile (the request is unchanged)."""
+    volatile = _volatile_text(messages)
+    if not volatile:
+        return None
+    return ModelRequestParameters(
+        instruction_parts=[InstructionPart(content=volatile, dynamic=True)])
+
+
 def _usage_from_pai(usage: Optional[RequestUsage], provider: str, model: str) -> Optional[UsageRecord]:
     if usage is None:
         return None
@@ -554,6 +831,10 @@ def _usage_from_pai(usage: Optional[RequestUsage], provider: str, model: str) ->
         prompt_tokens=prompt_tokens,
         completion_tokens=completion_tokens,
         total_tokens=prompt_tokens + completion_tokens,
+        # Both are subsets of prompt_tokens (pydantic-ai normalizes
+        # Anthropic's separately reported cache counts into input_tokens).
+        cached_prompt_tokens=usage.cache_read_tokens or 0,
+        cache_write_tokens=usage.cache_write_tokens or 0,
         # RunUsage (agent loop) carries tool_calls; RequestUsage (plain
         # chat) doesn't have the attribute — default to 0.
         tool_calls=getattr(usage, "tool_calls", 0) or 0,
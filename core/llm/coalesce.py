@@ -0,0 +1,124 @@
+"""In-flight de-duplication and a short-TTL answer cache for chat replies.
+
+In a busy guild several people often mention the bot with the same question
+within seconds, and each one used to run its own history assembly and
+provider call. `RequestCoalescer.run(key, produce)` lets the first caller for
+a key (the leader) do the work while later callers with the same key await
+its result, and keeps successful results for a caller-chosen TTL.
+
+The key is opaque here; the chat cog builds it from (guild, channel,
+provider, model, normalized question, fingerprint of the conversation the
+question was asked into) — see `normalize_question` and
+`context_fingerprint`. A `produce()` that returns None (refusal, empty
+reply, API error) shares nothing: waiters get None and are expected to run
+on their own, and nothing is cached.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+# Answers kept at once (least recently stored are dropped past this).
+MAX_ANSWERS = 256
+# Upper bound on any per-guild answer TTL, in seconds.
+MAX_ANSWER_TTL = 300.0
+# Turns before the question that identify the conversation it was asked into.
+CONTEXT_TURNS = 5
+
+# How a run() result was obtained.
+LED = "led"  # this caller did the work
+JOINED = "joined"  # awaited an identical in-flight request
+CACHED = "cached"  # served from the answer cache
+
+_MENTION = re.compile(r"<@[!&]?\d+>")
+_NON_WORD = re.compile(r"[^\w]+")
+# A leading prefix command ("!gpt ", "?ask "), dropped before comparing.
+_COMMAND = re.compile(r"^\s*(?:<@[!&]?\d+>\s*)*[^\w\s<]{1,3}\w+\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercased words only: mentions, punctuation and spacing don't make
+    two askings of a question different."""
+    return " ".join(_NON_WORD.sub(" ", _MENTION.sub(" ", text or "").lower()).split())
+
+
+def context_fingerprint(turns: Iterable[Any], question: str,
+                        through_id: Optional[int] = None) -> str:
+    """Digest of the CONTEXT_TURNS turns (HistoryTurn-likes, oldest first)
+    that lead up to the invoking message (`through_id`; the end of `turns`
+    when None). Bot turns and repeats of `question` (normalized, exact
+    match after any leading `!command`) are skipped, so everyone who asks it
+    into the same conversation gets the same fingerprint — and asking it
+    again after the conversation has moved on gets a new one."""
+    picked = []
+    for turn in reversed(list(turns)):
+        if through_id is not None and turn.id > through_id:
+            continue
+        if getattr(turn, "author_bot", False) or _asks(turn.content, question):
+            continue
+        picked.append(turn)
+        if len(picked) == CONTEXT_TURNS:
+            break
+    digest = hashlib.blake2b(digest_size=12)
+    for turn in reversed(picked):
+        digest.update(f"{turn.id}\x00{turn.rendered}\x01".encode())
+    return digest.hexdigest()
+
+
+def _asks(content: str, question: str) -> bool:
+    """Whether a message is (another) asking of the normalized `question`."""
+    return bool(question) and normalize_question(_COMMAND.sub("", content or "", count=1)) == question
+
+
+class RequestCoalescer:
+    def __init__(self, max_answers=MAX_ANSWERS, clock=time.monotonic):
+        self.max_answers = max_answers
+        self._clock = clock
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # key -> (expires_at, value), oldest stored first.
+        self._answers: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self.stats = {"hits": 0, "joins": 0, "misses": 0}
+
+    async def run(self, key: Hashable, produce: Callable[[], Awaitable[Any]],
+                  ttl: float = 0.0) -> Tuple[Any, str]:
+        """(value, how) — `how` is LED, JOINED or CACHED. A leader's
+        non-None value is cached for min(ttl, MAX_ANSWER_TTL) seconds. If
+        the leader raises or is cancelled, waiters get None and the
+        exception propagates to the leader only."""
+        cached = self._answers.get(key)
+        if cached is not None:
+            if cached[0] > self._clock():
+                self.stats["hits"] += 1
+                return cached[1], CACHED
+            del self._answers[key]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["joins"] += 1
+            # shield: a waiter being cancelled must not cancel the shared result.
+            return await asyncio.shield(pending), JOINED
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        value = None
+        try:
+            value = await produce()
+        finally:
+            del self._inflight[key]
+            future.set_result(value)
+        ttl = min(ttl, MAX_ANSWER_TTL)
+        if value is not None and ttl > 0:
+            self._store(key, value, ttl)
+        return value, LED
+
+    def _store(self, key, value, ttl):
+        self._answers.pop(key, None)
+        self._answers[key] = (self._clock() + ttl, value)
+        while len(self._answers) > self.max_answers:
+            self._answers.popitem(last=False)
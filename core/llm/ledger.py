@@ -0,0 +1,229 @@
+"""Persistent LLM usage ledger with per-hour and all-time rollups.
+
+Every call's UsageRecord used to be logged at debug level and forgotten,
+so the only cost knowledge the bot had was the static pricing table. The
+ledger keeps it, in SQLite next to the other local stores:
+
+    usage(ts, guild_id, provider, model, kind, tokens..., cost_usd)
+        -- append-only, one row per call
+    usage_hourly(hour, guild_id, provider, model, calls, tokens..., cost)
+    usage_totals(guild_id, provider, model, calls, tokens..., cost)
+        -- rollups, upserted in the same transaction as the rows they sum
+
+Records are buffered (`record`) and written in one transaction per
+`flush` — the `Gpt` cog flushes on a timer and at unload; reads flush
+first, so they see every recorded call (if that flush fails they log it
+and answer from what is already persisted). Reads come from the
+rollups only: a window of N hours touches at most N rows per model, and
+all-time totals one row per model, however many calls there were.
+
+`guild_id` 0 collects DMs and calls made without a guild. Costs are the
+`estimate_cost` numbers (None — unpriced — is counted in `unpriced_calls`
+and adds nothing), so `cost_per_call` is what a model actually costs per
+reply here, the figure the cooldown tiers are meant to track.
+
+Opt-out via the global `usage_ledger_enabled` bool (restart-bound). The
+file is created 0600 like the other stores under logs/.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .usage import UsageRecord
+
+logger = logging.getLogger(__name__)
+
+LEDGER_PATH = Path('logs/usage_ledger.sqlite3')
+LEDGER_FILE_MODE = 0o600
+
+# Summed per rollup row, in this order.
+_MEASURES = ("calls", "prompt_tokens", "completion_tokens", "cached_prompt_tokens",
+             "tool_calls", "cost_usd", "unpriced_calls")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id                   INTEGER PRIMARY KEY,
+    ts                   REAL NOT NULL,
+    guild_id             INTEGER NOT NULL,
+    provider             TEXT NOT NULL,
+    model                TEXT NOT NULL,
+    kind                 TEXT NOT NULL,
+    prompt_tokens        INTEGER NOT NULL,
+    completion_tokens    INTEGER NOT NULL,
+    cached_prompt_tokens INTEGER NOT NULL,
+    cache_write_tokens   INTEGER NOT NULL,
+    tool_calls           INTEGER NOT NULL,
+    cost_usd             REAL
+);
+CREATE TABLE IF NOT EXISTS usage_hourly (
+    hour     INTEGER NOT NULL,
+    guild_id INTEGER NOT NULL,
+    provider TEXT NOT NULL,
+    model    TEXT NOT NULL,
+    calls INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL, cached_prompt_tokens INTEGER NOT NULL,
+    tool_calls INTEGER NOT NULL, cost_usd REAL NOT NULL, unpriced_calls INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, hour, provider, model)
+);
+CREATE INDEX IF NOT EXISTS usage_hourly_hour ON usage_hourly (hour);
+CREATE TABLE IF NOT EXISTS usage_totals (
+    guild_id INTEGER NOT NULL,
+    provider TEXT NOT NULL,
+    model    TEXT NOT NULL,
+    calls INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL, cached_prompt_tokens INTEGER NOT NULL,
+    tool_calls INTEGER NOT NULL, cost_usd REAL NOT NULL, unpriced_calls INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, provider, model)
+);
+"""
+
+_COLUMNS = ", ".join(_MEASURES)
+_PLACEHOLDERS = ", ".join("?" for _ in _MEASURES)
+_ACCUMULATE = ", ".join(f"{m} = {m} + excluded.{m}" for m in _MEASURES)
+
+
+def guild_of(metadata: Optional[Dict[str, Any]]) -> int:
+    """The guild id in a chat call's metadata ("DM"/absent -> 0)."""
+    try:
+        return int((metadata or {}).get("guild"))
+    except (TypeError, ValueError):
+        return 0
+
+
+class UsageLedger:
+    """One SQLite connection, used from the event loop; the lock is for the
+    odd executor caller."""
+
+    def __init__(self, path=LEDGER_PATH, clock=time.time):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.chmod(f'{self.path}{suffix}', LEDGER_FILE_MODE)
+            except OSError:
+                pass
+        self._pending: List[Tuple] = []
+
+    # --- writes ---------------------------------------------------------
+
+    def record(self, usage: UsageRecord, guild_id: int = 0, kind: str = "chat") -> None:
+        self._pending.append((
+            usage.timestamp, guild_id or 0, usage.provider, usage.model or "", kind,
+            usage.prompt_tokens or 0, usage.completion_tokens or 0,
+            usage.cached_prompt_tokens or 0, usage.cache_write_tokens or 0,
+            usage.tool_calls or 0, usage.estimated_cost_usd))
+
+    def flush(self) -> int:
+        """Append buffered records and fold them into the rollups, in one
+        transaction. Returns records written. If the write fails the batch
+        goes back in front of anything recorded meanwhile and the error
+        propagates; the next flush retries it."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        try:
+            self._append(batch)
+        except BaseException:
+            self._pending[:0] = batch
+            raise
+        return len(batch)
+
+    def _append(self, batch: List[Tuple]) -> None:
+        hourly: Dict[Tuple, List] = {}
+        totals: Dict[Tuple, List] = {}
+        for ts, guild_id, provider, model, _kind, prompt, completion, cached, _write, tools, cost in batch:
+            measures = (1, prompt, completion, cached, tools, cost or 0.0, int(cost is None))
+            for rollup, key in ((hourly, (int(ts // 3600), guild_id, provider, model)),
+                                (totals, (guild_id, provider, model))):
+                sums = rollup.setdefault(key, [0] * len(_MEASURES))
+                for i, value in enumerate(measures):
+                    sums[i] += value
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO usage (ts, guild_id, provider, model, kind, prompt_tokens, '
+                'completion_tokens, cached_prompt_tokens, cache_write_tokens, tool_calls, cost_usd) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+            self._conn.executemany(
+                f'INSERT INTO usage_hourly (hour, guild_id, provider, model, {_COLUMNS}) '
+                f'VALUES (?, ?, ?, ?, {_PLACEHOLDERS}) '
+                f'ON CONFLICT (guild_id, hour, provider, model) DO UPDATE SET {_ACCUMULATE}',
+                [key + tuple(sums) for key, sums in hourly.items()])
+            self._conn.executemany(
+                f'INSERT INTO usage_totals (guild_id, provider, model, {_COLUMNS}) '
+                f'VALUES (?, ?, ?, {_PLACEHOLDERS}) '
+                f'ON CONFLICT (guild_id, provider, model) DO UPDATE SET {_ACCUMULATE}',
+                [key + tuple(sums) for key, sums in totals.items()])
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._conn.close()
+
+    # --- reads ----------------------------------------------------------
+
+    def _flush_for_read(self) -> None:
+        """A read answers from what is persisted even when the pending
+        batch can't be written right now (flush keeps it for next time)."""
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            logger.warning(f"Usage ledger flush failed; reading persisted rows only: {e}")
+
+    def spend(self, guild_id: Optional[int] = None, hours: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Per provider/model sums, most expensive first: over the last
+        `hours` whole hours (the current one included), or all time when
+        None. `guild_id` None sums every guild."""
+        self._flush_for_read()
+        where, args = [], []
+        if hours is None:
+            table = 'usage_totals'
+        else:
+            table = 'usage_hourly'
+            where.append('hour > ?')
+            args.append(int(self._clock() // 3600) - hours)
+        if guild_id is not None:
+            where.append('guild_id = ?')
+            args.append(guild_id)
+        sql = (f'SELECT provider, model, {", ".join(f"SUM({m})" for m in _MEASURES)} '
+               f'FROM {table}' + (f' WHERE {" AND ".join(where)}' if where else '')
+               + ' GROUP BY provider, model ORDER BY SUM(cost_usd) DESC, SUM(calls) DESC')
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [_rollup_row(row) for row in rows]
+
+    def hourly_cost(self, guild_id: Optional[int] = None, hours: int = 24) -> List[float]:
+        """Estimated USD per hour for the last `hours` hours, oldest first."""
+        self._flush_for_read()
+        now_hour = int(self._clock() // 3600)
+        sql = 'SELECT hour, SUM(cost_usd) FROM usage_hourly WHERE hour > ?'
+        args: List[Any] = [now_hour - hours]
+        if guild_id is not None:
+            sql += ' AND guild_id = ?'
+            args.append(guild_id)
+        with self._lock:
+            costs = dict(self._conn.execute(sql + ' GROUP BY hour', args).fetchall())
+        return [costs.get(hour, 0.0) for hour in range(now_hour - hours + 1, now_hour + 1)]
+
+
+def _rollup_row(row) -> Dict[str, Any]:
+    result = {"provider": row[0], "model": row[1]}
+    result.update(zip(_MEASURES, row[2:]))
+    result["cost_usd"] = round(result["cost_usd"], 6)
+    priced = result["calls"] - result["unpriced_calls"]
+    result["cost_per_call"] = round(result["cost_usd"] / priced, 6) if priced else None
+    return result
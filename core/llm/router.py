@@ -0,0 +1,295 @@
+"""Provider failover, circuit breakers and hedged requests.
+
+A guild's chat call used to go to its one configured provider; an error or
+a stall there meant an "Error calling … API" reply while the rest of the
+catalog sat idle. `ProviderRouter` wraps `LLMClient.chat` /
+`LLMClient.chat_stream` and walks the guild's chain instead: the current
+provider/model first, then `ProviderConfig.fallbacks` (the guild's
+`ai_fallback_chain`).
+
+- Failover: a candidate that raises — before producing its first token,
+  for streams — hands over to the next one in the chain. Once a stream has
+  yielded text the reply is committed to it.
+- Circuit breakers, one per provider, fed by every call's outcome: a run of
+  FAILURE_THRESHOLD errors, or a failure ratio of FAILURE_RATIO over the
+  last OUTCOME_WINDOW calls (a call SLOW_FACTOR times slower than its p95
+  counts as a failure), opens the breaker. An open provider is skipped for
+  OPEN_SECONDS, doubling per re-open up to MAX_OPEN_SECONDS; then one
+  probe call decides whether it closes again.
+- Hedging (`ProviderConfig.hedge`, the guild's `ai_hedge_requests`): when
+  the first candidate hasn't answered — or streamed its first token —
+  within the p95 of its recent latencies, the next candidate is started as
+  well and whichever answers first wins; the other is cancelled.
+
+The LLMResponse that comes back is the answering provider's own, so usage
+and cost are attributed to whoever actually answered. Agent runs are not
+routed: their tools have side effects a retry on another provider would
+repeat.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from .client import LLMClient, LLMResponse, ProviderConfig
+
+# Breaker: consecutive failures that open it, or this failure ratio over the
+# last OUTCOME_WINDOW calls (once at least MIN_OUTCOMES are in).
+FAILURE_THRESHOLD = 3
+FAILURE_RATIO = 0.5
+OUTCOME_WINDOW = 20
+MIN_OUTCOMES = 6
+# How long an opened breaker skips its provider; doubles per re-open.
+OPEN_SECONDS = 30.0
+MAX_OPEN_SECONDS = 600.0
+# A success this many times slower than the p95 counts as a failure.
+SLOW_FACTOR = 3.0
+# Hedge deadline = p95 of the last LATENCY_SAMPLES latencies, once there are
+# MIN_LATENCY_SAMPLES of them (DEFAULT_HEDGE_DELAY until then), floored at
+# MIN_HEDGE_DELAY so a fast provider isn't hedged on every jitter.
+LATENCY_SAMPLES = 50
+MIN_LATENCY_SAMPLES = 10
+DEFAULT_HEDGE_DELAY = 10.0
+MIN_HEDGE_DELAY = 1.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """Per-provider health from live call outcomes (see module docstring)."""
+
+    def __init__(self):
+        self.outcomes: deque = deque(maxlen=OUTCOME_WINDOW)  # True = failure
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.open_seconds = OPEN_SECONDS
+        self.opened = False
+        self.probing = False
+
+    def state(self, now: float) -> str:
+        if not self.opened:
+            return CLOSED
+        return OPEN if now < self.open_until or self.probing else HALF_OPEN
+
+    def allows(self, now: float) -> bool:
+        return self.state(now) != OPEN
+
+    def begin(self, now: float) -> None:
+        """A call is starting; in the half-open state it is THE probe."""
+        if self.state(now) == HALF_OPEN:
+            self.probing = True
+
+    def record(self, failed: bool, now: float) -> None:
+        self.outcomes.append(failed)
+        if not failed:
+            self.consecutive_failures = 0
+            if self.probing or self.opened:
+                # Probe succeeded: close and forget the bad run.
+                self.opened = self.probing = False
+                self.open_seconds = OPEN_SECONDS
+                self.outcomes.clear()
+            return
+        self.consecutive_failures += 1
+        if self.probing:
+            self.probing = False
+            self.open_seconds = min(self.open_seconds * 2, MAX_OPEN_SECONDS)
+            self._open(now)
+        elif not self.opened and (
+                self.consecutive_failures >= FAILURE_THRESHOLD
+                or (len(self.outcomes) >= MIN_OUTCOMES
+                    and sum(self.outcomes) / len(self.outcomes) >= FAILURE_RATIO)):
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.opened = True
+        self.open_until = now + self.open_seconds
+
+
+class LatencyStats:
+    """Recent latencies of one (provider, model, mode)."""
+
+    def __init__(self):
+        self.samples: deque = deque(maxlen=LATENCY_SAMPLES)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class ProviderRouter:
+    def __init__(self, client: LLMClient, clock=time.monotonic):
+        self.client = client
+        self.logger = client.logger
+        self._clock = clock
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latency: Dict[Tuple[str, Optional[str], str], LatencyStats] = {}
+        self.stats = {"failovers": 0, "hedges": 0, "hedge_wins": 0, "skipped_open": 0}
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        breaker = self.breakers.get(provider)
+        if breaker is None:
+            breaker = self.breakers[provider] = CircuitBreaker()
+        return breaker
+
+    def hedge_delay(self, candidate: ProviderConfig, mode: str) -> float:
+        stats = self.latency.get((candidate.provider, candidate.model, mode))
+        p95 = stats.p95() if stats else None
+        return DEFAULT_HEDGE_DELAY if p95 is None else max(MIN_HEDGE_DELAY, p95)
+
+    def candidates(self, provider_config: ProviderConfig) -> List[ProviderConfig]:
+        """The chain minus providers whose breaker is open. If every one is
+        open the primary is tried anyway — refusing outright helps no one."""
+        now = self._clock()
+        chain = [provider_config] + list(provider_config.fallbacks)
+        allowed = []
+        for candidate in chain:
+            if self.breaker(candidate.provider).allows(now):
+                allowed.append(candidate)
+            else:
+                self.stats["skipped_open"] += 1
+        return allowed or [provider_config]
+
+    # ------------------------------------------------------------------
+
+    async def chat(self, provider_config: ProviderConfig, messages: List[Dict],
+                   metadata: Optional[Dict] = None) -> LLMResponse:
+        """LLMClient.chat across the guild's chain (failover, breakers,
+        optional hedging). Raises the last candidate's error if all fail."""
+        async def call(candidate):
+            return await self.client.chat(candidate, messages, metadata)
+        response, _candidate = await self._race(
+            provider_config, call, "chat", discard=lambda response: None)
+        return response
+
+    async def chat_stream(self, provider_config: ProviderConfig, messages: List[Dict],
+                          metadata: Optional[Dict] = None
+                          ) -> AsyncIterator[Union[str, LLMResponse]]:
+        """LLMClient.chat_stream across the chain. Candidates race to their
+        first item (the p95 of time-to-first-token is the hedge deadline);
+        the winner's stream is then relayed to the end."""
+        async def first_item(candidate):
+            stream = self.client.chat_stream(candidate, messages, metadata)
+            try:
+                return stream, await stream.__anext__()
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def discard(result):
+            await result[0].aclose()
+
+        (stream, first), candidate = await self._race(
+            provider_config, first_item, "stream", discard=discard)
+        try:
+            yield first
+            async for item in stream:
+                yield item
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Too late to fail over (text is out), but it still counts.
+            self.breaker(candidate.provider).record(True, self._clock())
+            raise
+        finally:
+            await stream.aclose()
+
+    # ------------------------------------------------------------------
+
+    async def _attempt(self, candidate: ProviderConfig, call, mode: str):
+        breaker = self.breaker(candidate.provider)
+        started = self._clock()
+        breaker.begin(started)
+        try:
+            result = await call(candidate)
+        except asyncio.CancelledError:
+            # A hedge loser: no verdict. A cancelled probe frees the slot.
+            breaker.probing = False
+            raise
+        except Exception:
+            breaker.record(True, self._clock())
+            raise
+        elapsed = self._clock() - started
+        stats = self.latency.setdefault((candidate.provider, candidate.model, mode), LatencyStats())
+        p95 = stats.p95()
+        breaker.record(p95 is not None and elapsed > SLOW_FACTOR * p95, self._clock())
+        stats.add(elapsed)
+        return result
+
+    async def _race(self, provider_config: ProviderConfig,
+                    call: Callable[[ProviderConfig], Awaitable[Any]], mode: str,
+                    discard: Callable[[Any], Any]) -> Tuple[Any, ProviderConfig]:
+        """(result, candidate that produced it). One candidate runs at a
+        time; a failure starts the next, and with hedging on a candidate
+        that outlives its deadline is joined by the next one."""
+        pending = self.candidates(provider_config)
+        running: Dict[asyncio.Task, Tuple[ProviderConfig, float]] = {}
+        last_error: Optional[BaseException] = None
+        hedged = False
+
+        def launch():
+            candidate = pending.pop(0)
+            task = asyncio.ensure_future(self._attempt(candidate, call, mode))
+            task.add_done_callback(_retrieve)
+            running[task] = (candidate, self._clock())
+
+        launch()
+        try:
+            while running:
+                timeout = None
+                if provider_config.hedge and pending and len(running) == 1:
+                    candidate, started = next(iter(running.values()))
+                    timeout = max(0.0, self.hedge_delay(candidate, mode) - (self._clock() - started))
+                done, _ = await asyncio.wait(running, timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    self.stats["hedges"] += 1
+                    self.logger.info(f"LLM hedge: {candidate.provider} slower than "
+                                     f"{self.hedge_delay(candidate, mode):.1f}s, also trying "
+                                     f"{pending[0].provider}")
+                    launch()
+                    continue
+                winner = None
+                for task in done:
+                    candidate, _started = running.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        self.logger.warning(f"LLM provider {candidate.provider} failed: {last_error}")
+                    elif winner is None:
+                        winner = (task.result(), candidate)
+                    else:
+                        await _maybe_await(discard(task.result()))
+                if winner is not None:
+                    if hedged and winner[1] is not provider_config:
+                        self.stats["hedge_wins"] += 1
+                    return winner
+                if not running and pending:
+                    self.stats["failovers"] += 1
+                    launch()
+            raise last_error
+        finally:
+            for task in running:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await _maybe_await(discard(task.result()))  # finished too late
+
+
+def _retrieve(task: asyncio.Task) -> None:
+    # Losing tasks may fail after we stopped listening; don't log that as
+    # "exception was never retrieved".
+    if not task.cancelled():
+        task.exception()
+
+
+async def _maybe_await(value):
+    if asyncio.iscoroutine(value):
+        await value
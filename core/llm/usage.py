@@ -2,8 +2,9 @@
 
 The original cog read `response.usage` off the OpenAI SDK response but
 never looked at it. This module gives that data a home: a small record
-type plus a best-effort USD cost estimate and an in-memory aggregator that
-cogs can use for `!aiinfo`-style reporting.
+type plus a best-effort USD cost estimate. Records are persisted and
+rolled up by guild/provider/model/hour in core/llm/ledger.py, which backs
+the settings panel's Usage tab and the `ai_usage_summary` op.
 
 Pricing table is intentionally coarse (per-provider/model prefix, USD per
 1M tokens) -- it exists to give a rough running total, not to reconcile
@@ -43,6 +44,18 @@ _PRICING_USD_PER_MTOK: Dict[str, Dict[str, tuple]] = {
     },
 }
 
+# Price of a cached prompt token as a fraction of the provider's normal
+# prompt price: cache reads are discounted everywhere; Anthropic also bills
+# writing the cache (5-minute TTL) at a premium. Same coarseness as above.
+_CACHE_READ_MULTIPLIER: Dict[str, float] = {
+    "openai": 0.10,
+    "anthropic": 0.10,
+    "xai": 0.25,
+}
+_CACHE_WRITE_MULTIPLIER: Dict[str, float] = {
+    "anthropic": 1.25,
+}
+
 
 def _match_prices(provider: str, model: str) -> Optional[tuple]:
     """(prompt_price, completion_price) per Mtok for a model — exact match,
@@ -86,16 +99,26 @@ class UsageRecord:
     # runs; 0 for plain chat). A zero here on an action request is the
     # "model narrated instead of acting" failure signature.
     tool_calls: int = 0
+    # Prompt tokens served from / written to the provider's prompt cache.
+    # Both are already counted in prompt_tokens.
+    cached_prompt_tokens: int = 0
+    cache_write_tokens: int = 0
 
 
 def estimate_cost(record: UsageRecord) -> Optional[float]:
     """Best-effort USD cost estimate for a UsageRecord. None if the model
-    isn't in the pricing table (unknown, not zero)."""
+    isn't in the pricing table (unknown, not zero). Cached prompt tokens
+    are billed at the provider's cache read/write rate."""
     prices = _match_prices(record.provider, record.model)
     if prices is None:
         return None
 
     prompt_price, completion_price = prices
-    cost = (record.prompt_tokens / 1_000_000) * prompt_price
+    read_price = prompt_price * _CACHE_READ_MULTIPLIER.get(record.provider, 1.0)
+    write_price = prompt_price * _CACHE_WRITE_MULTIPLIER.get(record.provider, 1.0)
+    uncached = record.prompt_tokens - record.cached_prompt_tokens - record.cache_write_tokens
+    cost = (max(uncached, 0) / 1_000_000) * prompt_price
+    cost += (record.cached_prompt_tokens / 1_000_000) * read_price
+    cost += (record.cache_write_tokens / 1_000_000) * write_price
     cost += (record.completion_tokens / 1_000_000) * completion_price
     return round(cost, 6)
@@ -0,0 +1,178 @@
+"""GPT memory capture: pattern matching and the per-guild memory index.
+
+`Gpt.capture_and_store_memories` runs on every message the bot sees. It
+used to run eleven uncompiled regexes one by one, de-duplicate by scanning
+the guild's whole memory list per new memory, and scan that list again for
+expired entries on every message. Here:
+
+- `MemoryMatcher` gates the patterns behind one compiled keyword regex:
+  a message is scanned once for trigger words ("I", "my", "call me",
+  "remind me", "you're"), and only the patterns those triggers can start
+  are run. Most messages trip no trigger and cost one regex search.
+- `MemoryIndex` wraps a guild's stored list (the `gpt_memories` config
+  value, still the source of truth and the on-disk format) with a
+  (text, type, sender) → memory dict for de-duplication and a min-heap of
+  expiry times, so a purge touches only what expired.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# (type, pattern, duration in seconds, trigger) — the trigger names the
+# keyword group in _TRIGGERS that every match of the pattern starts with.
+MEMORY_PATTERNS = (
+    ("directive", r"you'?re\s+to\s+always\s+(.+)", 604800, "you"),  # 1 week
+    ("stated_name", r"\bmy name(?:'s| is)?\s+([^\.,!\n]+)", 7776000, "my"),  # 90 days
+    ("nickname", r"\bcall me\s+([^\.,!\n]+)", 7776000, "call"),  # 90 days
+    ("personal_statement", r"\bI(?:'m| am)\s+(.+)", 86400, "i"),  # 1 day
+    ("desire_request", r"\bI(?: want|'?d like)\s+(.+)", 43200, "i"),  # 12 hours
+    ("positive_preference", r"\bI love\s+(.+)", 2592000, "i"),  # 30 days
+    ("negative_preference", r"\bI hate\s+(.+)", 2592000, "i"),  # 30 days
+    ("reminder", r"\bremind me to\s+(.+)", 86400, "remind"),  # 1 day
+    ("emotional_state", r"\bI (?:feel|am feeling)\s+(.+)", 43200, "i"),  # 12 hours
+    ("birthday", r"\bmy birthday(?:'s| is)?\s+([^\.,!\n]+)", 31536000, "my"),  # 1 year
+    ("enthusiasm", r"\bI(?:'m| am) excited (?:about|for)\s+(.+)", 172800, "i"),  # 2 days
+)
+
+# Each alternative is a prefix of every pattern that names it, so a message
+# with no trigger cannot match any pattern.
+_TRIGGERS = re.compile(
+    r"(?P<you>you'?re\s)|\b(?:(?P<my>my\s)|(?P<call>call me)|(?P<remind>remind me)|(?P<i>i['\sd]))",
+    re.I)
+
+MemoryKey = Tuple[str, str, object]  # (text, type, sender)
+
+
+class MemoryMatch(NamedTuple):
+    type: str
+    text: str
+    duration: int
+
+
+class MemoryMatcher:
+    """The MEMORY_PATTERNS, compiled once and grouped by trigger."""
+
+    def __init__(self, patterns=MEMORY_PATTERNS):
+        self._by_trigger: Dict[str, List[Tuple[str, re.Pattern, int]]] = {}
+        self._order = {}
+        for order, (kind, pattern, duration, trigger) in enumerate(patterns):
+            self._by_trigger.setdefault(trigger, []).append(
+                (kind, re.compile(pattern, re.I), duration))
+            self._order[kind] = order
+
+    def scan(self, content: str) -> List[MemoryMatch]:
+        """Every pattern that matches `content`, in MEMORY_PATTERNS order
+        (first match of each, whole matched text) — the same results the
+        patterns give when run one by one."""
+        triggers = {m.lastgroup for m in _TRIGGERS.finditer(content)}
+        if not triggers:
+            return []
+        found = []
+        for trigger in triggers:
+            for kind, pattern, duration in self._by_trigger[trigger]:
+                m = pattern.search(content)
+                if m:
+                    found.append(MemoryMatch(kind, m.group(0), duration))
+        found.sort(key=lambda match: self._order[match.type])
+        return found
+
+
+def memory_key(memory: Dict) -> MemoryKey:
+    return (memory.get("text", ""), memory.get("type", ""), memory.get("sender"))
+
+
+class MemoryIndex:
+    """De-dup index and expiry heap over one guild's stored memory list.
+
+    `memories` is the config list itself and is mutated in place (the
+    config store's lists are shared references — see docs/config-system.md);
+    the caller persists it with config.set after a change. Removal swaps
+    the last entry into the hole, so list order is not preserved."""
+
+    # Rebuild the heap once stale entries (refreshed memories leave their old
+    # expiry behind) outnumber live ones by this factor.
+    HEAP_SLACK = 2
+
+    def __init__(self, memories: List[Dict]):
+        self.memories = memories
+        self._seq = itertools.count()
+        self._positions: Dict[MemoryKey, int] = {}
+        unique = []
+        for memory in memories:
+            key = memory_key(memory)
+            if key not in self._positions:  # first of any legacy duplicates wins
+                self._positions[key] = len(unique)
+                unique.append(memory)
+        # True when legacy duplicates were dropped from the list (persist it).
+        self.compacted = len(unique) != len(memories)
+        if self.compacted:
+            memories[:] = unique
+        self._heap: List[Tuple[float, int, MemoryKey]] = [
+            (m.get("expires", 0), next(self._seq), memory_key(m)) for m in unique]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self.memories)
+
+    def get(self, key: MemoryKey) -> Optional[Dict]:
+        position = self._positions.get(key)
+        return None if position is None else self.memories[position]
+
+    def upsert(self, memory: Dict) -> bool:
+        """Add `memory`, or refresh the stored duplicate's expires /
+        personality_version / stored_at from it. True if anything changed."""
+        key = memory_key(memory)
+        existing = self.get(key)
+        if existing is None:
+            self._positions[key] = len(self.memories)
+            self.memories.append(memory)
+        else:
+            fields = ("expires", "personality_version", "stored_at")
+            if all(existing.get(f) == memory[f] for f in fields):
+                return False
+            for f in fields:
+                existing[f] = memory[f]
+        heapq.heappush(self._heap, (memory["expires"], next(self._seq), key))
+        if len(self._heap) > self.HEAP_SLACK * len(self.memories) + 64:
+            self._rebuild_heap()
+        return True
+
+    def next_expiry(self) -> Optional[float]:
+        """Earliest expiry among stored memories (stale heap entries are
+        dropped on the way), or None when empty."""
+        while self._heap:
+            expires, _seq, key = self._heap[0]
+            memory = self.get(key)
+            if memory is not None and memory.get("expires", 0) == expires:
+                return expires
+            heapq.heappop(self._heap)
+        return None
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Remove every memory with expires <= now; returns how many."""
+        now = time.time() if now is None else now
+        removed = 0
+        while True:
+            expires = self.next_expiry()
+            if expires is None or expires > now:
+                return removed
+            _expires, _seq, key = heapq.heappop(self._heap)
+            self._remove(key)
+            removed += 1
+
+    def _remove(self, key: MemoryKey) -> None:
+        position = self._positions.pop(key)
+        last = self.memories.pop()
+        if position < len(self.memories):
+            self.memories[position] = last
+            self._positions[memory_key(last)] = position
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(self.memories[position].get("expires", 0), next(self._seq), key)
+                      for key, position in self._positions.items()]
+        heapq.heapify(self._heap)
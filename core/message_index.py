@@ -0,0 +1,303 @@
+"""Local full-text message index (SQLite FTS5) — search_history's fallback.
+
+`search_history` prefers Discord's own guild search endpoint. When that is
+cold, withdrawn or rate-limited it used to degrade to a 200-message scan of a
+single channel, and guild-wide questions got "index unavailable". This module
+keeps an opt-in local copy of message rows to answer from instead:
+
+    messages(id, guild_id, channel_id, author_id, content, created_at)
+    messages_fts                    -- FTS5 over content (external content)
+    backfill(channel_id, ...)       -- per-channel history-walk checkpoints:
+                                       oldest_id going back, newest_id going
+                                       forward
+
+It is headless: the `search_index` cog feeds it (gateway listeners in real
+time, plus a paced backfill job) and registers the live instance with
+`activate()`; core/ops.py only ever asks `active_index()`.
+
+The live feed only sees what arrives while the bot runs. `newest_id` is the
+newest id up to which a channel's index has no gap; after a restart the
+backfill first walks forward from it to pick up what was posted while the
+bot was offline, and until that catch-up is done this process doesn't
+report the channel complete. (Edits and deletes made offline to messages
+older than newest_id stay unseen; no walk short of a full rescan finds them.) Rows come back in
+exactly serialize_message's shape, so consumers can't tell which path
+answered except by the payload's `note`.
+
+Opt-in via the global `message_index_enabled` bool (restart-bound). The file
+holds message content, so it is created 0600 like the config store.
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+INDEX_PATH = Path('logs/message_index.sqlite3')
+INDEX_FILE_MODE = 0o600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id         INTEGER PRIMARY KEY,
+    guild_id   INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    author_id  INTEGER NOT NULL,
+    content    TEXT NOT NULL DEFAULT '',
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_guild ON messages (guild_id, id);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel_id, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TABLE IF NOT EXISTS backfill (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id   INTEGER NOT NULL,
+    oldest_id  INTEGER,
+    complete   INTEGER NOT NULL DEFAULT 0,
+    newest_id  INTEGER
+);
+"""
+
+_active = None
+
+
+def activate(index: Optional['MessageIndex']) -> None:
+    """Register (or with None, clear) the index search_history may use."""
+    global _active
+    _active = index
+
+
+def active_index() -> Optional['MessageIndex']:
+    return _active
+
+
+def row_from_message(message: Any) -> Dict[str, Any]:
+    """A discord.Message as an index row: serialize_message's shape plus
+    guild_id. Kept local so this module never imports core.ops."""
+    created = getattr(message, 'created_at', None)
+    return {
+        "id": message.id,
+        "guild_id": message.guild.id,
+        "channel_id": message.channel.id,
+        "author_id": message.author.id,
+        "content": message.content or "",
+        "created_at": created.isoformat() if created else None,
+    }
+
+
+def fts_phrase(text: str) -> str:
+    """Quote user text as one FTS5 phrase: token (whole-word) matching like
+    Discord's search bar, with no query-syntax injection."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+class MessageIndex:
+    """One SQLite connection, shared by the event loop (writes, searches)
+    and nothing else; the lock is for the odd executor caller."""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(backfill)')}
+        if 'newest_id' not in columns:  # an index created before the catch-up walk
+            self._conn.execute('ALTER TABLE backfill ADD COLUMN newest_id INTEGER')
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.chmod(f'{self.path}{suffix}', INDEX_FILE_MODE)
+            except OSError:
+                pass
+        # Gateway rows are buffered and written in batches; searches flush
+        # first, so a query always sees every message the bot has received.
+        self._pending: List[Tuple] = []
+        # Where each channel's gap since the last run starts, read before
+        # the live feed adds anything; and the channels whose gap has been
+        # walked (this process only), whose flushed rows advance newest_id.
+        self._gap_starts = self._read_gap_starts()
+        self._caught_up: Set[int] = set()
+
+    # --- writes ---------------------------------------------------------
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self._pending.append((row["id"], row["guild_id"], row["channel_id"],
+                              row["author_id"], row["content"], row["created_at"]))
+
+    def add_many(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.add(row)
+        self.flush()
+
+    def flush(self) -> int:
+        """Write buffered rows in one transaction. Returns rows written."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        newest: Dict[int, Tuple[int, int]] = {}
+        for mid, guild_id, channel_id, *_rest in batch:
+            if channel_id in self._caught_up and mid > newest.get(channel_id, (0, 0))[1]:
+                newest[channel_id] = (guild_id, mid)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO messages (id, guild_id, channel_id, author_id, content, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET content = excluded.content',
+                batch)
+            self._save_newest(newest)
+        return len(batch)
+
+    def _save_newest(self, newest: Dict[int, Tuple[int, int]]) -> None:
+        """Raise newest_id per channel ({channel: (guild, id)}) - assumes the
+        lock held, inside a transaction."""
+        self._conn.executemany(
+            'INSERT INTO backfill (channel_id, guild_id, newest_id) VALUES (?, ?, ?) '
+            'ON CONFLICT (channel_id) DO UPDATE SET '
+            'newest_id = MAX(COALESCE(newest_id, 0), excluded.newest_id)',
+            [(channel_id, guild_id, mid) for channel_id, (guild_id, mid) in newest.items()])
+
+    def edit(self, message_id: int, content: str) -> None:
+        self.flush()
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE messages SET content = ? WHERE id = ?',
+                               (content or "", message_id))
+
+    def delete(self, message_ids: Sequence[int]) -> None:
+        self.flush()
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM messages WHERE id = ?',
+                                   [(mid,) for mid in message_ids])
+
+    # --- backfill checkpoints -------------------------------------------
+
+    def checkpoint(self, channel_id: int) -> Tuple[Optional[int], bool]:
+        """(oldest message id backfilled, complete?) for a channel."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT oldest_id, complete FROM backfill WHERE channel_id = ?',
+                (channel_id,)).fetchone()
+        return (row[0], bool(row[1])) if row else (None, False)
+
+    def save_checkpoint(self, guild_id: int, channel_id: int,
+                        oldest_id: Optional[int], complete: bool) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO backfill (channel_id, guild_id, oldest_id, complete) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (channel_id) DO UPDATE SET '
+                'oldest_id = excluded.oldest_id, complete = excluded.complete',
+                (channel_id, guild_id, oldest_id, int(complete)))
+
+    def _read_gap_starts(self) -> Dict[int, int]:
+        """{channel: newest_id} for every channel a previous run indexed; an
+        index written before that column falls back to its newest row. A
+        channel the backfill never reached has no row: its backward walk
+        starts at the present, so there is no gap to close."""
+        starts = {}
+        rows = self._conn.execute(
+            'SELECT channel_id, newest_id, oldest_id, complete FROM backfill').fetchall()
+        for channel_id, newest_id, oldest_id, complete in rows:
+            if newest_id is None:
+                newest_id = self._conn.execute(
+                    'SELECT MAX(id) FROM messages WHERE channel_id = ?', (channel_id,)).fetchone()[0]
+            if newest_id is None:
+                # Walked but nothing left indexed (an empty channel): every
+                # message after the walk's start is the gap.
+                newest_id = oldest_id if oldest_id is not None else (0 if complete else None)
+            if newest_id is not None:
+                starts[channel_id] = newest_id
+        return starts
+
+    def catch_up_from(self, channel_id: int) -> Optional[int]:
+        """The id the forward walk resumes after, or None when the channel
+        has no gap left to close."""
+        return self._gap_starts.get(channel_id)
+
+    def save_newest(self, guild_id: int, channel_id: int, newest_id: int) -> None:
+        """Checkpoint the forward walk."""
+        if channel_id in self._gap_starts:
+            self._gap_starts[channel_id] = max(self._gap_starts[channel_id], newest_id)
+        with self._lock, self._conn:
+            self._save_newest({channel_id: (guild_id, newest_id)})
+
+    def mark_caught_up(self, guild_id: int, channel_id: int) -> None:
+        """The forward walk reached the present: from here on the live feed
+        keeps the channel gap-free, so its rows advance newest_id."""
+        self.flush()
+        self._gap_starts.pop(channel_id, None)
+        self._caught_up.add(channel_id)
+        with self._lock:
+            newest = self._conn.execute(
+                'SELECT MAX(id) FROM messages WHERE channel_id = ?', (channel_id,)).fetchone()[0]
+        if newest is not None:
+            self.save_newest(guild_id, channel_id, newest)
+
+    def backfill_complete(self, guild_id: int,
+                          channel_ids: Sequence[int] = ()) -> bool:
+        """True when every known channel in scope finished its backfill and,
+        in this process, caught up on what was posted while it was down."""
+        query = 'SELECT channel_id, complete FROM backfill WHERE guild_id = ?'
+        params: List[Any] = [guild_id]
+        if channel_ids:
+            query += f' AND channel_id IN ({",".join("?" * len(channel_ids))})'
+            params.extend(channel_ids)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        wanted = len(channel_ids) if channel_ids else len(rows)
+        return (bool(rows) and len(rows) == wanted
+                and all(complete and channel_id in self._caught_up for channel_id, complete in rows))
+
+    # --- reads ----------------------------------------------------------
+
+    def has_guild(self, guild_id: int) -> bool:
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM messages WHERE guild_id = ? LIMIT 1',
+                (guild_id,)).fetchone() is not None
+
+    def search(self, guild_id: int, channel_ids: Sequence[int] = (),
+               limit: int = 100, author_id: Optional[int] = None,
+               contains: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Newest-first hits in serialize_message's shape, plus the total
+        match count — the same contract as core.ops._index_search."""
+        self.flush()
+        where = ['m.guild_id = ?']
+        params: List[Any] = [guild_id]
+        join = ''
+        if contains:
+            join = 'JOIN messages_fts f ON f.rowid = m.id'
+            where.append('messages_fts MATCH ?')
+            params.append(fts_phrase(contains))
+        if channel_ids:
+            where.append(f'm.channel_id IN ({",".join("?" * len(channel_ids))})')
+            params.extend(channel_ids)
+        if author_id is not None:
+            where.append('m.author_id = ?')
+            params.append(author_id)
+        clause = f'FROM messages m {join} WHERE {" AND ".join(where)}'
+        with self._lock:
+            total = self._conn.execute(f'SELECT COUNT(*) {clause}', params).fetchone()[0]
+            rows = self._conn.execute(
+                f'SELECT m.id, m.channel_id, m.author_id, m.content, m.created_at '
+                f'{clause} ORDER BY m.id DESC LIMIT ?', [*params, limit]).fetchall()
+        hits = [{"id": r[0], "channel_id": r[1], "author_id": r[2],
+                 "content": r[3], "created_at": r[4]} for r in rows]
+        return hits, total
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
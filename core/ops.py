@@ -65,6 +65,8 @@ from __future__ import annotations
 import asyncio
 import inspect
 import re
+import time
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from enum import Enum, IntEnum
@@ -73,6 +75,7 @@ from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import discord
 
+from core import message_index
 from core.dm_log import list_dm_users, load_dms, log_dm, row_from_message
 from core.utils import is_admin, is_superadmin
 
@@ -168,6 +171,7 @@ OP_GROUPS: Dict[str, str] = {
     "integrations": "Integrations",
     "auto-response": "Auto-responses",   # auto_response.py
     "media": "Media library",            # media.py
+    "ai-usage": "AI usage",              # gpt.py
 }
 
 # Where an op came from. Assigned by the REGISTRATION PATH, never accepted
@@ -1318,6 +1322,70 @@ async def remove_reaction(ctx: OpContext, message, emoji: str):
     return True
 
 
+# Discord's search endpoint pages 25 hits at a time. After page 0 reports
+# total_results the remaining offsets are fetched concurrently, at most this
+# many in flight; discord.py's per-bucket limiter (driven by the
+# X-RateLimit-* response headers) still queues anything over the bucket's
+# remaining budget, so the fan-out bound only caps burst size.
+_SEARCH_PAGE_SIZE = 25
+_SEARCH_PAGE_CONCURRENCY = 4
+# Identical queries (agents often re-ask within one conversation) are served
+# from memory for this long. Raw hits are cached — actor filtering happens in
+# the caller, per call — so one user's cache entry can't leak to another.
+_SEARCH_CACHE_TTL = 30.0
+_SEARCH_CACHE_MAX = 256
+_search_cache: Dict[Tuple, Tuple[float, int, List[Dict[str, Any]], Any]] = {}
+_SEARCH_TIMING_SAMPLES = 256
+_search_stats: Dict[str, Any] = {
+    "searches": 0, "cache_hits": 0, "pages": 0,
+    "page_ms": deque(maxlen=_SEARCH_TIMING_SAMPLES),
+}
+
+
+def index_search_stats() -> Dict[str, Any]:
+    """Counters plus recent per-page latency (ms) for _index_search."""
+    samples = sorted(_search_stats["page_ms"])
+
+    def pct(p):
+        if not samples:
+            return None
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))], 1)
+    return {
+        "searches": _search_stats["searches"],
+        "cache_hits": _search_stats["cache_hits"],
+        "pages": _search_stats["pages"],
+        "cached_queries": len(_search_cache),
+        "page_ms_p50": pct(0.50),
+        "page_ms_p95": pct(0.95),
+        "page_ms_max": round(samples[-1], 1) if samples else None,
+    }
+
+
+def _cached_search(key, limit):
+    entry = _search_cache.get(key)
+    if entry is None:
+        return None
+    expires, fetched_limit, hits, total = entry
+    if time.monotonic() >= expires:
+        del _search_cache[key]
+        return None
+    # A cached answer covers any limit it fetched, or every limit when it
+    # was exhaustive (fewer hits than asked for).
+    if limit > fetched_limit and len(hits) >= fetched_limit:
+        return None
+    return hits[:limit], total
+
+
+def _store_search(key, limit, hits, total):
+    if len(_search_cache) >= _SEARCH_CACHE_MAX:
+        now = time.monotonic()
+        for stale in [k for k, e in _search_cache.items() if e[0] <= now]:
+            del _search_cache[stale]
+        if len(_search_cache) >= _SEARCH_CACHE_MAX:
+            del _search_cache[next(iter(_search_cache))]  # oldest insert
+    _search_cache[key] = (time.monotonic() + _SEARCH_CACHE_TTL, limit, hits, total)
+
+
 async def _index_search(bot, guild_id, channel_ids, limit, author_id, contains):
     """Query Discord's guild message-search index, newest first — guild-wide
     when channel_ids is empty, else scoped to those channels (the endpoint
@@ -1327,49 +1395,93 @@ async def _index_search(bot, guild_id, channel_ids, limit, author_id, contains):
     keyword search. include_nsfw is always sent because actor visibility is
     enforced by our own gates (and this endpoint excludes age-restricted
     channels by default, which silently hides most of an NSFW-flagged
-    guild). The API pages 25 at a time; raises on any error so the caller
-    can fall back / degrade.
+    guild). The API pages 25 at a time: page 0 is fetched alone for
+    total_results, then the rest concurrently (see _SEARCH_PAGE_CONCURRENCY).
+    Answers are cached for _SEARCH_CACHE_TTL seconds. Raises on any error so
+    the caller can fall back / degrade.
     """
     from discord.http import Route
-    hits = []
-    total = None
-    while len(hits) < limit:
+    _search_stats["searches"] += 1
+    key = (guild_id, tuple(sorted(channel_ids)), author_id, contains)
+    cached = _cached_search(key, limit)
+    if cached is not None:
+        _search_stats["cache_hits"] += 1
+        return cached
+
+    route = Route("GET", "/guilds/{guild_id}/messages/search", guild_id=guild_id)
+
+    async def fetch_page(offset):
         # List-of-tuples so channel_id can repeat; str values for aiohttp.
         params = [
             ("include_nsfw", "true"),
             ("sort_by", "timestamp"),
             ("sort_order", "desc"),
-            ("limit", str(min(25, limit - len(hits)))),
-            ("offset", str(len(hits))),
+            ("limit", str(min(_SEARCH_PAGE_SIZE, limit - offset))),
+            ("offset", str(offset)),
         ]
         params.extend(("channel_id", str(cid)) for cid in channel_ids)
         if author_id is not None:
             params.append(("author_id", str(author_id)))
         if contains is not None:
             params.append(("content", contains))
-        data = await bot.http.request(
-            Route("GET", "/guilds/{guild_id}/messages/search",
-                  guild_id=guild_id),
-            params=params)
-        total = data.get("total_results")
+        started = time.perf_counter()
+        data = await bot.http.request(route, params=params)
+        _search_stats["pages"] += 1
+        _search_stats["page_ms"].append((time.perf_counter() - started) * 1000)
         # Each result is a group of messages with the actual match flagged
         # `hit`; the rest is surrounding context we don't want.
         page = [next((m for m in group if m.get("hit")), group[0])
                 for group in data.get("messages", []) if group]
-        if not page:
-            break
         # Same row shape as serialize_message — the fallback scan path uses
         # it, and consumers must not see two shapes for one op.
-        hits.extend({
+        rows = [{
             "id": int(m["id"]),
             "channel_id": int(m["channel_id"]),
             "author_id": int(m["author"]["id"]),
             "content": m.get("content", ""),
             "created_at": m.get("timestamp"),
-        } for m in page)
-        if total is not None and len(hits) >= int(total):
-            break
-    return hits[:limit], total
+        } for m in page]
+        return rows, data.get("total_results")
+
+    hits, total = await fetch_page(0)
+    if hits and total is not None:
+        wanted = min(limit, int(total))
+        offsets = range(len(hits), wanted, _SEARCH_PAGE_SIZE)
+        gate = asyncio.Semaphore(_SEARCH_PAGE_CONCURRENCY)
+
+        async def bounded(offset):
+            async with gate:
+                return await fetch_page(offset)
+        pages = await asyncio.gather(*(bounded(o) for o in offsets))
+        # Pages are offset windows over a live index: a message arriving
+        # mid-search shifts them, so one hit can appear on two pages.
+        seen = {h["id"] for h in hits}
+        for rows, _total in pages:
+            for row in rows:
+                if row["id"] not in seen:
+                    seen.add(row["id"])
+                    hits.append(row)
+    hits = hits[:limit]
+    _store_search(key, limit, hits, total)
+    return list(hits), total
+
+
+def _search_payload(ctx: OpContext, guild, hits, total):
+    """search_history's result for an index answer (Discord's or the local
+    one): actor-visibility filtered, total withheld when anything was."""
+    pre = len(hits)
+    hits = _drop_hits_actor_cannot_see(ctx, guild, hits)
+    payload = {"messages": hits, "count": len(hits)}
+    if len(hits) < pre:
+        # Some matches sit in channels the invoking user cannot read.
+        # The index's total counts THOSE too, so returning it would
+        # disclose activity in hidden channels — omit it and say why.
+        payload["note"] = ("some matches were in channels the invoking "
+                           "user cannot read and were dropped; "
+                           "total_matches omitted")
+    else:
+        payload["total_matches"] = total
+    return payload
 
 
 def _drop_hits_actor_cannot_see(ctx: OpContext, guild, hits):
@@ -1490,24 +1602,30 @@ async def search_history(ctx: OpContext, guild=None, channels=None,
         hits, total = await _index_search(
             ctx.bot, guild.id, [c.id for c in scoped],
             limit, author_id, contains)
-        pre = len(hits)
-        hits = _drop_hits_actor_cannot_see(ctx, guild, hits)
-        payload = {"messages": hits, "count": len(hits)}
-        if len(hits) < pre:
-            # Some matches sit in channels the invoking user cannot read.
-            # The index's total counts THOSE too, so returning it would
-            # disclose activity in hidden channels — omit it and say why.
-            payload["note"] = ("some matches were in channels the invoking "
-                               "user cannot read and were dropped; "
-                               "total_matches omitted")
-        else:
-            payload["total_matches"] = total
-        return payload
+        return _search_payload(ctx, guild, hits, total)
     except Exception as exc:
         # Index cold, endpoint withdrawn, or intent missing — degrade rather
         # than failing the tool outright, and SAY so in the payload so the
         # model doesn't overclaim "never said".
         logger = getattr(ctx.bot, "logger", None)
+        local = message_index.active_index()
+        if local is not None and local.has_guild(guild.id):
+            # Opt-in local FTS index (cogs/optional/search_index.py): same
+            # row shape and filters, guild-wide and multi-channel included.
+            if logger:
+                logger.warning(
+                    f"search_history index query failed ({type(exc).__name__}: "
+                    f"{exc}); answering from the local message index")
+            scope_ids = [c.id for c in scoped]
+            hits, total = local.search(guild.id, scope_ids, limit, author_id, contains)
+            payload = _search_payload(ctx, guild, hits, total)
+            note = "Discord's search index unavailable; answered from the bot's local message index"
+            if not local.backfill_complete(guild.id, scope_ids):
+                note += ("; its backfill is still running (older history, or "
+                         "messages posted while the bot was offline), so some "
+                         "messages may be missing — don't claim 'never'")
+            payload["note"] = f"{payload['note']}; {note}" if "note" in payload else note
+            return payload
         if logger:
             logger.warning(
                 f"search_history index query failed ({type(exc).__name__}: "
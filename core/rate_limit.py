@@ -0,0 +1,151 @@
+"""Nested sliding-window rate limiter (the GPT cooldown engine).
+
+A key (a guild) may make a call when every window (count, period) has
+room: fewer than `count` recorded calls in the last `period` seconds.
+Recorded times for a key are ascending, so "at least count calls within
+period" is exactly "the count-th most recent call is within period" — one
+indexed read per window instead of a scan. Only the newest max(count)
+timestamps can ever matter, so each key keeps them in a fixed-capacity
+ring and its memory is bounded by the largest window count, not by traffic.
+The ring holds REFUND_SLACK extra entries so that refunding in-flight calls
+(which pops the newest) never exposes a hole where an overwritten oldest
+call used to be.
+
+Times are monotonic while running. `dump`/`load` convert to wall-clock so
+the state survives a restart (the outermost window is the daily spend cap;
+resetting it on every restart would let a crash loop spend freely).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+Window = Tuple[int, float]  # (count, period seconds)
+
+STATE_FILE_MODE = 0o600
+# Calls that may be refunded before the next check without losing history.
+REFUND_SLACK = 16
+
+
+class _Ring:
+    """The newest `capacity` timestamps, oldest first."""
+
+    __slots__ = ("buf", "start", "size")
+
+    def __init__(self, capacity: int):
+        self.buf: List[float] = [0.0] * capacity
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self) -> Iterator[float]:
+        cap = len(self.buf)
+        for i in range(self.size):
+            yield self.buf[(self.start + i) % cap]
+
+    def latest(self, n: int) -> float:
+        """The n-th most recent timestamp (1-based); n <= len(self)."""
+        return self.buf[(self.start + self.size - n) % len(self.buf)]
+
+    def append(self, t: float) -> None:
+        cap = len(self.buf)
+        if self.size < cap:
+            self.buf[(self.start + self.size) % cap] = t
+            self.size += 1
+        else:  # full: overwrite the oldest
+            self.buf[self.start] = t
+            self.start = (self.start + 1) % cap
+
+    def pop(self) -> None:
+        if self.size:
+            self.size -= 1
+
+    def resize(self, capacity: int) -> None:
+        kept = list(self)[-capacity:]
+        self.buf = kept + [0.0] * (capacity - len(kept))
+        self.start = 0
+        self.size = len(kept)
+
+
+class SlidingWindowLimiter:
+    def __init__(self, clock=time.monotonic, wall_clock=time.time):
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._rings: Dict[object, _Ring] = {}
+        # True once a call or refund changed the state since the last dump().
+        self.dirty = False
+
+    def check(self, key, windows: Sequence[Window]) -> Optional[float]:
+        """None if every window has room — the call is then RECORDED — else
+        the seconds until the tightest violated window frees up."""
+        now = self._clock()
+        capacity = max(count for count, _period in windows) + REFUND_SLACK
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = _Ring(capacity)
+        elif len(ring.buf) != capacity:
+            ring.resize(capacity)
+        worst = 0.0
+        for count, period in windows:
+            if len(ring) >= count:
+                # The count-th most recent call exits this window at t+period.
+                worst = max(worst, ring.latest(count) + period - now)
+        if worst > 0:
+            return worst
+        ring.append(now)
+        self.dirty = True
+        return None
+
+    def refund(self, key) -> None:
+        """Un-record the key's most recent call."""
+        ring = self._rings.get(key)
+        if ring:
+            ring.pop()
+            self.dirty = True
+
+    def dump(self, horizon: float) -> Dict[str, List[float]]:
+        """Wall-clock timestamps per key, dropping calls older than
+        `horizon` seconds (no window can see them any more)."""
+        now = self._clock()
+        offset = self._wall_clock() - now
+        self.dirty = False
+        return {str(key): [round(t + offset, 3) for t in ring if now - t <= horizon]
+                for key, ring in self._rings.items() if len(ring)}
+
+    def load(self, state: Dict[str, Iterable[float]], key_type=int) -> None:
+        """Merge a `dump()` back in, mapping wall-clock times onto this
+        process's monotonic clock."""
+        offset = self._wall_clock() - self._clock()
+        for raw_key, stamps in state.items():
+            stamps = sorted(float(t) - offset for t in stamps)
+            if not stamps:
+                continue
+            ring = _Ring(len(stamps) + REFUND_SLACK)
+            for t in stamps:
+                ring.append(t)
+            self._rings[key_type(raw_key)] = ring
+
+
+def read_state(path) -> Dict[str, List[float]]:
+    """A state file written by write_state, or {} if missing/unreadable."""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def write_state(path, state: Dict[str, List[float]]) -> None:
+    """Atomically replace `path` with `state` (owner-only: temp + rename)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, STATE_FILE_MODE)
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(temp_path, path)
@@ -0,0 +1,138 @@
+"""Content-addressed asset store (core/asset_store.py +
+ChannelMigrator.download_bundle_assets).
+
+What has to hold: the same bytes are stored once whatever URL they came
+from, a re-issued CDN link is recognised as the asset already stored, an
+interrupted download resumes with a Range request, the stats show what
+dedupe saved, and replay reads stored assets without touching the network.
+"""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from cogs.optional.channel_migrator import ChannelMigrator
+from core.asset_store import AssetStore, asset_key
+from core.channel_bundle import BundleWriter
+
+CDN = "https://cdn.discordapp.com/attachments/1/2"
+
+
+def _put(store, tmp_path, url, data):
+    part = tmp_path / "download.part"
+    part.write_bytes(data)
+    return store.add_file(part, url)
+
+
+def test_blobs_are_keyed_by_content_and_stats_count_the_saving(tmp_path):
+    store = AssetStore(tmp_path / "assets")
+    sha, size, new = _put(store, tmp_path, f"{CDN}/cat.png?ex=1&hm=a", b"cat" * 100)
+    assert new and size == 300 and store.blob_path(sha).read_bytes() == b"cat" * 100
+    assert _put(store, tmp_path, "https://example.com/repost.png", b"cat" * 100) == (sha, 300, False)
+    assert asset_key(f"{CDN}/cat.png?ex=2&hm=b") == f"{CDN}/cat.png"
+    # Proxy renditions of one attachment are different bytes: only the
+    # signature is dropped, the size/format parameters stay in the key.
+    media = "https://media.discordapp.net/attachments/1/2/cat.png"
+    assert asset_key(f"{media}?ex=1&is=2&hm=3&width=200&height=100&format=webp") == \
+        f"{media}?width=200&height=100&format=webp"
+    assert asset_key(f"{media}?ex=9&hm=4&width=200&height=100&format=webp") != \
+        asset_key(f"{media}?ex=9&hm=4&width=400&height=200")
+    assert store.read(f"{CDN}/cat.png?ex=2&hm=b") == b"cat" * 100  # re-issued link
+
+    store.record("one", [(10, f"{CDN}/cat.png?ex=1&hm=a")])
+    store.record("two", [(20, "https://example.com/repost.png"), (21, f"{CDN}/cat.png")])
+    assert store.manifest("two") == {20: [{"key": "https://example.com/repost.png", "sha256": sha, "size": 300}],
+                                     21: [{"key": f"{CDN}/cat.png", "sha256": sha, "size": 300}]}
+    assert store.stats("one") == {"references": 1, "logical_bytes": 300, "blobs": 1,
+                                  "stored_bytes": 300, "saved_bytes": 0}
+    assert store.stats() == {"references": 3, "logical_bytes": 900, "blobs": 1,
+                             "stored_bytes": 300, "saved_bytes": 600}
+    assert [p.name for p in (tmp_path / "assets" / "blobs").rglob("*") if p.is_file()] == [sha]
+    store.close()
+
+
+class _Response:
+    def __init__(self, status, body=b"", headers=None):
+        self.status, self.body, self.headers = status, body, headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    def content(self):
+        async def chunks(size):
+            for i in range(0, len(self.body), size):
+                yield self.body[i:i + size]
+        return SimpleNamespace(iter_chunked=chunks)
+
+
+class _Server:
+    """Serves `files` by URL key and honours Range requests."""
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+
+    def get(self, url, headers=None):
+        headers = headers or {}
+        self.requests.append((url, headers.get("Range")))
+        body = self.files[asset_key(url)]
+        if "Range" in headers:
+            start = int(headers["Range"][len("bytes="):-1])
+            return _Response(206, body[start:], {"Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"})
+        return _Response(200, body)
+
+
+def _bundle(tmp_path, messages):
+    async def write():
+        writer = BundleWriter(tmp_path / "b.jsonl.gz", meta={"channel_id": 5})
+        await writer.put({"type": "bundle", "bundle_name": "b"})
+        for message in messages:
+            await writer.put({"type": "message", "message": message})
+        await writer.close()
+    asyncio.run(write())
+
+
+def test_bundle_assets_download_once_resume_and_feed_replay(tmp_path):
+    files = {f"{CDN}/a.png": b"A" * 1000, "https://example.com/a-copy.png": b"A" * 1000,
+             f"{CDN}/big.bin": bytes(range(256)) * 40}
+    _bundle(tmp_path, [
+        {"id": 1, "attachments": [{"url": f"{CDN}/a.png?ex=1", "filename": "a.png"}]},
+        {"id": 2, "attachments": [{"url": f"{CDN}/a.png?ex=2", "filename": "a.png"}],
+         "embeds": [{"image": {"url": "https://example.com/a-copy.png"}}]},
+        {"id": 3, "attachments": [{"url": f"{CDN}/big.bin?ex=1", "filename": "big.bin"}]},
+    ])
+    cog = ChannelMigrator.__new__(ChannelMigrator)
+    cog.storage_dir = tmp_path
+    cog.logger = logging.getLogger("test")
+    cog._assets = cog._http_session = None
+    server = _Server(files)
+    cog._session = lambda: server
+    # A crash left the first 4000 bytes of big.bin behind.
+    cog._asset_store().partial_path(f"{CDN}/big.bin?ex=9").write_bytes(files[f"{CDN}/big.bin"][:4000])
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+    ctx = SimpleNamespace(send=send)
+
+    asyncio.run(ChannelMigrator.download_bundle_assets.callback(cog, ctx, "b"))
+    assert sorted(server.requests) == [(f"{CDN}/a.png?ex=1", None), (f"{CDN}/big.bin?ex=1", "bytes=4000-"),
+                                       ("https://example.com/a-copy.png", None)]
+    assert "0 failed" in sent[-1]
+    store = cog._asset_store()
+    assert store.read(f"{CDN}/big.bin") == files[f"{CDN}/big.bin"]
+    assert store.stats("b") == {"references": 4, "logical_bytes": 3000 + 10240, "blobs": 2,
+                                "stored_bytes": 1000 + 10240, "saved_bytes": 2000}
+    assert not list(store.partial_dir.iterdir())
+
+    # A second run finds everything stored; replay never hits the network.
+    server.requests.clear()
+    asyncio.run(ChannelMigrator.download_bundle_assets.callback(cog, ctx, "b"))
+    assert server.requests == [] and "3 already stored" in sent[-1]
+    assert asyncio.run(cog._fetch_attachment(f"{CDN}/a.png?ex=99", "a.png")) == b"A" * 1000
+    assert server.requests == []
+    asyncio.run(cog.cog_unload())
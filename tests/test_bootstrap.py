@@ -490,11 +490,10 @@ def test_secret_is_never_on_disk_under_a_loose_mode(tmp_path, monkeypatch):
     argument is ignored when the file already exists — so tightening *after*
     json.dump would leave the secret briefly world-readable. Asserting the
     landed file's mode can't catch that: the post-rename chmod fixes the end
-    state either way. So this samples the temp file's mode from inside
-    json.dump, i.e. at the exact moment the secret is hitting the disk.
+    state either way. So this samples the temp file's mode from inside the
+    write of the (already serialized) config text, i.e. at the exact moment
+    the secret is hitting the disk.
     """
-    import json as _json
-
     config_dir = tmp_path / "configs"
     config = Config(config_dir=str(config_dir))
     try:
@@ -503,14 +502,30 @@ def test_secret_is_never_on_disk_under_a_loose_mode(tmp_path, monkeypatch):
         os.chmod(stale, 0o644)  # crash leftover, world-readable
 
         observed = {}
-        real_dump = _json.dump
+        real_fdopen = os.fdopen
+
+        class SpyingFile:
+            def __init__(self, f):
+                self._f = f
+
+            def write(self, text):
+                # The mode the secret is written under, sampled mid-write.
+                if "a-secret" in text:
+                    observed["mode"] = stat.S_IMODE(os.fstat(self._f.fileno()).st_mode)
+                return self._f.write(text)
+
+            def __getattr__(self, name):
+                return getattr(self._f, name)
+
+            def __enter__(self):
+                self._f.__enter__()
+                return self
 
-        def spying_dump(obj, fp, **kw):
-            # The mode the secret is written under, sampled mid-write.
-            observed["mode"] = stat.S_IMODE(os.fstat(fp.fileno()).st_mode)
-            return real_dump(obj, fp, **kw)
+            def __exit__(self, *exc):
+                return self._f.__exit__(*exc)
 
-        monkeypatch.setattr("core.config.json.dump", spying_dump)
+        monkeypatch.setattr("core.config.os.fdopen",
+                            lambda fd, *a, **kw: SpyingFile(real_fdopen(fd, *a, **kw)))
 
         config.set_global("discord_token", "a-secret")
         config.flush()
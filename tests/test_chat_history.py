@@ -0,0 +1,219 @@
+"""Chat-history assembly over the rolling buffer (core/chat_history.py).
+
+What has to hold: a channel is read with history() once and then served from
+gateway-fed turns (zero REST calls on a warm channel), a reply's target is
+resolved without fetch_message when the gateway already sent it, edits and
+deletes show up, and the assembled turns keep the exact line format the
+model has always seen.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from cogs.optional.gpt import HISTORY_LIMIT, Gpt
+from core.chat_history import ChannelHistoryBuffer, MessageFetchCache
+
+BOT_ID = 999
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class _Channel:
+    def __init__(self, cid=10, fetch_delay=0):
+        self.id = cid
+        self.messages = []  # oldest first
+        self.history_calls = 0
+        self.fetches = 0
+        self.fetch_delay = fetch_delay
+        self.in_flight = 0
+        self.peak = 0
+
+    def history(self, limit):
+        self.history_calls += 1
+
+        async def gen():
+            for m in list(reversed(self.messages))[:limit]:
+                yield m
+        return gen()
+
+    async def fetch_message(self, mid):
+        self.fetches += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.fetch_delay)
+        self.in_flight -= 1
+        for m in self.messages:
+            if m.id == mid:
+                return m
+        raise LookupError(mid)
+
+
+def _author(uid, name=None, bot=False):
+    return SimpleNamespace(id=uid, display_name=name or f"user{uid}",
+                           name=name or f"user{uid}", bot=bot)
+
+
+def _msg(channel, mid, content, author=None, reply_to=None):
+    reference = None
+    if reply_to is not None:
+        reference = SimpleNamespace(message_id=reply_to.id, resolved=reply_to)
+    return SimpleNamespace(id=mid, channel=channel, content=content,
+                           author=author or _author(1), embeds=[],
+                           attachments=[], mentions=[], reference=reference,
+                           created_at=T0 + timedelta(seconds=mid))
+
+
+def _gpt():
+    gpt = Gpt.__new__(Gpt)
+    gpt.bot = SimpleNamespace(user=_author(BOT_ID, "bot", bot=True),
+                              cached_messages=[])
+    gpt.logger = logging.getLogger("test")
+    gpt.history = ChannelHistoryBuffer()
+    gpt.fetch_cache = MessageFetchCache()
+    return gpt
+
+
+def _ctx(channel, message):
+    return SimpleNamespace(channel=channel, message=message,
+                           guild=SimpleNamespace(get_member=lambda uid: None))
+
+
+def _post(gpt, channel, message):
+    channel.messages.append(message)
+    gpt.history.observe(message)
+
+
+def test_warm_channel_builds_history_without_rest_calls():
+    gpt = _gpt()
+    channel = _Channel()
+    for i in range(1, 21):
+        channel.messages.append(_msg(channel, i, f"m{i}"))
+    history, mapping = asyncio.run(gpt._build_history(_ctx(channel, channel.messages[-1]), False))
+    assert channel.history_calls == 1
+    assert len(history) == HISTORY_LIMIT
+    assert mapping == {"1": "user1"}
+
+    # New traffic arrives over the gateway; the next run reads nothing.
+    target = channel.messages[0]  # long scrolled out of the window
+    _post(gpt, channel, _msg(channel, 21, "bot says hi", author=_author(BOT_ID, bot=True)))
+    last = _msg(channel, 22, "replying", author=_author(2), reply_to=target)
+    _post(gpt, channel, last)
+    history, mapping = asyncio.run(gpt._build_history(_ctx(channel, last), True))
+    assert channel.history_calls == 1 and channel.fetches == 0
+    assert history[-1]["content"] == "[MOST RECENT MESSAGE] [msg_id: 22] 2 [replying to user1]: replying"
+    assert history[0]["content"] == "[msg_id: 1] 1: [REFERENCED MESSAGE] m1"
+    assert {"role": "assistant", "content": "[msg_id: 21] bot says hi"} in history
+    assert mapping == {"1": "user1", "2": "user2"}
+
+
+def test_command_path_sees_invoking_message_before_listener():
+    gpt = _gpt()
+    channel = _Channel()
+    for i in range(1, 4):
+        channel.messages.append(_msg(channel, i, f"m{i}"))
+    asyncio.run(gpt._build_history(_ctx(channel, channel.messages[-1]), False))
+    # The invoking message reaches _build_history before on_message runs.
+    late = _msg(channel, 4, "!gpt hello")
+    channel.messages.append(late)
+    history, _ = asyncio.run(gpt._build_history(_ctx(channel, late), False))
+    assert history[-1]["content"] == "[MOST RECENT MESSAGE] 1: !gpt hello"
+    assert channel.history_calls == 1
+
+
+def test_edits_and_deletes_update_the_window():
+    gpt = _gpt()
+    channel = _Channel()
+    for i in range(1, 21):
+        channel.messages.append(_msg(channel, i, f"m{i}"))
+    asyncio.run(gpt._build_history(_ctx(channel, channel.messages[-1]), False))
+
+    gpt.history.update(_msg(channel, 20, "edited"))
+    history, _ = asyncio.run(gpt._build_history(_ctx(channel, channel.messages[-1]), False))
+    assert history[-1]["content"].endswith("1: edited")
+
+    # Deletes that leave a short window force one re-read instead of
+    # answering from a thinned-out context.
+    gpt.history.remove(channel.id, range(1, 21))
+    del channel.messages[5:]
+    asyncio.run(gpt._build_history(_ctx(channel, channel.messages[-1]), False))
+    assert channel.history_calls == 2
+
+
+def test_unresolved_references_are_fetched_concurrently_once():
+    gpt = _gpt()
+    channel = _Channel(fetch_delay=0.01)
+    old = [_msg(channel, i, f"old{i}") for i in range(1, 4)]
+    channel.messages.extend(old)
+    channel.messages.extend(_msg(channel, i, "filler") for i in range(10, 30))
+    # Replies whose targets the gateway did NOT resolve (reference only).
+    for i, target in enumerate(old, start=100):
+        m = _msg(channel, i, f"re{i}")
+        m.reference = SimpleNamespace(message_id=target.id, resolved=None)
+        channel.messages.append(m)
+    channel.messages.append(_msg(channel, 200, "?"))
+    ctx = _ctx(channel, channel.messages[-1])
+
+    history, _ = asyncio.run(gpt._build_history(ctx, False))
+    assert channel.fetches == 3 and channel.peak == 3
+    assert sum("[REFERENCED MESSAGE]" in h["content"] for h in history) == 3
+    # Nothing to fetch twice: all three now live in the buffer.
+    asyncio.run(gpt._build_history(ctx, False))
+    assert channel.fetches == 3
+
+
+def test_fetch_cache_coalesces_misses_and_caches_not_found():
+    channel = _Channel(fetch_delay=0.01)
+    channel.messages.append(_msg(channel, 1, "hi"))
+    cache = MessageFetchCache()
+
+    async def run():
+        first = await asyncio.gather(*(cache.get(channel, 1) for _ in range(5)))
+        assert {m.id for m in first} == {1} and channel.fetches == 1
+        await cache.get(channel, 1)
+        assert channel.fetches == 1
+        for _ in range(2):
+            try:
+                await cache.get(channel, 404)
+            except LookupError:
+                pass
+        assert channel.fetches == 2  # the miss was remembered
+        cache.discard([1])
+        await cache.get(channel, 1)
+        assert channel.fetches == 3
+    asyncio.run(run())
+    assert cache.stats["coalesced"] == 4
+
+
+def test_cancelling_the_first_caller_leaves_the_shared_fetch_running():
+    channel = _Channel(fetch_delay=0.02)
+    channel.messages.append(_msg(channel, 1, "hi"))
+    cache = MessageFetchCache()
+
+    async def run():
+        leader = asyncio.ensure_future(cache.get(channel, 1))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get(channel, 1))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert (await follower).id == 1
+        assert leader.cancelled()
+    asyncio.run(run())
+    assert channel.fetches == 1 and cache.stats["coalesced"] == 1
+
+
+def test_a_cancelled_reference_lookup_is_skipped():
+    gpt = _gpt()
+    channel = _Channel()
+    channel.messages.append(_msg(channel, 1, "kept"))
+    reply = _msg(channel, 2, "re")
+    reply.reference = SimpleNamespace(message_id=404, resolved=None)
+    channel.messages.append(reply)
+    channel.messages.append(_msg(channel, 3, "?"))
+
+    async def cancelled(channel, message_id):
+        raise asyncio.CancelledError
+    gpt.fetch_cache.get = cancelled
+    history, _ = asyncio.run(gpt._build_history(_ctx(channel, channel.messages[-1]), False))
+    assert not any("[REFERENCED MESSAGE]" in h["content"] for h in history)
+    assert any("kept" in h["content"] for h in history)
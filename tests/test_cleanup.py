@@ -0,0 +1,171 @@
+"""Cleanup engine (cogs/optional/cleanup.py).
+
+What has to hold: matches younger than 14 days leave in bulk batches of at
+most 100 and older ones one by one, a live run checkpoints each channel so
+the next run with the same criteria starts after it (a dry run never
+moves a checkpoint), a rejected batch falls back to single deletes, and a
+checkpoint never moves past a match that could not be deleted.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from cogs.optional import cleanup as cleanup_module
+from cogs.optional.cleanup import Cleanup, CleanupCheckpoints, CleanupCriteria, _ChannelResult
+
+
+class _Channel:
+    def __init__(self, messages, reject_bulk=False):
+        self.id, self.name = 7, "general"
+        self.guild = SimpleNamespace(id=1)
+        self.messages = messages
+        self.reject_bulk = reject_bulk
+        self.bulk, self.single, self.after = [], [], []
+
+    def history(self, limit=None, oldest_first=False, after=None):
+        self.after.append(after.id if after else None)
+
+        async def walk():
+            for message in sorted(self.messages, key=lambda m: m.id):
+                if after is None or message.id > after.id:
+                    yield message
+        return walk()
+
+    async def delete_messages(self, messages):
+        if self.reject_bulk:
+            raise discord.HTTPException(SimpleNamespace(status=400, reason="Bad Request"), "too old")
+        self.bulk.append([m.id for m in messages])
+        for m in messages:
+            self.messages.remove(m)
+
+
+def _message(channel, mid, author, age_days):
+    message = SimpleNamespace(id=mid, author=SimpleNamespace(id=author, bot=False), reference=None,
+                              created_at=discord.utils.utcnow() - timedelta(days=age_days))
+
+    async def delete():
+        channel.single.append(mid)
+        channel.messages.remove(message)
+    message.delete = delete
+    return message
+
+
+def _channel(young, old, other=0, reject_bulk=False):
+    channel = _Channel([], reject_bulk)
+    mid = 0
+    for count, author, age in ((old, 5, 30), (other, 6, 1), (young, 5, 1)):
+        for _ in range(count):
+            mid += 1
+            channel.messages.append(_message(channel, mid, author, age))
+    return channel
+
+
+def _run(cog, channel, checkpoints, dry=False, fresh=False):
+    result = _ChannelResult(channel)
+    criteria = CleanupCriteria(set(), target_author_ids={5})
+    asyncio.run(cog._clean_channel(result, criteria, dry, checkpoints, fresh))
+    return result
+
+
+@pytest.fixture
+def cog():
+    return Cleanup(SimpleNamespace(logger=logging.getLogger("test")))
+
+
+def test_young_matches_go_in_bulk_batches_old_ones_singly(cog, tmp_path):
+    channel = _channel(young=250, old=3, other=20)
+    checkpoints = CleanupCheckpoints(str(tmp_path / "cp.json"))
+    result = _run(cog, channel, checkpoints)
+    assert [len(batch) for batch in channel.bulk] == [100, 100, 50]
+    assert channel.single == [1, 2, 3]
+    assert result.found == result.deleted == 253 and result.bulk_requests == 3
+    assert len(channel.messages) == 20  # the other author's messages stay
+    assert checkpoints.get(1, "user:5", 7) == 273
+
+
+def test_runs_resume_from_the_checkpoint_and_dry_runs_leave_it(cog, tmp_path):
+    path = str(tmp_path / "cp.json")
+    channel = _channel(young=5, old=0, other=5)
+    _run(cog, channel, CleanupCheckpoints(path))
+    assert oct(os.stat(path).st_mode & 0o777) == "0o600"
+
+    channel.messages.append(_message(channel, 99, 5, 0))
+    dry = _run(cog, channel, CleanupCheckpoints(path), dry=True)
+    assert channel.after[-1] == 10 and dry.found == 1 and dry.deleted == 0
+    assert CleanupCheckpoints(path).get(1, "user:5", 7) == 10
+
+    live = _run(cog, channel, CleanupCheckpoints(path))
+    assert live.found == 1 and channel.single[-1] == 99
+    assert CleanupCheckpoints(path).get(1, "user:5", 7) == 99
+
+    _run(cog, channel, CleanupCheckpoints(path), fresh=True)
+    assert channel.after[-1] is None
+
+
+def test_a_rejected_batch_falls_back_to_single_deletes(cog, tmp_path):
+    channel = _channel(young=4, old=0, reject_bulk=True)
+    result = _run(cog, channel, CleanupCheckpoints(str(tmp_path / "cp.json")))
+    assert channel.single == [1, 2, 3, 4] and result.deleted == 4 and result.bulk_requests == 0
+
+
+def test_checkpoint_writes_are_coalesced(tmp_path):
+    clock = SimpleNamespace(now=0.0)
+    checkpoints = CleanupCheckpoints(str(tmp_path / "cp.json"), clock=lambda: clock.now)
+    checkpoints.advance(1, "gone", 7, 10)
+    checkpoints.advance(1, "gone", 7, 20)  # within CHECKPOINT_SAVE_SECONDS
+    assert CleanupCheckpoints(str(tmp_path / "cp.json")).get(1, "gone", 7) == 10
+    clock.now += cleanup_module.CHECKPOINT_SAVE_SECONDS
+    checkpoints.advance(1, "gone", 7, 30)
+    assert CleanupCheckpoints(str(tmp_path / "cp.json")).get(1, "gone", 7) == 30
+    checkpoints.clear(1, "gone")
+    assert CleanupCheckpoints(str(tmp_path / "cp.json")).get(1, "gone", 7) is None
+
+
+def _forbidden():
+    return discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), "Missing Access")
+
+
+def test_the_checkpoint_stops_before_a_failed_delete(cog, tmp_path):
+    path = str(tmp_path / "cp.json")
+    channel = _channel(young=0, old=6, other=3)
+    stuck = channel.messages[2]
+    real_delete = stuck.delete
+
+    async def refuse():
+        raise _forbidden()
+    stuck.delete = refuse
+    result = _run(cog, channel, CleanupCheckpoints(path))
+    assert result.found == 6 and result.deleted == 5 and result.failed == 1
+    assert CleanupCheckpoints(path).get(1, "user:5", 7) == 2
+
+    stuck.delete = real_delete  # deletable now: the next run retries it
+    retry = _run(cog, channel, CleanupCheckpoints(path))
+    assert channel.after[-1] == 2 and retry.found == 1 and retry.deleted == 1
+    assert CleanupCheckpoints(path).get(1, "user:5", 7) == 9
+
+
+def test_a_forbidden_scan_keeps_what_it_already_did(cog, tmp_path):
+    channel = _channel(young=6, old=4)
+    walk = channel.history
+
+    def history(**kwargs):
+        async def cut_off():
+            async for message in walk(**kwargs):
+                if message.id == 8:
+                    raise _forbidden()
+                yield message
+        return cut_off()
+    channel.history = history
+    path = str(tmp_path / "cp.json")
+    result = _run(cog, channel, CleanupCheckpoints(path))
+    assert result.error == "forbidden"
+    # The young matches pending when the scan broke off were still deleted.
+    assert result.found == 7 and result.deleted == 7 and result.failed == 0
+    assert channel.single == [1, 2, 3, 4] and channel.bulk == [[5, 6, 7]]
+    assert CleanupCheckpoints(path).get(1, "user:5", 7) == 7
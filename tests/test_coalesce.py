@@ -0,0 +1,166 @@
+"""Shared plain-chat answers (core/llm/coalesce.py + Gpt.process_askgpt).
+
+What has to hold: concurrent identical requests run the model once, an
+answer is re-served only within its TTL and only if there was one to share,
+a failed leader leaves its waiters free to try on their own, and the same
+question asked into the same conversation gets the same key — while a
+different conversation, or an agentic run, does not share.
+"""
+
+import asyncio
+import contextlib
+import logging
+from types import SimpleNamespace
+
+from cogs.optional.gpt import ANSWER_CACHE_KEY, COALESCE_KEY, Gpt
+from core.llm.coalesce import (
+    CACHED, JOINED, LED, RequestCoalescer, context_fingerprint, normalize_question,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_concurrent_requests_share_one_call_and_answers_expire():
+    clock = _Clock()
+    coalescer = RequestCoalescer(clock=clock)
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def burst():
+        return await asyncio.gather(*(coalescer.run("k", produce, ttl=30) for _ in range(4)))
+    results = asyncio.run(burst())
+    assert len(calls) == 1
+    assert sorted(how for _value, how in results) == [JOINED, JOINED, JOINED, LED]
+    assert all(value == "answer" for value, _how in results)
+
+    clock.now = 29
+    assert asyncio.run(coalescer.run("k", produce)) == ("answer", CACHED)
+    clock.now = 31
+    assert asyncio.run(coalescer.run("k", produce)) == ("answer", LED)
+    assert len(calls) == 2
+    assert coalescer.stats == {"hits": 1, "joins": 3, "misses": 2}
+
+
+def test_nothing_to_share_is_not_cached_and_failures_release_waiters():
+    coalescer = RequestCoalescer()
+
+    async def refused():
+        await asyncio.sleep(0.01)
+        return None
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("429")
+
+    async def scenario():
+        leader = asyncio.ensure_future(coalescer.run("k", failing))
+        await asyncio.sleep(0)
+        waiter = await coalescer.run("k", failing)
+        with contextlib.suppress(RuntimeError):
+            await leader
+        assert leader.exception() is not None
+        return waiter, await coalescer.run("k2", refused, ttl=60), await coalescer.run("k2", refused, ttl=60)
+    waiter, first, second = asyncio.run(scenario())
+    assert waiter == (None, JOINED)
+    assert first == (None, LED) and second == (None, LED)
+
+
+def _turn(mid, content, bot=False):
+    return SimpleNamespace(id=mid, content=content, rendered=content, author_bot=bot)
+
+
+def test_same_question_in_the_same_conversation_gets_the_same_fingerprint():
+    before = [_turn(1, "anyone tried the new map?"), _turn(2, "yeah it's huge")]
+    question = normalize_question("<@99> What's the spawn rate??")
+    assert question == normalize_question("what's   the spawn RATE")
+    first = context_fingerprint(before + [_turn(3, "<@99> what's the spawn rate?")], question)
+    later = context_fingerprint(before + [
+        _turn(3, "<@99> what's the spawn rate?"), _turn(4, "About 1 per minute.", bot=True),
+        _turn(5, "!gpt What's the spawn rate")], question)
+    assert first == later
+    elsewhere = context_fingerprint([_turn(7, "different chat"), _turn(8, "what's the spawn rate")], question)
+    assert elsewhere != first
+
+
+def test_asking_again_after_the_conversation_moved_on_gets_a_new_fingerprint():
+    question = normalize_question("why?")
+    talk = [_turn(1, "pineapple on pizza is fine"), _turn(2, "<@99> why?"),
+            _turn(3, "Because sweet and salty works.", bot=True)]
+    first = context_fingerprint(talk, question, through_id=2)
+    moved_on = talk + [_turn(4, "ok but tabs beat spaces"), _turn(5, "<@99> why?")]
+    assert context_fingerprint(moved_on, question, through_id=5) != first
+    # Messages arriving after the invoking one don't count.
+    assert context_fingerprint(moved_on, question, through_id=2) == first
+    # Exact matching: "hi" is not asked by "this is it".
+    hi = normalize_question("hi")
+    assert (context_fingerprint([_turn(1, "this is it"), _turn(2, "hi")], hi)
+            != context_fingerprint([_turn(1, "something else"), _turn(2, "hi")], hi))
+
+
+def _gpt(guild_config, answers, tools=()):
+    gpt = Gpt.__new__(Gpt)
+    gpt.logger = logging.getLogger("test")
+    gpt.coalescer = RequestCoalescer()
+    gpt._check_cooldown = lambda ctx: None
+    gpt.get_provider_config = lambda ctx: {"provider": "openai", "model": "m"}
+    gpt._resolve_bot_tools = lambda ctx: list(tools)
+    gpt.history = SimpleNamespace(observe=lambda message: None)
+
+    async def recent_turns(channel):
+        return [_turn(1, "hi"), _turn(2, "<@99> is it raining?")]
+    gpt._recent_turns = recent_turns
+
+    async def answer(ctx, question, provider_config, tool_names, agentic, reply_mentions):
+        answers.append(ctx.author.id)
+        await asyncio.sleep(0.01)
+        await ctx.send("It is raining.")
+        return "It is raining."
+    gpt._answer = answer
+    gpt.bot = SimpleNamespace(config=SimpleNamespace(
+        get=lambda ctx, key, default=None: guild_config.get(key, default)))
+    return gpt
+
+
+def _ctx(author_id, sent):
+    async def send(content, **kwargs):
+        sent.append((author_id, content))
+
+    @contextlib.asynccontextmanager
+    async def typing():
+        yield
+    return SimpleNamespace(guild=SimpleNamespace(id=1), channel=SimpleNamespace(id=2),
+                           author=SimpleNamespace(id=author_id), message=SimpleNamespace(id=100),
+                           send=send, typing=typing)
+
+
+def test_cog_shares_plain_chat_answers_only_when_opted_in():
+    async def ask(gpt, sent, *authors):
+        await asyncio.gather(*(gpt.process_askgpt(_ctx(a, sent), "is it raining") for a in authors))
+
+    for config, tools, expected_calls in (
+        ({COALESCE_KEY: True}, (), 1),
+        ({ANSWER_CACHE_KEY: 60}, (), 1),
+        ({}, (), 3),  # not opted in
+        ({COALESCE_KEY: True}, ("add_reaction",), 3),  # agentic: never shared
+    ):
+        answers, sent = [], []
+        gpt = _gpt(config, answers, tools)
+        asyncio.run(ask(gpt, sent, 10, 11, 12))
+        assert len(answers) == expected_calls, config
+        assert sorted(sent) == [(a, "It is raining.") for a in (10, 11, 12)]
+
+    answers, sent = [], []
+    gpt = _gpt({ANSWER_CACHE_KEY: 60}, answers)
+    asyncio.run(ask(gpt, sent, 10))
+    asyncio.run(ask(gpt, sent, 11))
+    assert answers == [10] and gpt.coalescer.stats["hits"] == 1
@@ -0,0 +1,571 @@
+"""core.config: external-change watching, the background writer, snapshots.
+
+The store used to stat every file in configs/ on a 2-second timer, and to
+re-create a Timer on every set(). These lock the properties of the
+replacements that matter at thousands of guild files: external edits still
+land, only the changed files are re-parsed, the bot's own writes are never
+mistaken for external ones, and a burst of writes costs one file write.
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from core.config import Config
+from core.config_watch import PollingWatcher, make_watcher
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def _write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def _seed(config_dir, count):
+    os.makedirs(config_dir, exist_ok=True)
+    for gid in range(count):
+        _write_json(os.path.join(config_dir, f'{1000 + gid}.json'), {'n': gid})
+
+
+def test_polling_watcher_reports_only_changed_files(tmp_path):
+    _seed(tmp_path, 50)
+    watcher = PollingWatcher(str(tmp_path), interval=0)
+    assert watcher.wait(0) == set()
+
+    target = tmp_path / '1007.json'
+    _write_json(target, {'n': 'edited'})
+    os.utime(target, (time.time() + 5, time.time() + 5))  # beat mtime granularity
+    _write_json(tmp_path / '2000.json', {})
+    (tmp_path / 'notes.txt').write_text('ignored')
+
+    assert watcher.wait(0) == {'1007.json', '2000.json'}
+    assert watcher.wait(0) == set()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux-only')
+def test_external_edit_reloads_only_that_file(tmp_path):
+    config_dir = str(tmp_path / 'configs')
+    _seed(config_dir, 200)
+    config = Config(config_dir=config_dir)
+    try:
+        assert config.reload_stats()['backend'] == 'inotify'
+        assert config.get(1042, 'n') == 42  # make it resident
+        _write_json(os.path.join(config_dir, '1042.json'), {'n': 'external'})
+
+        assert _wait_for(lambda: config.get(1042, 'n') == 'external')
+        stats = config.reload_stats()
+        assert stats['reloads'] == 1
+        # Scales with the change, not with the 200 files in the directory.
+        assert stats['files_checked'] == 1
+    finally:
+        config.shutdown()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux-only')
+def test_own_writes_are_not_reloaded(tmp_path):
+    config = Config(config_dir=str(tmp_path / 'configs'))
+    try:
+        config.set(1, 'k', 'v')
+        config.flush()
+        # The rename fires an event; the recorded mtime must swallow it.
+        assert _wait_for(lambda: config.reload_stats()['files_checked'] >= 1)
+        time.sleep(0.1)
+        assert config.reload_stats()['reloads'] == 0
+        assert config.get(1, 'k') == 'v'
+    finally:
+        config.shutdown()
+
+
+def test_poll_backend_is_selectable(tmp_path):
+    watcher = make_watcher(str(tmp_path), interval=0.1, backend='poll')
+    try:
+        assert watcher.backend == 'poll'
+    finally:
+        watcher.close()
+
+
+class _BrokenWatcher:
+    backend = 'inotify'
+    files_checked = 0
+
+    def wait(self, timeout):
+        raise OSError(9, 'Bad file descriptor')
+
+    def wake(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_a_failing_watcher_falls_back_to_polling(tmp_path):
+    config_dir = str(tmp_path / 'configs')
+    _seed(config_dir, 3)
+    config = Config(config_dir=config_dir)
+    config._reload_delay = 0.05
+    config.get(1000, 'n')
+    try:
+        old, config._watcher = config._watcher, _BrokenWatcher()
+        old.wake()  # the watch thread moves on to the broken watcher
+        assert _wait_for(lambda: config._watcher.backend == 'poll')
+        assert config._watch_thread.is_alive() and config.reload_stats()['errors'] == 1
+        target = os.path.join(config_dir, '1000.json')
+        _write_json(target, {'n': 'edited'})
+        os.utime(target, (time.time() + 5, time.time() + 5))
+        assert _wait_for(lambda: config.get(1000, 'n') == 'edited')
+    finally:
+        config.shutdown()
+
+
+def test_shutdown_does_not_wait_out_the_poll_interval(tmp_path):
+    config = Config(config_dir=str(tmp_path / 'configs'), watch_backend='poll')
+    started = time.monotonic()
+    config.shutdown()
+    assert time.monotonic() - started < 1.0
+    assert not config._watch_thread.is_alive()
+
+
+# --------------------------------------------------------------------------
+# Background writer
+# --------------------------------------------------------------------------
+
+def test_burst_of_sets_coalesces_into_one_write(tmp_path, monkeypatch):
+    config = Config(config_dir=str(tmp_path / 'configs'))
+    try:
+        for i in range(500):
+            config.set(1, 'memories', list(range(i)))
+        config.set(2, 'k', 'v')
+        stats = config.write_stats()
+        assert stats['queue_depth'] == 2
+        # One wake-up per config, not per set (the writer may already have
+        # taken one off the queue and be waiting out the window).
+        assert config._write_queue.qsize() in (1, 2)
+
+        config.flush()
+        stats = config.write_stats()
+        assert stats['queue_depth'] == 0
+        assert stats['files_written'] == 2
+        assert stats['batches'] == 1
+        assert stats['bytes_written'] > 0
+        with open(os.path.join(config.config_dir, '1.json')) as f:
+            assert json.load(f)['memories'] == list(range(499))
+    finally:
+        config.shutdown()
+
+
+def test_writer_thread_flushes_after_the_coalescing_window(tmp_path):
+    config = Config(config_dir=str(tmp_path / 'configs'))
+    config._save_delay = 0.05
+    try:
+        config.set(7, 'k', 'v')
+        path = os.path.join(config.config_dir, '7.json')
+        assert _wait_for(lambda: os.path.exists(path))
+        assert config.write_stats()['queue_depth'] == 0
+    finally:
+        config.shutdown()
+
+
+def test_a_failed_write_is_retried_and_the_writer_survives(tmp_path, monkeypatch):
+    config = Config(config_dir=str(tmp_path / 'configs'))
+    config._save_delay = 0.05
+    real_save = config._immediate_save
+    calls = []
+
+    def flaky_save(config_id, sync=False, text=None):
+        calls.append(config_id)
+        if len(calls) == 1:  # e.g. a dict mutated mid-encode before the fix
+            raise RuntimeError('dictionary changed size during iteration')
+        return real_save(config_id, sync=sync, text=text)
+    monkeypatch.setattr(config, '_immediate_save', flaky_save)
+    try:
+        config.set(5, 'k', 'v')
+        path = os.path.join(config.config_dir, '5.json')
+        assert _wait_for(lambda: os.path.exists(path))
+        assert config._writer_thread.is_alive()
+        assert calls == ['5', '5'] and config.write_stats()['write_errors'] == 1
+        config.set(5, 'k', 'w')  # later sets still reach disk
+        assert _wait_for(lambda: json.load(open(path)) == {'k': 'w'})
+    finally:
+        config.shutdown()
+
+
+def test_guild_files_are_compact_and_global_stays_readable(tmp_path):
+    config = Config(config_dir=str(tmp_path / 'configs'))
+    try:
+        config.set(1, 'k', {'a': [1, 2]})
+        config.set_global('k', {'a': [1, 2]})
+        config.flush()
+        with open(os.path.join(config.config_dir, '1.json')) as f:
+            assert f.read() == '{"k":{"a":[1,2]}}'
+        with open(os.path.join(config.config_dir, 'global.json')) as f:
+            assert '\n    ' in f.read()
+    finally:
+        config.shutdown()
+
+
+def test_shutdown_flushes_pending_writes(tmp_path):
+    config_dir = str(tmp_path / 'configs')
+    config = Config(config_dir=config_dir)
+    config.set(3, 'k', 'v')
+    config.shutdown()
+    assert not config._writer_thread.is_alive()
+    with open(os.path.join(config_dir, '3.json')) as f:
+        assert json.load(f) == {'k': 'v'}
+
+
+# --------------------------------------------------------------------------
+# Snapshots
+# --------------------------------------------------------------------------
+
+def test_snapshot_is_reused_until_a_change_retires_it(tmp_path):
+    config = Config(config_dir=str(tmp_path / 'configs'))
+    try:
+        config.set(1, 'a', 1)
+        first = config.snapshot(1)
+        assert config.snapshot(1) is first  # no rebuild without a change
+
+        config.set(1, 'a', 2)
+        second = config.snapshot(1)
+        assert second.version > first.version
+        assert (first.get('a'), second.get('a')) == (1, 2)  # old view is stable
+
+        config.rem(1, 'a')
+        assert 'a' not in config.snapshot(1)
+        assert config.snapshot(1).get('a', 'default') == 'default'
+    finally:
+        config.shutdown()
+
+
+def test_snapshot_is_read_only(tmp_path):
+    config = Config(config_dir=str(tmp_path / 'configs'))
+    try:
+        config.set_global('k', 'v')
+        snap = config.snapshot(None, scope='global')
+        with pytest.raises(TypeError):
+            snap._data['k'] = 'changed'
+        assert config.get_global('k') == 'v'
+    finally:
+        config.shutdown()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux-only')
+def test_external_reload_retires_the_snapshot(tmp_path):
+    config_dir = str(tmp_path / 'configs')
+    _seed(config_dir, 1)
+    config = Config(config_dir=config_dir)
+    try:
+        before = config.snapshot(1000)
+        assert before.get('n') == 0
+        _write_json(os.path.join(config_dir, '1000.json'), {'n': 'external'})
+        assert _wait_for(lambda: config.snapshot(1000).get('n') == 'external')
+        assert config.snapshot(1000).version > before.version
+        assert before.get('n') == 0
+    finally:
+        config.shutdown()
+
+
+# --------------------------------------------------------------------------
+# SQLite backend
+# --------------------------------------------------------------------------
+
+def _sqlite_config(config_dir, **kw):
+    config = Config(config_dir=str(config_dir), backend='sqlite', **kw)
+    config._reload_delay = 0.05
+    return config
+
+
+def test_sqlite_backend_round_trips_the_public_api(tmp_path):
+    config_dir = tmp_path / 'configs'
+    config = _sqlite_config(config_dir)
+    try:
+        config.set(42, 'gpt_memories', [{'text': 'x'}])
+        config.set_global('reminders', [])
+        config.set_user(7, 'tz', 'UTC')
+        config.flush()
+    finally:
+        config.shutdown()
+
+    reopened = Config(config_dir=str(config_dir))  # auto-detected from the db
+    try:
+        assert reopened.backend == 'sqlite'
+        assert reopened.get(42, 'gpt_memories') == [{'text': 'x'}]
+        assert reopened.has_global('reminders')
+        assert reopened.get_user(7, 'tz') == 'UTC'
+        assert reopened.guild_ids() == [42]
+        assert 'reminders' in reopened.global_keys()
+        assert reopened.rem(42, 'gpt_memories')
+        reopened.flush()
+        assert reopened._store.load('42') is None
+    finally:
+        reopened.shutdown()
+    assert not any(name.endswith('.json') for name in os.listdir(config_dir))
+
+
+def test_sqlite_backend_writes_only_the_changed_key(tmp_path):
+    config = _sqlite_config(tmp_path / 'configs')
+    try:
+        config.set(1, 'gpt_memories', [{'text': 'm' * 100}] * 1000)
+        config.flush()
+        before = config.write_stats()['bytes_written']
+        config.set(1, 'ai_enabled', False)
+        config.flush()
+        # One small row, not the ~100 KB memory list riding along.
+        assert config.write_stats()['bytes_written'] - before == len('false')
+    finally:
+        config.shutdown()
+
+
+def test_sqlite_list_values_write_only_the_changed_elements(tmp_path):
+    config_dir = tmp_path / 'configs'
+    config = _sqlite_config(config_dir)
+    memories = [{'id': i, 'text': f'memory {i}'} for i in range(1000)]
+
+    def cost(change):
+        before = config.write_stats()['bytes_written']
+        change()
+        config.set(1, 'gpt_memories', list(memories))
+        config.flush()
+        return config.write_stats()['bytes_written'] - before
+    try:
+        config.set(1, 'gpt_memories', list(memories))
+        config.flush()
+        new = {'id': 1000, 'text': 'memory 1000'}
+        assert cost(lambda: memories.append(new)) == len(json.dumps(new, separators=(',', ':')))
+        assert cost(lambda: memories.pop(0)) == 0  # one row deleted, none rewritten
+        edited = {'id': 500, 'text': 'edited'}
+        assert cost(lambda: memories.__setitem__(499, edited)) == len(
+            json.dumps(edited, separators=(',', ':')))
+        assert cost(lambda: memories.insert(10, new)) == len(json.dumps(new, separators=(',', ':')))
+        # Our own writes leave nothing behind in the change log.
+        assert not config._store._own_ranges
+        assert config._store._conn.execute('SELECT COUNT(*) FROM config_changes').fetchone()[0] == 0
+    finally:
+        config.shutdown()
+    reopened = _sqlite_config(config_dir)
+    try:
+        assert reopened.get(1, 'gpt_memories') == memories
+    finally:
+        reopened.shutdown()
+
+
+def test_sqlite_list_diffs_round_trip_under_random_edits(tmp_path):
+    import random
+
+    from core import config_sqlite
+    store = config_sqlite.SqliteConfigStore(str(tmp_path / 'c.sqlite3'))
+    rng = random.Random(4)
+    items = []
+    try:
+        for step in range(300):
+            op = rng.random()
+            if op < 0.4 or not items:
+                items.insert(rng.randint(0, len(items)), rng.randint(0, 9))
+            elif op < 0.7:
+                del items[rng.randrange(len(items))]
+            else:
+                items[rng.randrange(len(items))] = rng.randint(0, 9)
+            if step == 150:  # squeeze a gap until it needs renumbering
+                for _ in range(25):
+                    items.insert(1, 'x')
+                    store.write_batch([('1', {'l': list(items)}, {'l'})])
+            store.write_batch([('1', {'l': list(items), 's': step}, {'l', 's'})])
+            if step % 50 == 0:
+                assert store.load('1') == {'l': items, 's': step}
+        store.write_batch([('1', {'l': 'scalar now'}, {'l'})])
+        assert store.load('1') == {'l': 'scalar now', 's': 299}
+        assert store._conn.execute('SELECT COUNT(*) FROM config_items').fetchone()[0] == 0
+    finally:
+        store.close()
+
+
+def test_sqlite_store_created_before_list_rows_still_loads(tmp_path):
+    import sqlite3
+
+    config_dir = tmp_path / 'configs'
+    os.makedirs(config_dir)
+    conn = sqlite3.connect(str(config_dir / 'config.sqlite3'))
+    conn.execute('CREATE TABLE config_values (config_id TEXT NOT NULL, key TEXT NOT NULL, '
+                 'value TEXT NOT NULL, PRIMARY KEY (config_id, key)) WITHOUT ROWID')
+    conn.execute("INSERT INTO config_values VALUES ('1', 'reminders', '[1,2,3]')")
+    conn.commit()
+    conn.close()
+    config = _sqlite_config(config_dir)
+    try:
+        assert config.get(1, 'reminders') == [1, 2, 3]
+        config.set(1, 'reminders', [1, 2, 3, 4])
+        config.flush()
+        assert config._store.load('1') == {'reminders': [1, 2, 3, 4]}
+    finally:
+        config.shutdown()
+
+
+def test_sqlite_backend_reloads_external_element_edits(tmp_path):
+    import sqlite3
+
+    config = _sqlite_config(tmp_path / 'configs')
+    try:
+        config.set(5, 'gpt_memories', ['a', 'b'])
+        config.flush()
+        conn = sqlite3.connect(config._store.path)
+        with conn:
+            conn.execute("UPDATE config_items SET value = '\"B\"' "
+                         "WHERE config_id = '5' AND value = '\"b\"'")
+        conn.close()
+        assert _wait_for(lambda: config.get(5, 'gpt_memories') == ['a', 'B'])
+        config.set(5, 'gpt_memories', ['a', 'B', 'c'])
+        config.flush()
+        assert config._store.load('5') == {'gpt_memories': ['a', 'B', 'c']}
+    finally:
+        config.shutdown()
+
+
+def test_sqlite_backend_reloads_external_edits_but_not_its_own(tmp_path):
+    import sqlite3
+
+    config = _sqlite_config(tmp_path / 'configs')
+    try:
+        config.set(5, 'k', 'ours')
+        config.flush()
+        time.sleep(0.2)
+        assert config.reload_stats()['reloads'] == 0
+
+        conn = sqlite3.connect(config._store.path)
+        with conn:
+            conn.execute("UPDATE config_values SET value = '\"theirs\"' "
+                         "WHERE config_id = '5' AND key = 'k'")
+        conn.close()
+        assert _wait_for(lambda: config.get(5, 'k') == 'theirs')
+        assert config.reload_stats()['reloads'] == 1
+    finally:
+        config.shutdown()
+
+
+def test_migration_imports_json_and_moves_the_originals(tmp_path):
+    from core import config_sqlite
+
+    config_dir = tmp_path / 'configs'
+    _seed(str(config_dir), 3)
+    _write_json(config_dir / 'global.json', {'superadmins': [1]})
+
+    result = config_sqlite.migrate_json_dir(str(config_dir))
+    assert result['configs'] == 4
+    assert sorted(os.listdir(config_dir / config_sqlite.MIGRATED_DIRNAME)) == [
+        '1000.json', '1001.json', '1002.json', 'global.json']
+
+    config = Config(config_dir=str(config_dir))
+    try:
+        assert config.backend == 'sqlite'
+        assert config.get(1002, 'n') == 2
+        assert config.get_global('superadmins') == [1]
+    finally:
+        config.shutdown()
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='Unknown config backend'):
+        Config(config_dir=str(tmp_path), backend='redis')
+
+
+# --------------------------------------------------------------------------
+# Lazy loading / LRU residency
+# --------------------------------------------------------------------------
+
+def test_startup_parses_nothing_but_global(tmp_path, monkeypatch):
+    config_dir = str(tmp_path / 'configs')
+    _seed(config_dir, 100)
+    config = Config(config_dir=config_dir)
+    try:
+        assert config.cache_stats()['resident'] == 1  # global only
+        assert len(config.guild_ids()) == 100  # enumeration never loads
+        assert config.cache_stats()['loads'] == 0
+        assert config.get(1050, 'n') == 50
+        assert config.cache_stats()['loads'] == 1
+    finally:
+        config.shutdown()
+
+
+def test_lru_evicts_clean_configs_but_never_dirty_ones(tmp_path):
+    config_dir = str(tmp_path / 'configs')
+    _seed(config_dir, 10)
+    config = Config(config_dir=config_dir, max_resident=3)
+    try:
+        config.set(1000, 'n', 'unsaved')  # dirty: pinned
+        for gid in range(1001, 1010):
+            config.get(gid, 'n')
+        stats = config.cache_stats()
+        assert stats['resident'] <= 4  # cap + the pinned dirty config
+        assert stats['evictions'] >= 6
+        assert '1000' in config._configs
+        assert config.get(1000, 'n') == 'unsaved'
+
+        config.flush()
+        for gid in range(1001, 1010):
+            config.get(gid, 'n')
+        assert '1000' not in config._configs  # clean now, so evictable
+        assert config.get(1000, 'n') == 'unsaved'  # re-read from disk
+    finally:
+        config.shutdown()
+
+
+def test_snapshot_versions_stay_monotonic_across_eviction(tmp_path):
+    config_dir = str(tmp_path / 'configs')
+    _seed(config_dir, 3)
+    config = Config(config_dir=config_dir, max_resident=2)
+    try:
+        first = config.snapshot(1000)
+        config.get(1001, 'n')
+        config.get(1002, 'n')  # evicts 1000
+        assert config.snapshot(1000).version > first.version
+    finally:
+        config.shutdown()
+
+
+def test_a_corrupt_guild_file_survives_a_set(tmp_path):
+    config_dir = str(tmp_path / 'configs')
+    _seed(config_dir, 1)
+    path = os.path.join(config_dir, '1000.json')
+    with open(path, 'w') as f:
+        f.write('{"n": "half a')
+    config = Config(config_dir=config_dir)
+    try:
+        assert config.get(1000, 'n', 'default') == 'default'
+        with pytest.raises(ValueError, match='not overwriting'):
+            config.set(1000, 'n', 'clobber')
+        config.flush()
+        assert 1000 in config.guild_ids()
+        with open(path) as f:
+            assert f.read() == '{"n": "half a'
+
+        _write_json(path, {'n': 'repaired'})  # fixed by hand: the watcher sees it
+        config._check_external_changes(['1000.json'])
+        config.set(1000, 'm', 1)
+        assert config.get(1000, 'n') == 'repaired'
+    finally:
+        config.shutdown()
+
+
+def test_edit_to_a_non_resident_config_is_read_on_next_touch(tmp_path):
+    config_dir = str(tmp_path / 'configs')
+    _seed(config_dir, 2)
+    config = Config(config_dir=config_dir)
+    try:
+        _write_json(os.path.join(config_dir, '1001.json'), {'n': 'external'})
+        _write_json(os.path.join(config_dir, '3000.json'), {'n': 'new'})
+        config._check_external_changes()
+        assert config.reload_stats()['reloads'] == 0  # nothing parsed yet
+        assert 3000 in config.guild_ids()
+        assert config.get(1001, 'n') == 'external'
+        assert config.get(3000, 'n') == 'new'
+    finally:
+        config.shutdown()
@@ -0,0 +1,100 @@
+"""Token-budgeted GPT context (core/llm/budget.py + the cog's use of it).
+
+What has to hold: the newest message always goes in, history stays a
+contiguous recent window, a referenced message travels with its reply,
+relevant memories beat stale ones, and the volatile prompt stays inside
+the budget no matter how many memories a guild has piled up.
+"""
+
+import time
+from types import SimpleNamespace
+
+from cogs.optional.gpt import Gpt
+from core.llm.budget import (
+    ContextBudget, TokenCounter, estimate_tokens, rank_memories,
+)
+
+
+def _turns(n, words=20):
+    return [{"role": "user", "content": f"{i}: " + "word " * words} for i in range(n)]
+
+
+def test_estimator_tracks_length_and_calibrates_toward_reported_usage():
+    assert 1 <= estimate_tokens("hello world") <= 3
+    assert estimate_tokens("word " * 400) > 10 * estimate_tokens("word " * 30)
+
+    counter = TokenCounter()
+    messages = [{"role": "user", "content": "word " * 100}]
+    before = counter.count_messages(messages, "m")
+    for _ in range(30):
+        counter.calibrate("m", messages, before * 1.5)
+    assert abs(counter.count_messages(messages, "m") / before - 1.5) < 0.05
+    assert counter.count_messages(messages, "other") == before
+
+
+def test_history_is_newest_first_contiguous_and_keeps_the_last_message():
+    counter = TokenCounter()
+    history = _turns(15)
+    budget = ContextBudget(400, counter, memory_share=0.25)
+    kept = budget.pack_history(history)
+    assert kept and kept[-1] is history[-1]
+    assert kept == history[-len(kept):]
+    assert budget.used <= 300
+    assert budget.stats["turns"] + budget.stats["turns_dropped"] == 15
+
+    tiny = ContextBudget(1, counter)
+    assert tiny.pack_history(history) == [history[-1]]
+
+
+def test_reference_travels_with_its_reply():
+    counter = TokenCounter()
+    history = _turns(12)
+    # Entry 0 is a referenced message; entry 11 (newest) replies to it and
+    # entry 1 (oldest reply) replies to it as well.
+    budget = ContextBudget(400, counter)
+    kept = budget.pack_history(history, {11: 0, 1: 0})
+    assert history[0] in kept and history[11] in kept
+    assert history[1] not in kept  # outside the window, but its target isn't
+    assert budget.stats["refs"] == 1 and budget.stats["refs_dropped"] == 0
+
+    starved = ContextBudget(1, counter)
+    assert starved.pack_history(history, {10: 0}) == [history[11]]
+    assert starved.stats["refs_dropped"] == 1
+
+
+def test_relevant_and_present_memories_rank_first():
+    now = time.time()
+    memories = [
+        {"text": "likes gardening and tomatoes", "sender": 1, "stored_at": now},
+        {"text": "plays factorio every weekend", "sender": 2, "stored_at": now - 60 * 86400},
+        {"text": "owns a cat named Mochi", "sender": 3, "stored_at": now - 86400},
+    ]
+    ranked = rank_memories(memories, "anyone up for factorio tonight?", speakers=["3"], now=now)
+    assert [m["sender"] for m in ranked] == [2, 3, 1]
+
+
+def test_prompt_stays_flat_as_memories_accumulate():
+    counter = TokenCounter()
+    now = time.time()
+    memories = [{"text": f"memory number {i} about topic{i} " + "detail " * 15,
+                 "sender": 7, "type": "fact", "stored_at": now, "expires": now + 3600}
+                for i in range(500)]
+    live = []
+    gpt = Gpt.__new__(Gpt)
+    gpt.bot = SimpleNamespace(
+        user=SimpleNamespace(id=999, display_name="bot"),
+        config=SimpleNamespace(get=lambda ctx, key, default=None:
+                               live if key == "gpt_memories" else default))
+    ctx = SimpleNamespace(guild=SimpleNamespace(id=1))
+
+    sizes = []
+    for count in (50, 500):
+        live[:] = memories[:count]
+        budget = ContextBudget(2000, counter)
+        budget.pack_history(_turns(15))
+        _prompt, context = gpt._build_system_prompt(ctx, [], {"7": "ann"}, budget, "topic3")
+        sizes.append(counter.count(context))
+        assert budget.used <= budget.tokens
+        assert "topic3 " in context  # the relevant one made the cut
+    assert sizes[1] <= sizes[0] * 1.1
+    assert budget.stats["memories_dropped"] > 400
@@ -0,0 +1,106 @@
+"""Indexed DM transcripts (core/dm_log.py).
+
+What has to hold: every read returns exactly what the old full-file scan
+did (edit notes re-using an older message_id and corrupt lines included),
+a transcript written before the index existed or appended behind its back
+is indexed on the next read, and tail reads / polls don't read the file.
+"""
+
+import json
+import random
+from collections import deque
+
+import pytest
+
+from core import dm_log
+
+
+@pytest.fixture(autouse=True)
+def dm_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(dm_log, "DM_LOG_DIR", tmp_path)
+    return tmp_path
+
+
+def _scan(user_id, limit=None, since=None, after_id=None):
+    """The pre-index load_dms: stream and parse every line."""
+    rows = [] if (limit is None or after_id is not None) else deque(maxlen=limit)
+    with open(dm_log._dm_file(user_id)) as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if after_id is not None and int(row.get("message_id") or 0) <= after_id:
+                continue
+            if since is not None and str(row.get("timestamp", "")) <= since:
+                continue
+            rows.append(row)
+            if after_id is not None and limit is not None and len(rows) >= limit:
+                break
+    return list(rows)
+
+
+def _row(mid, second, edited=False):
+    row = {"timestamp": f"2026-01-01T00:{second // 60:02d}:{second % 60:02d}",
+           "direction": "in", "user_id": 1, "message_id": mid, "content": f"m{mid}"}
+    if edited:
+        row["edited"] = True
+    return row
+
+
+def test_indexed_reads_match_a_full_scan(dm_dir):
+    rng = random.Random(3)
+    mid = 100
+    for second in range(400):
+        mid += rng.randint(1, 5)
+        if second and rng.random() < 0.1:  # an edit note for an older message
+            dm_log.log_dm(1, _row(mid - rng.randint(1, 60), second, edited=True))
+        else:
+            dm_log.log_dm(1, _row(mid, second))
+        if rng.random() < 0.02:
+            with open(dm_log._dm_file(1), "a") as f:
+                f.write("{half a row\n")
+    ids = [r["message_id"] for r in _scan(1)]
+    queries = [{}, {"limit": 1}, {"limit": 50}, {"limit": 1000}, {"after_id": 0},
+               {"since": "2026-01-01T00:06:00"}, {"since": "2026-01-01T00:06:00", "limit": 7}]
+    for _ in range(60):
+        queries.append({"after_id": rng.choice(ids) + rng.randint(-1, 1),
+                        "limit": rng.choice([None, 1, 10, 100]),
+                        "since": rng.choice([None, "2026-01-01T00:03:20"])})
+    for query in queries:
+        assert dm_log.load_dms(1, **query) == _scan(1, **query), query
+
+
+def test_a_transcript_without_or_behind_its_index_is_caught_up(dm_dir):
+    with open(dm_log._dm_file(7), "w") as f:  # written before the index existed
+        for i in range(1, 11):
+            f.write(json.dumps(_row(i, i)) + "\n")
+    assert [r["message_id"] for r in dm_log.load_dms(7, limit=3)] == [8, 9, 10]
+    assert dm_log._index_file(7).stat().st_size == 10 * dm_log._INDEX_RECORD.size
+
+    with open(dm_log._dm_file(7), "a") as f:  # appended behind the index's back
+        f.write(json.dumps(_row(11, 11)) + "\n")
+    dm_log.log_dm(7, _row(12, 12))  # the writer leaves a stale index alone
+    with open(dm_log._index_file(7), "ab") as f:
+        f.write(b"torn")
+    assert [r["message_id"] for r in dm_log.load_dms(7, after_id=9)] == [10, 11, 12]
+
+    dm_log._dm_file(7).write_text(json.dumps(_row(1, 1)) + "\n")  # replaced
+    assert dm_log.load_dms(7) == [_row(1, 1)]
+    assert dm_log.load_dms(8) == [] and dm_log.list_dm_users() == [7]
+
+
+def test_polls_and_tail_reads_touch_only_the_rows_they_return(dm_dir, monkeypatch):
+    for i in range(1, 5001):
+        dm_log.log_dm(3, _row(i, i % 3600))
+    read = []
+    real_rows = dm_log._Index.rows
+
+    def rows(self, lo, hi):
+        read.append(hi - lo)
+        return real_rows(self, lo, hi)
+    monkeypatch.setattr(dm_log._Index, "rows", rows)
+    assert [r["message_id"] for r in dm_log.load_dms(3, limit=1)] == [5000]
+    assert [r["message_id"] for r in dm_log.load_dms(3, after_id=4990, limit=5)] == [4991, 4992, 4993,
+                                                                                    4994, 4995]
+    assert read == [1, 5]
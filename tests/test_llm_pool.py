@@ -0,0 +1,92 @@
+"""Model/connection-pool reuse in core/llm/client.py.
+
+`_build_model` used to construct a provider — and with it a new httpx client
+and connection pool — per request. What has to hold now: identical inputs
+reuse one model, models on one endpoint share one pool, any change to the
+key, base_url or catalog gets a fresh build, and a catalog write drops the
+cache. Zero network: building a model opens no connection.
+"""
+
+import asyncio
+
+from core.llm.client import LLMClient
+
+
+class _Config:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, ctx, key, default=None, scope="guild"):
+        return self.values.get(key, default)
+
+    def set(self, ctx, key, value, scope="guild"):
+        self.values[key] = value
+
+
+XAI = {
+    "name": "xAI Grok",
+    "base_url": "https://api.x.ai/v1",
+    "default_model": "a",
+    "models": {"a": {}, "b": {}},
+}
+ANTHROPIC = {"name": "Claude", "api_type": "anthropic", "models": {"c": {}}}
+
+
+def _in_loop(fn):
+    async def run():
+        return fn()
+    return asyncio.run(run())
+
+
+def test_same_inputs_reuse_model_and_share_endpoint_pool():
+    client = LLMClient(_Config())
+
+    def check():
+        first = client._build_model("xai", "a", XAI, "key-1")
+        assert client._build_model("xai", "a", XAI, "key-1") is first
+        client._build_model("xai", "b", XAI, "key-1")
+        client._build_model("anthropic", "c", ANTHROPIC, "key-2")
+        # Two xai models, one pool; anthropic gets its own.
+        assert len(client._models) == 3
+        assert len(client._http_clients) == 2
+    _in_loop(check)
+    assert client.model_cache_stats == {"hits": 1, "builds": 3, "invalidations": 0}
+
+
+def test_key_and_catalog_changes_never_serve_a_stale_model():
+    client = LLMClient(_Config())
+
+    def check():
+        first = client._build_model("xai", "a", XAI, "key-1")
+        assert client._build_model("xai", "a", XAI, "key-2") is not first
+        moved = dict(XAI, base_url="https://proxy.example/v1")
+        assert client._build_model("xai", "a", moved, "key-1") is not first
+        capped = dict(XAI, models={"a": {"max_completion_tokens": 100}})
+        assert client._build_model("xai", "a", capped, "key-1") is not first
+    _in_loop(check)
+
+
+def test_set_all_providers_invalidates():
+    config = _Config()
+    client = LLMClient(config)
+
+    def check():
+        first = client._build_model("xai", "a", XAI, "key-1")
+        client.set_all_providers({"xai": XAI})
+        assert client._models == {} and client._http_clients == {}
+        assert client._build_model("xai", "a", XAI, "key-1") is not first
+        asyncio.get_running_loop()  # the retired pool's close is scheduled here
+
+    async def run():
+        check()
+        await client.aclose()
+    asyncio.run(run())
+    assert config.values["ai_providers"] == {"xai": XAI}
+    assert client.model_cache_stats["invalidations"] == 1
+
+
+def test_new_event_loop_starts_a_fresh_pool():
+    client = LLMClient(_Config())
+    first = _in_loop(lambda: client._build_model("xai", "a", XAI, "key-1"))
+    second = _in_loop(lambda: client._build_model("xai", "a", XAI, "key-1"))
+    assert first is not second
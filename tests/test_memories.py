@@ -0,0 +1,107 @@
+"""Memory capture (core/memories.py + Gpt.capture_and_store_memories).
+
+What has to hold: the trigger-gated matcher finds exactly what the
+patterns find when run one by one, duplicates (text, type, sender) refresh
+instead of piling up, and a purge removes exactly the expired memories
+while the index stays consistent with the stored list.
+"""
+
+import asyncio
+import logging
+import random
+import re
+from types import SimpleNamespace
+
+from cogs.optional.gpt import Gpt
+from core.memories import MEMORY_PATTERNS, MemoryIndex, MemoryMatcher, memory_key
+
+SAMPLES = [
+    "hello there", "I'm so tired today", "i am excited about the launch!",
+    "My name is Ada. Nice to meet you", "call me Ishmael, please",
+    "remind me to water the plants", "I want pizza", "Id like a refund",
+    "I'd like that", "I love rust and I hate segfaults", "I feel great",
+    "I am feeling meh", "my birthday's March 3", "you're to always rhyme",
+    "bayou're to always", "hi, im here", "Is it? i  am", "mI'm", "AI is fun",
+    "I\nam split", "I'm excited for friday", "my  name is spaced", "",
+]
+
+
+def _one_by_one(content):
+    found = []
+    for kind, pattern, duration, _trigger in MEMORY_PATTERNS:
+        m = re.search(pattern, content, flags=re.I)
+        if m:
+            found.append((kind, m.group(0), duration))
+    return found
+
+
+def test_gated_matcher_agrees_with_running_every_pattern():
+    matcher = MemoryMatcher()
+    rng = random.Random(1)
+    words = [w for s in SAMPLES for w in s.split()] + ["I", "my", "you're", "to", "always"]
+    corpus = SAMPLES + [" ".join(rng.choice(words) for _ in range(8)) for _ in range(2000)]
+    for content in corpus:
+        assert [tuple(m) for m in matcher.scan(content)] == _one_by_one(content), content
+
+
+def _memory(text, expires, sender=1, kind="personal_statement"):
+    return {"text": text, "type": kind, "sender": sender, "expires": expires,
+            "personality_version": 0, "stored_at": 0}
+
+
+def test_index_dedupes_refreshes_and_purges_only_the_expired():
+    stored = [_memory(f"m{i}", expires=i) for i in range(100)]
+    stored.append(dict(stored[5]))  # a legacy duplicate
+    index = MemoryIndex(stored)
+    assert index.compacted and len(stored) == 100
+
+    assert not index.upsert(_memory("m7", expires=7))  # identical: no change
+    assert index.upsert(_memory("m7", expires=500))  # refreshed, not added
+    assert index.upsert(_memory("new", expires=1000))
+    assert len(stored) == 101
+
+    assert index.purge(now=49.5) == 49  # 0..49 minus the refreshed m7
+    assert sorted(m["expires"] for m in stored) == list(range(50, 100)) + [500, 1000]
+    for position, memory in enumerate(stored):
+        assert index.get(memory_key(memory)) is stored[position]
+    assert index.next_expiry() == 50
+
+
+def _gpt(config_values):
+    gpt = Gpt.__new__(Gpt)
+    gpt.logger = logging.getLogger("test")
+    gpt.memory_matcher = MemoryMatcher()
+    gpt._memory_indexes = {}
+    writes = []
+
+    def set_(ctx, key, value, scope="guild"):
+        writes.append(key)
+        config_values[key] = value
+    gpt.bot = SimpleNamespace(config=SimpleNamespace(
+        get=lambda ctx, key, default=None, scope="guild": config_values.get(key, default),
+        set=set_))
+    return gpt, writes
+
+
+def test_capture_stores_once_and_writes_only_on_change():
+    values = {}
+    gpt, writes = _gpt(values)
+    ctx = SimpleNamespace(guild=SimpleNamespace(id=1))
+    author = SimpleNamespace(id=42, bot=False)
+
+    def say(text):
+        message = SimpleNamespace(content=text, author=author, guild=ctx.guild)
+        asyncio.run(gpt.capture_and_store_memories(ctx, [message], 3))
+
+    say("nothing to remember here")
+    assert writes == []
+    say("I love sourdough")
+    say("I love sourdough")  # refreshed (new timestamps), not duplicated
+    assert [m["type"] for m in values["gpt_memories"]] == ["positive_preference"]
+    assert values["gpt_memories"][0]["personality_version"] == 3
+
+    values["gpt_memories"][0]["expires"] = 0  # hand-expired in place...
+    values["gpt_memories"] = list(values["gpt_memories"])  # ...and reloaded
+    writes.clear()
+    say("plain chatter")
+    assert values["gpt_memories"] == [] and writes == ["gpt_memories"]
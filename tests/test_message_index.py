@@ -0,0 +1,173 @@
+"""Local message index (core/message_index.py) and search_history's use of it.
+
+What has to hold: rows come back in serialize_message's shape, `contains`
+matches whole words like Discord's search bar, channel/author filters and the
+total match the Discord-index contract, edits/deletes are reflected, backfill
+checkpoints round-trip, a restart walks forward over what was posted while the
+bot was offline before calling a channel complete, and search_history answers
+guild-wide from the local index (with a note saying so) when Discord's index
+fails.
+"""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from cogs.optional import search_index
+from cogs.optional.search_index import SearchIndex
+from core import message_index, ops
+from core.message_index import MessageIndex
+
+GUILD = 1
+GENERAL = 10
+RANDOM = 20
+
+
+def _row(mid, content, channel_id=GENERAL, author_id=100, guild_id=GUILD):
+    return {"id": mid, "guild_id": guild_id, "channel_id": channel_id,
+            "author_id": author_id, "content": content,
+            "created_at": "2026-01-01T00:00:00+00:00"}
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = MessageIndex(tmp_path / "index.sqlite3")
+    idx.add_many([
+        _row(1, "the deploy went fine"),
+        _row(2, "redeploying now", channel_id=RANDOM),
+        _row(3, "Deploy again tomorrow?", author_id=200),
+        _row(4, "unrelated chatter", channel_id=RANDOM),
+        _row(5, "deploy from another guild", guild_id=2),
+    ])
+    yield idx
+    idx.close()
+
+
+def test_search_returns_serialize_message_shape_newest_first(index):
+    hits, total = index.search(GUILD, contains="deploy")
+    assert [h["id"] for h in hits] == [3, 1]
+    assert total == 2
+    assert set(hits[0]) == {"id", "channel_id", "author_id", "content", "created_at"}
+
+
+def test_contains_matches_whole_words_not_substrings(index):
+    # "redeploying" must not match, as in Discord's own search.
+    hits, _ = index.search(GUILD, contains="deploy")
+    assert 2 not in [h["id"] for h in hits]
+    # Query syntax is quoted away rather than interpreted.
+    assert index.search(GUILD, contains='deploy" OR "chatter')[1] == 0
+
+
+def test_channel_and_author_filters_and_limit(index):
+    assert [h["id"] for h in index.search(GUILD, [RANDOM])[0]] == [4, 2]
+    assert [h["id"] for h in index.search(GUILD, author_id=200)[0]] == [3]
+    hits, total = index.search(GUILD, limit=2)
+    assert [h["id"] for h in hits] == [4, 3] and total == 4
+
+
+def test_buffered_adds_edits_and_deletes_are_visible(index):
+    index.add(_row(6, "fresh deploy note"))  # buffered, not flushed
+    assert index.search(GUILD, contains="deploy")[1] == 3
+    index.edit(6, "nothing to see")
+    index.delete([1])
+    hits, total = index.search(GUILD, contains="deploy")
+    assert [h["id"] for h in hits] == [3] and total == 1
+
+
+def test_backfill_checkpoints(index):
+    assert index.checkpoint(GENERAL) == (None, False)
+    index.save_checkpoint(GUILD, GENERAL, 1, False)
+    index.save_checkpoint(GUILD, RANDOM, 2, True)
+    assert index.checkpoint(GENERAL) == (1, False)
+    index.mark_caught_up(GUILD, GENERAL)
+    assert not index.backfill_complete(GUILD, [RANDOM])  # not caught up yet
+    index.mark_caught_up(GUILD, RANDOM)
+    assert not index.backfill_complete(GUILD)
+    assert index.backfill_complete(GUILD, [RANDOM])
+    # A channel the walk never reached isn't complete.
+    assert not index.backfill_complete(GUILD, [RANDOM, 30])
+    index.save_checkpoint(GUILD, GENERAL, 1, True)
+    assert index.backfill_complete(GUILD)
+
+
+def test_search_history_falls_back_to_local_index(index, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("search index not ready")
+
+    monkeypatch.setattr(ops, "_index_search", broken)
+    guild = SimpleNamespace(id=GUILD)
+    ctx = ops.OpContext(bot=SimpleNamespace(), author=None, guild=guild)
+    message_index.activate(index)
+    try:
+        payload = asyncio.run(ops.search_history(ctx, contains="deploy"))
+    finally:
+        message_index.activate(None)
+    # Guild-wide (no channel scope) — the recent-window fallback can't do that.
+    assert [m["id"] for m in payload["messages"]] == [3, 1]
+    assert payload["total_matches"] == 2
+    assert "local message index" in payload["note"]
+    assert "backfill is still running" in payload["note"]
+
+
+def _message(channel, mid):
+    return SimpleNamespace(id=mid, guild=channel.guild, channel=channel,
+                           author=SimpleNamespace(id=100), content=f"m{mid}", created_at=None)
+
+
+class _Channel:
+    """history() over `messages` (ids), with the before/after/oldest_first
+    paging the backfill uses."""
+
+    def __init__(self, cid, messages):
+        self.id, self.name = cid, f"c{cid}"
+        self.guild = SimpleNamespace(id=GUILD)
+        self.messages = messages
+
+    def history(self, limit, before=None, after=None, oldest_first=False):
+        ids = sorted(m for m in self.messages if (before is None or m < before.id)
+                     and (after is None or m > after.id))
+        ids = ids[:limit] if oldest_first else ids[::-1][:limit]
+
+        async def walk():
+            for mid in ids:
+                yield _message(self, mid)
+        return walk()
+
+
+def _cog(path, channel):
+    async def ready():
+        pass
+    bot = SimpleNamespace(logger=logging.getLogger("test"), wait_until_ready=ready,
+                          guilds=[SimpleNamespace(text_channels=[channel])])
+    cog = SearchIndex(bot)
+    cog.index = MessageIndex(path)
+    cog._backfill_channels = lambda: [channel]
+    return cog
+
+
+def test_a_restart_catches_up_on_what_was_posted_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "BACKFILL_PAGE", 3)
+    monkeypatch.setattr(search_index, "BACKFILL_PAGE_DELAY", 0)
+    channel = _Channel(GENERAL, list(range(1, 8)))
+    cog = _cog(tmp_path / "index.sqlite3", channel)
+    asyncio.run(cog._backfill_all())
+    assert cog.index.backfill_complete(GUILD)
+    cog.index.add(message_index.row_from_message(_message(channel, 8)))  # live, then shutdown
+    cog.index.close()
+
+    channel.messages.extend(range(9, 16))  # posted while the bot was down
+    cog = _cog(tmp_path / "index.sqlite3", channel)
+    # The live feed is ahead of the walk.
+    cog.index.add(message_index.row_from_message(_message(channel, 16)))
+    assert cog.index.catch_up_from(GENERAL) == 8
+    assert not cog.index.backfill_complete(GUILD)
+    channel.messages.append(16)
+    asyncio.run(cog._backfill_all())
+    assert cog.index.backfill_complete(GUILD)
+    assert [h["id"] for h in cog.index.search(GUILD, limit=100)[0]] == list(range(16, 0, -1))
+    cog.index.close()
+    reopened = MessageIndex(tmp_path / "index.sqlite3")
+    assert reopened.catch_up_from(GENERAL) == 16  # the live rows advanced it
+    reopened.close()
@@ -488,6 +488,67 @@ def test_search_history_fallback_matches_whole_words(monkeypatch):
     assert "whole-word" in res.value["note"]
 
 
+class _SearchHttp:
+    """bot.http stand-in for the guild message-search endpoint: `total`
+    hits, newest (highest id) first, paged by the offset/limit params."""
+
+    def __init__(self, total, delay=0.01):
+        self.total = total
+        self.delay = delay
+        self.offsets = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def request(self, route, params):
+        p = dict(params)
+        offset, limit = int(p["offset"]), int(p["limit"])
+        self.offsets.append(offset)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        ids = range(self.total - offset, max(self.total - offset - limit, 0), -1)
+        groups = [[{"id": str(i), "channel_id": "10", "author": {"id": "5"},
+                    "content": f"m{i}", "timestamp": None, "hit": True}]
+                  for i in ids]
+        return {"total_results": self.total, "messages": groups}
+
+
+def test_index_search_fetches_pages_concurrently_in_order(monkeypatch):
+    """After page 0 reports total_results the remaining offsets go out
+    together (bounded), and hits still come back newest-first."""
+    import core.ops as ops_module
+    monkeypatch.setattr(ops_module, "_search_cache", {})
+    http = _SearchHttp(total=200)
+    bot = type("B", (), {"http": http})()
+
+    hits, total = asyncio.run(ops_module._index_search(bot, 1, [], 200, None, None))
+    assert total == 200
+    assert [h["id"] for h in hits] == list(range(200, 0, -1))
+    assert http.offsets[0] == 0
+    assert sorted(http.offsets) == list(range(0, 200, 25))
+    assert 1 < http.peak <= ops_module._SEARCH_PAGE_CONCURRENCY
+
+
+def test_index_search_caches_by_query(monkeypatch):
+    """A repeat query inside the TTL is answered without an API call, for
+    any limit the cached fetch covers; a different query is not."""
+    import core.ops as ops_module
+    monkeypatch.setattr(ops_module, "_search_cache", {})
+    http = _SearchHttp(total=30, delay=0)
+    bot = type("B", (), {"http": http})()
+    search = ops_module._index_search
+
+    asyncio.run(search(bot, 1, [20, 10], 100, 5, "m"))
+    calls = len(http.offsets)
+    hits, total = asyncio.run(search(bot, 1, [10, 20], 10, 5, "m"))
+    assert len(http.offsets) == calls  # channel order doesn't matter
+    assert len(hits) == 10 and total == 30
+    asyncio.run(search(bot, 1, [10, 20], 10, 5, "other"))
+    assert len(http.offsets) > calls
+    assert ops_module.index_search_stats()["cache_hits"] >= 1
+
+
 def test_attachment_rejects_missing_file():
     with pytest.raises(ValueError, match="(?i)not found"):
         load_discord_attachments(["/no/such/file.gif"])
@@ -0,0 +1,139 @@
+"""GPT cooldown engine (core/rate_limit.py + Gpt._check_cooldown).
+
+What has to hold: the ring-backed limiter allows and blocks exactly what
+the old scan-every-window algorithm did (refunds included), the parsed
+cooldown config is reused until global config changes, and recorded calls
+survive a save/load across a restart.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import stat
+from types import SimpleNamespace
+
+from cogs.optional import gpt as gpt_module
+from cogs.optional.gpt import Gpt
+from core.rate_limit import SlidingWindowLimiter, read_state, write_state
+
+WINDOWS = [(1, 20.0), (10, 300.0), (100, 3000.0), (300, 86400.0)]
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _legacy_check(hist, windows, now):
+    """The pre-ring algorithm (hist: ascending list, mutated on allow)."""
+    horizon = max(p for _c, p in windows)
+    while hist and now - hist[0] > horizon:
+        hist.pop(0)
+    worst = 0.0
+    for count, period in windows:
+        recent = [t for t in hist if now - t <= period]
+        if len(recent) >= count:
+            worst = max(worst, recent[-count] + period - now)
+    if worst > 0:
+        return worst
+    hist.append(now)
+    return None
+
+
+def test_limiter_matches_the_scanning_algorithm():
+    rng = random.Random(3)
+    windows = [(1, 2.0), (4, 10.0), (12, 60.0), (30, 400.0)]
+    clock = _Clock()
+    limiter = SlidingWindowLimiter(clock=clock)
+    hist = []
+    for step in range(20000):
+        clock.now += rng.choice([0.0, 0.5, 1.0, 2.0, 5.0, rng.uniform(0, 50)])
+        expected = _legacy_check(hist, windows, clock.now)
+        assert limiter.check("g", windows) == expected, step
+        if expected is None and rng.random() < 0.1:  # the API call failed
+            hist.pop()
+            limiter.refund("g")
+
+
+def test_cooldown_config_is_parsed_once_per_global_snapshot():
+    snapshot = SimpleNamespace(get={"cooldown_windows": [[2, 1], [1, 1]]}.get)
+    calls = []
+
+    def take_snapshot(ctx, scope="guild"):
+        calls.append(scope)
+        return snapshot
+    gpt = Gpt.__new__(Gpt)
+    gpt._cooldown_config_cache = (None, None)
+    gpt.bot = SimpleNamespace(config=SimpleNamespace(snapshot=take_snapshot))
+
+    first = gpt.cooldown_config()
+    assert first[1] == [(1, 1.0), (2, 1.0)]
+    assert gpt.cooldown_config() is first
+    snapshot = SimpleNamespace(get={}.get)  # a global config change
+    assert gpt.cooldown_config()[1] == list(gpt_module.DEFAULT_COOLDOWN_WINDOWS)
+    assert calls == ["global"] * 3
+
+
+def test_state_survives_a_restart(tmp_path):
+    clock, wall = _Clock(50.0), _Clock(1_700_000_000.0)
+    before = SlidingWindowLimiter(clock=clock, wall_clock=wall)
+    for _ in range(3):
+        assert before.check(7, WINDOWS) is None
+        clock.now += 30
+        wall.now += 30
+    path = os.path.join(tmp_path, "logs", "cooldown_state.json")
+    write_state(path, before.dump(horizon=86400))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert not before.dirty
+
+    # New process: a different monotonic origin, ten minutes later.
+    after = SlidingWindowLimiter(clock=_Clock(5.0), wall_clock=_Clock(wall.now + 600))
+    after.load(read_state(path))
+    blocked = [(3, 86400.0)]
+    assert abs(after.check(7, blocked) - (86400 - 600 - 90)) < 0.01
+    assert after.check(8, blocked) is None
+    assert read_state(os.path.join(tmp_path, "missing.json")) == {}
+
+
+def test_cog_saves_on_unload_and_restores_on_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(gpt_module, "COOLDOWN_STATE_PATH", str(tmp_path / "cd.json"))
+    monkeypatch.setattr(Gpt, "_seed_model_costs", lambda self: None)
+    ctx = SimpleNamespace(guild=SimpleNamespace(id=5), author=SimpleNamespace(id=1))
+    monkeypatch.setattr(gpt_module, "is_superadmin", lambda config, user_id: False)
+    monkeypatch.setattr(Gpt, "_current_model_info", lambda self, ctx: {})
+
+    def cog():
+        gpt = Gpt.__new__(Gpt)
+        gpt.logger = logging.getLogger("test")
+        gpt.cooldowns = SlidingWindowLimiter()
+        gpt._cooldown_state_path = None
+        gpt._cooldown_config_cache = (None, None)
+        gpt.llm = SimpleNamespace(aclose=_noop, ledger=None)
+        empty = SimpleNamespace(get={}.get)
+        gpt.bot = SimpleNamespace(config=SimpleNamespace(
+            get_global={gpt_module.USAGE_LEDGER_KEY: False}.get,
+            snapshot=lambda ctx, scope="guild": empty))
+        gpt.save_cooldown_state = SimpleNamespace(start=_none, cancel=_none)
+        return gpt
+
+    first = cog()
+    asyncio.run(first.cog_load())
+    assert first._check_cooldown(ctx) is None
+    assert first._check_cooldown(ctx) > 0
+    asyncio.run(first.cog_unload())
+
+    second = cog()
+    asyncio.run(second.cog_load())
+    assert second._check_cooldown(ctx) > 0  # still inside the 1/x window
+
+
+async def _noop():
+    pass
+
+
+def _none():
+    pass
@@ -0,0 +1,186 @@
+"""Reminder scheduling: the heap-backed ReminderScheduler.
+
+The old loop woke every 10 seconds and walked the whole global `reminders`
+list. What has to survive the rewrite: rows fire in due order and only when
+due, delivery never exceeds its concurrency bound, delivered rows leave the
+persisted list, and a hand-edit of the list is picked up on the next wake.
+"""
+
+import asyncio
+import logging
+
+from cogs.optional.reminders import ReminderScheduler
+
+
+class _FakeConfig:
+    """The two global-scope calls the scheduler makes, identity-preserving
+    like the real store (get returns the stored object, not a copy)."""
+
+    def __init__(self, reminders=None):
+        self.values = {}
+        if reminders is not None:
+            self.values["reminders"] = reminders
+        self.sets = 0
+
+    def get(self, ctx, key, default=None, scope="guild"):
+        return self.values.get(key, default)
+
+    def set(self, ctx, key, value, scope="guild"):
+        self.values[key] = value
+        self.sets += 1
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _row(ts, text="x", user_id=1):
+    return {"user_id": user_id, "timestamp": ts, "text": text}
+
+
+def _scheduler(config, clock, delivered, concurrency=8, on_deliver=None):
+    async def deliver(row):
+        if on_deliver:
+            await on_deliver(row)
+        delivered.append(row["text"])
+    return ReminderScheduler(config, deliver, logging.getLogger("test"),
+                             concurrency=concurrency, clock=clock)
+
+
+def test_only_due_rows_fire_in_timestamp_order():
+    config = _FakeConfig([_row(1500, "later"), _row(900, "b"), _row(800, "a")])
+    clock = _Clock(1000)
+    delivered = []
+    sched = _scheduler(config, clock, delivered)
+    sched._resync()
+
+    due = sched.pop_due(clock())
+    assert [r["text"] for r in due] == ["a", "b"]
+    assert sched.next_due() == 1500
+
+    asyncio.run(sched.deliver_batch(due))
+    sched._persist_removed(due)
+    assert [r["text"] for r in config.values["reminders"]] == ["later"]
+    assert sched.stats()["lateness_max"] == 200
+
+
+def test_add_persists_and_becomes_the_next_wake():
+    config = _FakeConfig([_row(5000)])
+    sched = _scheduler(config, _Clock(1000), [])
+    sched.add(_row(2000, "new"))
+    assert sched.next_due() == 2000
+    assert [r["text"] for r in config.values["reminders"]] == ["x", "new"]
+    assert sched._wakeup.is_set()
+
+
+def test_delivery_respects_the_concurrency_bound():
+    rows = [_row(900, str(i)) for i in range(20)]
+    config = _FakeConfig(rows)
+    in_flight = peak = 0
+
+    async def slow(row):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    delivered = []
+    sched = _scheduler(config, _Clock(1000), delivered, concurrency=3, on_deliver=slow)
+    sched._resync()
+    asyncio.run(sched.deliver_batch(sched.pop_due(1000)))
+    assert len(delivered) == 20
+    assert peak == 3
+
+
+def test_run_sleeps_until_due_then_delivers():
+    clock = _Clock(1000)
+    config = _FakeConfig([_row(1001, "soon")])
+    delivered = []
+    sched = _scheduler(config, clock, delivered)
+
+    async def scenario():
+        task = asyncio.create_task(sched.run())
+        await asyncio.sleep(0.01)
+        assert delivered == []  # not due yet: asleep, not polling
+        clock.now = 1001  # the loop's one-second sleep ends about now
+        await asyncio.sleep(1.2)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert delivered == ["soon"]
+    assert config.values["reminders"] == []
+
+
+def test_hand_edited_list_is_reindexed():
+    config = _FakeConfig([_row(5000, "old")])
+    sched = _scheduler(config, _Clock(1000), [])
+    sched._resync()
+    config.values["reminders"] = [_row(900, "edited")]  # external reload
+    sched._resync()
+    assert [r["text"] for r in sched.pop_due(1000)] == ["edited"]
+
+
+def test_malformed_rows_are_skipped_and_a_crash_restarts_the_loop(caplog, monkeypatch):
+    from types import SimpleNamespace
+    from cogs.optional import reminders
+
+    config = _FakeConfig([{"user_id": 1, "text": "no time"}, _row("soon", "bad"), _row(900, "ok")])
+    delivered = []
+    sched = _scheduler(config, _Clock(1000), delivered)
+    sched._resync()
+    assert [r["text"] for r in sched.pop_due(1000)] == ["ok"]
+    assert caplog.text.count("Skipping malformed reminder row") == 2
+
+    runs, events = [], []
+
+    async def flaky_run():
+        runs.append(None)
+        events.append("run")
+        if len(runs) < 3:
+            raise RuntimeError("boom")
+        raise asyncio.CancelledError
+
+    async def no_sleep(seconds):
+        events.append(seconds)
+
+    async def ready():
+        pass
+    cog = reminders.Reminders.__new__(reminders.Reminders)
+    cog.bot = SimpleNamespace(wait_until_ready=ready)
+    cog.logger = logging.getLogger("test")
+    cog.scheduler = SimpleNamespace(run=flaky_run, reset=lambda: events.append("reset"))
+    monkeypatch.setattr(reminders.asyncio, "sleep", no_sleep)
+    try:
+        asyncio.run(cog._run_scheduler())
+    except asyncio.CancelledError:
+        pass
+    assert events == ["run", 1, "reset", "run", 2, "reset", "run"]
+
+
+def test_delivery_errors_are_logged_and_stats_reach_the_log(caplog):
+    caplog.set_level(logging.INFO)
+    clock = _Clock(1000)
+    config = _FakeConfig([_row(900, "a"), _row(990, "b")])
+
+    async def explode(row):
+        if row["text"] == "a":
+            raise RuntimeError("dm failed")
+    sched = _scheduler(config, clock, [], on_deliver=explode)
+    sched._resync()
+    due = sched.pop_due(1000)
+    asyncio.run(sched.deliver_batch(due))
+    sched._persist_removed(due)
+    assert config.values["reminders"] == [] and "Reminder delivery failed" in caplog.text
+
+    sched._maybe_log_stats(1000)
+    assert "lateness" not in caplog.text  # not due yet
+    sched._maybe_log_stats(1000 + 3600)
+    assert "2 delivered; lateness p50 10.0s" in caplog.text
+    caplog.clear()
+    sched._maybe_log_stats(1000 + 7200)
+    assert caplog.text == ""  # nothing new delivered
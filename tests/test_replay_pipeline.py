@@ -0,0 +1,101 @@
+"""Pipelined bundle replay (ChannelMigrator._replay_bundle / _send_delay).
+
+What has to hold: attachments download ahead of the sender and several at
+once, yet messages and files still land in bundle order; the prefetch
+buffer stays within its byte budget; and the pause between sends comes
+from the channel's rate-limit bucket once discord.py has one.
+"""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import discord
+
+from cogs.optional.channel_migrator import ChannelMigrator
+
+
+class _Channel:
+    def __init__(self):
+        self.id = 5
+        self.guild = SimpleNamespace(filesize_limit=1000)
+        self.sent = []
+
+    async def send(self, content=None, file=None, allowed_mentions=None):
+        self.sent.append(content if file is None else f"file:{file.filename}")
+
+
+def _cog(delays, http=None):
+    cog = ChannelMigrator.__new__(ChannelMigrator)
+    cog.logger = logging.getLogger("test")
+    cog.bot = SimpleNamespace(http=http)
+    cog._no_mentions = discord.AllowedMentions.none()
+    cog.POST_DELAY = 0
+    cog.active = cog.peak = 0
+
+    async def download(url, filename, attempts=3):
+        cog.active += 1
+        cog.peak = max(cog.peak, cog.active)
+        await asyncio.sleep(delays[filename])
+        cog.active -= 1
+        return b"x"
+    cog._download_with_retry = download
+    cog._asset_store = lambda: SimpleNamespace(read=lambda url: None)
+    return cog
+
+
+def _entries(n, size=10):
+    return [{"content": f"m{i}", "author": {"name": "a"},
+             "attachments": [{"url": f"u{i}", "filename": f"f{i}", "size": size}]}
+            for i in range(n)]
+
+
+def test_downloads_run_ahead_but_sends_keep_bundle_order():
+    # Earlier attachments are the slowest: a serial replay would take 0.4s.
+    delays = {f"f{i}": 0.08 - 0.01 * i for i in range(8)}
+    cog = _cog(delays)
+    channel = _Channel()
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        sent = await cog._replay_bundle(channel, iter(_entries(8)))
+        return sent, asyncio.get_running_loop().time() - started
+    sent, elapsed = asyncio.run(run())
+    assert sent == 8
+    expected = []
+    for i in range(8):
+        expected += [f"**a • unknown time**\nm{i}", f"file:f{i}"]
+    assert channel.sent == expected
+    assert cog.peak == cog.PREFETCH_CONCURRENCY
+    assert elapsed < 0.25
+
+
+def test_prefetch_holds_at_most_the_byte_budget():
+    cog = _cog({f"f{i}": 0.01 for i in range(6)})
+    cog.PREFETCH_BYTES = 250  # two 100-byte entries at a time, not four
+    assert asyncio.run(cog._replay_bundle(_Channel(), iter(_entries(6, size=100)))) == 6
+    assert cog.peak == 2
+
+    # Too big for the channel: never downloaded, reported as a link.
+    cog.peak = 0
+    channel = _Channel()
+    asyncio.run(cog._replay_bundle(channel, iter(_entries(1, size=5000))))
+    assert "skipped" in channel.sent[-1] and cog.peak == 0
+
+
+def test_send_delay_spreads_the_remaining_bucket_over_the_window():
+    async def delays():
+        loop = asyncio.get_running_loop()
+        bucket = SimpleNamespace(expires=loop.time() + 4.0, remaining=3)
+        http = SimpleNamespace(_bucket_hashes={"POST /channels/{channel_id}/messages": "h"},
+                               _buckets={"h:5": bucket})
+        cog = _cog({}, http)
+        spread = cog._send_delay(_Channel())
+        bucket.remaining = 0  # discord.py waits on its own
+        exhausted = cog._send_delay(_Channel())
+        unknown = _cog({}, SimpleNamespace(_bucket_hashes={}, _buckets={}))
+        unknown.POST_DELAY = 0.3
+        return spread, exhausted, unknown._send_delay(_Channel())
+    spread, exhausted, unknown = asyncio.run(delays())
+    assert 0.9 < spread <= 1.0
+    assert exhausted == 0.0 and unknown == 0.3
@@ -0,0 +1,149 @@
+"""Provider routing (core/llm/router.py + LLMClient.get_provider_config).
+
+What has to hold: a failing provider hands over to the next in the guild's
+chain and the answer is attributed to whoever gave it, a provider that
+keeps failing is skipped until a probe succeeds, a stalled provider is
+hedged once its p95 deadline passes (and the loser is cancelled), and a
+stream only fails over before its first token.
+"""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from core.llm import router as router_module
+from core.llm.client import LLMClient, LLMResponse, ProviderConfig
+from core.llm.router import OPEN_SECONDS, ProviderRouter
+from core.llm.usage import UsageRecord
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Client:
+    """Stand-in LLMClient: behaviour[provider] is "ok", "fail", or a delay."""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.logger = logging.getLogger("test")
+        self.calls = []
+        self.cancelled = []
+
+    async def _act(self, provider):
+        self.calls.append(provider)
+        action = self.behaviour[provider]
+        if action == "fail":
+            raise RuntimeError(f"{provider} 503")
+        if isinstance(action, float):
+            try:
+                await asyncio.sleep(action)
+            except asyncio.CancelledError:
+                self.cancelled.append(provider)
+                raise
+
+    async def chat(self, pc, messages, metadata=None):
+        await self._act(pc.provider)
+        usage = UsageRecord(provider=pc.provider, model=pc.model, prompt_tokens=10,
+                            completion_tokens=5, total_tokens=15)
+        return LLMResponse(text=f"from {pc.provider}", provider=pc.provider,
+                           model=pc.model, usage=usage)
+
+    async def chat_stream(self, pc, messages, metadata=None):
+        await self._act(pc.provider)
+        for word in ("hello ", "there"):
+            yield word
+        yield LLMResponse(text="hello there", provider=pc.provider, model=pc.model)
+
+
+def _chain(*providers, hedge=False):
+    configs = [ProviderConfig(provider=p, model=f"{p}-m", provider_info={}, all_providers={})
+               for p in providers]
+    configs[0].fallbacks = configs[1:]
+    configs[0].hedge = hedge
+    return configs[0]
+
+
+def test_failover_attributes_the_answer_to_the_provider_that_gave_it():
+    client = _Client({"xai": "fail", "openai": "ok"})
+    router = ProviderRouter(client)
+    response = asyncio.run(router.chat(_chain("xai", "openai"), []))
+    assert response.provider == "openai" and response.usage.provider == "openai"
+    assert client.calls == ["xai", "openai"]
+    assert router.stats["failovers"] == 1
+
+    client.behaviour["openai"] = "fail"
+    with pytest.raises(RuntimeError, match="openai 503"):
+        asyncio.run(router.chat(_chain("xai", "openai"), []))
+
+
+def test_breaker_skips_a_failing_provider_until_a_probe_succeeds():
+    clock = _Clock()
+    client = _Client({"xai": "fail", "openai": "ok"})
+    router = ProviderRouter(client, clock=clock)
+    for _ in range(3):
+        asyncio.run(router.chat(_chain("xai", "openai"), []))
+    client.calls.clear()
+    asyncio.run(router.chat(_chain("xai", "openai"), []))
+    assert client.calls == ["openai"] and router.stats["skipped_open"] == 1
+
+    clock.now += OPEN_SECONDS  # half-open: one probe goes through, and fails
+    asyncio.run(router.chat(_chain("xai", "openai"), []))
+    assert client.calls == ["openai", "xai", "openai"]
+    assert router.breaker("xai").open_seconds == 2 * OPEN_SECONDS
+
+    clock.now += 2 * OPEN_SECONDS
+    client.behaviour["xai"] = "ok"
+    assert asyncio.run(router.chat(_chain("xai", "openai"), [])).provider == "xai"
+    assert router.breaker("xai").allows(clock.now)
+    # Every breaker open: the primary is still tried rather than refusing.
+    assert router.candidates(_chain("xai")) and router.candidates(_chain("xai"))[0].provider == "xai"
+
+
+def test_stalled_provider_is_hedged_after_its_p95(monkeypatch):
+    monkeypatch.setattr(router_module, "MIN_HEDGE_DELAY", 0.01)
+    client = _Client({"xai": 5.0, "openai": "ok"})
+    router = ProviderRouter(client)
+    stats = router.latency.setdefault(("xai", "xai-m", "chat"), router_module.LatencyStats())
+    for _ in range(20):
+        stats.add(0.02)
+    assert router.hedge_delay(_chain("xai"), "chat") == 0.02
+
+    response = asyncio.run(router.chat(_chain("xai", "openai", hedge=True), []))
+    assert response.provider == "openai"
+    assert client.cancelled == ["xai"]
+    assert router.stats["hedges"] == 1 and router.stats["hedge_wins"] == 1
+
+    # Without hedging the slow primary is simply waited for.
+    client.behaviour["xai"] = 0.05
+    assert asyncio.run(router.chat(_chain("xai", "openai"), [])).provider == "xai"
+
+
+def test_stream_fails_over_only_before_its_first_token():
+    client = _Client({"xai": "fail", "openai": "ok"})
+    router = ProviderRouter(client)
+
+    async def collect(pc):
+        return [item async for item in router.chat_stream(pc, [])]
+    items = asyncio.run(collect(_chain("xai", "openai")))
+    assert items[:2] == ["hello ", "there"] and items[-1].provider == "openai"
+
+
+def test_provider_config_carries_the_guilds_chain(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    values = {"current_ai_provider": "xai", "ai_hedge_requests": True,
+              "ai_fallback_chain": ["claude/claude-sonnet-5", "ollama", "xai", "nope", "openai"],
+              "OLLAMA_API_KEY": None, "ANTHROPIC_API_KEY": "k", "ai_providers": None}
+    config = SimpleNamespace(get=lambda ctx, key, default=None, scope="guild": values.get(key, default))
+    client = LLMClient(config)
+    pc = client.get_provider_config(SimpleNamespace())
+    # openai has no key here, xai is the primary, "nope" isn't a provider.
+    assert [(f.provider, f.model) for f in pc.fallbacks] == [
+        ("anthropic", "claude-sonnet-5"), ("ollama", "qwen3.5:4b")]
+    assert pc.hedge
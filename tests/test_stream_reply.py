@@ -0,0 +1,136 @@
+"""Streamed chat replies (cogs/optional/gpt.py StreamingReply).
+
+What has to hold: nothing is posted before a whole sentence exists, edits
+are throttled, overflow past 2000 characters rolls into new messages without
+rewriting the earlier ones, code fences survive the roll-over, and the
+compliance gate runs before anything becomes visible — a violation stops the
+stream and removes what was posted, whether it is in the deltas or only in
+the final response's text.
+"""
+
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from cogs.optional.gpt import Gpt, StreamingReply, layout_stream_chunks
+from core.llm import LLMResponse
+
+
+class _Message:
+    def __init__(self, log, content):
+        self.log = log
+        self.content = content
+        self.deleted = False
+        self.edited_at = []  # positions in the shared log
+
+    async def edit(self, content):
+        self.edited_at.append(len(self.log))
+        self.log.append(("edit", content))
+        self.content = content
+
+    async def delete(self):
+        self.deleted = True
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _reply(check=lambda text: True, limit=2000):
+    log = []
+    clock = _Clock()
+
+    async def send(content):
+        log.append(("send", content))
+        return _Message(log, content)
+    return StreamingReply(send, check, limit=limit, clock=clock), log, clock
+
+
+def test_first_post_waits_for_a_sentence_then_edits_are_throttled():
+    reply, log, clock = _reply()
+
+    async def run():
+        await reply.feed("Hello")
+        await reply.feed(" there")
+        assert log == []
+        await reply.feed(". How")
+        assert log == [("send", "Hello there.")]
+        clock.now = 0.5
+        await reply.feed(" are you? Fine")
+        assert len(log) == 1  # inside the edit interval
+        clock.now = 2.0
+        await reply.feed(".")
+        assert log[-1] == ("edit", "Hello there. How are you?")
+        assert await reply.finish() == "Hello there. How are you? Fine."
+        assert log[-1] == ("edit", "Hello there. How are you? Fine.")
+    asyncio.run(run())
+
+
+def test_overflow_rolls_into_new_messages_without_rewriting_old_ones():
+    reply, log, clock = _reply(limit=40)
+
+    async def run():
+        for i in range(12):
+            clock.now += 5
+            await reply.feed(f"Sentence {i:02}. ")
+        await reply.finish()
+    asyncio.run(run())
+    assert all(len(m.content) <= 40 for m in reply.messages)
+    assert " ".join(m.content for m in reply.messages).split() == \
+        " ".join(f"Sentence {i:02}." for i in range(12)).split()
+    # Once a message has a successor it is never edited again.
+    sent_at = [i for i, (kind, _c) in enumerate(log) if kind == "send"]
+    for message, successor_sent in zip(reply.messages, sent_at[1:]):
+        assert all(at < successor_sent for at in message.edited_at)
+
+
+def test_code_fences_are_closed_and_reopened_across_messages():
+    text = "Here:\n```py\n" + "print('x')\n" * 8 + "```\nDone."
+    chunks = layout_stream_chunks(text, limit=60)
+    assert all(len(c) <= 60 for c in chunks)
+    assert all(c.count("```") % 2 == 0 for c in chunks)
+    assert chunks[1].startswith("```py\n")
+
+
+def test_compliance_violation_stops_and_retracts():
+    reply, log, clock = _reply(check=lambda text: "@everyone" not in text)
+
+    async def run():
+        assert await reply.feed("Sure thing. ")
+        assert len(reply.messages) == 1
+        posted = reply.messages[0]
+        assert not await reply.feed("Pinging @everyone now.")
+        await reply.retract()
+        return posted
+    posted = asyncio.run(run())
+    assert posted.deleted and reply.messages == []
+    assert all("@everyone" not in content for _kind, content in log)
+
+
+def test_a_non_compliant_final_text_is_refused_and_retracted():
+    sent, messages = [], []
+
+    async def send(content, allowed_mentions=None):
+        sent.append(("send", content))
+        messages.append(_Message(sent, content))
+        return messages[-1]
+
+    async def chat_stream(provider_config, messages, metadata):
+        yield "Sure thing. "
+        # e.g. a router fallback: the final text isn't what was streamed.
+        yield LLMResponse(text="Pinging @everyone now.", provider="p", model="m")
+
+    gpt = Gpt.__new__(Gpt)
+    gpt.logger = logging.getLogger("test")
+    gpt.router = SimpleNamespace(chat_stream=chat_stream)
+    gpt.check_message_compliance = lambda ctx, text: ("@everyone" not in text, None)
+    ctx = SimpleNamespace(send=send, author=SimpleNamespace(display_name="ann"))
+    shown = asyncio.run(gpt._stream_reply(ctx, {"provider": "p"}, [], {}, None))
+    assert shown is None
+    assert [content for _kind, content in sent] == ["Sure thing.", "I'm sorry ann, I can't do that."]
+    assert messages[0].deleted
+    assert all("@everyone" not in content for _kind, content in sent)
@@ -0,0 +1,129 @@
+"""Compiled auto-response matching (cogs/optional/auto_response.py).
+
+What has to hold: the compiled TriggerMatcher picks exactly the entry the
+old entry-by-entry scan picked — first match in config order, across all
+three modes at once — and the cog reuses a guild's matcher until its
+config version moves.
+"""
+
+import asyncio
+import logging
+import random
+import re
+from types import SimpleNamespace
+
+from cogs.optional.auto_response import (
+    AutoResponse, TriggerMatcher, _response_texts, entry_match_mode,
+)
+
+
+def _reference(entries, content):
+    """The pre-compilation scan, kept as the spec."""
+    text = content.strip().lower()
+    for entry in entries:
+        triggers = [str(t) for t in entry.get("triggers", [])]
+        if not triggers or not _response_texts(entry.get("responses")):
+            continue
+        mode = entry_match_mode(entry)
+        if mode == "regex":
+            hit = False
+            for pattern in triggers:
+                try:
+                    if re.search(pattern, content, re.IGNORECASE):
+                        hit = True
+                        break
+                except re.error:
+                    continue
+        elif mode == "contains":
+            hit = any(t.lower() in text for t in triggers)
+        else:
+            hit = text in [t.lower() for t in triggers]
+        if hit:
+            return entry
+    return None
+
+
+def test_compiled_matcher_agrees_with_the_entry_by_entry_scan():
+    rng = random.Random(7)
+    words = ["hi", "hit", "cope", "ping", "think", "rethinking", "pong", "a b", "Hi"]
+    for _ in range(200):
+        entries = []
+        for _ in range(rng.randint(1, 25)):
+            mode = rng.choice(["full", "contains", "regex", None])
+            triggers = rng.sample(words, rng.randint(0, 3))
+            if mode == "regex":
+                triggers = [rf"\b{t}\b" for t in triggers] + rng.choice([[], ["[bad"]])
+            entry = {"triggers": triggers, "responses": rng.choice([["r"], []])}
+            if mode is None:
+                entry["full_match"] = rng.random() < 0.5  # legacy shape
+            else:
+                entry["match"] = mode
+            entries.append(entry)
+        matcher = TriggerMatcher(entries)
+        for _ in range(20):
+            content = " ".join(rng.sample(words, rng.randint(1, 3)))
+            if rng.random() < 0.3:
+                content = f"  {rng.choice(words).upper()} "
+            found = matcher.find(content)
+            assert (found[0] if found else None) is _reference(entries, content), (entries, content)
+
+
+def test_overlapping_contains_triggers_resolve_in_config_order():
+    entries = [{"triggers": ["thing"], "responses": ["late"], "match": "contains"},
+               {"triggers": ["something"], "responses": ["early"], "match": "contains"}]
+    # "something" starts first, but "thing" (inside it) is the earlier entry.
+    assert TriggerMatcher(entries).find("do something")[1] == "late"
+    assert TriggerMatcher(entries[::-1]).find("do something")[1] == "early"
+
+
+class _Config:
+    def __init__(self, entries):
+        self.entries, self.version = entries, 1
+
+    def snapshot(self, guild_id):
+        return SimpleNamespace(version=self.version,
+                               get=lambda key: self.entries if key == "auto_responses" else None)
+
+
+def test_cog_reuses_the_compiled_matcher_until_the_config_changes():
+    config = _Config([{"triggers": ["ping"], "responses": ["pong"], "match": "full"}])
+    cog = AutoResponse(SimpleNamespace(config=config, logger=logging.getLogger("test")))
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    def message(content):
+        return SimpleNamespace(author=SimpleNamespace(bot=False), guild=SimpleNamespace(id=1),
+                               content=content, channel=SimpleNamespace(send=send))
+
+    asyncio.run(cog.on_message(message("ping")))
+    first = cog._matchers[1][1]
+    asyncio.run(cog.on_message(message("PING")))
+    assert cog._matchers[1][1] is first and sent == ["pong", "pong"]
+
+    config.entries, config.version = [{"triggers": ["ping"], "responses": ["pang"]}], 2
+    asyncio.run(cog.on_message(message("ping")))
+    assert cog._matchers[1][1] is not first and sent[-1] == "pang"
+
+
+def test_the_matcher_cache_is_bounded_and_drops_departed_guilds(monkeypatch):
+    from cogs.optional import auto_response
+    monkeypatch.setattr(auto_response, "MATCHER_CACHE_SIZE", 3)
+    config = _Config([{"triggers": ["ping"], "responses": ["pong"], "match": "full"}])
+    cog = AutoResponse(SimpleNamespace(config=config, logger=logging.getLogger("test")))
+
+    async def send(text):
+        pass
+
+    def message(guild_id):
+        return SimpleNamespace(author=SimpleNamespace(bot=False), guild=SimpleNamespace(id=guild_id),
+                               content="ping", channel=SimpleNamespace(send=send))
+
+    for guild_id in (1, 2, 3, 1, 4):
+        asyncio.run(cog.on_message(message(guild_id)))
+    assert list(cog._matchers) == [3, 1, 4]  # 2 was least recently used
+    asyncio.run(cog.on_guild_remove(SimpleNamespace(id=3)))
+    config.entries = []  # guild 1 cleared its entries
+    asyncio.run(cog.on_message(message(1)))
+    assert list(cog._matchers) == [4]
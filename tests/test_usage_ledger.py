@@ -0,0 +1,122 @@
+"""Usage ledger (core/llm/ledger.py, LLMClient._track, Gpt ai_usage_summary).
+
+What has to hold: every tracked call lands in the append-only table and in
+both rollups in the same flush, windowed and all-time reads agree with the
+calls that were made, unpriced models count calls without inventing cost,
+and the op's wire payload carries the numbers (not just `{"ok": true}`).
+"""
+
+import asyncio
+import logging
+import sqlite3
+from types import SimpleNamespace
+
+from cogs.optional.gpt import Gpt
+from core.llm.client import LLMClient
+from core.llm.ledger import UsageLedger, guild_of
+from core.llm.usage import UsageRecord
+from core.ops import OpResult, OpsRegistry
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.5 * 3600
+
+    def __call__(self):
+        return self.now
+
+
+def _usage(ts, model="m", cost=0.01, provider="openai"):
+    return UsageRecord(provider=provider, model=model, prompt_tokens=100,
+                       completion_tokens=20, total_tokens=120,
+                       estimated_cost_usd=cost, timestamp=ts)
+
+
+def test_flush_writes_calls_and_rollups_and_windows_read_them(tmp_path):
+    clock = _Clock()
+    ledger = UsageLedger(tmp_path / "ledger.sqlite3", clock=clock)
+    ledger.record(_usage(clock.now - 5 * 3600), guild_id=1)
+    ledger.record(_usage(clock.now - 60), guild_id=1)
+    ledger.record(_usage(clock.now - 30, model="local", cost=None), guild_id=1)
+    ledger.record(_usage(clock.now - 10), guild_id=2)
+    assert ledger.flush() == 4 and ledger.flush() == 0
+
+    last_hour = {row["model"]: row for row in ledger.spend(1, hours=1)}
+    assert last_hour["m"]["calls"] == 1 and last_hour["m"]["prompt_tokens"] == 100
+    assert last_hour["local"]["unpriced_calls"] == 1 and last_hour["local"]["cost_per_call"] is None
+
+    all_time = {row["model"]: row for row in ledger.spend(1)}
+    assert all_time["m"]["calls"] == 2 and all_time["m"]["cost_usd"] == 0.02
+    assert all_time["m"]["cost_per_call"] == 0.01
+    assert sum(row["calls"] for row in ledger.spend()) == 4
+
+    hourly = ledger.hourly_cost(1, hours=6)
+    assert len(hourly) == 6 and hourly[0] == 0.01 and hourly[-1] == 0.01
+
+    # Reads flush first; a second flush accumulates into the same rollup rows.
+    ledger.record(_usage(clock.now), guild_id=1)
+    assert {row["model"]: row["calls"] for row in ledger.spend(1)}["m"] == 3
+    ledger.close()
+    conn = sqlite3.connect(str(tmp_path / "ledger.sqlite3"))
+    assert conn.execute("SELECT COUNT(*) FROM usage").fetchone()[0] == 5
+    assert conn.execute("SELECT COUNT(*) FROM usage_totals WHERE guild_id = 1").fetchone()[0] == 2
+
+
+def test_guild_of_and_client_tracking(tmp_path):
+    assert guild_of({"guild": "42"}) == 42
+    assert guild_of({"guild": "DM"}) == 0 and guild_of(None) == 0
+
+    client = LLMClient.__new__(LLMClient)
+    client.ledger = None
+    client._track(_usage(0.0), {"guild": 7}, "chat")  # ledger off: no-op
+    client.ledger = UsageLedger(tmp_path / "ledger.sqlite3", clock=lambda: 0.0)
+    client._track(_usage(0.0), {"guild": 7}, "stream")
+    client._track(None, {"guild": 7}, "chat")
+    assert [row["calls"] for row in client.ledger.spend(7)] == [1]
+    client.ledger.close()
+
+
+def test_usage_summary_op_payload_carries_the_numbers(tmp_path):
+    gpt = Gpt.__new__(Gpt)
+    gpt.logger = logging.getLogger("test")
+    ledger = UsageLedger(tmp_path / "ledger.sqlite3", clock=lambda: 10 * 3600.0)
+    gpt.llm = SimpleNamespace(ledger=ledger)
+    ledger.record(_usage(10 * 3600.0, cost=0.25), guild_id=5)
+
+    reg = OpsRegistry()
+    assert "ai_usage_summary" in reg.register_cog_ops(gpt)
+    o = reg.require("ai_usage_summary")
+    ctx = SimpleNamespace(guild=SimpleNamespace(id=5))
+    payload = o.result_payload(OpResult(ok=True, value=asyncio.run(o.impl(ctx, hours=24))))
+    assert payload["ok"] is True and payload["enabled"] is True
+    assert payload["calls"] == 1 and payload["cost_usd"] == 0.25
+    assert payload["models"][0]["model"] == "m"
+    ledger.close()
+
+    gpt.llm = SimpleNamespace(ledger=None)
+    assert gpt.usage_summary(5)["enabled"] is False
+
+
+def test_a_failed_flush_keeps_the_batch_the_loop_and_the_reads_running(tmp_path, caplog):
+    clock = _Clock()
+    ledger = UsageLedger(tmp_path / "ledger.sqlite3", clock=clock)
+    gpt = Gpt.__new__(Gpt)
+    gpt.logger = logging.getLogger("test")
+    gpt.llm = SimpleNamespace(ledger=ledger)
+    ledger.record(_usage(clock.now, model="first"), guild_id=1)
+    ledger._conn.execute("ALTER TABLE usage RENAME TO usage_moved")  # every write now fails
+
+    asyncio.run(Gpt.flush_usage_ledger.coro(gpt))
+    assert "Could not flush the usage ledger" in caplog.text
+    ledger.record(_usage(clock.now, model="second"), guild_id=1)
+    assert [row[3] for row in ledger._pending] == ["first", "second"]
+
+    # Reads still answer, from what is persisted: nothing yet.
+    assert gpt.usage_summary(1)["calls"] == 0 and ledger.hourly_cost(1, 1) == [0.0]
+    assert len(ledger._pending) == 2
+
+    ledger._conn.execute("ALTER TABLE usage_moved RENAME TO usage")
+    asyncio.run(Gpt.flush_usage_ledger.coro(gpt))
+    assert ledger._pending == []
+    assert sorted(row["model"] for row in ledger.spend(1)) == ["first", "second"]
+    ledger.close()